@@ -1,19 +1,53 @@
 from flask import Flask
-from app.main import main as main_blueprint
-from app.controle_de_isv import controle_de_isv_bp as controle_de_isv_blueprint
-from app.controle_vencimento import controle_vencimento as controle_vencimento_blueprint
-from app.controle_de_perdas import controle_de_perdas as controle_perdas_blueprint
-from app.controle_ruptura import controle_ruptura as controle_ruptura_blueprint
+from app import admission, assets, cache, colunar, cursores, deltas, eventos, export_jobs, importacao, lojas, offline, profiling, relatorios, saude
 
 
 
-def create_app():
-    app = Flask(__name__)
-    
+def create_app(config=None):
+    """
+    Monta a aplicação.
+
+    A configuração é lida antes dos ``init_app``, que só preenchem o que
+    faltar: ``instance/portal.cfg`` (ou o arquivo em ``PORTAL_CONFIG``),
+    depois as variáveis ``PORTAL_<CHAVE>`` do ambiente (valores em JSON,
+    ``PORTAL_LOJAS_FONTES__889__smg12=/caminho`` para chaves aninhadas) e por
+    fim ``config``.
+    """
+    # Importar os blueprints aqui deixa "import app" leve (ex.: app.datasets
+    # no gerador de dados do teste de carga)
+    from app.main import main as main_blueprint
+    from app.controle_de_isv import controle_de_isv_bp as controle_de_isv_blueprint
+    from app.controle_vencimento import controle_vencimento as controle_vencimento_blueprint
+    from app.controle_de_perdas import controle_de_perdas as controle_perdas_blueprint
+    from app.controle_ruptura import controle_ruptura as controle_ruptura_blueprint
+    from app.fornecedores import fornecedores as fornecedores_blueprint
+
+    app = Flask(__name__, instance_relative_config=True)
+    app.config.from_pyfile('portal.cfg', silent=True)
+    app.config.from_envvar('PORTAL_CONFIG', silent=True)
+    app.config.from_prefixed_env('PORTAL')
+    if config:
+        app.config.update(config)
+
+    profiling.init_app(app)
+    admission.init_app(app)
+    assets.init_app(app)
+    export_jobs.init_app(app)
+    lojas.init_app(app)
+    cache.init_app(app)
+    cursores.init_app(app)
+    deltas.init_app(app)
+    eventos.init_app(app)
+    saude.init_app(app)
+    importacao.init_app(app)
+    relatorios.init_app(app)
+    offline.init_app(app)
+    colunar.init_app(app)
     app.register_blueprint(main_blueprint)
     app.register_blueprint(controle_de_isv_blueprint, url_prefix='/controle-isv')
     app.register_blueprint(controle_vencimento_blueprint, url_prefix='/controle-vencimento')
     app.register_blueprint(controle_perdas_blueprint, url_prefix='/controle-perdas')
     app.register_blueprint(controle_ruptura_blueprint, url_prefix='/controle-ruptura')
-    
-    return app
\ No newline at end of file
+    app.register_blueprint(fornecedores_blueprint, url_prefix='/fornecedores')
+
+    return app
@@ -0,0 +1,260 @@
+"""
+Controle de admissão (bulkhead) por classe de rota.
+
+As rotas pesadas (impressões de lista completa, exportações, totalperdas)
+disputam os mesmos workers das páginas paginadas e das APIs rápidas. Aqui
+cada classe de rota ganha seu próprio limite de requisições simultâneas e
+tempo máximo de espera na fila; quando a fila da classe está cheia ou o
+tempo de espera estoura, a requisição é recusada na hora com 503 e
+``Retry-After`` em vez de segurar uma thread.
+
+Os limites valem por processo; com o gunicorn use workers ``gthread``
+(``--threads``) para que haja concorrência dentro de cada worker. No
+``post_worker_init`` os limites configurados viram tetos ajustados às threads
+do worker (``ajustar_ao_worker``): as pesadas em execução, as que esperam na
+fila e as conexões de eventos somam no máximo ``threads - 1``, e a classe
+interativa admite ``threads - 1`` de cada vez. Sempre sobra uma thread para as
+páginas e para responder o 503.
+
+Configuração (app.config):
+    ADMISSION_CLASSES  {classe: {'limit', 'queue_timeout', 'max_queue', 'retry_after'}}
+    ADMISSION_ROUTES   {endpoint: classe}; endpoints não listados usam 'interativa'
+
+Endpoints de ``LISTAS_LIMITADAS`` só são pesados sem o parâmetro de limite
+(ou com um limite acima do teto): ``/fornecedores/api?limite=20`` é
+interativo, ``/fornecedores/api`` devolve a lista inteira e é pesado.
+
+Métricas: GET /metricas/admissao
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+CLASSE_PESADA = 'pesada'
+CLASSE_INTERATIVA = 'interativa'
+
+DEFAULT_CLASSES = {
+    CLASSE_PESADA: {'limit': 2, 'queue_timeout': 5.0, 'max_queue': 4, 'retry_after': 10},
+    CLASSE_INTERATIVA: {'limit': 16, 'queue_timeout': 15.0, 'max_queue': 64, 'retry_after': 2},
+}
+
+DEFAULT_ROUTES = {
+    'controle_ruptura.imprimir': CLASSE_PESADA,
+    'controle_ruptura.export_excel': CLASSE_PESADA,
+    'controle_vencimento.imprimir': CLASSE_PESADA,
+    'controle_vencimento.exportar': CLASSE_PESADA,
+    'controle_vencimento.exportar_vencendo45': CLASSE_PESADA,
+    'controle_vencimento.exportar_valoravencer': CLASSE_PESADA,
+    'controle_de_perdas.totalperdas': CLASSE_PESADA,
+    'controle_de_perdas.perdafrios': CLASSE_PESADA,
+    'colunar.baixar': CLASSE_PESADA,
+    # Consolidado de todas as lojas no pool de processos (até LOJAS_REGIONAL_TIMEOUT)
+    'controle_ruptura.regional': CLASSE_PESADA,
+    'controle_de_perdas.regional': CLASSE_PESADA,
+    'controle_vencimento.exportar_risco': CLASSE_PESADA,
+    # Dataset inteiro em JSON para a cópia offline
+    'offline.api_dataset': CLASSE_PESADA,
+    'fornecedores.api': CLASSE_PESADA,
+}
+
+# {endpoint: (parâmetro, teto)}: com o parâmetro até o teto a rota é interativa
+LISTAS_LIMITADAS = {
+    'fornecedores.api': ('limite', 500),
+}
+
+# Endpoints que nunca passam pela admissão (arquivos estáticos, métricas e eventos)
+EXEMPT_ENDPOINTS = {
+    'static', 'assets', 'admission_metrics', 'lojas_metrics', 'cache_metrics', 'cursores_metrics',
+    'saude', 'saude_pronto',
+    # Conexões SSE longas; têm limite próprio (EVENTOS_MAX_CONEXOES)
+    'eventos.stream', 'eventos.versoes',
+}
+
+# Quantas esperas recentes guardar para os percentis
+WAIT_SAMPLES = 1000
+
+
+class Bulkhead:
+    """Semáforo com fila limitada e métricas para uma classe de rota."""
+
+    def __init__(self, name, limit, queue_timeout, max_queue, retry_after):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    def acquire(self):
+        """Tenta admitir a requisição; retorna False se deve ser recusada."""
+        # Caminho rápido: vaga livre, sem entrar na fila
+        if self._semaphore.acquire(blocking=False):
+            self._record_admission(0.0)
+            return True
+
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                return False
+            self.waiting += 1
+
+        inicio = time.perf_counter()
+        admitido = self._semaphore.acquire(timeout=self.queue_timeout)
+        espera = time.perf_counter() - inicio
+
+        with self._lock:
+            self.waiting -= 1
+            if not admitido:
+                self.rejected_timeout += 1
+        if admitido:
+            self._record_admission(espera)
+        return admitido
+
+    def _record_admission(self, espera):
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+            self.total_wait += espera
+            self.max_wait = max(self.max_wait, espera)
+            self._waits.append(espera)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            admitted = self.admitted
+            dados = {
+                'limit': self.limit,
+                'queue_timeout': self.queue_timeout,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'queue_depth': self.waiting,
+                'admitted': admitted,
+                'rejected_queue_full': self.rejected_queue_full,
+                'rejected_timeout': self.rejected_timeout,
+                'wait_avg_ms': round(self.total_wait / admitted * 1000, 2) if admitted else 0.0,
+                'wait_max_ms': round(self.max_wait * 1000, 2),
+            }
+        for nome, q in (('wait_p50_ms', 0.50), ('wait_p95_ms', 0.95), ('wait_p99_ms', 0.99)):
+            dados[nome] = round(waits[min(int(q * len(waits)), len(waits) - 1)] * 1000, 2) if waits else 0.0
+        return dados
+
+
+class AdmissionController:
+    """Classifica cada requisição e aplica o bulkhead da sua classe."""
+
+    def __init__(self, classes, routes):
+        self.routes = dict(routes)
+        self.bulkheads = {
+            nome: Bulkhead(nome, **cfg) for nome, cfg in classes.items()
+        }
+
+    def classify(self, endpoint, args=None):
+        classe = self.routes.get(endpoint, CLASSE_INTERATIVA)
+        if classe == CLASSE_PESADA and args is not None and endpoint in LISTAS_LIMITADAS:
+            parametro, teto = LISTAS_LIMITADAS[endpoint]
+            limite = args.get(parametro, type=int)
+            if limite is not None and limite <= teto:
+                return CLASSE_INTERATIVA
+        return classe
+
+    def before_request(self):
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in EXEMPT_ENDPOINTS or endpoint.endswith('.static'):
+            return None
+        bulkhead = self.bulkheads.get(self.classify(endpoint, request.args))
+        if bulkhead is None:
+            return None
+        if not bulkhead.acquire():
+            return self._overloaded(bulkhead)
+        g.admission_bulkhead = bulkhead
+        return None
+
+    def teardown_request(self, exc=None):
+        bulkhead = g.pop('admission_bulkhead', None)
+        if bulkhead is not None:
+            bulkhead.release()
+
+    def _overloaded(self, bulkhead):
+        mensagem = 'Servidor ocupado com relatórios pesados, tente novamente em instantes.'
+        if request.accept_mimetypes.best == 'application/json':
+            response = jsonify({'success': False, 'error': mensagem, 'classe': bulkhead.name})
+        else:
+            response = current_app.response_class(mensagem, mimetype='text/plain')
+        response.status_code = 503
+        response.headers['Retry-After'] = str(bulkhead.retry_after)
+        return response
+
+    def snapshot(self):
+        return {nome: b.snapshot() for nome, b in self.bulkheads.items()}
+
+
+def ajustar_ao_worker(app, worker_class, threads):
+    """
+    Ajusta os limites das classes às threads do worker do gunicorn (no ``post_worker_init``).
+
+    Chamar depois de ``app.eventos.limitar_ao_worker``: as conexões de eventos
+    entram na conta das pesadas e, se preciso, perdem vagas para elas.
+    Workers gevent/eventlet não prendem uma thread por requisição e ficam
+    com os limites configurados.
+    """
+    if any(nome in str(worker_class).lower() for nome in ('gevent', 'eventlet')):
+        return
+    classes = app.config['ADMISSION_CLASSES']
+    streams = app.extensions['eventos']
+    reserva = max(1, threads - 1)
+
+    pesada = classes[CLASSE_PESADA]
+    pesada['limit'] = max(1, min(pesada['limit'], reserva))
+    streams.max_conexoes = max(0, min(streams.max_conexoes, reserva - pesada['limit']))
+    pesada['max_queue'] = max(0, min(pesada['max_queue'], reserva - pesada['limit'] - streams.max_conexoes))
+
+    interativa = classes[CLASSE_INTERATIVA]
+    interativa['limit'] = max(1, min(interativa['limit'], reserva))
+    interativa['max_queue'] = max(0, min(interativa['max_queue'], threads - interativa['limit']))
+
+    # Ainda sem requisições neste processo: recria os semáforos com os novos limites
+    controller = app.extensions['admission']
+    controller.bulkheads = {nome: Bulkhead(nome, **cfg) for nome, cfg in classes.items()}
+    logger.info('Admissão: %s thread(s); pesada %s+%s na fila, eventos %s, interativa %s+%s na fila',
+                threads, pesada['limit'], pesada['max_queue'], streams.max_conexoes,
+                interativa['limit'], interativa['max_queue'])
+
+
+def admission_metrics():
+    """Profundidade de fila, tempo de espera e recusas por classe de rota."""
+    return jsonify(current_app.extensions['admission'].snapshot())
+
+
+def init_app(app):
+    # O configurado completa os padrões: PORTAL_ADMISSION_CLASSES__pesada__limit=2
+    # muda só o limite da classe pesada
+    classes = dict(app.config.get('ADMISSION_CLASSES') or {})
+    app.config['ADMISSION_CLASSES'] = {
+        nome: dict(DEFAULT_CLASSES.get(nome, {}), **classes.get(nome, {}))
+        for nome in {**DEFAULT_CLASSES, **classes}
+    }
+    app.config['ADMISSION_ROUTES'] = dict(DEFAULT_ROUTES, **(app.config.get('ADMISSION_ROUTES') or {}))
+    controller = AdmissionController(app.config['ADMISSION_CLASSES'], app.config['ADMISSION_ROUTES'])
+    app.extensions['admission'] = controller
+    app.before_request(controller.before_request)
+    app.teardown_request(controller.teardown_request)
+    app.add_url_rule('/metricas/admissao', 'admission_metrics', admission_metrics)
@@ -0,0 +1,192 @@
+"""
+Pipeline de assets estáticos (CSS/JS) dos blueprints.
+
+O comando ``flask assets build`` copia cada ``.css``/``.js`` da pasta
+``static`` de cada blueprint para ``static/dist`` com o hash do conteúdo no
+nome (``controle_ruptura.3f9a1c2b7d4e.css``), gera as versões pré-comprimidas
+(``.gz`` e, se o pacote ``brotli`` estiver instalado, ``.br``) e grava um
+``manifest.json`` com o mapeamento nome original -> nome com hash.
+
+Nos templates, ``asset_url('controle_ruptura.static', filename='x.css')``
+aponta para o arquivo com hash servido em ``/assets/...`` com cache imutável
+de um ano. Sem build (ambiente de desenvolvimento) cai para a rota ``static``
+normal do blueprint com ``?v=<hash>`` para não servir versão antiga.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import click
+from flask import abort, current_app, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional, sem ele só gera .gz
+    brotli = None
+
+ASSET_EXTENSIONS = ('.css', '.js')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Codificações pré-comprimidas em ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifests = {}
+_runtime_hashes = {}
+
+
+def _static_roots(app):
+    """Retorna {nome: pasta_static} da aplicação e de cada blueprint."""
+    roots = {}
+    if app.static_folder and os.path.isdir(app.static_folder):
+        roots['app'] = app.static_folder
+    for name, blueprint in app.blueprints.items():
+        folder = blueprint.static_folder
+        if folder and os.path.isdir(folder):
+            roots[name] = folder
+    return roots
+
+
+def _root_for_endpoint(endpoint):
+    """'controle_ruptura.static' -> 'controle_ruptura'; 'static' -> 'app'."""
+    if endpoint == 'static':
+        return 'app'
+    return endpoint.rsplit('.', 1)[0]
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+
+
+def _iter_assets(folder):
+    """Percorre os assets de uma pasta static, ignorando a pasta dist."""
+    for dirpath, dirnames, filenames in os.walk(folder):
+        if dirpath == folder and DIST_DIR in dirnames:
+            dirnames.remove(DIST_DIR)
+        for filename in sorted(filenames):
+            if filename.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, folder).replace(os.sep, '/'), path
+
+
+def _write_compressed(path, content):
+    """Grava as variantes .gz/.br ao lado do arquivo com hash."""
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0 deixa o .gz determinístico entre builds
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content))
+
+
+def build_assets(app):
+    """Gera os arquivos com hash, as versões comprimidas e os manifestos."""
+    resumo = {}
+    for root, folder in _static_roots(app).items():
+        dist = os.path.join(folder, DIST_DIR)
+        manifest = {}
+        for rel_path, path in _iter_assets(folder):
+            with open(path, 'rb') as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+            stem, ext = os.path.splitext(rel_path)
+            hashed = f'{stem}.{digest}{ext}'
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if not os.path.exists(target):
+                with open(target, 'wb') as f:
+                    f.write(content)
+                _write_compressed(target, content)
+            manifest[rel_path] = hashed
+        if manifest:
+            with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            resumo[root] = manifest
+    _manifests.clear()
+    return resumo
+
+
+def _load_manifest(app, root):
+    if root not in _manifests:
+        folder = _static_roots(app).get(root)
+        manifest = {}
+        if folder:
+            path = os.path.join(folder, DIST_DIR, MANIFEST_NAME)
+            if os.path.exists(path):
+                with open(path) as f:
+                    manifest = json.load(f)
+        _manifests[root] = manifest
+    return _manifests[root]
+
+
+def asset_url(endpoint, filename):
+    """Equivalente ao url_for(endpoint, filename=...) para assets com hash."""
+    app = current_app._get_current_object()
+    root = _root_for_endpoint(endpoint)
+    hashed = _load_manifest(app, root).get(filename)
+    if hashed:
+        return url_for('assets', root=root, filename=hashed)
+
+    # Sem build: usa a rota static normal com o hash na query string
+    folder = _static_roots(app).get(root)
+    path = os.path.join(folder, filename) if folder else None
+    if path and os.path.exists(path):
+        key = (path, os.path.getmtime(path))
+        if key not in _runtime_hashes:
+            _runtime_hashes[key] = _file_hash(path)
+        return url_for(endpoint, filename=filename, v=_runtime_hashes[key])
+    return url_for(endpoint, filename=filename)
+
+
+def serve_asset(root, filename):
+    """Serve um asset com hash, preferindo a variante pré-comprimida."""
+    folder = _static_roots(current_app).get(root)
+    if not folder:
+        abort(404)
+    dist = os.path.realpath(os.path.join(folder, DIST_DIR))
+    path = os.path.realpath(os.path.join(dist, filename))
+    if not path.startswith(dist + os.sep) or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    accepted = request.accept_encodings
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if accepted[name] and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, name
+            break
+
+    response = send_file(path, mimetype=mimetype, max_age=CACHE_MAX_AGE,
+                         conditional=True, download_name=os.path.basename(filename))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@click.group('assets')
+def assets_cli():
+    """Comandos do pipeline de assets estáticos."""
+
+
+@assets_cli.command('build')
+def build_command():
+    """Gera os assets com hash e pré-comprimidos em static/dist."""
+    resumo = build_assets(current_app)
+    for root, manifest in resumo.items():
+        click.echo(f'{root}: {len(manifest)} arquivo(s)')
+    if brotli is None:
+        click.echo('Aviso: pacote brotli não instalado, gerado apenas .gz')
+
+
+def init_app(app):
+    app.add_url_rule('/assets/<root>/<path:filename>', 'assets', serve_asset)
+    app.add_template_global(asset_url)
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,487 @@
+"""
+Cache compartilhado de resultados caros (agregados e páginas renderizadas).
+
+Com vários nós do portal atrás de um balanceador, cada um recalcularia os
+mesmos agregados (perdas por grupo, estatísticas de ruptura por grupo) e as
+mesmas páginas de impressão. ``cached(nome, fontes, func, *partes)`` guarda o
+resultado pela versão dos arquivos de origem da loja: quando o arquivo muda,
+a chave muda junto e o valor antigo simplesmente deixa de ser lido (e expira
+por ``CACHE_TTL``).
+
+Duas camadas:
+
+- local: LRU em memória do processo (``MemoryBackend``), sempre presente;
+- compartilhada (``CACHE_BACKEND``): ``filesystem`` (pasta em disco de rede,
+  ``CACHE_DIR``) ou ``redis`` (qualquer servidor que fale o protocolo do
+  Redis, ``CACHE_URL``). ``memory`` desliga a camada compartilhada.
+
+Para calcular uma vez por versão no cluster, o nó que não encontra o valor
+tenta pegar uma trava (``SET NX`` no Redis, arquivo exclusivo no disco): quem
+pega calcula e grava; os demais esperam o valor aparecer por até
+``CACHE_ESPERA_S`` segundos. Falhas do backend compartilhado não derrubam a
+página: o valor é calculado localmente, o erro vai para o log e o backend
+fica de lado por ``PAUSA_APOS_ERRO`` segundos.
+
+Os valores vão serializados: texto (HTML) em UTF-8 e o resto (DataFrames,
+dicts) em pickle, comprimidos acima de alguns KB. Use só em rede interna:
+quem escreve no backend compartilhado consegue executar código nos nós.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from flask import current_app, jsonify
+
+from app.lojas import loja_atual, versao_fontes
+
+logger = logging.getLogger(__name__)
+
+PREFIXO = 'portal'
+# Depois de uma falha, quantos segundos trabalhar só com a camada local
+PAUSA_APOS_ERRO = 30
+COMPRIMIR_ACIMA = 4096
+INTERVALO_ESPERA = 0.1
+
+
+def serializar(valor):
+    """Bytes do valor: 1 byte de tipo (T texto, P pickle; minúsculo = zlib) + dados."""
+    if isinstance(valor, str):
+        tipo, dados = b'T', valor.encode('utf-8')
+    else:
+        tipo, dados = b'P', pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(dados) > COMPRIMIR_ACIMA:
+        return tipo.lower() + zlib.compress(dados, 1)
+    return tipo + dados
+
+
+def desserializar(dados):
+    tipo, corpo = dados[:1], dados[1:]
+    if tipo.islower():
+        corpo = zlib.decompress(corpo)
+    if tipo.upper() == b'T':
+        return corpo.decode('utf-8')
+    return pickle.loads(corpo)
+
+
+# =============== BACKENDS ===============
+
+class MemoryBackend:
+    """LRU em memória do processo; guarda os objetos sem serializar."""
+
+    def __init__(self, max_itens=256):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # chave -> (valor, expira_em)
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em is not None and time.monotonic() > expira_em:
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def add(self, chave, valor, ttl=None):
+        with self._lock:
+            if chave in self._itens:
+                return False
+        self.set(chave, valor, ttl)
+        return True
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class FileBackend:
+    """Um arquivo por chave em uma pasta (pode ser compartilhada entre nós)."""
+
+    # A cada quantas gravações apagar os arquivos expirados
+    LIMPAR_A_CADA = 200
+
+    def __init__(self, pasta, ttl=86400):
+        self.pasta = pasta
+        self.ttl = ttl
+        self._gravacoes = 0
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, chave):
+        nome = hashlib.sha1(chave.encode('utf-8')).hexdigest()
+        return os.path.join(self.pasta, nome[:2], nome)
+
+    def _expirado(self, caminho, ttl):
+        return time.time() - os.path.getmtime(caminho) > ttl
+
+    def get(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            if self._expirado(caminho, self.ttl):
+                return None
+            with open(caminho, 'rb') as f:
+                return desserializar(f.read())
+        except FileNotFoundError:
+            return None
+
+    def set(self, chave, valor, ttl=None):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f'{caminho}.{uuid.uuid4().hex}.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(serializar(valor))
+        os.replace(temporario, caminho)
+
+        self._gravacoes += 1
+        if self._gravacoes % self.LIMPAR_A_CADA == 0:
+            self.limpar()
+
+    def _apagar_vencido(self, caminho, ttl):
+        """
+        Apaga ``caminho`` se ele passou de ``ttl`` segundos.
+
+        Renomeia antes de apagar e confere a idade de novo: se outro nó apagou
+        o vencido e criou um arquivo novo no meio, o novo volta para o lugar.
+        """
+        try:
+            if not self._expirado(caminho, ttl):
+                return False
+        except OSError:
+            return False
+        vencido = f'{caminho}.{uuid.uuid4().hex}.vencido'
+        try:
+            os.rename(caminho, vencido)
+        except OSError:
+            return False
+        try:
+            if not self._expirado(vencido, ttl):
+                try:
+                    os.link(vencido, caminho)
+                except OSError:
+                    pass
+                return False
+            return True
+        finally:
+            try:
+                os.remove(vencido)
+            except OSError:
+                pass
+
+    def add(self, chave, valor, ttl=None):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Trava abandonada (nó que caiu no meio do cálculo)
+        self._apagar_vencido(caminho, ttl or self.ttl)
+        try:
+            fd = os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'wb') as f:
+            f.write(serializar(valor))
+        return True
+
+    def delete(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def limpar(self):
+        """Apaga os arquivos mais velhos que o TTL."""
+        for raiz, _, arquivos in os.walk(self.pasta):
+            for arquivo in arquivos:
+                self._apagar_vencido(os.path.join(raiz, arquivo), self.ttl)
+
+
+class RespError(Exception):
+    """Erro devolvido pelo servidor Redis."""
+
+
+class RedisBackend:
+    """
+    Cliente mínimo do protocolo do Redis (RESP), uma conexão por thread.
+
+    Usa só GET, SET (com EX/NX), DEL, SELECT e AUTH, então funciona com
+    Redis, Valkey, KeyDB ou um servidor substituto local nos testes.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', ttl=86400, timeout=2.0):
+        partes = urlparse(url)
+        self.host = partes.hostname or 'localhost'
+        self.port = partes.port or 6379
+        self.db = int((partes.path or '/0').lstrip('/') or 0)
+        self.password = partes.password
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conectar(self):
+        conexao = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.conexao = conexao
+        self._local.leitor = conexao.makefile('rb')
+        if self.password:
+            self._enviar('AUTH', self.password)
+        if self.db:
+            self._enviar('SELECT', self.db)
+
+    def _fechar(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is not None:
+            try:
+                conexao.close()
+            except OSError:
+                pass
+        self._local.conexao = None
+
+    def _ler_resposta(self):
+        linha = self._local.leitor.readline()
+        if not linha:
+            raise ConnectionError('Conexão com o Redis fechada')
+        tipo, resto = linha[:1], linha[1:-2]
+        if tipo == b'+':
+            return resto.decode()
+        if tipo == b'-':
+            raise RespError(resto.decode())
+        if tipo == b':':
+            return int(resto)
+        if tipo == b'$':
+            tamanho = int(resto)
+            if tamanho < 0:
+                return None
+            dados = self._local.leitor.read(tamanho + 2)
+            return dados[:-2]
+        if tipo == b'*':
+            quantidade = int(resto)
+            if quantidade < 0:
+                return None
+            return [self._ler_resposta() for _ in range(quantidade)]
+        raise ConnectionError(f'Resposta inválida do Redis: {linha!r}')
+
+    def _enviar(self, *args):
+        partes = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            partes.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self._local.conexao.sendall(b''.join(partes))
+        return self._ler_resposta()
+
+    def execute(self, *args):
+        """Executa um comando; reconecta uma vez se a conexão caiu."""
+        for tentativa in range(2):
+            if getattr(self._local, 'conexao', None) is None:
+                self._conectar()
+            try:
+                return self._enviar(*args)
+            except (ConnectionError, OSError):
+                self._fechar()
+                if tentativa:
+                    raise
+
+    def get(self, chave):
+        dados = self.execute('GET', chave)
+        return None if dados is None else desserializar(dados)
+
+    def set(self, chave, valor, ttl=None):
+        self.execute('SET', chave, serializar(valor), 'EX', int(ttl or self.ttl))
+
+    def add(self, chave, valor, ttl=None):
+        return self.execute('SET', chave, serializar(valor), 'NX', 'EX', int(ttl or self.ttl)) is not None
+
+    def delete(self, chave):
+        self.execute('DEL', chave)
+
+
+# =============== CACHE ===============
+
+class SharedCache:
+    """Camada local (LRU) na frente de um backend compartilhado opcional."""
+
+    def __init__(self, local, compartilhado=None, ttl=86400, espera=30):
+        self.local = local
+        self.compartilhado = compartilhado
+        self.ttl = ttl
+        self.espera = espera
+        self.no = f'{socket.gethostname()}:{os.getpid()}'
+        self._calculando = {}
+        self._pausado_ate = 0.0
+        self._lock = threading.Lock()
+        self.contadores = {'local': 0, 'compartilhado': 0, 'calculados': 0, 'esperas': 0, 'erros': 0}
+
+    def _contar(self, nome):
+        with self._lock:
+            self.contadores[nome] += 1
+
+    def _falhou(self, acao, chave, erro):
+        self._contar('erros')
+        self._pausado_ate = time.monotonic() + PAUSA_APOS_ERRO
+        logger.warning(f'Cache compartilhado indisponível ({acao} de {chave}): {erro}')
+
+    def _compartilhado_ativo(self):
+        return self.compartilhado is not None and time.monotonic() >= self._pausado_ate
+
+    def _ler_compartilhado(self, chave):
+        try:
+            return self.compartilhado.get(chave)
+        except Exception as e:
+            self._falhou('leitura', chave, e)
+            return None
+
+    def _calcular(self, chave, func):
+        valor = func()
+        self._contar('calculados')
+        self.local.set(chave, valor, self.ttl)
+        return valor
+
+    def _calcular_no_cluster(self, chave, func):
+        """Calcula se conseguir a trava; senão espera outro nó gravar o valor."""
+        trava = f'{chave}:trava'
+        try:
+            pegou = self.compartilhado.add(trava, self.no, ttl=self.espera)
+        except Exception as e:
+            self._falhou('trava', chave, e)
+            return self._calcular(chave, func)
+
+        if not pegou:
+            self._contar('esperas')
+            limite = time.monotonic() + self.espera
+            while time.monotonic() < limite:
+                time.sleep(INTERVALO_ESPERA)
+                valor = self._ler_compartilhado(chave)
+                if valor is not None:
+                    self.local.set(chave, valor, self.ttl)
+                    return valor
+            logger.warning(f'Tempo esgotado esperando {chave}; calculando neste nó')
+            return self._calcular(chave, func)
+
+        try:
+            valor = self._calcular(chave, func)
+            try:
+                self.compartilhado.set(chave, valor, self.ttl)
+            except Exception as e:
+                self._falhou('gravação', chave, e)
+            return valor
+        finally:
+            try:
+                self.compartilhado.delete(trava)
+            except Exception:
+                pass
+
+    def get_or_compute(self, chave, func):
+        """Valor de ``chave``; ``func()`` roda uma vez por chave no cluster."""
+        valor = self.local.get(chave)
+        if valor is not None:
+            self._contar('local')
+            return valor
+
+        # Uma thread por chave neste processo vai ao backend (ou calcula)
+        with self._lock:
+            calculando = self._calculando.setdefault(chave, threading.Lock())
+        try:
+            with calculando:
+                valor = self.local.get(chave)
+                if valor is not None:
+                    self._contar('local')
+                    return valor
+
+                if not self._compartilhado_ativo():
+                    return self._calcular(chave, func)
+
+                valor = self._ler_compartilhado(chave)
+                if valor is not None:
+                    self._contar('compartilhado')
+                    self.local.set(chave, valor, self.ttl)
+                    return valor
+                if not self._compartilhado_ativo():
+                    return self._calcular(chave, func)
+                return self._calcular_no_cluster(chave, func)
+        finally:
+            with self._lock:
+                if self._calculando.get(chave) is calculando:
+                    del self._calculando[chave]
+
+    def snapshot(self):
+        with self._lock:
+            contadores = dict(self.contadores)
+        return {
+            'backend': type(self.compartilhado).__name__ if self.compartilhado else 'MemoryBackend',
+            'itens_locais': len(self.local),
+            **contadores,
+        }
+
+
+def chave(nome, loja, versao, partes=()):
+    """Chave legível com a versão dos dados; ``partes`` (filtros) entram como hash."""
+    resumo = hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()[:16]
+    return f'{PREFIXO}:{nome}:{loja}:{versao}:{resumo}'
+
+
+def get_cache():
+    return current_app.extensions['cache']
+
+
+def cached(nome, fontes, func, *partes, loja=None):
+    """
+    Resultado de ``func()`` para a versão atual das ``fontes`` da loja.
+
+    Args:
+        nome: nome do resultado (prefixo da chave)
+        fontes: nomes em ``app.datasets.SOURCES`` de que o resultado depende
+        partes: demais valores que mudam o resultado (filtros, data do dia)
+    """
+    loja = loja or loja_atual()
+    return get_cache().get_or_compute(chave(nome, loja, versao_fontes(fontes, [loja]), partes), func)
+
+
+def cache_metrics():
+    """Acertos por camada, cálculos e erros do cache compartilhado."""
+    return jsonify(get_cache().snapshot())
+
+
+def criar_backend(app):
+    tipo = app.config['CACHE_BACKEND']
+    if tipo == 'memory':
+        return None
+    if tipo == 'filesystem':
+        return FileBackend(app.config['CACHE_DIR'], ttl=app.config['CACHE_TTL'])
+    if tipo == 'redis':
+        return RedisBackend(app.config['CACHE_URL'], ttl=app.config['CACHE_TTL'])
+    raise ValueError(f'CACHE_BACKEND desconhecido: {tipo}')
+
+
+def init_app(app):
+    app.config.setdefault('CACHE_BACKEND', os.environ.get('PORTAL_CACHE', 'memory'))
+    app.config.setdefault('CACHE_URL', os.environ.get('PORTAL_CACHE_URL', 'redis://localhost:6379/0'))
+    app.config.setdefault('CACHE_DIR', os.environ.get('PORTAL_CACHE_DIR', os.path.join(app.instance_path, 'cache')))
+    app.config.setdefault('CACHE_ITENS_LOCAIS', 256)
+    app.config.setdefault('CACHE_TTL', 86400)
+    app.config.setdefault('CACHE_ESPERA_S', 30)
+
+    app.extensions['cache'] = SharedCache(
+        MemoryBackend(app.config['CACHE_ITENS_LOCAIS']),
+        criar_backend(app),
+        ttl=app.config['CACHE_TTL'],
+        espera=app.config['CACHE_ESPERA_S'],
+    )
+    app.add_url_rule('/metricas/cache', 'cache_metrics', cache_metrics)
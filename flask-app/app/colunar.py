@@ -0,0 +1,223 @@
+"""
+Downloads binários (Arrow IPC e Parquet) dos dados preparados, para análise.
+
+Os analistas puxam os dados para notebooks pandas; o CSV das exportações e
+as tabelas HTML passam por formatação de texto na ida e por parsing na
+volta. Aqui os DataFrames que as telas já têm em memória (ruptura,
+vencimento, ISV, perdas) saem direto em formato colunar: as linhas filtradas
+viram uma tabela Arrow, com só as colunas pedidas, e a resposta é escrita em
+lotes (record batches no Arrow, row groups no Parquet), sem cópia em texto.
+
+Os datasets são registrados pelos blueprints com
+``registrar_colunar(DadosColunares(...))``, cada um com os filtros da sua
+tela: ``posicoes(df, args)`` devolve as posições das linhas que passam nos
+filtros da query string (os mesmos cursores e índices das páginas).
+
+O ``pyarrow`` está no requirements.txt; se faltar na instalação, as rotas de
+download respondem 501 e o catálogo lista os formatos vazios.
+
+Rotas:
+    GET /dados/                 datasets, filtros e formatos (sem carregar os dados)
+    GET /dados/<nome>/colunas   colunas (com tipos) da loja atual; carrega só esse dataset
+    GET /dados/<nome>.arrow     Arrow IPC (stream): ``pyarrow.ipc.open_stream(arquivo).read_pandas()``
+    GET /dados/<nome>.parquet   Parquet: ``pd.read_parquet(arquivo)``
+
+Parâmetros dos downloads: ``colunas=A,B`` (projeção), ``loja=`` e os filtros
+do dataset. A ETag sai da versão dos dados servidos (a fixada na requisição,
+``app.lojas``), da data e dos parâmetros;
+``If-None-Match`` com a mesma ETag responde 304.
+"""
+import hashlib
+import importlib.util
+import io
+import json
+from datetime import date
+
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
+
+from app.lazy import lazy_import
+from app.lojas import loja_atual, versao_fontes
+
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+
+colunar = Blueprint('colunar', __name__, url_prefix='/dados')
+
+# Datasets registrados pelos blueprints, por nome
+_datasets = {}
+
+FORMATOS = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def pyarrow_disponivel():
+    """O pacote ``pyarrow`` está instalado (sem importá-lo)."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+class DadosColunares:
+    """Um dataset disponível para download colunar."""
+
+    def __init__(self, nome, titulo, fontes, carregar, filtros=None, posicoes=None):
+        """
+        Args:
+            carregar: ``carregar(loja)`` -> DataFrame preparado da loja
+            filtros: {parâmetro: descrição} dos filtros aceitos
+            posicoes: ``posicoes(df, args)`` -> posições das linhas que passam
+                nos filtros de ``args`` (a query string); None devolve todas.
+                ValueError vira resposta 400 (filtro inválido)
+        """
+        self.nome = nome
+        self.titulo = titulo
+        self.fontes = tuple(fontes)
+        self.carregar = carregar
+        self.filtros = dict(filtros or {})
+        self.posicoes = posicoes
+
+
+def registrar_colunar(ds):
+    """Registra um dataset para os downloads colunares."""
+    _datasets[ds.nome] = ds
+    return ds
+
+
+def _erro(mensagem, status):
+    response = jsonify({'erro': mensagem})
+    response.status_code = status
+    return response
+
+
+def _tabela(df):
+    """
+    DataFrame -> ``pyarrow.Table`` sem o índice.
+
+    Colunas de texto com tipos misturados (números e textos na mesma coluna
+    vindos das planilhas) viram texto; os vazios continuam nulos.
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        df = df.copy()
+        for coluna in df.columns[df.dtypes == object]:
+            df[coluna] = df[coluna].where(df[coluna].isna(), df[coluna].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _drenar(buffer):
+    """Bytes escritos no ``buffer`` desde a última drenagem."""
+    dados = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return dados
+
+
+def gerar_arrow(tabela, lote):
+    """Arrow IPC (stream) da tabela, um record batch de até ``lote`` linhas por vez."""
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, tabela.schema) as escritor:
+        for batch in tabela.to_batches(max_chunksize=lote):
+            escritor.write_batch(batch)
+            yield _drenar(buffer)
+    yield _drenar(buffer)
+
+
+def gerar_parquet(tabela, lote, compressao='snappy'):
+    """Parquet da tabela, um row group de até ``lote`` linhas por vez."""
+    buffer = io.BytesIO()
+    with pq.ParquetWriter(buffer, tabela.schema, compression=compressao) as escritor:
+        for inicio in range(0, max(tabela.num_rows, 1), lote):
+            escritor.write_table(tabela.slice(inicio, lote))
+            yield _drenar(buffer)
+    yield _drenar(buffer)
+
+
+def _etag(ds, loja, formato, colunas, args):
+    versao = versao_fontes(ds.fontes, [loja])
+    filtros = {nome: args[nome] for nome in sorted(ds.filtros) if args.get(nome)}
+    # A data entra porque há filtros relativos a hoje (lotes não vencidos, caixas do dia)
+    conteudo = json.dumps([ds.nome, loja, versao, date.today().isoformat(), formato, colunas, filtros], default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:32]
+
+
+@colunar.route('/')
+def catalogo():
+    """Datasets disponíveis e filtros; as colunas ficam em ``/dados/<nome>/colunas``."""
+    formatos = sorted(FORMATOS) if pyarrow_disponivel() else []
+    datasets = [{
+        'nome': ds.nome,
+        'titulo': ds.titulo,
+        'filtros': ds.filtros,
+        'formatos': formatos,
+        'colunas_url': url_for('colunar.colunas', nome=ds.nome),
+        'downloads': {formato: url_for('colunar.baixar', nome=ds.nome, formato=formato) for formato in formatos},
+    } for ds in _datasets.values()]
+    return jsonify({'loja': loja_atual(), 'formatos': formatos, 'datasets': datasets})
+
+
+@colunar.route('/<nome>/colunas')
+def colunas(nome):
+    """Colunas (e tipos) e linhas do dataset na loja atual."""
+    ds = _datasets.get(nome)
+    if ds is None:
+        return _erro(f'Dataset desconhecido: {nome}', 404)
+    loja = loja_atual()
+    df = ds.carregar(loja)
+    return jsonify({
+        'nome': ds.nome,
+        'loja': loja,
+        'linhas': int(len(df)),
+        'colunas': {str(c): str(t) for c, t in df.dtypes.items()},
+    })
+
+
+@colunar.route('/<nome>.<formato>')
+def baixar(nome, formato):
+    ds = _datasets.get(nome)
+    if ds is None or formato not in FORMATOS:
+        return _erro(f'Dataset ou formato desconhecido: {nome}.{formato}', 404)
+    if not pyarrow_disponivel():
+        return _erro('Downloads colunares indisponíveis: pacote pyarrow não instalado', 501)
+
+    loja = loja_atual()
+    pedidas = [c.strip() for c in request.args.get('colunas', '').split(',') if c.strip()]
+    # Carregar antes fixa a versão dos dados na requisição: a ETag é a deles
+    df = ds.carregar(loja)
+    etag = _etag(ds, loja, formato, pedidas, request.args)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    desconhecidas = [c for c in pedidas if c not in df.columns]
+    if desconhecidas:
+        return _erro(f'Colunas desconhecidas: {desconhecidas}', 400)
+    colunas = pedidas or list(df.columns)
+
+    # Projeção e filtro em um passo: só as colunas pedidas das linhas que passam são copiadas
+    try:
+        linhas = ds.posicoes(df, request.args) if ds.posicoes is not None else slice(None)
+    except ValueError as e:
+        return _erro(str(e), 400)
+    tabela = _tabela(df.iloc[linhas, [df.columns.get_loc(c) for c in colunas]])
+
+    # O gerador roda depois do fim da requisição: a configuração é lida aqui
+    lote = current_app.config['COLUNAR_LINHAS_POR_LOTE']
+    if formato == 'arrow':
+        partes = gerar_arrow(tabela, lote)
+    else:
+        partes = gerar_parquet(tabela, lote, current_app.config['COLUNAR_COMPRESSAO'])
+    response = Response(partes, mimetype=FORMATOS[formato])
+    response.headers['Content-Disposition'] = f'attachment; filename={nome}_{loja}.{formato}'
+    response.headers['X-Linhas'] = str(tabela.num_rows)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('COLUNAR_LINHAS_POR_LOTE', 65536)
+    app.config.setdefault('COLUNAR_COMPRESSAO', 'snappy')
+    app.register_blueprint(colunar)
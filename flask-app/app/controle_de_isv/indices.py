@@ -0,0 +1,117 @@
+"""
+Índices da tabela do ISV, montados uma vez por carga dos dados.
+
+- DIAS S/VND e IDADE: a ordem das linhas por valor (``argsort``) e os
+  valores já ordenados; um filtro de intervalo vira duas buscas binárias
+  (``searchsorted``) e uma fatia da ordem;
+- FORNECEDOR: código de cada linha (``factorize``) e as linhas de cada
+  fornecedor agrupadas, para a faceta com contagens.
+
+As consultas cruzam posições de linha (arrays de inteiros) e só as linhas
+exibidas saem do DataFrame; a tabela não é copiada nem convertida de novo.
+"""
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+COLUNAS = ['CODIGO', 'DESCRICAO', 'EMBALAGEM', 'FORNECEDOR', 'ESTOQUE EMB1', 'ESTOQUE EMB9', 'IDADE', 'DIAS S/VND']
+COLUNAS_NUMERICAS = ['ESTOQUE EMB1', 'ESTOQUE EMB9', 'IDADE', 'DIAS S/VND']
+COLUNAS_INTERVALO = ['DIAS S/VND', 'IDADE']
+SEM_FORNECEDOR = 'SEM FORNECEDOR'
+
+
+class IndiceIntervalo:
+    """Linhas ordenadas pelo valor de uma coluna numérica."""
+
+    def __init__(self, valores):
+        self.ordem = np.argsort(valores, kind='stable')
+        self.valores = valores[self.ordem]
+
+    def entre(self, minimo=None, maximo=None):
+        """Posições (sem ordem definida) das linhas com minimo <= valor <= maximo."""
+        inicio = 0 if minimo is None else np.searchsorted(self.valores, minimo, side='left')
+        fim = len(self.valores) if maximo is None else np.searchsorted(self.valores, maximo, side='right')
+        return self.ordem[inicio:max(inicio, fim)]
+
+
+class IsvIndex:
+    """Tabela do ISV normalizada com índices de intervalo e faceta de fornecedor."""
+
+    def __init__(self, df, versao=None):
+        self.versao = versao
+        df = df.reindex(columns=COLUNAS)
+        for coluna in COLUNAS:
+            if coluna in COLUNAS_NUMERICAS:
+                df[coluna] = pd.to_numeric(df[coluna], errors='coerce').fillna(0).astype(int)
+            else:
+                df[coluna] = df[coluna].fillna('')
+        self.df = df.reset_index(drop=True)
+
+        self.intervalos = {coluna: IndiceIntervalo(self.df[coluna].to_numpy()) for coluna in COLUNAS_INTERVALO}
+
+        fornecedores = self.df['FORNECEDOR'].astype(str).str.strip().replace('', SEM_FORNECEDOR)
+        self.codigos_fornecedor, self.fornecedores = fornecedores.factorize(sort=True)
+        self._codigo_por_fornecedor = {str(nome): codigo for codigo, nome in enumerate(self.fornecedores)}
+
+        # Texto da busca (código, descrição e fornecedor) já em minúsculas
+        self._texto = (self.df['CODIGO'].astype(str) + '\x00' + self.df['DESCRICAO'].astype(str)
+                       + '\x00' + self.df['FORNECEDOR'].astype(str)).str.lower().to_numpy()
+
+    def __len__(self):
+        return len(self.df)
+
+    def _filtrar(self, intervalos, busca):
+        """Posições das linhas que passam nos intervalos e na busca (ordem da tabela)."""
+        posicoes = None
+        for coluna, (minimo, maximo) in intervalos.items():
+            if minimo is None and maximo is None:
+                continue
+            linhas = self.intervalos[coluna].entre(minimo, maximo)
+            posicoes = linhas if posicoes is None else np.intersect1d(posicoes, linhas, assume_unique=True)
+        posicoes = np.arange(len(self.df)) if posicoes is None else np.sort(posicoes)
+
+        if busca:
+            termo = busca.lower()
+            # A busca varre só as linhas que sobraram dos intervalos
+            texto = self._texto[posicoes]
+            encontrados = np.fromiter((termo in t for t in texto), dtype=bool, count=len(texto))
+            posicoes = posicoes[encontrados]
+        return posicoes
+
+    def _do_fornecedor(self, posicoes, fornecedor):
+        if not fornecedor:
+            return posicoes
+        codigo = self._codigo_por_fornecedor.get(fornecedor, -1)
+        return posicoes[self.codigos_fornecedor[posicoes] == codigo]
+
+    def posicoes(self, dias_min=None, dias_max=None, idade_min=None, idade_max=None, fornecedor=None, busca=''):
+        """Posições (ordem da tabela) das linhas que passam em todos os filtros, sem limite."""
+        posicoes = self._filtrar({'DIAS S/VND': (dias_min, dias_max), 'IDADE': (idade_min, idade_max)}, busca)
+        return self._do_fornecedor(posicoes, fornecedor)
+
+    def consultar(self, dias_min=None, dias_max=None, idade_min=None, idade_max=None,
+                  fornecedor=None, busca='', limite=1000):
+        """
+        Linhas filtradas e contagens por fornecedor.
+
+        As contagens da faceta usam todos os filtros menos o próprio
+        fornecedor, para mostrar quantas linhas cada escolha traria.
+
+        Returns:
+            dict: linhas (DataFrame limitado a ``limite``), total (sem o
+            limite) e fornecedores [(nome, contagem)] por contagem decrescente
+        """
+        posicoes = self._filtrar({'DIAS S/VND': (dias_min, dias_max), 'IDADE': (idade_min, idade_max)}, busca)
+
+        contagens = np.bincount(self.codigos_fornecedor[posicoes], minlength=len(self.fornecedores))
+        ordem = np.lexsort((np.arange(len(contagens)), -contagens))
+        faceta = [(str(self.fornecedores[codigo]), int(contagens[codigo])) for codigo in ordem if contagens[codigo]]
+
+        posicoes = self._do_fornecedor(posicoes, fornecedor)
+
+        return {
+            'linhas': self.df.iloc[posicoes[:limite]],
+            'total': int(len(posicoes)),
+            'fornecedores': faceta,
+        }
@@ -1,144 +1,169 @@
 from flask import render_template, request, jsonify
 from . import controle_de_isv_bp
-import pandas as pd
 from datetime import datetime
+from .indices import IsvIndex
+from app.fragments import render_page
+from app.saude import ler_fonte, registrar_aquecimento, registrar_carga
+from app.lojas import dataset, versao_fontes
+from app.colunar import DadosColunares, registrar_colunar
+from app.offline import DatasetOffline, registrar_offline
+from app.lazy import lazy_import
 
+pd = lazy_import('pandas')
 
+# Máximo de linhas enviadas para a página (o total filtrado vem à parte)
+LIMITE_LINHAS = 1000
 
-# Dados das tabelas
-forn_df = pd.read_csv(
-    '//10.122.244.1/files/gerencial/WebISV/Forn.csv', sep=';', encoding='latin-1')
 
+def preparar_dados_isv(loja=None):
+    """
+    Lê e cruza o smg12 com os fornecedores da loja (tabela do ISV).
+
+    Returns:
+        pd.DataFrame: tabela unificada com as colunas exibidas no ISV
+    """
+    # Dados das tabelas
+    forn_df = ler_fonte('forn_isv', loja, pd.read_csv, sep=';', encoding='latin-1')
+
+
+    smg12_df = ler_fonte('smg12', loja, pd.read_csv, sep=';', encoding='latin-1')
+
+    # Limpar e converter a coluna IDADE
+    # 1. Remover espaços em branco
+    smg12_df['IDADE'] = smg12_df['IDADE'].astype(str).str.strip()
+
+    # 2. Substituir vírgula por ponto (formato decimal brasileiro)
+    smg12_df['IDADE'] = smg12_df['IDADE'].str.replace(',', '.')
+
+    # 3. Converter para float primeiro, depois para int
+    smg12_df['IDADE'] = pd.to_numeric(smg12_df['IDADE'], errors='coerce')
 
-smg12_df = pd.read_csv('//10.122.244.1/files/gerencial/gerencia/edvan/smg12.f888.csv', sep=';', encoding='latin-1')
+    # 4. Tratar valores NaN (se houver)
+    smg12_df['IDADE'] = smg12_df['IDADE'].fillna(0)
 
-# Limpar e converter a coluna IDADE
-# 1. Remover espaços em branco
-smg12_df['IDADE'] = smg12_df['IDADE'].astype(str).str.strip()
+    # 5. Converter para int
+    smg12_df['IDADE'] = smg12_df['IDADE'].astype(int)
 
-# 2. Substituir vírgula por ponto (formato decimal brasileiro)
-smg12_df['IDADE'] = smg12_df['IDADE'].str.replace(',', '.')
 
-# 3. Converter para float primeiro, depois para int
-smg12_df['IDADE'] = pd.to_numeric(smg12_df['IDADE'], errors='coerce')
+    smg12_df = smg12_df.rename(columns={
+                               'MERC': 'CODIGO',
+                               'ESTOQ EMB1':'ESTOQUE EMB1',
+                               'ESTOQ EMB9':'ESTOQUE EMB9'})
 
-# 4. Tratar valores NaN (se houver)
-smg12_df['IDADE'] = smg12_df['IDADE'].fillna(0)
 
-# 5. Converter para int
-smg12_df['IDADE'] = smg12_df['IDADE'].astype(int)
+    # Convertendo ESTOQUE EMB1, ESTOQUE EMB9 para inteiros
+    # (com vírgula decimal, como a IDADE)
+    for coluna in ('ESTOQUE EMB1', 'ESTOQUE EMB9'):
+        smg12_df[coluna] = smg12_df[coluna].astype(str).str.strip().str.replace(',', '.')
+    smg12_df['ESTOQUE EMB1'] = pd.to_numeric(smg12_df['ESTOQUE EMB1'], errors='coerce').fillna(0).astype(int)
+    smg12_df['ESTOQUE EMB9'] = pd.to_numeric(smg12_df['ESTOQUE EMB9'], errors='coerce').fillna(0).astype(int)
+    # Convertendo IDADE para inteiro
+    smg12_df['IDADE'] = pd.to_numeric(smg12_df['IDADE'], errors='coerce').fillna(0).astype(int)
 
+    smg12_organizado_df = smg12_df[['CODIGO', 'DESCRICAO', 'EMBALAGEM','DIAS S/VND', 'IDADE','ESTOQUE EMB1', 'ESTOQUE EMB9']]
 
-smg12_df = smg12_df.rename(columns={
-                           'MERC': 'CODIGO',
-                           'ESTOQ EMB1':'ESTOQUE EMB1',
-                           'ESTOQ EMB9':'ESTOQUE EMB9'})
 
+    # Renomeando colunas
+    forn_renomeado_df = forn_df.rename(columns={
+                                        'Item Produto': 'CODIGO',
+                                        'Fornecedor Atual': 'CNPJ/CPF', 
+                                        'Unnamed: 2': 'FORNECEDOR'}).dropna(subset=['FORNECEDOR'])
 
-# Convertendo ESTOQUE EMB1, ESTOQUE EMB9 para inteiros
-smg12_df['ESTOQUE EMB1'] = pd.to_numeric(smg12_df['ESTOQUE EMB1'], errors='coerce').fillna(0).astype(int)
-smg12_df['ESTOQUE EMB9'] = pd.to_numeric(smg12_df['ESTOQUE EMB9'], errors='coerce').fillna(0).astype(int)
-# Convertendo IDADE para inteiro
-smg12_df['IDADE'] = pd.to_numeric(smg12_df['IDADE'], errors='coerce').fillna(0).astype(int)
 
-smg12_organizado_df = smg12_df[['CODIGO', 'DESCRICAO', 'EMBALAGEM','DIAS S/VND', 'IDADE','ESTOQUE EMB1', 'ESTOQUE EMB9']]
+    # Convertendo para string e padronizando os códigos (agora com 5 dígitos em vez de 7)
+    forn_renomeado_df = forn_renomeado_df.copy()
+    # Converter explicitamente para string antes da atribuição
+    codigo_forn_processado = forn_renomeado_df['CODIGO'].astype(str).apply(lambda x: x.split('.')[0].zfill(5))
+    forn_renomeado_df = forn_renomeado_df.astype({'CODIGO': 'object'})
+    forn_renomeado_df['CODIGO'] = codigo_forn_processado
 
+    smg12_organizado_df = smg12_organizado_df.copy()
+    # Converter explicitamente para string antes da atribuição
+    codigo_smg12_processado = smg12_organizado_df['CODIGO'].astype(str).str.zfill(7).str[2:]  # Remove os dois primeiros zeros
+    smg12_organizado_df = smg12_organizado_df.astype({'CODIGO': 'object'})
+    smg12_organizado_df['CODIGO'] = codigo_smg12_processado
 
-# Renomeando colunas
-forn_renomeado_df = forn_df.rename(columns={
-                                    'Item Produto': 'CODIGO',
-                                    'Fornecedor Atual': 'CNPJ/CPF', 
-                                    'Unnamed: 2': 'FORNECEDOR'}).dropna(subset=['FORNECEDOR'])
+    # Realizar o merge com a opção 'indicator' para diagnosticar
+    tabela_unificada2_df = pd.merge(
+        forn_renomeado_df, smg12_organizado_df, on='CODIGO', how='outer', indicator=True)
 
+    # Remover linhas duplicadas com base na coluna 'CODIGO'
+    tabela_unificada2_df = tabela_unificada2_df.drop_duplicates(subset=['CODIGO'])
 
-# Convertendo para string e padronizando os códigos (agora com 5 dígitos em vez de 7)
-forn_renomeado_df = forn_renomeado_df.copy()
-# Converter explicitamente para string antes da atribuição
-codigo_forn_processado = forn_renomeado_df['CODIGO'].astype(str).apply(lambda x: x.split('.')[0].zfill(5))
-forn_renomeado_df = forn_renomeado_df.astype({'CODIGO': 'object'})
-forn_renomeado_df['CODIGO'] = codigo_forn_processado
+    # Selecionar apenas as colunas necessárias
+    colunas_necessarias = ['CODIGO', 'DESCRICAO', 'EMBALAGEM', 'FORNECEDOR',
+                           'ESTOQUE EMB1', 'ESTOQUE EMB9', 'IDADE', 'DIAS S/VND']
+    tabela_unificada2_df = tabela_unificada2_df[colunas_necessarias]
 
-smg12_organizado_df = smg12_organizado_df.copy()
-# Converter explicitamente para string antes da atribuição
-codigo_smg12_processado = smg12_organizado_df['CODIGO'].astype(str).str.zfill(7).str[2:]  # Remove os dois primeiros zeros
-smg12_organizado_df = smg12_organizado_df.astype({'CODIGO': 'object'})
-smg12_organizado_df['CODIGO'] = codigo_smg12_processado
+    return tabela_unificada2_df
 
-# Realizar o merge com a opção 'indicator' para diagnosticar
-tabela_unificada2_df = pd.merge(
-    forn_renomeado_df, smg12_organizado_df, on='CODIGO', how='outer', indicator=True)
 
-# Remover linhas duplicadas com base na coluna 'CODIGO'
-tabela_unificada2_df = tabela_unificada2_df.drop_duplicates(subset=['CODIGO'])
+def criar_indice(loja):
+    """Lê a tabela do ISV da loja e monta os índices (com a versão dos arquivos lidos)"""
+    versao = versao_fontes(('forn_isv', 'smg12'), [loja])
+    return IsvIndex(preparar_dados_isv(loja), versao)
 
-# Selecionar apenas as colunas necessárias
-colunas_necessarias = ['CODIGO', 'DESCRICAO', 'EMBALAGEM', 'FORNECEDOR',
-                       'ESTOQUE EMB1', 'ESTOQUE EMB9', 'IDADE', 'DIAS S/VND']
-tabela_unificada2_df = tabela_unificada2_df[colunas_necessarias]
+
+def indice_isv(loja=None):
+    """Índices (DIAS S/VND, IDADE e fornecedor) do ISV da loja (a atual por padrão), guardados no cache por loja"""
+    return dataset('isv_indice', criar_indice, ('forn_isv', 'smg12'), loja=loja)
+
+registrar_carga(('forn_isv',), indice_isv)
+
+# Página do ISV (filtros padrão), renderizada no aquecimento do worker
+registrar_aquecimento('controle_de_isv.isv_page')
+
+
+def dados_isv(loja=None):
+    """Tabela do ISV da loja (a atual por padrão), já normalizada pelo índice"""
+    return indice_isv(loja).df
+
+# Cópia no aparelho para o modo offline
+registrar_offline(DatasetOffline('isv', 'ISV', ('forn_isv', 'smg12'), dados_isv,
+                                 chave=['CODIGO'], faceta='FORNECEDOR'))
+
+
+def _inteiro(valor):
+    """Número do filtro ou None quando vazio/inválido"""
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
 
 
-def get_isv_data(search='', dias_filter='3'):
+def get_isv_data(search='', dias_filter='3', fornecedor='', idade_min='', idade_max=''):
     """
     Função centralizada para obter e filtrar dados ISV
     
     Args:
         search (str): Termo de busca para filtrar por código, descrição ou fornecedor
         dias_filter (str): Número mínimo de dias sem venda para filtrar
+        fornecedor (str): Fornecedor selecionado na faceta
+        idade_min, idade_max (str): Intervalo de IDADE
     
     Returns:
-        dict: Dicionário com success, data e total
+        dict: Dicionário com success, data, total (exibidos), total_filtrado
+        e fornecedores (faceta com contagens)
     """
     try:
-        global tabela_unificada2_df
+        resultado = indice_isv().consultar(
+            dias_min=_inteiro(dias_filter),
+            idade_min=_inteiro(idade_min),
+            idade_max=_inteiro(idade_max),
+            fornecedor=fornecedor or None,
+            busca=search,
+            limite=LIMITE_LINHAS
+        )
         
-        # Trabalhar com uma cópia dos dados
-        dados_filtrados = tabela_unificada2_df.copy()
-        
-        # Garantir que todas as colunas necessárias existam e tenham valores válidos
-        colunas_necessarias = ['CODIGO', 'DESCRICAO', 'EMBALAGEM', 'FORNECEDOR', 'ESTOQUE EMB1', 'ESTOQUE EMB9', 'IDADE', 'DIAS S/VND']
-        
-        for col in colunas_necessarias:
-            if col not in dados_filtrados.columns:
-                if col in ['ESTOQUE EMB1', 'ESTOQUE EMB9', 'IDADE', 'DIAS S/VND']:
-                    dados_filtrados[col] = 0
-                else:
-                    dados_filtrados[col] = ''
-        
-        # Preencher valores NaN
-        for col in colunas_necessarias:
-            if col in ['ESTOQUE EMB1', 'ESTOQUE EMB9', 'IDADE', 'DIAS S/VND']:
-                dados_filtrados[col] = pd.to_numeric(dados_filtrados[col], errors='coerce').fillna(0).astype(int)
-            else:
-                dados_filtrados[col] = dados_filtrados[col].fillna('')
-        
-        # Aplicar filtro de dias primeiro (mais restritivo)
-        if dias_filter:
-            try:
-                dias_limite = int(dias_filter)
-                dados_filtrados = dados_filtrados[dados_filtrados['DIAS S/VND'] >= dias_limite]
-            except ValueError:
-                pass
-        
-        # Aplicar filtro de busca
-        if search:
-            mask = (
-                dados_filtrados['CODIGO'].astype(str).str.contains(search, case=False, na=False) |
-                dados_filtrados['DESCRICAO'].fillna('').str.contains(search, case=False, na=False) |
-                dados_filtrados['FORNECEDOR'].fillna('').str.contains(search, case=False, na=False)
-            )
-            dados_filtrados = dados_filtrados[mask]
-        
-        # Limitar resultados para melhor performance (máximo 1000 registros)
-        if len(dados_filtrados) > 1000:
-            dados_filtrados = dados_filtrados.head(1000)
-        
-        # Converter para lista de dicionários
-        data = dados_filtrados.to_dict('records')
+        # Converter para lista de dicionários (só as linhas exibidas)
+        data = resultado['linhas'].to_dict('records')
         
         return {
             'success': True,
             'data': data,
-            'total': len(data)
+            'total': len(data),
+            'total_filtrado': resultado['total'],
+            'fornecedores': resultado['fornecedores']
         }
         
     except Exception as e:
@@ -146,26 +171,74 @@ def get_isv_data(search='', dias_filter='3'):
             'success': False,
             'error': str(e),
             'data': [],
-            'total': 0
+            'total': 0,
+            'total_filtrado': 0,
+            'fornecedores': []
         }
 
 
+PARAMETROS_FILTRO = ('busca', 'dias', 'fornecedor', 'idade_min', 'idade_max')
+
+
+def parametros_filtro():
+    """Parâmetros de filtro preenchidos na query string (para montar os links da faceta)"""
+    return {nome: request.args[nome] for nome in PARAMETROS_FILTRO if request.args.get(nome)}
+
+
+def filtros_da_requisicao(args=None):
+    """Filtros do ISV na query string (dias padrão: 3)"""
+    args = request.args if args is None else args
+    return {
+        'search': args.get('busca', '').strip(),
+        'dias_filter': args.get('dias', '3').strip(),
+        'fornecedor': args.get('fornecedor', ''),
+        'idade_min': args.get('idade_min', '').strip(),
+        'idade_max': args.get('idade_max', '').strip(),
+    }
+
+
+def posicoes_colunar(df, args):
+    """Linhas do download colunar (app.colunar), com os filtros da página"""
+    filtros = filtros_da_requisicao(args)
+    return indice_isv().posicoes(
+        dias_min=_inteiro(filtros['dias_filter']),
+        idade_min=_inteiro(filtros['idade_min']),
+        idade_max=_inteiro(filtros['idade_max']),
+        fornecedor=filtros['fornecedor'] or None,
+        busca=filtros['search'],
+    )
+
+registrar_colunar(DadosColunares('isv', 'ISV', ('forn_isv', 'smg12'), dados_isv,
+                                 filtros={nome: 'mesmo filtro da página' for nome in PARAMETROS_FILTRO},
+                                 posicoes=posicoes_colunar))
+
+
 @controle_de_isv_bp.route('/page')
 def isv_page():
     """Página completa do ISV com dados carregados"""
     print("=== ROTA /page ACESSADA ===")
     try:
-        # Carregar dados ISV
+        # Carregar dados ISV (filtros e faceta respondidos pelos índices)
         print("Carregando dados ISV...")
-        data = get_isv_data()
+        filtros = filtros_da_requisicao()
+        data = get_isv_data(**filtros)
         print(f"Dados carregados: {len(data.get('data', []))} itens")
         print("Renderizando template...")
-        return render_template('/isv_page.html', isv_data=data)
+        return render_page('/isv_page.html', 'isv_tabela.html',
+                           isv_data=data, filtros=filtros, parametros=parametros_filtro())
     except Exception as e:
         print(f"Erro ao carregar página ISV: {e}")
         import traceback
         traceback.print_exc()
-        return render_template('/isv_page.html', isv_data={"data": [], "error": str(e)})
+        return render_template('/isv_page.html', isv_data={"data": [], "error": str(e)},
+                               filtros={}, parametros={})
+
+
+@controle_de_isv_bp.route('/api/dados')
+def api_dados():
+    """Itens filtrados e faceta de fornecedores em JSON (mesmos filtros da página)"""
+    data = get_isv_data(**filtros_da_requisicao())
+    return jsonify(data), 200 if data['success'] else 500
 
 
 
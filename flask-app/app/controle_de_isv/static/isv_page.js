@@ -0,0 +1,239 @@
+// JavaScript específico para a página ISV
+// Os filtros (busca, dias, idade e fornecedor) são respondidos pelo servidor,
+// que devolve só o fragmento #isv-tabela; a DataTable pagina as linhas recebidas.
+function initIsvTable() {
+    if (!document.getElementById('isv-table') || $.fn.dataTable.isDataTable('#isv-table')) {
+        return;
+    }
+    $('#isv-table').DataTable({
+        "pageLength": 50,
+        "language": {
+            "url": "//cdn.datatables.net/plug-ins/1.10.24/i18n/Portuguese-Brasil.json"
+        },
+        "ordering": false,
+        "dom": 'rtip' // Remove a caixa de busca padrão e o seletor de length
+    });
+}
+
+$(document).ready(initIsvTable);
+document.addEventListener('fragment:loaded', function() {
+    initIsvTable();
+    // Voltar/avançar (fragments.js) também troca o fragmento: os campos seguem a URL
+    syncFilterInputs(new URL(window.location.href));
+});
+
+// Busca o fragmento filtrado e troca a tabela e a faceta sem recarregar a página
+function loadIsvFragment(url, push) {
+    var container = document.getElementById('isv-tabela');
+    if (!container) {
+        window.location.href = url;
+        return;
+    }
+    container.classList.add('carregando');
+    fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(function(response) {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.text();
+        })
+        .then(function(html) {
+            container.outerHTML = html;
+            if (push) {
+                history.pushState({ fragment: 'isv-tabela' }, '', url);
+            }
+            document.dispatchEvent(new CustomEvent('fragment:loaded', { detail: { id: 'isv-tabela' } }));
+        })
+        .catch(function(error) {
+            console.error('Erro ao filtrar ISV:', error);
+            window.location.href = url;
+        });
+}
+
+// Mantém os campos do formulário iguais aos filtros da URL
+function syncFilterInputs(url) {
+    var campos = { 'search-input': 'busca', 'dias-filter': 'dias', 'idade-min': 'idade_min',
+                   'idade-max': 'idade_max', 'fornecedor-filter': 'fornecedor' };
+    Object.keys(campos).forEach(function(id) {
+        var campo = document.getElementById(id);
+        if (campo) {
+            var valor = url.searchParams.get(campos[id]);
+            campo.value = valor !== null ? valor : (id === 'dias-filter' ? '3' : '');
+        }
+    });
+}
+
+// Função para aplicar filtros quando o botão for clicado
+function applyFilters() {
+    var form = document.querySelector('.isv-filters');
+    var url = new URL(form.action, window.location.href);
+    new FormData(form).forEach(function(valor, nome) {
+        url.searchParams.set(nome, valor);
+    });
+    loadIsvFragment(url.toString(), true);
+}
+
+// Função para limpar todos os filtros
+function clearAllFilters() {
+    var form = document.querySelector('.isv-filters');
+    loadIsvFragment(new URL(form.action, window.location.href).toString(), true);
+}
+
+// Clique em um fornecedor da faceta: aplica (ou remove) o filtro sem recarregar
+document.addEventListener('click', function(e) {
+    var link = e.target.closest('#isv-tabela a[data-faceta]');
+    if (!link || e.button !== 0 || e.ctrlKey || e.metaKey || e.shiftKey) {
+        return;
+    }
+    e.preventDefault();
+    loadIsvFragment(link.href, true);
+});
+
+// Função para imprimir apenas os dados filtrados
+function printFilteredData() {
+    // Obter a instância da DataTable
+    var table = $('#isv-table').DataTable();
+
+    // Obter apenas as linhas visíveis (filtradas)
+    var filteredData = table.rows({ search: 'applied' }).data().toArray();
+
+    if (filteredData.length === 0) {
+        alert('Nenhum dado para imprimir. Verifique os filtros aplicados.');
+        return;
+    }
+
+    // Criar o conteúdo HTML para impressão
+    var printContent = `
+        <html>
+        <head>
+            <title>Relatório de Controle de ISV</title>
+            <style>
+                body { 
+                    font-family: Arial, sans-serif; 
+                    margin: 20px;
+                    color: #333;
+                }
+                h1 { 
+                    text-align: center; 
+                    color: #33A621;
+                    margin-bottom: 30px;
+                    font-size: 24px;
+                }
+                table { 
+                    width: 100%; 
+                    border-collapse: collapse; 
+                    margin-top: 20px;
+                }
+                th, td { 
+                    border: 1px solid #ddd; 
+                    padding: 8px; 
+                    text-align: left;
+                    font-size: 12px;
+                }
+                th { 
+                    background-color: #f8f9fa; 
+                    font-weight: bold;
+                    color: #333;
+                }
+                tr:nth-child(even) { 
+                    background-color: #f9f9f9; 
+                }
+                .print-info {
+                    text-align: center;
+                    margin-bottom: 20px;
+                    font-size: 14px;
+                    color: #666;
+                }
+                @media print {
+                    body { margin: 0; }
+                    .no-print { display: none; }
+                    @page {
+                        margin: 10mm;
+                        size: A4 landscape;
+                        orientation: landscape;
+                    }
+                    @page :first {
+                        margin-top: 10mm;
+                    }
+                    @page :left {
+                        margin-left: 10mm;
+                    }
+                    @page :right {
+                        margin-right: 10mm;
+                    }
+                    /* Remove rodapés e cabeçalhos do navegador */
+                    html, body {
+                        -webkit-print-color-adjust: exact;
+                        print-color-adjust: exact;
+                    }
+                    /* Otimização para paisagem */
+                    table {
+                        width: 100%;
+                        font-size: 10px;
+                    }
+                    th, td {
+                        padding: 4px;
+                        font-size: 10px;
+                    }
+                    h1 {
+                        font-size: 20px;
+                        margin-bottom: 15px;
+                    }
+                    .print-info {
+                        font-size: 12px;
+                        margin-bottom: 10px;
+                    }
+                }
+            </style>
+        </head>
+        <body>
+            <h1>Controle de ISV - Itens Sem Vendas</h1>
+            <div class="print-info">
+                <p>Data de impressão: ${new Date().toLocaleDateString('pt-BR')} às ${new Date().toLocaleTimeString('pt-BR')}</p>
+                <p>Total de itens: ${filteredData.length}</p>
+            </div>
+            <table>
+                <thead>
+                    <tr>
+                        <th>Código</th>
+                        <th>Descrição</th>
+                        <th>Complemento</th>
+                        <th>Fornecedor</th>
+                        <th>Estoque EMB1</th>
+                        <th>Estoque EMB9</th>
+                        <th>Dias S/VND</th>
+                    </tr>
+                </thead>
+                <tbody>`;
+
+    // Adicionar os dados filtrados
+    filteredData.forEach(function(row) {
+        printContent += `
+                    <tr>
+                        <td>${row[0] || ''}</td>
+                        <td>${row[1] || ''}</td>
+                        <td>${row[2] || ''}</td>
+                        <td>${row[3] || ''}</td>
+                        <td>${row[4] || ''}</td>
+                        <td>${row[5] || ''}</td>
+                        <td>${row[6] || ''}</td>
+                    </tr>`;
+    });
+
+    printContent += `
+                </tbody>
+            </table>
+        </body>
+        </html>`;
+
+    // Abrir nova janela para impressão
+    var printWindow = window.open('', '_blank');
+    printWindow.document.write(printContent);
+    printWindow.document.close();
+
+    // Aguardar o carregamento e imprimir
+    printWindow.onload = function() {
+        printWindow.print();
+        printWindow.close();
+    };
+}
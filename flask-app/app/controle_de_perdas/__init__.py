@@ -2,6 +2,7 @@ from flask import Blueprint
 
 controle_de_perdas = Blueprint('controle_de_perdas', __name__,
                                 template_folder='templates',
-                                static_folder='static',)
+                                static_folder='static',
+                                cli_group='perdas')
 from . import routes
 
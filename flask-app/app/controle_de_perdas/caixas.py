@@ -0,0 +1,223 @@
+"""
+Caixas (boxes) das páginas de perdas e seleção dos primeiros itens de cada uma.
+
+Cada ``Caixa`` declara um ``Filtro`` da taxonomia de perdas (``taxonomia``):
+tipos de evento, de operação e classes de produto. Por carga dos dados,
+``TabelaPerdas`` normaliza o SAEOI051 e classifica cada linha uma vez
+(``CATEGORIA_PERDA`` e classe do produto); as posições das linhas ficam
+agrupadas por (categoria, classe), e as linhas de cada caixa são a junção dos
+grupos que o filtro aceita. ``CaixasPerdas`` guarda essas posições e os
+agregados (soma de VLR.TOTAL e EMB1, quantidade de linhas, eventos
+distintos); os totais das páginas saem desses agregados.
+
+A página mostra só os N primeiros itens (``PERDAS_CAIXA_TOP``) na ordem de
+VLR.TOTAL: em vez de ordenar a caixa inteira, uma seleção parcial
+(``np.partition``) separa os candidatos até a posição pedida e só eles são
+ordenados; só as linhas devolvidas são formatadas em moeda. O "carregar mais"
+pede a fatia seguinte a partir de um cursor (a posição do próximo item).
+
+Caixas com ``hoje=True`` valem só para os eventos do dia; as posições do dia
+são calculadas na primeira consulta de cada data.
+"""
+import threading
+
+from app.lazy import lazy_import
+
+from .taxonomia import TAXONOMIA
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+COLUNAS_CAIXA = ['EVENTO', 'MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']
+
+# Classe de cada célula nas linhas renderizadas
+CLASSES_COLUNA = {
+    'EVENTO': 'evento',
+    'MERCADORIA': 'mercadoria',
+    'DESCRICAO': 'descricao',
+    'VLR.TOTAL': 'valor',
+    'EMB1': 'emb1',
+}
+
+
+class Caixa:
+    """Definição de uma caixa: filtro da taxonomia, colunas exibidas e ordem por VLR.TOTAL."""
+
+    def __init__(self, filtro, colunas=COLUNAS_CAIXA, ascendente=True, hoje=False,
+                 arredondar=False, classe_linha=''):
+        """
+        Args:
+            filtro: ``taxonomia.Filtro`` das linhas da caixa
+            hoje: só os eventos da data consultada
+            arredondar: VLR.TOTAL arredondado a 2 casas antes de ordenar e somar
+            classe_linha: classe das linhas (``<tr>``) renderizadas
+        """
+        self.filtro = filtro
+        self.colunas = list(colunas)
+        self.ascendente = ascendente
+        self.hoje = hoje
+        self.arredondar = arredondar
+        self.classe_linha = classe_linha
+
+
+class TabelaPerdas:
+    """
+    Colunas do SAEOI051 normalizadas e classificadas uma vez por carga.
+
+    ``classificacao`` tem ``CATEGORIA_PERDA`` e as marcas ``PRODUTO_HF`` /
+    ``PRODUTO_RF`` de cada linha (mesmo índice de ``df``); ``grupos`` dá as
+    posições das linhas de cada grupo (categoria, classe) da taxonomia.
+    """
+
+    def __init__(self, df, taxonomia=TAXONOMIA):
+        self.df = df
+        self.taxonomia = taxonomia
+        self.evento = _coluna(df, 'EVENTO', pd.to_numeric, errors='coerce').fillna(0).astype(int).to_numpy()
+        self.valor = _coluna(df, 'VLR.TOTAL', pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        self.data = _coluna(df, 'DT.ULT.EV.', pd.to_datetime, errors='coerce').dt.normalize().to_numpy()
+        descricao = _coluna(df, 'DESCRICAO', lambda s: s.astype(str).where(s.notna(), ''))
+        operacao = _coluna(df, 'OPERACAO', lambda s: s.astype(str).where(s.notna(), ''))
+
+        categoria, classe = taxonomia.classificar(self.evento, operacao, descricao)
+        self.classificacao = taxonomia.colunas(categoria, classe, index=df.index)
+
+        # Posições agrupadas por (categoria, classe): ordem estável, então
+        # cada grupo fica em ordem crescente de posição
+        grupo = categoria.astype(np.int64) * len(taxonomia.classes) + classe
+        self._ordem = np.argsort(grupo, kind='stable')
+        self._limites = np.concatenate(([0], np.cumsum(np.bincount(
+            grupo, minlength=len(taxonomia.categorias) * len(taxonomia.classes)))))
+
+    def posicoes(self, filtro):
+        """Posições (crescentes) das linhas que o ``Filtro`` aceita."""
+        partes = [self._ordem[self._limites[g]:self._limites[g + 1]] for g in self.taxonomia.grupos(filtro)]
+        partes = [p for p in partes if len(p)]
+        if not partes:
+            return np.array([], dtype=np.intp)
+        return partes[0] if len(partes) == 1 else np.sort(np.concatenate(partes))
+
+
+def _coluna(df, nome, converter, **kwargs):
+    """Coluna ``nome`` convertida; ausente vira uma coluna vazia do mesmo tamanho."""
+    serie = df[nome] if nome in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+    return converter(serie, **kwargs)
+
+
+def selecionar(chave, inicio, n):
+    """
+    Índices dos itens ``inicio`` a ``inicio + n`` de ``chave`` em ordem crescente.
+
+    Só os candidatos até a posição ``inicio + n`` (pela seleção parcial) são
+    ordenados; empates são desfeitos pela posição, então fatias seguidas não
+    repetem nem pulam itens.
+    """
+    fim = min(inicio + n, len(chave))
+    if inicio >= fim:
+        return np.array([], dtype=np.intp)
+    if fim < len(chave):
+        limite = np.partition(chave, fim - 1)[fim - 1]
+        candidatos = np.flatnonzero(chave <= limite)
+    else:
+        candidatos = np.arange(len(chave))
+    ordem = candidatos[np.lexsort((candidatos, chave[candidatos]))]
+    return ordem[inicio:fim]
+
+
+class SelecaoCaixa:
+    """Linhas de uma caixa (posições na tabela), chave de ordenação e agregados."""
+
+    def __init__(self, tabela, caixa, posicoes):
+        self.tabela = tabela
+        self.caixa = caixa
+        self.posicoes = posicoes
+        valores = tabela.valor[posicoes]
+        if caixa.arredondar:
+            valores = np.round(valores, 2)
+        self.valores = valores
+        # Sem valor vai para o fim nas duas ordens
+        chave = valores if caixa.ascendente else -valores
+        self.chave = np.where(np.isnan(chave), np.inf, chave)
+
+        self.total = len(posicoes)
+        self.vlr_total = float(np.nansum(valores))
+        self.emb1_total = tabela.df['EMB1'].iloc[posicoes].sum() if 'EMB1' in tabela.df.columns else 0
+        self.eventos = len(np.unique(tabela.evento[posicoes]))
+
+    def pagina(self, inicio=0, n=50, formatar=str):
+        """
+        Itens ``inicio`` a ``inicio + n`` na ordem da caixa.
+
+        Args:
+            formatar: formatação de VLR.TOTAL (só nas linhas devolvidas)
+
+        Returns:
+            dict: itens (registros), cursor, proximo (None no fim), total,
+            restantes, vlr_total (numérico) e emb1_total
+        """
+        inicio = max(0, inicio)
+        indices = selecionar(self.chave, inicio, n)
+        linhas = self.tabela.df.iloc[self.posicoes[indices]].reindex(columns=self.caixa.colunas)
+        linhas = linhas.assign(**{'VLR.TOTAL': [formatar(v) for v in self.valores[indices]]})
+        if 'EVENTO' in linhas.columns:
+            linhas['EVENTO'] = self.tabela.evento[self.posicoes[indices]]
+        fim = inicio + len(indices)
+        return {
+            'itens': linhas.to_dict(orient='records'),
+            'cursor': inicio,
+            'proximo': fim if fim < self.total else None,
+            'total': self.total,
+            'restantes': max(0, self.total - fim),
+            'vlr_total': self.vlr_total,
+            'emb1_total': self.emb1_total,
+        }
+
+
+class CaixasPerdas:
+    """Caixas de uma carga do SAEOI051: posições e agregados de cada uma."""
+
+    def __init__(self, df, caixas, versao=None):
+        self.versao = versao
+        self.caixas = caixas
+        self.tabela = TabelaPerdas(df)
+        self._base = {}
+        for nome, caixa in caixas.items():
+            self._base[nome] = self.tabela.posicoes(caixa.filtro)
+        self._selecoes = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Para o snapshot em disco (app.spill): sem a trava e sem as seleções memorizadas
+        estado = dict(self.__dict__)
+        del estado['_lock']
+        estado['_selecoes'] = {}
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def __contains__(self, nome):
+        return nome in self.caixas
+
+    def selecao(self, nome, dia=None):
+        """``SelecaoCaixa`` da caixa ``nome`` (as do dia usam ``dia``, padrão hoje)."""
+        caixa = self.caixas[nome]
+        if caixa.hoje:
+            dia = pd.Timestamp(dia or pd.Timestamp.today()).normalize()
+        chave = (nome, dia if caixa.hoje else None)
+        with self._lock:
+            selecao = self._selecoes.get(chave)
+        if selecao is not None:
+            return selecao
+
+        posicoes = self._base[nome]
+        if caixa.hoje:
+            posicoes = posicoes[self.tabela.data[posicoes] == dia.to_datetime64()]
+        selecao = SelecaoCaixa(self.tabela, caixa, posicoes)
+        with self._lock:
+            # As caixas do dia de datas anteriores não voltam a ser consultadas
+            if caixa.hoje:
+                for antiga in [c for c in self._selecoes if c[0] == nome and c[1] != dia]:
+                    del self._selecoes[antiga]
+            self._selecoes[chave] = selecao
+        return selecao
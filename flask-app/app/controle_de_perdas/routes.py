@@ -1,14 +1,43 @@
-from flask import render_template, jsonify
-import pandas as pd
-import openpyxl
+from flask import render_template, jsonify, current_app, send_file, request, get_template_attribute
 import locale
+import logging
+import os
+import shutil
+import click
 from datetime import datetime
-import numpy as np
 from . import controle_de_perdas
+from .caixas import CLASSES_COLUNA, Caixa, CaixasPerdas
+from .taxonomia import Exceto, Filtro
+from .subgrupos import SubgrupoRegistry
+from app.cache import cached
+from app.colunar import DadosColunares, registrar_colunar
+from app.datasets import source_path, file_version
+from app.fragments import render_page, wants_fragment
+from app.deltas import Incremental, STATUS_INSERIDO, para_registros
+from app.lojas import consolidado, dataset, dataset_incremental, loja_atual, lojas_configuradas, mudancas
+from app.relatorios import Relatorio, registrar_relatorio, servir_relatorio
+from app.saude import ler_fonte, registrar_aquecimento, registrar_carga
+from app.lazy import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+@controle_de_perdas.record_once
+def configurar_locale(state):
+    """Configura o locale brasileiro ao registrar o blueprint (e não no import)"""
+    try:
+        locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
+    except locale.Error:
+        # Os valores são formatados por format_currency, que não depende do locale
+        logging.getLogger(__name__).warning('Locale pt_BR.UTF-8 indisponível; mantendo o locale do sistema')
+
+@controle_de_perdas.record_once
+def configurar_caixas(state):
+    """Itens de cada caixa ao abrir a página e máximo de itens por pedido de carregar mais"""
+    state.app.config.setdefault('PERDAS_CAIXA_TOP', 50)
+    state.app.config.setdefault('PERDAS_CAIXA_MAX', 500)
 
-# Configura o locale para o formato de moeda brasileira
-locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
-saeoi51 = pd.read_excel("//10.122.244.3/publico/ISV/SAEOI051.xlsx")
+COLUNAS_DETALHE = ['MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']
 
 # =============== FUNÇÕES UTILITÁRIAS ===============
 
@@ -160,13 +189,174 @@ def format_date_for_display(date_obj):
     """Formata data para exibição"""
     return date_obj.strftime('%d/%m/%Y') if date_obj else "N/A"
 
+def carregar_saeoi051(loja=None):
+    """Lê o SAEOI051 (eventos de perda) da loja"""
+    return ler_fonte('saeoi051', loja, pd.read_excel)
+
+# Eventos comparados entre versões por evento + mercadoria + data (repetidos são numerados)
+PERDAS_INCREMENTAL = Incremental(carregar_saeoi051, chave=['EVENTO', 'MERCADORIA', 'DT.ULT.EV.'])
+
+def dados_perdas(loja=None):
+    """SAEOI051 da loja atual, guardado no cache por loja"""
+    return dataset_incremental('perdas', PERDAS_INCREMENTAL, ('saeoi051',), loja=loja)
+
+registrar_carga(('saeoi051',), dados_perdas)
+
+def criar_registro(loja):
+    """Monta o registro de subgrupos da loja (com a versão do arquivo lido)"""
+    versao = file_version(source_path('saeoi051', loja))
+    return SubgrupoRegistry(dados_perdas(loja), versao)
+
+def registro_subgrupos():
+    """Registro de subgrupos (slugs e linhas agrupadas) da carga atual do SAEOI051"""
+    return dataset('perdas_subgrupos', criar_registro, ('saeoi051',))
+
+# =============== CAIXAS (totalperdas, negativo, perdafrios, perda_hf, perda_vencimento) ===============
+
+# Tipos de operação que contam como avaria (taxonomia.TIPOS_OPERACAO)
+OPERACOES_AVARIA = ['AVARIA', 'VENCIMENTO', 'HORTIFRUT']
+
+AVARIAS = Filtro(eventos=['AVARIA'], operacoes=OPERACOES_AVARIA)
+AJUSTES = Filtro(eventos=['AJUSTE', 'AJUSTE_6501', 'NEGATIVO_FALTA'])
+
+CAIXAS = {
+    # totalperdas: acumulado do mês e eventos de hoje
+    'avarias_mes': Caixa(AVARIAS, arredondar=True),
+    'ajustes_mes': Caixa(AJUSTES, arredondar=True),
+    'avarias_hoje': Caixa(AVARIAS, arredondar=True, hoje=True),
+    'ajustes_hoje': Caixa(AJUSTES, arredondar=True, hoje=True),
+    # negativo: sobra (6521) e falta (6021)
+    'negativo_sobra': Caixa(Filtro(eventos=['NEGATIVO_SOBRA']), colunas=COLUNAS_DETALHE),
+    'negativo_falta': Caixa(Filtro(eventos=['NEGATIVO_FALTA']), colunas=COLUNAS_DETALHE),
+    # perdafrios: itens RF
+    'frios': Caixa(Filtro(classes=['RF'])),
+    'frios_avarias': Caixa(Filtro(eventos=['AVARIA'], operacoes=OPERACOES_AVARIA, classes=['RF'])),
+    'frios_ajustes': Caixa(Filtro(eventos=['AJUSTE', 'NEGATIVO_FALTA'], classes=['RF'])),
+    'frios_vencimento': Caixa(Filtro(operacoes=['VENCIMENTO'], classes=['RF'])),
+    # perda_hf: itens HF da operação de hortifruti e os demais (menos sobra)
+    'hf_avarias': Caixa(Filtro(operacoes=['HORTIFRUT'], classes=['HF'])),
+    'hf_ajustes': Caixa(Filtro(eventos=Exceto('NEGATIVO_SOBRA'), operacoes=Exceto('HORTIFRUT'), classes=['HF'])),
+    # perda_vencimento: sem HF e RF
+    'vencimento': Caixa(Filtro(operacoes=['VENCIMENTO'], classes=Exceto('HF', 'RF')),
+                        colunas=COLUNAS_DETALHE, classe_linha='vencimento-row'),
+}
+
+def criar_caixas(loja):
+    """Posições e agregados das caixas para a carga atual do SAEOI051 da loja"""
+    versao = file_version(source_path('saeoi051', loja))
+    return CaixasPerdas(dados_perdas(loja), CAIXAS, versao)
+
+def caixas_perdas(loja=None):
+    """Caixas da carga atual do SAEOI051 da loja (a atual por padrão), guardadas no cache por loja"""
+    return dataset('perdas_caixas', criar_caixas, ('saeoi051',), loja=loja)
+
+registrar_carga(('saeoi051',), caixas_perdas)
+
+# Páginas mais usadas, renderizadas no aquecimento do worker
+registrar_aquecimento('controle_de_perdas.perdaporgrupo', prioridade=10)
+registrar_aquecimento('controle_de_perdas.totalperdas')
+
+def perdas_classificadas(loja=None):
+    """SAEOI051 da loja com a classificação da taxonomia (CATEGORIA_PERDA, PRODUTO_HF, PRODUTO_RF)"""
+    tabela = caixas_perdas(loja).tabela
+    return pd.concat([tabela.df, tabela.classificacao], axis=1, copy=False)
+
+def posicoes_caixa(df, args):
+    """Linhas de uma caixa das páginas (``?caixa=``); sem caixa, todas"""
+    nome = args.get('caixa', '')
+    if not nome:
+        return slice(None)
+    caixas = caixas_perdas()
+    if nome not in caixas:
+        raise ValueError(f'Caixa desconhecida: {nome} (caixas: {sorted(CAIXAS)})')
+    return caixas.selecao(nome).posicoes
+
+# Download colunar (app.colunar) com as mesmas caixas das páginas
+registrar_colunar(DadosColunares(
+    'perdas', 'Perdas (SAEOI051)', ('saeoi051',), perdas_classificadas,
+    filtros={'caixa': 'caixa das páginas (avarias_mes, negativo_falta, hf_avarias...)'},
+    posicoes=posicoes_caixa,
+))
+
+def pagina_caixa(nome, cursor=0, n=None):
+    """Fatia de uma caixa a partir de ``cursor`` (VLR.TOTAL formatado só nos itens devolvidos)"""
+    pagina = caixas_perdas().selecao(nome).pagina(cursor, n or current_app.config['PERDAS_CAIXA_TOP'], format_currency)
+    caixa = CAIXAS[nome]
+    pagina.update(
+        nome=nome,
+        colunas=[(coluna, CLASSES_COLUNA.get(coluna, '')) for coluna in caixa.colunas],
+        classe_linha=caixa.classe_linha,
+    )
+    return pagina
+
+def paginas_caixas(*nomes):
+    """Primeira página de cada caixa, por nome"""
+    return {nome: pagina_caixa(nome) for nome in nomes}
+
+def prerender_dir(loja=None, versao=None):
+    """Pasta dos popups pré-renderizados de uma loja e versão dos dados"""
+    base = current_app.config.get('PERDAS_PRERENDER_DIR') or os.path.join(current_app.instance_path, 'perdas_subgrupos')
+    partes = [p for p in (loja, versao) if p]
+    return os.path.join(base, *partes)
+
+def prerendered_popup(tipo, slug):
+    """Caminho do popup pré-renderizado para a versão carregada, se existir"""
+    versao = registro_subgrupos().versao
+    if not versao:
+        return None
+    caminho = os.path.join(prerender_dir(loja_atual(), versao), tipo, f'{slug}.html')
+    return caminho if os.path.exists(caminho) else None
+
+def render_subgrupo_popup(nome):
+    """Renderiza o popup de itens de um subgrupo (todas as operações)"""
+    subgrupo_df = registro_subgrupos().linhas(nome)
+    if subgrupo_df.empty:
+        return render_template(
+            'subgrupo_popup.html',
+            table="<p>Nenhum dado encontrado para o subgrupo: " + str(nome) + "</p>",
+            subgrupo=nome,
+            total_subgrupo=format_currency(0),
+            quantidade_items=0
+        )
+
+    # Calcula o total do subgrupo
+    total_subgrupo = subgrupo_df['VLR.TOTAL'].sum()
+
+    # Seleciona e ordena as colunas para exibição
+    subgrupo_df = subgrupo_df[COLUNAS_DETALHE].sort_values('VLR.TOTAL', ascending=False)
+
+    # Formata valores monetários
+    subgrupo_df = format_dataframe_currency(subgrupo_df, 'VLR.TOTAL')
+
+    return render_template(
+        'subgrupo_popup.html',
+        table=dataframe_to_html_table(subgrupo_df),
+        subgrupo=nome,
+        total_subgrupo=format_currency(total_subgrupo),
+        quantidade_items=len(subgrupo_df)
+    )
+
+def render_ajuste_popup(nome):
+    """Renderiza o popup de ajuste preventivo (eventos 6004 e 6504) de um subgrupo"""
+    subgrupo_df = registro_subgrupos().linhas(nome)
+    subgrupo_df = subgrupo_df[subgrupo_df['EVENTO'].isin([6004, 6504])]
+
+    # Prepara dados para exibição
+    subgrupo_df = prepare_dataframe_for_display(subgrupo_df)
+
+    # Formata valores com 2 casas decimais (sem símbolo de moeda)
+    subgrupo_df = format_dataframe_currency(subgrupo_df, 'VLR.TOTAL')
+
+    table_html = dataframe_to_html_table(subgrupo_df)
+
+    return render_template('ajustepreventiva_popup.html', table=table_html, subgrupo=nome)
+
 # =============== ROTAS ===============
 #rota da página inicial
 @controle_de_perdas.route('/')
 @controle_de_perdas.route('/controle_de_perdas')
 def index():
-    global saeoi51
-    df = saeoi51
+    df = dados_perdas()
 
     data_mais_antiga, data_mais_recente = get_date_range_info(df)
     
@@ -181,8 +371,7 @@ def index():
 #visualisar se  está atualisado.
 @controle_de_perdas.route('/menu')
 def menu():
-    global saeoi51
-    df = saeoi51
+    df = dados_perdas()
 
     data_mais_antiga, data_mais_recente = get_date_range_info(df)
     
@@ -197,8 +386,7 @@ def menu():
 
 @controle_de_perdas.route('/ajustepreventiva')
 def ajustepreventiva():
-    global saeoi51
-    df = saeoi51
+    df = dados_perdas()
     
     # Filtra os eventos 6004 e 6504
     evento_6004 = filter_by_evento(df, 6004)
@@ -268,63 +456,32 @@ def ajustepreventiva():
         ajustes_pendentes=ajustes_pendentes,
         ajustes_realizados=ajustes_realizados,
         economia_gerada=economia_gerada,
-        subgrupos_disponiveis=subgrupos_disponiveis
+        subgrupos_disponiveis=subgrupos_disponiveis,
+        slug_subgrupo=registro_subgrupos().slug
     )
 
 @controle_de_perdas.route('/ajustepreventiva_subgrupo/<subgrupo>')
 def ajustepreventiva_subgrupo(subgrupo):
-    global saeoi51
-    df = saeoi51
+    registro = registro_subgrupos()
+    nome = registro.resolver(subgrupo)
+    if nome is None:
+        return render_template('ajustepreventiva_popup.html', table=dataframe_to_html_table(pd.DataFrame()), subgrupo=subgrupo)
 
-    # Filtra apenas os eventos 6004 e 6504 primeiro
-    df_eventos = df[df['EVENTO'].isin([6004, 6504])]
-    
-    # Decodifica o subgrupo da URL (caso tenha caracteres especiais)
-    from urllib.parse import unquote
-    import base64
-    
-    subgrupo_decoded = unquote(subgrupo)
-    
-    # Tenta decodificar base64 se necessário
-    try:
-        # Verifica se parece com base64 (termina com = ou ==)
-        if subgrupo_decoded.endswith('=') or subgrupo_decoded.endswith('=='):
-            subgrupo_decoded = base64.b64decode(subgrupo_decoded).decode('utf-8')
-    except Exception:
-        # Se falhar na decodificação base64, usa o valor original
-        pass
-
-    # Tenta busca exata primeiro
-    subgrupo_df = df_eventos[df_eventos['SUB-GRUPO'] == subgrupo_decoded]
-    
-    # Se não encontrar, tenta busca case-insensitive
-    if subgrupo_df.empty:
-        subgrupo_df = df_eventos[df_eventos['SUB-GRUPO'].str.upper() == subgrupo_decoded.upper()]
-        
-    # Se ainda não encontrar, tenta busca parcial
-    if subgrupo_df.empty:
-        subgrupo_df = df_eventos[df_eventos['SUB-GRUPO'].str.contains(subgrupo_decoded, case=False, na=False)]
-    
-    # Prepara dados para exibição
-    subgrupo_df = prepare_dataframe_for_display(subgrupo_df)
-    
-    # Formata valores com 2 casas decimais (sem símbolo de moeda)
-    if not subgrupo_df.empty and 'VLR.TOTAL' in subgrupo_df.columns:
-        subgrupo_df = format_dataframe_currency(subgrupo_df, 'VLR.TOTAL')
+    prerenderizado = prerendered_popup('ajustepreventiva', registro.slug(nome))
+    if prerenderizado:
+        return send_file(prerenderizado, mimetype='text/html')
 
-    table_html = dataframe_to_html_table(subgrupo_df)
+    return render_ajuste_popup(nome)
 
-    return render_template('ajustepreventiva_popup.html', table=table_html, subgrupo=subgrupo_decoded)
-
-@controle_de_perdas.route('/perdaporgrupo')
-def perdaporgrupo():
-    global saeoi51
-    df = saeoi51
+def agregar_perdas_por_grupo():
+    """Totais por grupo e subgrupo do SAEOI051 (box_data, total_geral)."""
+    df = dados_perdas()
 
     if validate_columns(df, ['GRUPO', 'SUB-GRUPO', 'VLR.TOTAL']):
+        registro = registro_subgrupos()
+
         # Cria uma cópia do DataFrame e limpa os dados
         df = df.copy()
-        df['SUB-GRUPO'] = df['SUB-GRUPO'].str.replace('/', '-', regex=False)
         
         # Certifica que VLR.TOTAL é numérico
         df['VLR.TOTAL'] = pd.to_numeric(df['VLR.TOTAL'], errors='coerce')
@@ -352,15 +509,15 @@ def perdaporgrupo():
             # Verifica se os totais dos subgrupos batem com o total do grupo
             subgrupos_total = subgrupos['VLR.TOTAL'].sum()
             if not np.isclose(subgrupos_total, grupo_total, rtol=1e-10):
-                print(f"Aviso: Diferença encontrada no grupo {grupo}")
-                print(f"Total do grupo: {grupo_total}")
-                print(f"Soma dos subgrupos: {subgrupos_total}")
+                current_app.logger.warning(
+                    f'Grupo {grupo}: total {grupo_total} difere da soma dos subgrupos {subgrupos_total}')
             
             # Prepara dados dos subgrupos
             subgrupos_lista = []
             for _, row in subgrupos.iterrows():
                 subgrupo_data = {
                     'nome': row['SUB-GRUPO'],
+                    'slug': registro.slug(row['SUB-GRUPO']),
                     'valor': format_currency(row['VLR.TOTAL']),
                     'valor_raw': float(row['VLR.TOTAL']),  # mantém o valor original
                     'quantidade': row['GRUPO']
@@ -377,9 +534,8 @@ def perdaporgrupo():
         # Verifica se o total geral está correto
         soma_todos_grupos = sum(float(dados['soma_raw']) for dados in box_data.values())
         if not np.isclose(soma_todos_grupos, total_geral, rtol=1e-10):
-            print("Aviso: Total geral não corresponde à soma dos grupos")
-            print(f"Total geral: {total_geral}")
-            print(f"Soma dos grupos: {soma_todos_grupos}")
+            current_app.logger.warning(
+                f'Total geral {total_geral} difere da soma dos grupos {soma_todos_grupos}')
 
     else:
         box_data = {"Nenhum Grupo Encontrado": {
@@ -390,6 +546,13 @@ def perdaporgrupo():
         }}
         total_geral = 0
 
+    return box_data, total_geral
+
+@controle_de_perdas.route('/perdaporgrupo')
+def perdaporgrupo():
+    # Calculado uma vez por versão do SAEOI051 entre todos os nós (app.cache)
+    box_data, total_geral = cached('perdaporgrupo', ('saeoi051',), agregar_perdas_por_grupo)
+
     return render_template(
         'perdaporgrupo.html',
         box_data=box_data,
@@ -400,425 +563,292 @@ def perdaporgrupo():
 @controle_de_perdas.route('/controle_de_perdas/subgrupo/<subgrupo>')
 @controle_de_perdas.route('/subgrupo/<subgrupo>')
 def subgrupo_items(subgrupo):
-    global saeoi51
-    df = saeoi51
-
-    # Decodifica o subgrupo da URL
-    from urllib.parse import unquote
-    subgrupo_decoded = unquote(subgrupo)
-    
-    # Substitui - por / no subgrupo para corresponder aos dados
-    subgrupo_decoded = subgrupo_decoded.replace('-', '/')
-
-    if validate_columns(df, ['SUB-GRUPO', 'VLR.TOTAL']):
-        # Filtra por subgrupo
-        subgrupo_df = df[df['SUB-GRUPO'] == subgrupo_decoded].copy()
-        
-        # Debug logs
-        print(f"Procurando subgrupo: {subgrupo_decoded}")
-        print(f"Subgrupos disponíveis: {df['SUB-GRUPO'].unique()}")
-        print(f"Registros encontrados: {len(subgrupo_df)}")
-        
-        if subgrupo_df.empty:
-            return render_template(
-                'subgrupo_popup.html',
-                table="<p>Nenhum dado encontrado para o subgrupo: " + subgrupo_decoded + "</p>",
-                subgrupo=subgrupo_decoded,
-                total_subgrupo=format_currency(0),
-                quantidade_items=0
-            )
-        
-        # Calcula o total do subgrupo
-        total_subgrupo = subgrupo_df['VLR.TOTAL'].sum()
-        
-        # Seleciona e ordena as colunas para exibição
-        colunas_exibicao = ['MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']
-        subgrupo_df = subgrupo_df[colunas_exibicao].sort_values('VLR.TOTAL', ascending=False)
-        
-        # Formata valores monetários
-        subgrupo_df['VLR.TOTAL'] = subgrupo_df['VLR.TOTAL'].apply(format_currency)
-        
-        # Converte DataFrame para HTML
-        table_html = dataframe_to_html_table(subgrupo_df)
-        
+    if not validate_columns(dados_perdas(), ['SUB-GRUPO', 'VLR.TOTAL']):
         return render_template(
             'subgrupo_popup.html',
-            table=table_html,
-            subgrupo=subgrupo_decoded,
-            total_subgrupo=format_currency(total_subgrupo),
-            quantidade_items=len(subgrupo_df)
+            table="<p>Erro: Colunas necessárias não encontradas no DataFrame</p>",
+            subgrupo=subgrupo,
+            total_subgrupo=format_currency(0),
+            quantidade_items=0
         )
-    else:
+
+    registro = registro_subgrupos()
+    nome = registro.resolver(subgrupo)
+    if nome is None:
         return render_template(
             'subgrupo_popup.html',
-            table="<p>Erro: Colunas necessárias não encontradas no DataFrame</p>",
-            subgrupo=subgrupo_decoded,
+            table="<p>Nenhum dado encontrado para o subgrupo: " + subgrupo + "</p>",
+            subgrupo=subgrupo,
             total_subgrupo=format_currency(0),
             quantidade_items=0
         )
 
+    prerenderizado = prerendered_popup('subgrupo', registro.slug(nome))
+    if prerenderizado:
+        return send_file(prerenderizado, mimetype='text/html')
+
+    return render_subgrupo_popup(nome)
+
+@controle_de_perdas.route('/api/mudancas')
+def api_mudancas():
+    """Eventos que mudaram desde a versão ``desde`` e as perdas novas de hoje"""
+    dados_perdas()
+    desde = request.args.get('desde', '')
+    versao, mudancas_df = mudancas('perdas', desde)
+    if not desde:
+        return jsonify({'success': True, 'versao': versao})
+    if mudancas_df is None:
+        return jsonify({
+            'success': False,
+            'versao': versao,
+            'error': 'Versão fora do histórico, recarregue a página'
+        }), 410
+
+    perdas_hoje = mudancas_df[mudancas_df['STATUS'] == STATUS_INSERIDO]
+    if validate_columns(perdas_hoje, ['DT.ULT.EV.', 'VLR.TOTAL']):
+        datas = pd.to_datetime(perdas_hoje['DT.ULT.EV.'], errors='coerce').dt.date
+        perdas_hoje = perdas_hoje[datas == datetime.now().date()]
+        total_hoje = pd.to_numeric(perdas_hoje['VLR.TOTAL'], errors='coerce').sum()
+    else:
+        perdas_hoje = perdas_hoje.iloc[0:0]
+        total_hoje = 0
+
+    return jsonify({
+        'success': True,
+        'versao': versao,
+        'desde': desde,
+        'total': len(mudancas_df),
+        'mudancas': para_registros(mudancas_df),
+        'perdas_hoje': para_registros(perdas_hoje),
+        'total_perdas_hoje': format_currency(total_hoje)
+    })
+
 @controle_de_perdas.route('/negativo')
 def negativo():
-    global saeoi51
-    df = saeoi51
-
-    # Box 1: Evento 6001
-    box1_df = df[df['EVENTO'] == 6521]
-    
-    # Box 2: Evento 6501 
-    box2_df = df[df['EVENTO'] == 6021]
-
-    # Seleciona colunas para ambas as boxes
-    colunas = ['MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']
-    box1_df = box1_df[colunas].copy()
-    box2_df = box2_df[colunas].copy()
-
-    # Ordena por valor total
-    box1_df = box1_df.sort_values('VLR.TOTAL', ascending=True)
-    box2_df = box2_df.sort_values('VLR.TOTAL', ascending=True)
-
-    # Calcula totais antes da formatação
-    box1_vlr_total = box1_df['VLR.TOTAL'].sum()
-    box1_emb1_total = box1_df['EMB1'].sum()
-    
-    box2_vlr_total = box2_df['VLR.TOTAL'].sum()
-    box2_emb1_total = box2_df['EMB1'].sum()
-
-    # Formata valores monetários nos DataFrames
-    box1_df['VLR.TOTAL'] = box1_df['VLR.TOTAL'].apply(format_currency)
-    box2_df['VLR.TOTAL'] = box2_df['VLR.TOTAL'].apply(format_currency)
-
-    # Formata totais
-    box1_vlr_total_fmt = format_currency(box1_vlr_total)
-    box2_vlr_total_fmt = format_currency(box2_vlr_total)
-    total_geral = format_currency(box1_vlr_total + box2_vlr_total)
-
-    # Converte para HTML
-    box1_html = box1_df.to_html(classes='table table-striped', index=False)
-    box2_html = box2_df.to_html(classes='table table-striped', index=False)
+    caixas = paginas_caixas('negativo_sobra', 'negativo_falta')
+    sobra, falta = caixas['negativo_sobra'], caixas['negativo_falta']
 
     return render_template(
         'negativo.html',
-        box1_html=box1_html,
-        box2_html=box2_html,
-        box1_vlr_total=box1_vlr_total_fmt,
-        box2_vlr_total=box2_vlr_total_fmt,
-        box1_emb1_total=box1_emb1_total,
-        box2_emb1_total=box2_emb1_total,
-        total_geral=total_geral
+        caixas=caixas,
+        box1_vlr_total=format_currency(sobra['vlr_total']),
+        box2_vlr_total=format_currency(falta['vlr_total']),
+        box1_emb1_total=sobra['emb1_total'],
+        box2_emb1_total=falta['emb1_total'],
+        total_geral=format_currency(sobra['vlr_total'] + falta['vlr_total'])
     )
 
 @controle_de_perdas.route("/perda_hf")
 def perda_hf():
-    global saeoi51
-    df = saeoi51
-    
-    # Filtra itens que começam com "HF"
-    df_filtrado = filter_by_description_prefix(df, ['HF'])
-    
-    if df_filtrado.empty:
-        return render_template('perda_hf.html',
-                             filtro1_html="<p>Nenhum dado disponível</p>",
-                             filtro2_html="<p>Nenhum dado disponível</p>",
-                             filtro1_vlr_total=format_currency(0),
-                             filtro2_vlr_total=format_currency(0),
-                             filtro1_emb1_total=0,
-                             filtro2_emb1_total=0,
-                             total_perdas=format_currency(0))
-
-    # Filtro 1: OPERACAO = "AVARIAS / HORTIFRUT"
-    filtro1_df = filter_by_operacao(df_filtrado, "AVARIAS / HORTIFRUT")
-    
-    # Filtro 2: OPERACAO != "AVARIAS / HORTIFRUT" e EVENTO != 6521
-    filtro2_df = df_filtrado[
-        (df_filtrado['OPERACAO'] != "AVARIAS / HORTIFRUT") & 
-        (df_filtrado['EVENTO'] != 6521)
-    ] if validate_columns(df_filtrado, ['OPERACAO', 'EVENTO']) else pd.DataFrame()
-
-    # Prepara dados para exibição
-    filtro1_df = prepare_dataframe_for_display(filtro1_df)
-    filtro2_df = prepare_dataframe_for_display(filtro2_df)
+    pronto = servir_relatorio('perdas_perda_hf')
+    if pronto is not None:
+        return pronto
 
-    # Calcula totais
-    filtro1_vlr_total, filtro1_emb1_total = calculate_totals(filtro1_df)
-    filtro2_vlr_total, filtro2_emb1_total = calculate_totals(filtro2_df)
-    
-    # Formata valores
-    filtro1_vlr_total_fmt = format_currency(filtro1_vlr_total)
-    filtro2_vlr_total_fmt = format_currency(filtro2_vlr_total)
-    total_perdas_fmt = format_currency(filtro1_vlr_total + filtro2_vlr_total)
-
-    # Aplica formatação nos DataFrames
-    filtro1_df = format_dataframe_currency(filtro1_df)
-    filtro2_df = format_dataframe_currency(filtro2_df)
-
-    # Converte para HTML
-    filtro1_html = dataframe_to_html_table(filtro1_df)
-    filtro2_html = dataframe_to_html_table(filtro2_df)
+    # Itens HF: operação "AVARIAS / HORTIFRUT" (box 1) e as demais, sem sobra (box 2)
+    caixas = paginas_caixas('hf_avarias', 'hf_ajustes')
+    avarias, ajustes = caixas['hf_avarias'], caixas['hf_ajustes']
 
     return render_template(
         'perda_hf.html',
-        filtro1_html=filtro1_html,
-        filtro2_html=filtro2_html,
-        filtro1_vlr_total=filtro1_vlr_total_fmt,
-        filtro2_vlr_total=filtro2_vlr_total_fmt,
-        filtro1_emb1_total=filtro1_emb1_total,
-        filtro2_emb1_total=filtro2_emb1_total,
-        total_perdas=total_perdas_fmt
+        caixas=caixas,
+        filtro1_vlr_total=format_currency(avarias['vlr_total']),
+        filtro2_vlr_total=format_currency(ajustes['vlr_total']),
+        filtro1_emb1_total=avarias['emb1_total'],
+        filtro2_emb1_total=ajustes['emb1_total'],
+        total_perdas=format_currency(avarias['vlr_total'] + ajustes['vlr_total'])
     )
 
 @controle_de_perdas.route('/totalperdas')
 def totalperdas():
-    global saeoi51
-    df = saeoi51
-    
-    # Converte a coluna "EVENTO" para o tipo int
-    if 'EVENTO' in df.columns:
-        df['EVENTO'] = pd.to_numeric(df['EVENTO'], errors='coerce').fillna(0).astype(int)
-    
-    # Converte a coluna de data para o formato datetime"
-    if 'DT.ULT.EV.' in df.columns:
-        df['DT.ULT.EV.'] = pd.to_datetime(df['DT.ULT.EV.'], errors='coerce')
-
-    # Filtra os dados para cada box e ordena por "VLR.TOTAL" (do menor para o maior)
-    # Box 1: Evento 1500 E operação contendo "MERCADORIAS AVARIADAS"
-    box1_df = df[
-        (df['EVENTO'] == 1500) & 
-        (df['OPERACAO'].str.contains('MERCADORIAS  AVARIADAS|MERCADORIAS AVARIADAS POR VENCIMENTO|AVARIAS POR DEGUSTACAO|AVARIAS / HORTIFRUT', na=False))
-    ][['EVENTO', 'MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']].sort_values(by='VLR.TOTAL', ascending=True)
-    
-    box2_df = df[df['EVENTO'].isin([6004, 6001, 6504, 6021, 8000, 6501])][['EVENTO', 'MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']].sort_values(by='VLR.TOTAL', ascending=True)
-    
-    # Box 3: Evento 1500 E operação contendo "MERCADORIAS AVARIADAS" E data atual
-    data_atual = datetime.now().date()
-    box3_df = df[
-        (df['EVENTO'] == 1500) & 
-         (df['OPERACAO'].str.contains('MERCADORIAS  AVARIADAS|MERCADORIAS AVARIADAS POR VENCIMENTO|AVARIAS POR DEGUSTACAO|AVARIAS / HORTIFRUT', na=False)) & 
-        (df['DT.ULT.EV.'].dt.date == data_atual)
-    ][['EVENTO', 'MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']].sort_values(by='VLR.TOTAL', ascending=True)
-
-    box4_df = df[(df['EVENTO'].isin([6004, 6001, 6504, 6021, 8000,6501])) & (df['DT.ULT.EV.'].dt.date == data_atual)][['EVENTO', 'MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']].sort_values(by='VLR.TOTAL', ascending=True)
-
-    # Arredonda os valores da coluna "VLR.TOTAL" para duas casas decimais
-    box1_df['VLR.TOTAL'] = box1_df['VLR.TOTAL'].round(2)
-    box2_df['VLR.TOTAL'] = box2_df['VLR.TOTAL'].round(2)
-    box3_df['VLR.TOTAL'] = box3_df['VLR.TOTAL'].round(2)
-    box4_df['VLR.TOTAL'] = box4_df['VLR.TOTAL'].round(2)
-
-    # Calcula as somas
-    box1_vlr_total = box1_df['VLR.TOTAL'].sum()
-    box1_emb1_total = box1_df['EMB1'].sum()
-
-    box2_vlr_total = box2_df['VLR.TOTAL'].sum()
-    box2_emb1_total = box2_df['EMB1'].sum()
-
-    box3_vlr_total = box3_df['VLR.TOTAL'].sum()
-    box3_emb1_total = box3_df['EMB1'].sum()
-
-    box4_vlr_total = box4_df['VLR.TOTAL'].sum()
-    box4_emb1_total = box4_df['EMB1'].sum()
-
-    # Primeiro, calcula os valores originais (sem formatação)
-    box1_vlr_total_raw = box1_df['VLR.TOTAL'].sum() if 'VLR.TOTAL' in box1_df.columns else 0
-    box2_vlr_total_raw = box2_df['VLR.TOTAL'].sum() if 'VLR.TOTAL' in box2_df.columns else 0
-    box3_vlr_total_raw = box3_df['VLR.TOTAL'].sum() if 'VLR.TOTAL' in box3_df.columns else 0
-    box4_vlr_total_raw = box4_df['VLR.TOTAL'].sum() if 'VLR.TOTAL' in box4_df.columns else 0
-
-    # Calcula os totais para o box central
-    central_vlr_total = box3_vlr_total + box4_vlr_total
-    central_emb1_total = box3_emb1_total + box4_emb1_total
-
-    perda_total = box1_vlr_total_raw + box2_vlr_total_raw
-    perda_total = format_currency(perda_total)
-    perda_total2 = box3_vlr_total_raw + box4_vlr_total_raw
-    perda_total2 = format_currency(perda_total2)
-
-   
-    # Formata os valores totais
-    box1_vlr_total = format_currency(box1_vlr_total_raw)
-    box2_vlr_total = format_currency(box2_vlr_total_raw)
-    box3_vlr_total = format_currency(box3_vlr_total_raw)
-    box4_vlr_total = format_currency(box4_vlr_total_raw)
-
-    # Formata VLR.TOTAL em todos os DataFrames
-    for df in [box1_df, box2_df, box3_df, box4_df]:
-        if not df.empty and 'VLR.TOTAL' in df.columns:
-            df['VLR.TOTAL'] = df['VLR.TOTAL'].apply(format_currency)
-
-    # Converte os dados para exibição
-    box1 = box1_df.head(50).to_dict(orient='records')
-    box2 = box2_df.head(50).to_dict(orient='records')
-    box3 = box3_df.head(50).to_dict(orient='records')
-    box4 = box4_df.head(50).to_dict(orient='records')
-
-    return render_template(
+    # Página inteira pré-gerada do dia (app.relatorios); o fragmento é sempre gerado na hora
+    if not wants_fragment():
+        pronto = servir_relatorio('perdas_totalperdas')
+        if pronto is not None:
+            pronto.vary.add('X-Requested-With')
+            return pronto
+
+    # Box 1 e 2: avarias (evento 1500) e ajustes do mês; box 3 e 4: os mesmos, só de hoje
+    caixas = paginas_caixas('avarias_mes', 'ajustes_mes', 'avarias_hoje', 'ajustes_hoje')
+    box1, box2, box3, box4 = caixas.values()
+
+    # Totais vêm dos agregados das caixas, não das linhas exibidas
+    central_vlr_total = box3['vlr_total'] + box4['vlr_total']
+    central_emb1_total = box3['emb1_total'] + box4['emb1_total']
+
+    return render_page(
         'totalperdas.html',
-        box1=box1,
-        box1_vlr_total=box1_vlr_total,
-        box1_emb1_total=box1_emb1_total,
-        box2=box2,
-        box2_vlr_total=box2_vlr_total,
-        box2_emb1_total=box2_emb1_total,
-        box3=box3,
-        box3_vlr_total=box3_vlr_total,
-        box3_emb1_total=box3_emb1_total,
-        box4=box4,
-        box4_vlr_total=box4_vlr_total,
-        box4_emb1_total=box4_emb1_total,
+        'totalperdas_conteudo.html',
+        caixas=caixas,
+        box1=box1['itens'],
+        box1_vlr_total=format_currency(box1['vlr_total']),
+        box1_emb1_total=box1['emb1_total'],
+        box2=box2['itens'],
+        box2_vlr_total=format_currency(box2['vlr_total']),
+        box2_emb1_total=box2['emb1_total'],
+        box3=box3['itens'],
+        box3_vlr_total=format_currency(box3['vlr_total']),
+        box3_emb1_total=box3['emb1_total'],
+        box4=box4['itens'],
+        box4_vlr_total=format_currency(box4['vlr_total']),
+        box4_emb1_total=box4['emb1_total'],
         central_vlr_total=central_vlr_total,
         central_emb1_total=central_emb1_total,
-        perda_total=perda_total,
-        perda_total2=perda_total2
+        perda_total=format_currency(box1['vlr_total'] + box2['vlr_total']),
+        perda_total2=format_currency(central_vlr_total)
     )
 
 @controle_de_perdas.route('/perda_vencimento')
 def perda_vencimento():
     try:
-        global saeoi51
-        df = saeoi51
-
-        # Filtra as linhas onde a coluna "OPERACAO" contém o texto desejado
-        if 'OPERACAO' in df.columns:
-            df_filtrado = df[df['OPERACAO'] == "MERCADORIAS AVARIADAS POR VENCIMENTO"]
-        else:
-            df_filtrado = pd.DataFrame()  # DataFrame vazio caso a coluna não exista
-
-        # Remove os itens onde "DESCRICAO" começa com "HF" ou "RF"
-        if 'DESCRICAO' in df_filtrado.columns:
-            df_filtrado = df_filtrado[~df_filtrado['DESCRICAO'].str.startswith(('HF', 'RF'), na=False)]
-
-        # Remove as colunas indesejadas
-        colunas_selecionadas = ['MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']
-        df_filtrado = df_filtrado[colunas_selecionadas].sort_values(by='VLR.TOTAL', ascending=True)
-
-        # Calcula o valor total de perdas por vencimento ANTES da formatação
-        total_perdas = df_filtrado['VLR.TOTAL'].sum() if 'VLR.TOTAL' in df_filtrado.columns else 0
-        total_perdas_formatado = format_currency(total_perdas)
-
-        # Calcula o total de EMB1
-        total_emb1 = df_filtrado['EMB1'].sum() if 'EMB1' in df_filtrado.columns else 0
-
-        # Aplica formatação de moeda na coluna VLR.TOTAL do DataFrame
-        if 'VLR.TOTAL' in df_filtrado.columns and not df_filtrado.empty:
-            df_filtrado = df_filtrado.copy()
-            df_filtrado['VLR.TOTAL'] = df_filtrado['VLR.TOTAL'].apply(format_currency)
-
-        # Converte o DataFrame filtrado para HTML
-        if not df_filtrado.empty:
-            table_html = df_filtrado.to_html(classes='table table-striped', index=False)
-        else:
-            table_html = "<p class='text-center text-muted'>Nenhum dado disponível para exibição.</p>"
+        # Avarias por vencimento, sem itens HF e RF
+        caixas = paginas_caixas('vencimento')
+        vencimento = caixas['vencimento']
+        total_perdas_formatado = format_currency(vencimento['vlr_total'])
 
         return render_template(
             'perda_vencimento.html',
-            vencimento_data=df_filtrado.to_dict('records') if not df_filtrado.empty else [],
+            caixas=caixas,
+            vencimento_data=vencimento['itens'],
             vencimento_vlr_total=total_perdas_formatado,
-            vencimento_emb1_total=total_emb1,
-            table=table_html,
+            vencimento_emb1_total=vencimento['emb1_total'],
             total_perdas=total_perdas_formatado,
-            total_emb1=total_emb1
+            total_emb1=vencimento['emb1_total']
         )
     except Exception as e:
         print(f"Error in perda_vencimento: {e}")
         return render_template(
             'perda_vencimento.html',
+            caixas={},
             vencimento_data=[],
             vencimento_vlr_total="R$ 0,00",
             vencimento_emb1_total=0,
-            table="<p class='text-center text-muted'>Erro ao carregar dados.</p>",
             total_perdas="R$ 0,00",
             total_emb1=0
         )
 
 @controle_de_perdas.route('/perdafrios')
 def perdafrios():
-    global saeoi51
-    df = saeoi51
-    
-    # Filtra os itens onde "DESCRICAO" começa com "RF"
-    if 'DESCRICAO' in df.columns:
-        df_filtrado = df[df['DESCRICAO'].str.startswith('RF', na=False)]
-    else:
-        df_filtrado = pd.DataFrame()
-
-    # Box da esquerda: EVENTO em [6004, 6001, 6504, 6021, 8000]
-    eventos_esquerda = [6004, 6001, 6504, 6021, 8000]
-    box_esquerda_df = df_filtrado[df_filtrado['EVENTO'].isin(eventos_esquerda)]
-
-    # Box da direita: EVENTO = 1500
-    box_direita_df = df_filtrado[(df_filtrado['EVENTO'] == 1500) & 
-                            (df_filtrado['OPERACAO'].str.contains('MERCADORIAS  AVARIADAS|MERCADORIAS AVARIADAS POR VENCIMENTO|AVARIAS POR DEGUSTACAO|AVARIAS / HORTIFRUT', na=False))]
-    
+    pronto = servir_relatorio('perdas_perdafrios')
+    if pronto is not None:
+        return pronto
 
-    # Novo box: Perdas por Vencimento (Frios)
-    if 'OPERACAO' in df.columns:
-        box_vencimento_df = df[
-            (df['OPERACAO'] == "MERCADORIAS AVARIADAS POR VENCIMENTO") &
-            (df['DESCRICAO'].str.startswith('RF', na=False))
-        ]
-    else:
-        box_vencimento_df = pd.DataFrame()
-
-    # Seleciona as colunas relevantes para exibição
-    colunas_para_exibir = ['MERCADORIA', 'DESCRICAO', 'VLR.TOTAL', 'EMB1']
-    box_esquerda_df = box_esquerda_df[colunas_para_exibir].sort_values(by='VLR.TOTAL', ascending=True)
-    box_direita_df = box_direita_df[colunas_para_exibir].sort_values(by='VLR.TOTAL', ascending=True)
-    box_vencimento_df = box_vencimento_df[colunas_para_exibir].sort_values(by='VLR.TOTAL', ascending=True)
-
-    # Calcula os totais ANTES da formatação
-    total_esquerda = box_esquerda_df['VLR.TOTAL'].sum() if 'VLR.TOTAL' in box_esquerda_df.columns else 0
-    emb1_esquerda = box_esquerda_df['EMB1'].sum() if 'EMB1' in box_esquerda_df.columns else 0
-
-    total_direita = box_direita_df['VLR.TOTAL'].sum() if 'VLR.TOTAL' in box_direita_df.columns else 0
-    emb1_direita = box_direita_df['EMB1'].sum() if 'EMB1' in box_direita_df.columns else 0
+    # Itens RF: avarias (box 1), ajustes (box 2) e perdas por vencimento (box 3)
+    caixas = paginas_caixas('frios_avarias', 'frios_ajustes', 'frios_vencimento')
+    avarias, ajustes, vencimento = caixas.values()
+    frios = caixas_perdas().selecao('frios')
 
-    total_vencimento = box_vencimento_df['VLR.TOTAL'].sum() if 'VLR.TOTAL' in box_vencimento_df.columns else 0
-    emb1_vencimento = box_vencimento_df['EMB1'].sum() if 'EMB1' in box_vencimento_df.columns else 0
+    total_geral = avarias['vlr_total'] + ajustes['vlr_total'] + vencimento['vlr_total']
 
-    # Formata os totais
-    total_esquerda_formatado = format_currency(total_esquerda)
-    total_direita_formatado = format_currency(total_direita)
-    total_vencimento_formatado = format_currency(total_vencimento)
-
-    # Calcula o total geral
-    total_geral = total_esquerda + total_direita + total_vencimento
-    total_geral_formatado = format_currency(total_geral)
-
-    # Aplica formatação de moeda nos DataFrames
-    for df_box in [box_esquerda_df, box_direita_df, box_vencimento_df]:
-        if 'VLR.TOTAL' in df_box.columns and not df_box.empty:
-            df_box['VLR.TOTAL'] = df_box['VLR.TOTAL'].apply(format_currency)
-
-    # Converte os DataFrames para HTML
-    box_esquerda_html = dataframe_to_html_table(box_esquerda_df)
-    box_direita_html = dataframe_to_html_table(box_direita_df)
-    box_vencimento_html = dataframe_to_html_table(box_vencimento_df)
-
-    # Calcular totais gerais para os cards de resumo
-    rf_vlr_total = total_geral_formatado
-    rf_emb1_total = emb1_esquerda + emb1_direita + emb1_vencimento
-    eventos_count = len(df_filtrado['EVENTO'].unique()) if not df_filtrado.empty else 0
-    avariadas_vlr_total = total_direita_formatado  # Box 2 é mercadorias avariadas
-    
     return render_template('perdafrios.html',
-                         # Dados dos DataFrames para iteração no template
-                         box1=box_direita_df.to_dict('records') if not box_direita_df.empty else [],
-                         box2=box_esquerda_df.to_dict('records') if not box_esquerda_df.empty else [],
-                         box3=box_vencimento_df.to_dict('records') if not box_vencimento_df.empty else [],
-                         # Tabelas HTML
-                         box1_html=box_direita_html,
-                         box2_html=box_esquerda_html,
-                         box3_html=box_vencimento_html,
+                         caixas=caixas,
+                         # Itens da primeira página de cada box
+                         box1=avarias['itens'],
+                         box2=ajustes['itens'],
+                         box3=vencimento['itens'],
                          # Valores totais dos boxes
-                         box1_vlr_total=total_direita_formatado,
-                         box2_vlr_total=total_esquerda_formatado,
-                         box3_vlr_total=total_vencimento_formatado,
+                         box1_vlr_total=format_currency(avarias['vlr_total']),
+                         box2_vlr_total=format_currency(ajustes['vlr_total']),
+                         box3_vlr_total=format_currency(vencimento['vlr_total']),
                          # EMB1 totais dos boxes
-                         box1_emb1_total=emb1_direita,
-                         box2_emb1_total=emb1_esquerda,
-                         box3_emb1_total=emb1_vencimento,
+                         box1_emb1_total=avarias['emb1_total'],
+                         box2_emb1_total=ajustes['emb1_total'],
+                         box3_emb1_total=vencimento['emb1_total'],
                          # Totais gerais para os cards de resumo
-                         rf_vlr_total=rf_vlr_total,
-                         rf_emb1_total=rf_emb1_total,
-                         eventos_count=eventos_count,
-                         avariadas_vlr_total=avariadas_vlr_total)
+                         rf_vlr_total=format_currency(total_geral),
+                         rf_emb1_total=avarias['emb1_total'] + ajustes['emb1_total'] + vencimento['emb1_total'],
+                         eventos_count=frios.eventos if frios.total else 0,
+                         avariadas_vlr_total=format_currency(avarias['vlr_total']))
+
+@controle_de_perdas.route('/api/caixa/<nome>')
+def api_caixa(nome):
+    """Próxima fatia de uma caixa ("carregar mais"): linhas já renderizadas e o cursor seguinte"""
+    if nome not in CAIXAS:
+        return jsonify({'success': False, 'error': f'Caixa desconhecida: {nome}'}), 404
+    cursor = request.args.get('cursor', 0, type=int)
+    n = request.args.get('n', current_app.config['PERDAS_CAIXA_TOP'], type=int)
+    pagina = pagina_caixa(nome, cursor, max(1, min(n, current_app.config['PERDAS_CAIXA_MAX'])))
+    linhas = get_template_attribute('caixas.html', 'linhas')
+
+    return jsonify({
+        'success': True,
+        'caixa': nome,
+        'versao': caixas_perdas().versao,
+        'cursor': pagina['cursor'],
+        'proximo': pagina['proximo'],
+        'restantes': pagina['restantes'],
+        'total': pagina['total'],
+        'html': str(linhas(pagina))
+    })
+
+# =============== RELATÓRIOS PRÉ-GERADOS ===============
+# As caixas de hoje do totalperdas mudam com a data: a página é refeita a cada dia
+
+registrar_relatorio(Relatorio('perdas_totalperdas', ('saeoi051',), lambda params, destino: totalperdas(), diario=True))
+registrar_relatorio(Relatorio('perdas_perdafrios', ('saeoi051',), lambda params, destino: perdafrios()))
+registrar_relatorio(Relatorio('perdas_perda_hf', ('saeoi051',), lambda params, destino: perda_hf()))
+
+def resumo_perdas_loja(loja):
+    """Perda (VLR.TOTAL) por grupo de uma loja; roda no pool regional, um processo por loja"""
+    df = carregar_saeoi051(loja)
+    if not validate_columns(df, ['GRUPO', 'VLR.TOTAL']):
+        return pd.DataFrame()
+    df = df.assign(**{'VLR.TOTAL': pd.to_numeric(df['VLR.TOTAL'], errors='coerce')})
+    return df.groupby('GRUPO', as_index=False)['VLR.TOTAL'].sum()
+
+@controle_de_perdas.route('/regional')
+def regional():
+    resumo = consolidado('perdas', resumo_perdas_loja, ('saeoi051',))
+
+    if resumo.empty:
+        tabela = ''
+        lojas_com_dados = []
+    else:
+        tabela_df = resumo.pivot_table(index='GRUPO', columns='LOJA', values='VLR.TOTAL',
+                                       aggfunc='sum', fill_value=0)
+        tabela_df['TOTAL'] = tabela_df.sum(axis=1)
+        tabela_df = tabela_df.sort_values('TOTAL', ascending=False)
+        tabela_df.loc['TOTAL'] = tabela_df.sum()
+        tabela = tabela_df.applymap(format_currency).reset_index().to_html(
+            classes='table table-striped', index=False)
+        lojas_com_dados = sorted(resumo['LOJA'].unique())
+
+    return render_template(
+        'regional.html',
+        titulo='Perdas Regionais por Grupo',
+        tabela=tabela,
+        lojas_com_dados=lojas_com_dados
+    )
+
+# =============== PRÉ-RENDERIZAÇÃO ===============
+
+@controle_de_perdas.cli.command('prerender')
+@click.option('--loja', 'lojas', multiple=True, help='Loja a pré-renderizar (padrão: todas).')
+def prerender_subgrupos(lojas):
+    """Pré-renderiza os popups de todos os subgrupos da versão atual do SAEOI051."""
+    for loja in lojas or lojas_configuradas():
+        # A loja vai na query string para loja_atual() valer dentro dos templates
+        with current_app.test_request_context(query_string={'loja': loja}):
+            registro = registro_subgrupos()
+            if not registro.versao:
+                raise click.ClickException(f'Arquivo SAEOI051 da loja {loja} inacessível; versão dos dados desconhecida.')
+
+            destino = prerender_dir(loja, registro.versao)
+            tmp = destino + '.tmp'
+            shutil.rmtree(tmp, ignore_errors=True)
+            for tipo in ('subgrupo', 'ajustepreventiva'):
+                os.makedirs(os.path.join(tmp, tipo))
+
+            for nome in registro:
+                slug = registro.slug(nome)
+                for tipo, render in (('subgrupo', render_subgrupo_popup), ('ajustepreventiva', render_ajuste_popup)):
+                    with open(os.path.join(tmp, tipo, f'{slug}.html'), 'w', encoding='utf-8') as f:
+                        f.write(render(nome))
+
+            # Publica a versão nova e remove as anteriores da loja
+            shutil.rmtree(destino, ignore_errors=True)
+            os.replace(tmp, destino)
+            for antiga in os.listdir(prerender_dir(loja)):
+                if antiga != registro.versao:
+                    shutil.rmtree(os.path.join(prerender_dir(loja), antiga), ignore_errors=True)
+
+        click.echo(f'Loja {loja}: {len(registro)} subgrupo(s) pré-renderizados em {destino}')
@@ -0,0 +1,45 @@
+function toggleGrupo(grupoId) {
+    const content = document.getElementById(grupoId);
+    const button = event.currentTarget.querySelector('.expand-btn');
+
+    if (content.style.display === 'none' || content.style.display === '') {
+        content.style.display = 'block';
+        button.classList.add('expanded');
+    } else {
+        content.style.display = 'none';
+        button.classList.remove('expanded');
+    }
+}
+
+function abrirSubgrupo(slug) {
+    const url = `/controle-perdas/ajustepreventiva_subgrupo/${encodeURIComponent(slug)}`;
+
+    // Abre uma nova janela popup
+    const popup = window.open(
+        url, 
+        'subgrupo_popup', 
+        'width=1000,height=600,scrollbars=yes,resizable=yes,toolbar=no,menubar=no,location=no,status=no'
+    );
+
+    // Foca na nova janela
+    if (popup) {
+        popup.focus();
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    // Adicionar ícones Font Awesome se não estiverem carregados
+    if (!document.querySelector('link[href*="font-awesome"]')) {
+        const link = document.createElement('link');
+        link.rel = 'stylesheet';
+        link.href = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css';
+        document.head.appendChild(link);
+    }
+
+    // Adicionar evento de clique aos subgrupos (linhas da tabela)
+    document.querySelectorAll('.subgrupos-table tbody tr').forEach(row => {
+        row.addEventListener('click', function() {
+            abrirSubgrupo(this.dataset.subgrupo);
+        });
+    });
+});
@@ -0,0 +1,29 @@
+// "Carregar mais" das caixas de perdas: pede a próxima fatia da caixa e
+// acrescenta as linhas na tabela. Delegado no document para continuar
+// funcionando depois que a atualização ao vivo troca o conteúdo da página.
+document.addEventListener('click', function(event) {
+    const botao = event.target.closest('.carregar-mais[data-caixa]');
+    if (!botao || botao.disabled) return;
+
+    botao.disabled = true;
+    const url = `${botao.dataset.url}?cursor=${encodeURIComponent(botao.dataset.cursor)}`;
+    fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.error);
+            const corpo = document.querySelector(`[data-caixa-linhas="${botao.dataset.caixa}"]`);
+            if (corpo) corpo.insertAdjacentHTML('beforeend', data.html);
+
+            if (data.proximo === null) {
+                botao.remove();
+                return;
+            }
+            botao.dataset.cursor = data.proximo;
+            botao.querySelector('.restantes').textContent = data.restantes;
+            botao.disabled = false;
+        })
+        .catch(error => {
+            console.error('Erro ao carregar mais itens:', error);
+            botao.disabled = false;
+        });
+});
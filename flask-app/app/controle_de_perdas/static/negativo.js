@@ -0,0 +1,10 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Adicionar tooltips para descrições longas
+    const descricoes = document.querySelectorAll('.descricao');
+    descricoes.forEach(desc => {
+        if (desc.scrollWidth > desc.clientWidth) {
+            desc.title = desc.textContent;
+            desc.style.cursor = 'help';
+        }
+    });
+});
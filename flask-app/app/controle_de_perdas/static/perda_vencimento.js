@@ -0,0 +1,113 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Funcionalidade de ordenação
+    const table = document.getElementById('vencimento-table');
+    if (table) {
+        const headers = table.querySelectorAll('th.sortable');
+        headers.forEach((header, index) => {
+            header.addEventListener('click', () => sortTable(table, index));
+        });
+    }
+
+
+
+    // Botões de ação
+    const exportExcelBtn = document.getElementById('export-excel');
+    const exportPdfBtn = document.getElementById('export-pdf');
+    const refreshDataBtn = document.getElementById('refresh-data');
+
+    if (exportExcelBtn) {
+        exportExcelBtn.addEventListener('click', exportToExcel);
+    }
+
+    if (exportPdfBtn) {
+        exportPdfBtn.addEventListener('click', exportToPdf);
+    }
+
+    if (refreshDataBtn) {
+        refreshDataBtn.addEventListener('click', refreshData);
+    }
+
+    // Animar barras de progresso
+    const bars = document.querySelectorAll('.bar-fill');
+    bars.forEach(bar => {
+        const width = bar.style.width;
+        bar.style.width = '0%';
+        setTimeout(() => {
+            bar.style.width = width;
+        }, 500);
+    });
+});
+
+function sortTable(table, column) {
+    const tbody = table.querySelector('tbody');
+    const rows = Array.from(tbody.querySelectorAll('tr'));
+
+    const sortedRows = rows.sort((a, b) => {
+        const aText = a.cells[column].textContent.trim();
+        const bText = b.cells[column].textContent.trim();
+
+        // Tentar converter para número se possível
+        const aNum = parseFloat(aText.replace(/[^\d.-]/g, ''));
+        const bNum = parseFloat(bText.replace(/[^\d.-]/g, ''));
+
+        if (!isNaN(aNum) && !isNaN(bNum)) {
+            return aNum - bNum;
+        }
+
+        return aText.localeCompare(bText);
+    });
+
+    // Limpar tbody e adicionar linhas ordenadas
+    tbody.innerHTML = '';
+    sortedRows.forEach(row => tbody.appendChild(row));
+
+    updateTableTotals();
+}
+
+
+
+function updateTableTotals() {
+    const visibleRows = document.querySelectorAll('.vencimento-row:not([style*="display: none"])');
+    let totalValue = 0;
+    let totalUnits = 0;
+
+    visibleRows.forEach(row => {
+        const valor = parseFloat(row.dataset.valor.replace(/[^\d.-]/g, '')) || 0;
+        const units = parseInt(row.querySelector('.emb1').textContent) || 0;
+
+        totalValue += valor;
+        totalUnits += units;
+    });
+
+    document.getElementById('total-value').textContent = totalValue.toLocaleString('pt-BR', {
+        style: 'currency',
+        currency: 'BRL'
+    });
+    document.getElementById('total-units').textContent = `${totalUnits} unidades`;
+}
+
+function exportToExcel() {
+    // Implementar exportação para Excel
+    alert('Funcionalidade de exportação para Excel será implementada');
+}
+
+function exportToPdf() {
+    // Implementar exportação para PDF
+    alert('Funcionalidade de exportação para PDF será implementada');
+}
+
+function refreshData() {
+    // Implementar atualização de dados
+    location.reload();
+}
+
+// Função para destacar linhas por status
+function highlightStatus(status) {
+    const rows = document.querySelectorAll(`.vencimento-row[data-status="${status}"]`);
+    rows.forEach(row => {
+        row.style.backgroundColor = '#fff3cd';
+        setTimeout(() => {
+            row.style.backgroundColor = '';
+        }, 2000);
+    });
+}
@@ -0,0 +1,36 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Adicionar funcionalidade de ordenação às tabelas
+    const tables = document.querySelectorAll('.perdas-table');
+
+    tables.forEach(table => {
+        const headers = table.querySelectorAll('th');
+        headers.forEach((header, index) => {
+            header.style.cursor = 'pointer';
+            header.addEventListener('click', () => sortTable(table, index));
+        });
+    });
+});
+
+function sortTable(table, column) {
+    const tbody = table.querySelector('tbody');
+    const rows = Array.from(tbody.querySelectorAll('tr'));
+
+    const sortedRows = rows.sort((a, b) => {
+        const aText = a.cells[column].textContent.trim();
+        const bText = b.cells[column].textContent.trim();
+
+        // Tentar converter para número se possível
+        const aNum = parseFloat(aText.replace(/[^\d.-]/g, ''));
+        const bNum = parseFloat(bText.replace(/[^\d.-]/g, ''));
+
+        if (!isNaN(aNum) && !isNaN(bNum)) {
+            return aNum - bNum;
+        }
+
+        return aText.localeCompare(bText);
+    });
+
+    // Limpar tbody e adicionar linhas ordenadas
+    tbody.innerHTML = '';
+    sortedRows.forEach(row => tbody.appendChild(row));
+}
@@ -0,0 +1,80 @@
+// Variável para controlar qual accordion está ativo
+let activeAccordion = null;
+
+function toggleAccordion(index) {
+  const header = document.querySelector(`[data-grupo="${index}"] .accordion-header`);
+  const content = document.getElementById(`content-${index}`);
+  const icon = header.querySelector('.accordion-icon');
+
+  // Se este accordion já está ativo, fecha ele
+  if (activeAccordion === index) {
+    closeAccordion(index);
+    activeAccordion = null;
+    return;
+  }
+
+  // Fecha o accordion ativo anterior (se houver)
+  if (activeAccordion !== null) {
+    closeAccordion(activeAccordion);
+  }
+
+  // Abre o novo accordion
+  openAccordion(index);
+  activeAccordion = index;
+}
+
+function openAccordion(index) {
+  const header = document.querySelector(`[data-grupo="${index}"] .accordion-header`);
+  const content = document.getElementById(`content-${index}`);
+  const icon = header.querySelector('.accordion-icon');
+
+  header.classList.add('active');
+  content.classList.add('active');
+  icon.classList.add('rotated');
+}
+
+function closeAccordion(index) {
+  const header = document.querySelector(`[data-grupo="${index}"] .accordion-header`);
+  const content = document.getElementById(`content-${index}`);
+  const icon = header.querySelector('.accordion-icon');
+
+  header.classList.remove('active');
+  content.classList.remove('active');
+  icon.classList.remove('rotated');
+}
+
+function abrirSubgrupo(slug) {
+  const url = `/controle-perdas/subgrupo/${encodeURIComponent(slug)}`;
+
+  const popup = window.open(
+    url,
+    "subgrupo_popup",
+    "width=1000,height=600,scrollbars=yes,resizable=yes"
+  );
+
+  if (popup) {
+    popup.focus();
+  } else {
+    alert(
+      "Por favor, permita popups para este site para visualizar os detalhes do subgrupo."
+    );
+  }
+}
+
+// Inicialização quando a página carregar
+document.addEventListener("DOMContentLoaded", function () {
+  // Garante que todos os accordions começam fechados
+  document.querySelectorAll('.accordion-content').forEach(content => {
+    content.classList.remove('active');
+  });
+
+  document.querySelectorAll('.accordion-header').forEach(header => {
+    header.classList.remove('active');
+  });
+
+  document.querySelectorAll('.accordion-icon').forEach(icon => {
+    icon.classList.remove('rotated');
+  });
+
+  activeAccordion = null;
+});
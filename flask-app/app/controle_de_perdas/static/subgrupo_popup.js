@@ -0,0 +1,23 @@
+// Adiciona classes para estilização específica das colunas
+document.addEventListener("DOMContentLoaded", function () {
+  const table = document.querySelector("table");
+  if (table) {
+    // Adiciona classes à tabela
+    table.classList.add("table", "table-hover");
+
+    // Adiciona classes às células específicas
+    const cells = table.getElementsByTagName("td");
+    for (let cell of cells) {
+      if (cell.textContent.startsWith("R$")) {
+        cell.classList.add("valor");
+      }
+      if (!isNaN(cell.textContent) && !cell.textContent.includes("R$")) {
+        cell.classList.add("quantidade");
+      }
+      if (cell.cellIndex === 1) {
+        // Coluna de descrição
+        cell.classList.add("descricao");
+      }
+    }
+  }
+});
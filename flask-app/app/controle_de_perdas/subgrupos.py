@@ -0,0 +1,87 @@
+"""
+Registro de subgrupos do SAEOI051 para os detalhamentos (popups) de perdas.
+
+Montado uma vez por carga dos dados: ordena as linhas por SUB-GRUPO (cada
+subgrupo vira um intervalo contíguo de linhas) e gera um slug estável e
+seguro para URL de cada nome (``ARROZ/FEIJAO`` -> ``arroz-feijao``). Os
+detalhamentos resolvem o slug por dicionário e fatiam o intervalo, sem
+varrer a planilha a cada requisição.
+"""
+import re
+import unicodedata
+
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+COLUNA = 'SUB-GRUPO'
+
+
+def slugify(nome):
+    """Converte o nome do subgrupo em um slug só com [a-z0-9-]."""
+    texto = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode('ascii')
+    slug = re.sub(r'[^a-z0-9]+', '-', texto.lower()).strip('-')
+    return slug or 'subgrupo'
+
+
+class SubgrupoRegistry:
+    """Slugs e intervalos de linhas de cada subgrupo de uma versão dos dados."""
+
+    def __init__(self, df, versao=None):
+        self.versao = versao
+        self._slugs = {}
+        self._nomes = {}
+        self._aliases = {}
+        self._intervalos = {}
+
+        if COLUNA not in df.columns or df.empty:
+            self._ordenado = df.iloc[0:0]
+            return
+
+        codigos, nomes = df[COLUNA].factorize(sort=True)
+        ordem = np.argsort(codigos, kind='stable')
+        self._ordenado = df.iloc[ordem].reset_index(drop=True)
+        # Códigos ordenados: -1 (subgrupo vazio) vem antes e fica de fora
+        contagens = np.bincount(codigos[codigos >= 0], minlength=len(nomes))
+        inicio = int((codigos < 0).sum())
+
+        for codigo, nome in enumerate(nomes):
+            nome = str(nome)
+            fim = inicio + int(contagens[codigo])
+            self._intervalos[nome] = (inicio, fim)
+            inicio = fim
+
+            slug = base = slugify(nome)
+            sufixo = 2
+            while slug in self._nomes:
+                slug = f'{base}-{sufixo}'
+                sufixo += 1
+            self._slugs[nome] = slug
+            self._nomes[slug] = nome
+
+            # Formatos de URL antigos: nome cru e '/' trocado por '-'
+            for alias in (nome, nome.replace('/', '-')):
+                self._aliases.setdefault(alias, nome)
+                self._aliases.setdefault(alias.upper(), nome)
+
+    def __iter__(self):
+        return iter(self._intervalos)
+
+    def __len__(self):
+        return len(self._intervalos)
+
+    def slug(self, nome):
+        """Slug do subgrupo ``nome`` (ou None se não existir nesta versão)."""
+        return self._slugs.get(str(nome))
+
+    def resolver(self, valor):
+        """Nome do subgrupo a partir do slug (ou de um link no formato antigo)."""
+        if valor in self._nomes:
+            return self._nomes[valor]
+        return self._aliases.get(valor) or self._aliases.get(valor.upper())
+
+    def linhas(self, nome):
+        """Linhas do subgrupo, já agrupadas (fatia, sem varrer a planilha)."""
+        inicio, fim = self._intervalos.get(nome, (0, 0))
+        return self._ordenado.iloc[inicio:fim]
+
@@ -0,0 +1,182 @@
+"""
+Taxonomia das perdas: regras declarativas que classificam cada evento do SAEOI051.
+
+As regras ficam nas tabelas abaixo, e não espalhadas pelas rotas:
+
+- ``TIPOS_EVENTO``: tipo de cada código de EVENTO (avaria, ajuste,
+  negativo...); códigos fora da tabela são ``OUTRO``;
+- ``TIPOS_OPERACAO``: tipo de cada OPERACAO, pela primeira regra que casa
+  (texto igual ou contendo um dos trechos); o resto é ``OUTRA``;
+- ``CLASSES_PRODUTO``: classe do produto pelo prefixo da DESCRICAO (HF, RF).
+
+Na carga, ``Taxonomia.classificar`` compila as regras em uma passada
+vetorizada: EVENTO por busca binária nos códigos, OPERACAO e o prefixo da
+DESCRICAO avaliados só nos valores distintos (``factorize``). O resultado é a
+coluna categórica ``CATEGORIA_PERDA`` ("<tipo do evento>:<tipo da operação>")
+e as marcas de classe do produto (``PRODUTO_HF``, ``PRODUTO_RF``).
+
+As caixas das páginas são declaradas com ``Filtro`` (tipos de evento, tipos
+de operação e classes, com ``Exceto`` para excluir); cada filtro vira um
+conjunto de grupos (categoria, classe), e as linhas saem das posições já
+agrupadas, sem varrer a tabela de novo.
+"""
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+EVENTO_OUTRO = 'OUTRO'
+OPERACAO_OUTRA = 'OUTRA'
+SEM_CLASSE = ''
+
+# Tipo de cada código de EVENTO
+TIPOS_EVENTO = {
+    1500: 'AVARIA',
+    6001: 'AJUSTE',
+    6004: 'AJUSTE',
+    6504: 'AJUSTE',
+    8000: 'AJUSTE',
+    6501: 'AJUSTE_6501',
+    6021: 'NEGATIVO_FALTA',
+    6521: 'NEGATIVO_SOBRA',
+}
+
+
+class RegraOperacao:
+    """OPERACAO igual a um dos ``iguais`` ou contendo um dos ``contem``."""
+
+    def __init__(self, tipo, iguais=(), contem=()):
+        self.tipo = tipo
+        self.iguais = tuple(iguais)
+        self.contem = tuple(contem)
+
+    def casa(self, operacao):
+        return operacao in self.iguais or any(trecho in operacao for trecho in self.contem)
+
+
+# Tipo de cada OPERACAO; vale a primeira regra que casa
+TIPOS_OPERACAO = [
+    RegraOperacao('VENCIMENTO', iguais=['MERCADORIAS AVARIADAS POR VENCIMENTO']),
+    RegraOperacao('HORTIFRUT', iguais=['AVARIAS / HORTIFRUT']),
+    RegraOperacao('AVARIA', contem=['MERCADORIAS  AVARIADAS', 'MERCADORIAS AVARIADAS POR VENCIMENTO',
+                                    'AVARIAS POR DEGUSTACAO', 'AVARIAS / HORTIFRUT']),
+]
+
+# Classe do produto pelo prefixo da DESCRICAO
+CLASSES_PRODUTO = {
+    'HF': 'HF',
+    'RF': 'RF',
+}
+
+
+class Exceto:
+    """Todos os tipos (ou classes) menos os listados."""
+
+    def __init__(self, *nomes):
+        self.nomes = set(nomes)
+
+
+class Filtro:
+    """
+    Linhas de uma caixa pela taxonomia.
+
+    Args:
+        eventos: tipos de evento (``TIPOS_EVENTO``); None aceita todos
+        operacoes: tipos de operação (``TIPOS_OPERACAO``); None aceita todos
+        classes: classes de produto (``CLASSES_PRODUTO``); None aceita todas
+    Cada argumento também aceita ``Exceto(...)``.
+    """
+
+    def __init__(self, eventos=None, operacoes=None, classes=None):
+        self.eventos = eventos
+        self.operacoes = operacoes
+        self.classes = classes
+
+
+def _escolher(criterio, todos):
+    if criterio is None:
+        return set(todos)
+    if isinstance(criterio, Exceto):
+        return set(todos) - criterio.nomes
+    return set(criterio)
+
+
+class Taxonomia:
+    """Regras compiladas: categorias (evento x operação) e classes de produto."""
+
+    def __init__(self, tipos_evento=TIPOS_EVENTO, tipos_operacao=TIPOS_OPERACAO, classes=CLASSES_PRODUTO):
+        self.regras_operacao = list(tipos_operacao)
+        self.classes_produto = dict(classes)
+
+        self.eventos = list(dict.fromkeys(list(tipos_evento.values()) + [EVENTO_OUTRO]))
+        self.operacoes = list(dict.fromkeys([r.tipo for r in self.regras_operacao] + [OPERACAO_OUTRA]))
+        self.categorias = [f'{e}:{o}' for e in self.eventos for o in self.operacoes]
+        self.classes = [SEM_CLASSE] + list(dict.fromkeys(self.classes_produto.values()))
+        self.tipos_evento = dict(tipos_evento)
+
+    def tipo_operacao(self, operacao):
+        for regra in self.regras_operacao:
+            if regra.casa(operacao):
+                return regra.tipo
+        return OPERACAO_OUTRA
+
+    def classe_produto(self, descricao):
+        for prefixo, classe in self.classes_produto.items():
+            if descricao.startswith(prefixo):
+                return classe
+        return SEM_CLASSE
+
+    def _codigos_eventos(self, evento):
+        outro = self.eventos.index(EVENTO_OUTRO)
+        if not self.tipos_evento:
+            return np.full(len(evento), outro, dtype=np.int16)
+        # Códigos de EVENTO ordenados e o tipo (posição em self.eventos) de cada um
+        codigos = np.array(sorted(self.tipos_evento), dtype=np.int64)
+        tipos = np.array([self.eventos.index(self.tipos_evento[c]) for c in codigos.tolist()], dtype=np.int16)
+        posicao = np.searchsorted(codigos, evento).clip(0, len(codigos) - 1)
+        return np.where(codigos[posicao] == evento, tipos[posicao], outro).astype(np.int16)
+
+    @staticmethod
+    def _por_valor_distinto(valores, funcao, nomes):
+        """Aplica ``funcao`` só aos valores distintos e devolve o código (posição em ``nomes``) de cada linha."""
+        codigos, distintos = pd.factorize(valores)
+        mapa = np.array([nomes.index(funcao(str(v))) for v in distintos], dtype=np.int16)
+        return mapa[codigos] if len(mapa) else np.zeros(len(valores), dtype=np.int16)
+
+    def classificar(self, evento, operacao, descricao):
+        """
+        Classifica as linhas (arrays/Series já normalizados, NaN como ''/0).
+
+        Returns:
+            tuple: (códigos de ``self.categorias``, códigos de ``self.classes``)
+        """
+        tipo_evento = self._codigos_eventos(np.asarray(evento, dtype=np.int64))
+        tipo_operacao = self._por_valor_distinto(operacao, self.tipo_operacao, self.operacoes)
+        classe = self._por_valor_distinto(descricao, self.classe_produto, self.classes)
+        categoria = tipo_evento * len(self.operacoes) + tipo_operacao
+        return categoria, classe
+
+    def colunas(self, categoria, classe, index=None):
+        """``CATEGORIA_PERDA`` (categórica) e as marcas ``PRODUTO_<classe>`` como DataFrame."""
+        colunas = {'CATEGORIA_PERDA': pd.Categorical.from_codes(categoria, self.categorias)}
+        for codigo, nome in enumerate(self.classes):
+            if nome:
+                colunas[f'PRODUTO_{nome}'] = classe == codigo
+        return pd.DataFrame(colunas, index=index)
+
+    def grupos(self, filtro):
+        """Grupos (categoria * len(classes) + classe) que o ``Filtro`` aceita."""
+        eventos = _escolher(filtro.eventos, self.eventos)
+        operacoes = _escolher(filtro.operacoes, self.operacoes)
+        classes = _escolher(filtro.classes, self.classes)
+        desconhecidos = (eventos - set(self.eventos)) | (operacoes - set(self.operacoes)) | (classes - set(self.classes))
+        if desconhecidos:
+            raise ValueError(f'Tipos fora da taxonomia: {sorted(desconhecidos)}')
+        return sorted(
+            (self.eventos.index(e) * len(self.operacoes) + self.operacoes.index(o)) * len(self.classes)
+            + self.classes.index(c)
+            for e in eventos for o in operacoes for c in classes
+        )
+
+
+TAXONOMIA = Taxonomia()
@@ -0,0 +1,170 @@
+"""
+Pontuação de risco de ruptura dos itens do smg12.
+
+A nota (0 a 100) é a média ponderada de componentes normalizados entre 0 e 1,
+calculados de uma vez, em arrays numpy, sobre o DataFrame preparado:
+
+- ``ruptura``: DIA S/VND (RUPT.) em relação a ``ruptura`` dias;
+- ``sem_venda``: DIAS S/VND em relação a ``sem_venda`` dias;
+- ``estoque_emb1`` / ``estoque_emb9``: estoque parado (escala logarítmica,
+  relativa ao percentil 95 do próprio arquivo) — item com estoque e sem
+  venda é o caso que o comprador procura;
+- ``idade_entrada``: dias desde a DT ULT ENTRADA em relação a
+  ``idade_entrada`` dias (sem entrada conta como o máximo);
+- ``entrada``: quantidade da última entrada (escala logarítmica, percentil 95).
+
+A idade da entrada é contada a partir da data do arquivo (e não de hoje),
+então a nota só depende da versão dos dados e o ranking pode ser montado uma
+vez por versão. Pesos e referências vêm de ``RUPTURA_RISCO_PESOS`` e
+``RUPTURA_RISCO_REFERENCIAS``; componente com peso 0 é ignorado.
+"""
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+PESOS_PADRAO = {
+    'ruptura': 3.0,
+    'sem_venda': 2.0,
+    'estoque_emb1': 2.0,
+    'estoque_emb9': 1.0,
+    'idade_entrada': 1.0,
+    'entrada': 1.0,
+}
+
+# Dias em que o componente chega ao máximo
+REFERENCIAS_PADRAO = {
+    'ruptura': 30,
+    'sem_venda': 60,
+    'idade_entrada': 90,
+}
+
+# Rótulos dos componentes (coluna MOTIVO) para exibição
+MOTIVOS = {
+    'ruptura': 'Dias em ruptura',
+    'sem_venda': 'Dias sem venda',
+    'estoque_emb1': 'Estoque parado (EMB1)',
+    'estoque_emb9': 'Estoque parado (EMB9)',
+    'idade_entrada': 'Entrada antiga',
+    'entrada': 'Entrada grande',
+}
+
+TODOS = 'todos'
+
+COLUNAS_RANKING = ['CODIGO', 'DESCRICAO', 'EMBALAGEM', 'GRUPO', 'DIA S/VND (RUPT.)', 'DIAS S/VND',
+                   'ESTOQ EMB1', 'ESTOQ EMB9', 'DT ULT ENTRADA', 'ENTRADA EMB1']
+
+
+def _numerico(df, coluna):
+    """Coluna como float (vírgula decimal aceita); ausente ou inválido vira 0."""
+    if coluna not in df.columns:
+        return np.zeros(len(df))
+    valores = df[coluna]
+    if valores.dtype == object:
+        valores = valores.astype(str).str.replace(',', '.').str.strip()
+    return pd.to_numeric(valores, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+
+def _escala_log(valores):
+    """log1p do valor (negativos viram 0) relativo ao percentil 95 dos positivos."""
+    valores = np.log1p(np.clip(valores, 0, None))
+    positivos = valores[valores > 0]
+    referencia = np.percentile(positivos, 95) if positivos.size else 1.0
+    return np.clip(valores / max(referencia, 1e-9), 0, 1)
+
+
+def componentes(df, data_base, referencias=None):
+    """
+    Componentes normalizados (0 a 1) de cada linha.
+
+    Args:
+        data_base: data a partir da qual a idade da última entrada é contada
+
+    Returns:
+        dict: {componente: np.ndarray}
+    """
+    referencias = {**REFERENCIAS_PADRAO, **(referencias or {})}
+    entrada = pd.to_datetime(df['DT ULT ENTRADA'], format='%d/%m/%Y', errors='coerce') \
+        if 'DT ULT ENTRADA' in df.columns else pd.Series(pd.NaT, index=df.index)
+    idade = (pd.Timestamp(data_base) - entrada).dt.days.to_numpy(dtype=float)
+    # Sem entrada (ou data inválida) é o pior caso
+    idade = np.where(np.isnan(idade), referencias['idade_entrada'], idade)
+
+    return {
+        'ruptura': np.clip(_numerico(df, 'DIA S/VND (RUPT.)') / referencias['ruptura'], 0, 1),
+        'sem_venda': np.clip(_numerico(df, 'DIAS S/VND') / referencias['sem_venda'], 0, 1),
+        'estoque_emb1': _escala_log(_numerico(df, 'ESTOQ EMB1')),
+        'estoque_emb9': _escala_log(_numerico(df, 'ESTOQ EMB9')),
+        'idade_entrada': np.clip(idade / referencias['idade_entrada'], 0, 1),
+        'entrada': _escala_log(_numerico(df, 'ENTRADA EMB1')),
+    }
+
+
+def pontuar(df, data_base, pesos=None, referencias=None):
+    """
+    Nota de risco (0 a 100) e o componente que mais pesou, por linha.
+
+    Returns:
+        tuple: (np.ndarray de notas, np.ndarray com o nome do principal componente)
+    """
+    pesos = {nome: float(peso) for nome, peso in {**PESOS_PADRAO, **(pesos or {})}.items() if peso}
+    valores = componentes(df, data_base, referencias)
+    nomes = [nome for nome in pesos if nome in valores]
+    if not nomes or df.empty:
+        return np.zeros(len(df)), np.full(len(df), '', dtype=object)
+
+    # Uma linha por item, uma coluna por componente já multiplicado pelo peso
+    matriz = np.column_stack([valores[nome] * pesos[nome] for nome in nomes])
+    notas = 100 * matriz.sum(axis=1) / sum(pesos[nome] for nome in nomes)
+    motivos = np.array(nomes, dtype=object)[matriz.argmax(axis=1)]
+    return np.round(notas, 1), motivos
+
+
+class RiscoRuptura:
+    """Itens mais arriscados por GRUPO (e no geral) de uma versão dos dados."""
+
+    def __init__(self, df, versao=None, data_base=None, pesos=None, referencias=None, top=20):
+        self.versao = versao
+        self.data_base = pd.Timestamp(data_base or pd.Timestamp.today()).normalize()
+        self.top_n = top
+        self._listas = {}
+
+        if df.empty:
+            self._listas[TODOS] = pd.DataFrame(columns=COLUNAS_RANKING + ['RISCO', 'MOTIVO'])
+            return
+
+        notas, motivos = pontuar(df, self.data_base, pesos, referencias)
+        colunas = [coluna for coluna in COLUNAS_RANKING if coluna in df.columns]
+        ranking = df[colunas].assign(RISCO=notas, MOTIVO=motivos)
+
+        # Ordem geral: maior nota primeiro, código como desempate estável
+        # (posição do código na ordem crescente, para ordenar inteiros e não textos)
+        codigos = ranking['CODIGO'].factorize(sort=True)[0] if 'CODIGO' in ranking.columns \
+            else np.arange(len(ranking))
+        ordem = np.lexsort((codigos, -notas))
+        self._listas[TODOS] = ranking.iloc[ordem[:top]].reset_index(drop=True)
+
+        if 'GRUPO' not in ranking.columns:
+            return
+        # Mesma ordem dentro de cada grupo; a posição no grupo vem da distância ao início dele
+        grupos, nomes = ranking['GRUPO'].factorize(sort=True)
+        ordem = np.lexsort((codigos, -notas, grupos))
+        grupos_ordenados = grupos[ordem]
+        inicio = np.r_[0, np.flatnonzero(np.diff(grupos_ordenados)) + 1]
+        tamanhos = np.diff(np.r_[inicio, len(ordem)])
+        posicao = np.arange(len(ordem)) - np.repeat(inicio, tamanhos)
+        selecionados = ordem[(posicao < top) & (grupos_ordenados >= 0)]
+        topo = ranking.iloc[selecionados]
+        for codigo, linhas in topo.groupby(grupos[selecionados], sort=False):
+            self._listas[str(nomes[codigo])] = linhas.reset_index(drop=True)
+
+    @property
+    def grupos(self):
+        return sorted(grupo for grupo in self._listas if grupo != TODOS)
+
+    def top(self, grupo=None, n=None):
+        """Itens de maior risco do ``grupo`` (ou de todos), já ordenados."""
+        lista = self._listas.get(grupo or TODOS)
+        if lista is None:
+            lista = self._listas[TODOS].iloc[0:0]
+        return lista if n is None else lista.head(n)
@@ -1,79 +1,212 @@
-from flask import render_template, request, send_file, jsonify
+from flask import current_app, render_template, request, jsonify
 from . import controle_ruptura
-import pandas as pd 
-import openpyxl
+from .risco import MOTIVOS, PESOS_PADRAO, REFERENCIAS_PADRAO, RiscoRuptura
+from app.cache import cached
+from app.colunar import DadosColunares, registrar_colunar
+from app.cursores import Ordem, cursor, semear
+from app.fragments import render_page
+from app.datasets import file_version, source_path
+from app.export_jobs import submit_export
+from app.deltas import Incremental, STATUS_REMOVIDO, para_registros
+from app.lojas import consolidado, dataset, dataset_incremental, loja_atual, mudancas
+from app.offline import DatasetOffline, registrar_offline
+from app.relatorios import Relatorio, registrar_relatorio, servir_relatorio, url_relatorio
+from app.saude import ler_fonte, registrar_aquecimento, registrar_carga
+from app.lazy import lazy_import
+from datetime import date
 from math import ceil
-from io import BytesIO
 import logging
+import os
+
+pd = lazy_import('pandas')
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
-def calculo_ruptura():
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def ler_smg12(loja=None):
+    """
+    Reads the raw smg12 CSV of the store.
+    """
+    return ler_fonte('smg12', loja, pd.read_csv, sep=';', encoding='latin1')
+
+def preparar_ruptura(smg12_df):
+    """
+    Cleans raw smg12 rows into the rupture control layout.
+    
+    Every step works row by row, so it can also run on just the rows that
+    changed between two versions of the file (see app.deltas).
+    
+    Returns:
+        pd.DataFrame: Processed DataFrame with rupture control data
+    """
+    # Column mapping for better readability
+    column_mapping = {
+        'MERC': 'CODIGO',
+        'NAO VENDE (RUPT.)': 'DIA S/VND (RUPT.)',
+        'DT ULT ENT': 'DT ULT ENTRADA',
+        'QTD ULT ENT': 'ENTRADA EMB1',
+    }
+    
+    smg12_df = smg12_df.rename(columns=column_mapping)
+    
+    # Define selected columns (GRUPO is kept for filtering but will be hidden in display)
+    colunas_selecionadas = [
+        'CODIGO', 'DESCRICAO', 'EMBALAGEM', 'DT ULT ENTRADA',
+        'DIA S/VND (RUPT.)', 'ENTRADA EMB1', 'ESTOQ EMB1',
+        'ESTOQ EMB9', 'DT ULT VND', 'IDADE', 'DIAS S/VND', 'GRUPO'
+    ]
+    
+    # Filter columns that exist in the DataFrame
+    existing_columns = [col for col in colunas_selecionadas if col in smg12_df.columns]
+    smg12_df = smg12_df[existing_columns]
+    
+    # Clean data
+    smg12_df = smg12_df.dropna(subset=['DIA S/VND (RUPT.)'])
+    smg12_df['ESTOQ EMB1'] = smg12_df['ESTOQ EMB1'].fillna(0)
+    smg12_df['ESTOQ EMB9'] = smg12_df['ESTOQ EMB9'].fillna(0)
+    
+    # Process numeric columns
+    colunas_numericas = ['ESTOQ EMB1', 'ESTOQ EMB9', 'ENTRADA EMB1', 
+                       'DIA S/VND (RUPT.)', 'IDADE']
+    
+    for coluna in colunas_numericas:
+        if coluna in smg12_df.columns:
+            smg12_df[coluna] = (smg12_df[coluna]
+                               .fillna(0)
+                               .astype(str)
+                               .str.replace(',', '.')
+                               .str.strip())
+            smg12_df[coluna] = pd.to_numeric(smg12_df[coluna], errors='coerce').fillna(0).astype(int)
+    
+    # Sort by group
+    if 'GRUPO' in smg12_df.columns:
+        smg12_df = smg12_df.sort_values(by=['GRUPO', 'CODIGO'])
+    if 'DT ULT ENTRADA' in smg12_df.columns:
+        smg12_df['DT ULT ENTRADA'] = smg12_df['DT ULT ENTRADA'].fillna('SEM ENTRADA')
+    
+    return smg12_df
+
+def calculo_ruptura(loja=None):
     """
-    Processes rupture control data from CSV file.
+    Processes rupture control data from the store's CSV file.
+    
+    Args:
+        loja (str): store code (default store when omitted)
     
     Returns:
         pd.DataFrame: Processed DataFrame with rupture control data
     """
     try:
-        file_path = r'\\10.122.244.1\files\gerencial\gerencia\edvan\smg12.f888.csv'
-        
-        # Read CSV with error handling
-        smg12_df = pd.read_csv(file_path, sep=';', encoding='latin1')
-        
-        # Column mapping for better readability
-        column_mapping = {
-            'MERC': 'CODIGO',
-            'NAO VENDE (RUPT.)': 'DIA S/VND (RUPT.)',
-            'DT ULT ENT': 'DT ULT ENTRADA',
-            'QTD ULT ENT': 'ENTRADA EMB1',
-        }
-        
-        smg12_df = smg12_df.rename(columns=column_mapping)
-        
-        # Define selected columns (GRUPO is kept for filtering but will be hidden in display)
-        colunas_selecionadas = [
-            'CODIGO', 'DESCRICAO', 'EMBALAGEM', 'DT ULT ENTRADA',
-            'DIA S/VND (RUPT.)', 'ENTRADA EMB1', 'ESTOQ EMB1',
-            'ESTOQ EMB9', 'DT ULT VND', 'IDADE', 'DIAS S/VND', 'GRUPO'
-        ]
-        
-        # Filter columns that exist in the DataFrame
-        existing_columns = [col for col in colunas_selecionadas if col in smg12_df.columns]
-        smg12_df = smg12_df[existing_columns]
-        
-        # Clean data
-        smg12_df = smg12_df.dropna(subset=['DIA S/VND (RUPT.)'])
-        smg12_df['ESTOQ EMB1'] = smg12_df['ESTOQ EMB1'].fillna(0)
-        smg12_df['ESTOQ EMB9'] = smg12_df['ESTOQ EMB9'].fillna(0)
-        
-        # Process numeric columns
-        colunas_numericas = ['ESTOQ EMB1', 'ESTOQ EMB9', 'ENTRADA EMB1', 
-                           'DIA S/VND (RUPT.)', 'IDADE']
-        
-        for coluna in colunas_numericas:
-            if coluna in smg12_df.columns:
-                smg12_df[coluna] = (smg12_df[coluna]
-                                   .fillna(0)
-                                   .astype(str)
-                                   .str.replace(',', '.')
-                                   .str.strip())
-                smg12_df[coluna] = pd.to_numeric(smg12_df[coluna], errors='coerce').fillna(0).astype(int)
-        
-        # Sort by group
-        if 'GRUPO' in smg12_df.columns:
-            smg12_df = smg12_df.sort_values(by=['GRUPO', 'CODIGO'])
-        if 'DT ULT ENTRADA' in smg12_df.columns:
-            smg12_df['DT ULT ENTRADA'].fillna('SEM ENTRADA',inplace=True)
-        
+        return preparar_ruptura(ler_smg12(loja))
+    except Exception as e:
+        logger.error(f"Error processing data: {str(e)}")
+        return pd.DataFrame()
+
+# Reloads diff the raw rows by MERC and only re-prepare the products that changed
+RUPTURA_INCREMENTAL = Incremental(ler_smg12, chave=['MERC'], preparar=preparar_ruptura,
+                                  chave_preparada='CODIGO', ordenar=['GRUPO', 'CODIGO'])
+
+# Orders used by the index and print pages; their permutations are computed
+# once per data version and every filtered cursor is sliced from them
+ORDENS_RUPTURA = {
+    'grupo_codigo': Ordem(['GRUPO', 'CODIGO']),
+    'estoque_emb1': Ordem(['ESTOQ EMB1'], ascendente=False),
+}
+
+def dados_ruptura(loja=None):
+    """
+    Prepared rupture data of the store (the current one by default), kept
+    in the per-store cache.
+    """
+    try:
+        smg12_df = dataset_incremental('ruptura', RUPTURA_INCREMENTAL, ('smg12',), loja=loja)
+        if not smg12_df.empty:
+            semear(smg12_df, ORDENS_RUPTURA)
         return smg12_df
-        
     except Exception as e:
         logger.error(f"Error processing data: {str(e)}")
         return pd.DataFrame()
 
+registrar_carga(('smg12',), dados_ruptura)
+
+# Copy kept on the handhelds for the offline mode (filtered by group there)
+registrar_offline(DatasetOffline('ruptura', 'Ruptura', ('smg12',), dados_ruptura,
+                                 chave=['CODIGO'], faceta='GRUPO'))
+
+@controle_ruptura.record_once
+def configurar_risco(state):
+    """
+    Risk score defaults: component weights, reference days, items kept per
+    group (RUPTURA_RISCO_TOP) and items shown on the index page.
+    """
+    config = state.app.config
+    # Partial overrides (PORTAL_RUPTURA_RISCO_PESOS__idade=0.5) keep the other defaults
+    config['RUPTURA_RISCO_PESOS'] = dict(PESOS_PADRAO, **(config.get('RUPTURA_RISCO_PESOS') or {}))
+    config['RUPTURA_RISCO_REFERENCIAS'] = dict(REFERENCIAS_PADRAO, **(config.get('RUPTURA_RISCO_REFERENCIAS') or {}))
+    config.setdefault('RUPTURA_RISCO_TOP', 20)
+    config.setdefault('RUPTURA_RISCO_EXIBIDOS', 10)
+
+@controle_ruptura.context_processor
+def contexto_risco():
+    return {'motivos_risco': MOTIVOS}
+
+def criar_risco(loja):
+    """
+    Scores every item of the store and keeps the ranked top-N per group.
+
+    Entry age is counted from the smg12 file date, so the ranking only
+    depends on the data version and is built once per version.
+    """
+    caminho = source_path('smg12', loja)
+    try:
+        data_base = date.fromtimestamp(os.path.getmtime(caminho))
+    except OSError:
+        data_base = date.today()
+    config = current_app.config
+    return RiscoRuptura(dados_ruptura(loja),
+                        versao=file_version(caminho),
+                        data_base=data_base,
+                        pesos=config['RUPTURA_RISCO_PESOS'],
+                        referencias=config['RUPTURA_RISCO_REFERENCIAS'],
+                        top=config['RUPTURA_RISCO_TOP'])
+
+def risco_ruptura():
+    """
+    Rupture-risk ranking of the current store, kept in the per-store cache.
+    """
+    return dataset('ruptura_risco', criar_risco, ('smg12',))
+
+registrar_carga(('smg12',), risco_ruptura)
+
+# Rendered by the post-fork warm-up: the index page (first page, all groups)
+registrar_aquecimento('controle_ruptura.index', prioridade=10)
+
+def posicoes_ruptura(smg12_df, grupo_selecionado):
+    """
+    Row positions shown for a group filter: GRUPO+CODIGO order for all
+    groups, highest ESTOQ EMB1 first within one group (cached cursor).
+    """
+    if grupo_selecionado and grupo_selecionado != 'todos':
+        return cursor(smg12_df, ORDENS_RUPTURA, 'estoque_emb1', ('GRUPO', grupo_selecionado),
+                      lambda df: (df['GRUPO'] == grupo_selecionado).to_numpy())
+    return cursor(smg12_df, ORDENS_RUPTURA, 'grupo_codigo')
+
+def posicoes_colunar(smg12_df, args):
+    """
+    Rows of the columnar download (app.colunar): the index page order and
+    group filter (``?grupo=``).
+    """
+    if smg12_df.empty:
+        return slice(None)
+    return posicoes_ruptura(smg12_df, args.get('grupo', ''))
+
+registrar_colunar(DadosColunares('ruptura', 'Ruptura', ('smg12',), dados_ruptura,
+                                 filtros={'grupo': 'GRUPO (todos por padrão)'},
+                                 posicoes=posicoes_colunar))
+
 def get_grupos_disponiveis():
     """
     Get list of available groups from the data.
@@ -82,7 +215,7 @@ def get_grupos_disponiveis():
         list: List of unique groups
     """
     try:
-        smg12_df = calculo_ruptura()
+        smg12_df = dados_ruptura()
         if 'GRUPO' in smg12_df.columns:
             grupos = sorted(smg12_df['GRUPO'].dropna().unique().tolist())
             return grupos
@@ -106,7 +239,7 @@ def index():
         per_page = 50
         
         # Get all data
-        smg12_df = calculo_ruptura()
+        smg12_df = dados_ruptura()
         
         # Get available groups
         grupos_disponiveis = get_grupos_disponiveis()
@@ -119,18 +252,18 @@ def index():
                                  total_pages=0,
                                  grupos_disponiveis=grupos_disponiveis,
                                  grupo_selecionado=grupo_selecionado,
-                                 total_items=0)
+                                 total_items=0,
+                                 risco_itens=[])
+
+        # Highest-risk items of the group (precomputed for this data version)
+        risco_itens = risco_ruptura().top(grupo_selecionado if grupo_selecionado != 'todos' else None,
+                                          current_app.config['RUPTURA_RISCO_EXIBIDOS'])
         
-        # Filter by group if selected
-        if grupo_selecionado and grupo_selecionado != 'todos':
-            smg12_df = smg12_df[smg12_df['GRUPO'] == grupo_selecionado]
-            smg12_df = smg12_df.sort_values(by=['ESTOQ EMB1'], ascending=False)
-      
-            
-            
+        # Filtered and sorted row positions (cached per data version and filter)
+        posicoes = posicoes_ruptura(smg12_df, grupo_selecionado)
         
         # Calculate pagination
-        total_items = len(smg12_df)
+        total_items = len(posicoes)
         total_pages = ceil(total_items / per_page) if total_items > 0 else 1
         
         # Validate page number
@@ -143,7 +276,7 @@ def index():
         if total_items > 0:
             start_idx = (page - 1) * per_page
             end_idx = min(start_idx + per_page, total_items)
-            page_data = smg12_df.iloc[start_idx:end_idx]
+            page_data = smg12_df.iloc[posicoes[start_idx:end_idx]]
             
             # Define display columns (GRUPO column is ALWAYS excluded from display)
             colunas_exibidas = [
@@ -172,7 +305,8 @@ def index():
             end_item = 0
     
         
-        return render_template('controle_ruptura.html', 
+        return render_page('controle_ruptura.html',
+                              'controle_ruptura_tabela.html',
                               smg12_df=smg12_html, 
                               page=page, 
                               total_pages=total_pages,
@@ -180,7 +314,8 @@ def index():
                               start_item=start_item,
                               end_item=end_item,
                               grupos_disponiveis=grupos_disponiveis,
-                              grupo_selecionado=grupo_selecionado)
+                              grupo_selecionado=grupo_selecionado,
+                              risco_itens=para_registros(risco_itens))
                               
     except Exception as e:
         logger.error(f"Error in index route: {str(e)}")
@@ -190,7 +325,8 @@ def index():
                              total_pages=0,
                              grupos_disponiveis=[],
                              grupo_selecionado='',
-                             total_items=0)
+                             total_items=0,
+                             risco_itens=[])
 
 @controle_ruptura.route('/api/grupos')
 def api_grupos():
@@ -210,54 +346,141 @@ def api_grupos():
             'error': str(e)
         }), 500
 
+@controle_ruptura.route('/api/risco')
+def api_risco():
+    """
+    Highest rupture-risk items of ``grupo`` (all groups when omitted), up to
+    ``n`` items (capped at RUPTURA_RISCO_TOP). Each item carries its score
+    (RISCO, 0-100) and the component that weighed the most (MOTIVO).
+    """
+    try:
+        grupo = request.args.get('grupo', '')
+        if grupo == 'todos':
+            grupo = ''
+        limite = current_app.config['RUPTURA_RISCO_TOP']
+        n = min(max(request.args.get('n', limite, type=int), 1), limite)
+
+        risco = risco_ruptura()
+        itens = risco.top(grupo or None, n)
+        return jsonify({
+            'success': True,
+            'versao': risco.versao,
+            'data_base': risco.data_base.strftime('%d/%m/%Y'),
+            'grupo': grupo or 'todos',
+            'pesos': current_app.config['RUPTURA_RISCO_PESOS'],
+            'total': len(itens),
+            'itens': para_registros(itens)
+        })
+    except Exception as e:
+        logger.error(f"Error in API risco: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@controle_ruptura.route('/api/mudancas')
+def api_mudancas():
+    """
+    Rows that changed since data version ``desde`` (inserted, removed or
+    updated), plus the new ruptures among them (changed rows with no stock).
+    Without ``desde`` only the current version is returned.
+    """
+    dados_ruptura()
+    desde = request.args.get('desde', '')
+    versao, mudancas_df = mudancas('ruptura', desde)
+    if not desde:
+        return jsonify({'success': True, 'versao': versao})
+    if mudancas_df is None:
+        return jsonify({
+            'success': False,
+            'versao': versao,
+            'error': 'Versão fora do histórico, recarregue a página'
+        }), 410
+
+    if mudancas_df.empty:
+        preparado = novas_rupturas = pd.DataFrame()
+    else:
+        # Removed rows only carry the key (app.deltas keeps no raw rows), so
+        # they are reported by CODIGO; the prepared rows keep the index, so
+        # STATUS can be put back by label
+        removido = mudancas_df['STATUS'] == STATUS_REMOVIDO
+        status = mudancas_df.pop('STATUS')
+        preparado = preparar_ruptura(mudancas_df[~removido])
+        preparado['STATUS'] = status.loc[preparado.index]
+        novas_rupturas = preparado[preparado['ESTOQ EMB1'] <= 0]
+        removidos = pd.DataFrame({'CODIGO': mudancas_df.loc[removido, 'MERC'], 'STATUS': STATUS_REMOVIDO})
+        preparado = pd.concat([preparado, removidos], ignore_index=True)
+
+    return jsonify({
+        'success': True,
+        'versao': versao,
+        'desde': desde,
+        'total': len(preparado),
+        'mudancas': para_registros(preparado),
+        'novas_rupturas': para_registros(novas_rupturas)
+    })
+
+def render_impressao_ruptura(grupo_selecionado):
+    """
+    Render the print page of one group (or all groups) without pagination.
+    """
+    smg12_df = dados_ruptura()
+
+    if smg12_df is None or smg12_df.empty:
+        return render_template('controle_ruptura_print.html', 
+                             smg12_df='', 
+                             grupo_selecionado=grupo_selecionado,
+                             total_items=0)
+
+    # Same rows and order as the index page (slice of the cached cursor)
+    smg12_df = smg12_df.iloc[posicoes_ruptura(smg12_df, grupo_selecionado)]
+
+    # Define display columns (GRUPO column is ALWAYS excluded from display)
+    colunas_exibidas = [
+        'CODIGO', 'DESCRICAO', 'EMBALAGEM', 'DT ULT ENTRADA',
+        'ENTRADA EMB1', 'DIA S/VND (RUPT.)', 'ESTOQ EMB1',
+        'ESTOQ EMB9', 'DT ULT VND', 'IDADE'
+    ]
+
+    # Filter to existing display columns (excluding GRUPO)
+    existing_display_columns = [col for col in colunas_exibidas if col in smg12_df.columns]
+    smg12_df_display = smg12_df[existing_display_columns]
+
+    # Convert to HTML for printing
+    smg12_html = smg12_df_display.to_html(
+        classes='table table-striped table-hover table-sm print-table',
+        index=False,
+        escape=False,
+        table_id='print-rupture-table'
+    )
+
+    total_items = len(smg12_df)
+
+    return render_template('controle_ruptura_print.html', 
+                         smg12_df=smg12_html, 
+                         grupo_selecionado=grupo_selecionado,
+                         total_items=total_items)
+
 @controle_ruptura.route('/imprimir')
 def imprimir():
     """
     Route for printing all filtered data without pagination.
+
+    The rendered page is shared between portal nodes for each smg12
+    version (see app.cache).
     """
     try:
         # Get filter parameters
         grupo_selecionado = request.args.get('grupo', 'todos')
-        
-        # Load all data
-        smg12_df = calculo_ruptura()
-        
-        if smg12_df is None or smg12_df.empty:
-            return render_template('controle_ruptura_print.html', 
-                                 smg12_df='', 
-                                 grupo_selecionado=grupo_selecionado,
-                                 total_items=0)
-        
-        # Filter by group if selected
-        if grupo_selecionado and grupo_selecionado != 'todos':
-            smg12_df = smg12_df[smg12_df['GRUPO'] == grupo_selecionado]
-            smg12_df = smg12_df.sort_values(by=['ESTOQ EMB1'], ascending=False)
-        
-        # Define display columns (GRUPO column is ALWAYS excluded from display)
-        colunas_exibidas = [
-            'CODIGO', 'DESCRICAO', 'EMBALAGEM', 'DT ULT ENTRADA',
-            'ENTRADA EMB1', 'DIA S/VND (RUPT.)', 'ESTOQ EMB1',
-            'ESTOQ EMB9', 'DT ULT VND', 'IDADE'
-        ]
-        
-        # Filter to existing display columns (excluding GRUPO)
-        existing_display_columns = [col for col in colunas_exibidas if col in smg12_df.columns]
-        smg12_df_display = smg12_df[existing_display_columns]
-        
-        # Convert to HTML for printing
-        smg12_html = smg12_df_display.to_html(
-            classes='table table-striped table-hover table-sm print-table',
-            index=False,
-            escape=False,
-            table_id='print-rupture-table'
-        )
-        
-        total_items = len(smg12_df)
-        
-        return render_template('controle_ruptura_print.html', 
-                             smg12_df=smg12_html, 
-                             grupo_selecionado=grupo_selecionado,
-                             total_items=total_items)
+
+        # Standard print pages are pre-generated per smg12 version (app.relatorios)
+        pronto = servir_relatorio('ruptura_imprimir', {'grupo': grupo_selecionado})
+        if pronto is not None:
+            return pronto
+
+        return cached('ruptura_imprimir', ('smg12',),
+                      lambda: render_impressao_ruptura(grupo_selecionado),
+                      grupo_selecionado)
                               
     except Exception as e:
         logger.error(f"Error in print route: {str(e)}")
@@ -266,113 +489,154 @@ def imprimir():
                              grupo_selecionado='todos',
                              total_items=0)
 
+def gerar_excel_ruptura(grupo_selecionado, include_grupo, loja, destino):
+    """
+    Build the rupture control Excel file and write it to ``destino``.
+
+    Runs inside the export process pool (see app.export_jobs), so it must
+    stay a module-level function that only receives picklable arguments.
+    """
+    # openpyxl only loads when an export actually runs
+    from openpyxl.utils import get_column_letter
+
+    smg12_df = calculo_ruptura(loja)
+
+    if smg12_df.empty:
+        raise ValueError('Não há dados para exportar')
+
+    # Filter by group if selected
+    if grupo_selecionado and grupo_selecionado != 'todos':
+        smg12_df = smg12_df[smg12_df['GRUPO'] == grupo_selecionado]
+
+    if smg12_df.empty:
+        raise ValueError('Nenhum dado encontrado para o grupo selecionado')
+
+    # Define export columns (GRUPO can be included based on parameter)
+    export_columns = [
+        'CODIGO', 'DESCRICAO', 'EMBALAGEM', 'DT ULT ENTRADA',
+        'ENTRADA EMB1', 'DIA S/VND (RUPT.)', 'ESTOQ EMB1',
+        'ESTOQ EMB9', 'DT ULT VND', 'IDADE'
+    ]
+    if include_grupo:
+        export_columns.append('GRUPO')
+
+    # Filter to existing export columns
+    existing_export_columns = [col for col in export_columns if col in smg12_df.columns]
+    export_df = smg12_df[existing_export_columns]
+
+    with pd.ExcelWriter(destino, engine='openpyxl') as writer:
+        export_df.to_excel(writer, sheet_name='Controle_Ruptura', index=False)
+
+        # Auto-adjust column widths from the DataFrame instead of walking every cell
+        worksheet = writer.sheets['Controle_Ruptura']
+        for posicao, coluna in enumerate(export_df.columns, start=1):
+            max_length = max(len(str(coluna)),
+                             int(export_df[coluna].astype(str).str.len().max() or 0))
+            letra = get_column_letter(posicao)
+            worksheet.column_dimensions[letra].width = min(max_length + 2, 50)
+
+
 @controle_ruptura.route('/export')
 def export_excel():
     """
-    Export rupture control data to Excel file with group filtering.
+    Queue the rupture control Excel export as a background job.
+
+    Returns the job state as JSON (202 while running); the client polls
+    ``status_url`` and downloads from ``download_url`` once it is ready.
+    Identical requests for the same data version share one job and file.
     GRUPO column can be optionally included in Excel export.
     """
     try:
         grupo_selecionado = request.args.get('grupo', '')
         include_grupo = request.args.get('include_grupo', 'false').lower() == 'true'
-        
-        smg12_df = calculo_ruptura()
-        
-        if smg12_df.empty:
-            return jsonify({'error': 'Não há dados para exportar'}), 400
-        
-        # Filter by group if selected
-        original_df = smg12_df.copy()  # Keep original for group info
+
         if grupo_selecionado and grupo_selecionado != 'todos':
-            smg12_df = smg12_df[smg12_df['GRUPO'] == grupo_selecionado]
             filename = f'controle_ruptura_{grupo_selecionado}.xlsx'
         else:
+            grupo_selecionado = 'todos'
             filename = 'controle_ruptura_todos_grupos.xlsx'
-        
-        if smg12_df.empty:
-            return jsonify({'error': 'Nenhum dado encontrado para o grupo selecionado'}), 400
-        
-        # Define export columns (GRUPO can be included based on parameter)
-        if include_grupo:
-            export_columns = [
-                'CODIGO', 'DESCRICAO', 'EMBALAGEM', 'DT ULT ENTRADA',
-                'ENTRADA EMB1', 'DIA S/VND (RUPT.)', 'ESTOQ EMB1',
-                'ESTOQ EMB9', 'DT ULT VND', 'IDADE', 'GRUPO'
-            ]
-        else:
-            export_columns = [
-                'CODIGO', 'DESCRICAO', 'EMBALAGEM', 'DT ULT ENTRADA',
-                'ENTRADA EMB1', 'DIA S/VND (RUPT.)', 'ESTOQ EMB1',
-                'ESTOQ EMB9', 'DT ULT VND', 'IDADE'
-            ]
-        
-        # Filter to existing export columns
-        existing_export_columns = [col for col in export_columns if col in smg12_df.columns]
-        export_df = smg12_df[existing_export_columns]
-        
-        # Create Excel file in memory
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            export_df.to_excel(writer, sheet_name='Controle_Ruptura', index=False)
-            
-            # Format the Excel file
-            workbook = writer.book
-            worksheet = writer.sheets['Controle_Ruptura']
-            
-            # Auto-adjust column widths
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        output.seek(0)
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+
+        # Pre-generated file for this smg12 version: no job needed
+        if not include_grupo:
+            download_url = url_relatorio('ruptura_export', {'grupo': grupo_selecionado})
+            if download_url:
+                return jsonify({
+                    'success': True,
+                    'status': 'concluido',
+                    'download_name': filename,
+                    'download_url': download_url,
+                })
+
+        loja = loja_atual()
+        return submit_export(
+            'controle_ruptura',
+            file_version(source_path('smg12', loja)),
+            {'grupo': grupo_selecionado, 'include_grupo': include_grupo, 'loja': loja},
+            gerar_excel_ruptura,
+            (grupo_selecionado, include_grupo, loja),
+            filename,
+            XLSX_MIMETYPE
         )
-        
+
     except Exception as e:
         logger.error(f"Error exporting to Excel: {str(e)}")
         return jsonify({'error': 'Erro ao exportar dados'}), 500
 
+def variantes_grupos():
+    """
+    One pre-generated file for all groups plus one per group.
+    """
+    return [{'grupo': 'todos'}] + [{'grupo': grupo} for grupo in get_grupos_disponiveis()]
+
+def nome_export_ruptura(params):
+    if params['grupo'] == 'todos':
+        return 'controle_ruptura_todos_grupos.xlsx'
+    return f"controle_ruptura_{params['grupo']}.xlsx"
+
+registrar_relatorio(Relatorio(
+    'ruptura_imprimir', ('smg12',),
+    lambda params, destino: render_impressao_ruptura(params['grupo']),
+    variantes=variantes_grupos,
+))
+registrar_relatorio(Relatorio(
+    'ruptura_export', ('smg12',),
+    lambda params, destino: gerar_excel_ruptura(params['grupo'], False, loja_atual(), destino),
+    variantes=variantes_grupos,
+    extensao='.xlsx',
+    mimetype=XLSX_MIMETYPE,
+    download=nome_export_ruptura,
+))
+
+def calcular_group_stats():
+    """
+    Statistics by group of the current store's rupture data.
+    """
+    smg12_df = dados_ruptura()
+
+    if smg12_df.empty or 'GRUPO' not in smg12_df.columns:
+        return {}
+
+    # Calculate statistics by group
+    group_stats = {}
+    for grupo in smg12_df['GRUPO'].unique():
+        group_data = smg12_df[smg12_df['GRUPO'] == grupo]
+        group_stats[grupo] = {
+            'total_items': len(group_data),
+            'avg_rupture_days': round(group_data['DIA S/VND (RUPT.)'].mean(), 2) if len(group_data) > 0 else 0,
+            'total_stock_emb1': int(group_data['ESTOQ EMB1'].sum()) if 'ESTOQ EMB1' in group_data.columns else 0,
+            'total_stock_emb9': int(group_data['ESTOQ EMB9'].sum()) if 'ESTOQ EMB9' in group_data.columns else 0
+        }
+    return group_stats
+
 @controle_ruptura.route('/api/group-stats')
 def api_group_stats():
     """
     API endpoint to get statistics by group.
     """
     try:
-        smg12_df = calculo_ruptura()
-        
-        if smg12_df.empty or 'GRUPO' not in smg12_df.columns:
-            return jsonify({
-                'success': True,
-                'stats': {}
-            })
-        
-        # Calculate statistics by group
-        group_stats = {}
-        for grupo in smg12_df['GRUPO'].unique():
-            group_data = smg12_df[smg12_df['GRUPO'] == grupo]
-            group_stats[grupo] = {
-                'total_items': len(group_data),
-                'avg_rupture_days': round(group_data['DIA S/VND(RUPT.)'].mean(), 2) if len(group_data) > 0 else 0,
-                'total_stock_emb1': int(group_data['ESTOQ EMB1'].sum()) if 'ESTOQ EMB1' in group_data.columns else 0,
-                'total_stock_emb9': int(group_data['ESTOQ EMB9'].sum()) if 'ESTOQ EMB9' in group_data.columns else 0
-            }
-        
         return jsonify({
             'success': True,
-            'stats': group_stats
+            'stats': cached('ruptura_group_stats', ('smg12',), calcular_group_stats)
         })
         
     except Exception as e:
@@ -380,4 +644,51 @@ def api_group_stats():
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+def resumo_ruptura_loja(loja):
+    """
+    Per-group rupture summary of one store.
+
+    Runs in the regional process pool (one process per store), so it reads
+    the store's file directly instead of using the request cache.
+    """
+    smg12_df = calculo_ruptura(loja)
+    if smg12_df.empty or 'GRUPO' not in smg12_df.columns:
+        return pd.DataFrame()
+
+    smg12_df = smg12_df.assign(SEM_ESTOQUE=smg12_df['ESTOQ EMB1'] <= 0)
+    return (smg12_df.groupby('GRUPO')
+            .agg(ITENS=('CODIGO', 'count'),
+                 SEM_ESTOQUE=('SEM_ESTOQUE', 'sum'),
+                 DIAS_RUPT=('DIA S/VND (RUPT.)', 'mean'))
+            .reset_index())
+
+@controle_ruptura.route('/regional')
+def regional():
+    """
+    Regional view: items without stock per group across all stores,
+    computed in parallel (one worker process per store) and merged.
+    """
+    try:
+        resumo = consolidado('ruptura', resumo_ruptura_loja, ('smg12',))
+        if resumo.empty:
+            tabela = ''
+        else:
+            tabela_df = resumo.pivot_table(index='GRUPO', columns='LOJA', values='SEM_ESTOQUE',
+                                           aggfunc='sum', fill_value=0)
+            tabela_df['TOTAL'] = tabela_df.sum(axis=1)
+            tabela_df.loc['TOTAL'] = tabela_df.sum()
+            tabela = tabela_df.astype(int).reset_index().to_html(
+                classes='table table-striped table-hover table-sm', index=False)
+
+        return render_template('regional.html',
+                               titulo='Ruptura Regional - Itens sem estoque por grupo',
+                               tabela=tabela,
+                               lojas_com_dados=sorted(resumo['LOJA'].unique()) if not resumo.empty else [])
+    except Exception as e:
+        logger.error(f"Error in regional route: {str(e)}")
+        return render_template('regional.html',
+                               titulo='Ruptura Regional',
+                               tabela='',
+                               lojas_com_dados=[])
@@ -0,0 +1,269 @@
+// Parâmetros da página renderizados no template (data-* de #contentWrapper)
+function rupturaConfig() {
+    const wrapper = document.getElementById('contentWrapper');
+    return wrapper ? wrapper.dataset : {};
+}
+
+// FOUC prevention - Control content visibility
+document.addEventListener('DOMContentLoaded', function() {
+    setTimeout(function() {
+        const loadingSpinner = document.getElementById('loadingSpinnerMain');
+        const contentWrapper = document.getElementById('contentWrapper');
+
+        if (loadingSpinner) {
+            loadingSpinner.style.display = 'none';
+        }
+        if (contentWrapper) {
+            contentWrapper.classList.add('loaded');
+        }
+    }, 100);
+});
+
+// Fallback for window load
+window.addEventListener('load', function() {
+    const loadingSpinner = document.getElementById('loadingSpinnerMain');
+    const contentWrapper = document.getElementById('contentWrapper');
+
+    if (loadingSpinner) {
+        loadingSpinner.style.display = 'none';
+    }
+    if (contentWrapper) {
+        contentWrapper.classList.add('loaded');
+    }
+});
+
+function filtrarPorGrupo(grupo) {
+    const currentUrl = new URL(window.location);
+
+    if (grupo === 'todos') {
+        currentUrl.searchParams.delete('grupo');
+    } else {
+        currentUrl.searchParams.set('grupo', grupo);
+    }
+
+    // Reset to page 1 when filtering
+    currentUrl.searchParams.set('page', '1');
+
+    // Add loading state with smooth transition
+    document.body.classList.add('loading');
+
+    // Adiciona transição suave aos elementos principais
+    const mainElements = document.querySelectorAll('.ruptura-table-container, .ruptura-header, .table-wrapper');
+    mainElements.forEach(element => {
+        if (element) {
+            element.style.transition = 'opacity 0.2s ease-in-out';
+            element.style.opacity = '0.7';
+        }
+    });
+
+    // Pequeno delay para permitir que a transição seja visível
+    setTimeout(() => {
+        // Navigate to new URL
+        window.location.href = currentUrl.toString();
+    }, 150);
+}
+
+function limparFiltro() {
+    const currentUrl = new URL(window.location);
+    currentUrl.searchParams.delete('grupo');
+    currentUrl.searchParams.set('page', '1');
+
+    document.body.classList.add('loading');
+    window.location.href = currentUrl.toString();
+}
+
+function imprimirFiltrado() {
+    try {
+        // Capturar o grupo selecionado atual
+        const grupoSelecionado = rupturaConfig().grupo;
+
+        // Construir a URL para impressão completa
+        let printUrl = rupturaConfig().printUrl;
+
+        // Adicionar parâmetro do grupo se não for 'todos'
+        if (grupoSelecionado && grupoSelecionado !== 'todos') {
+            printUrl += '?grupo=' + encodeURIComponent(grupoSelecionado);
+        }
+
+        // Abrir página de impressão em nova aba
+        const printWindow = window.open(printUrl, '_blank');
+
+        if (!printWindow) {
+            alert('Por favor, permita pop-ups para este site para usar a função de impressão.');
+        }
+
+    } catch (error) {
+        console.error('Erro ao imprimir:', error);
+        alert('Erro ao tentar imprimir. Verifique as configurações do seu navegador.');
+    }
+}
+
+// Exportação em segundo plano: enfileira o job e acompanha o status até o
+// arquivo ficar pronto, então dispara o download.
+function exportarExcel(includeGrupo = false) {
+    const grupoSelecionado = document.getElementById('grupo-select').value;
+    const exportUrl = rupturaConfig().exportUrl;
+
+    if (!exportUrl) {
+        alert('Função de exportação não disponível');
+        return;
+    }
+
+    const params = new URLSearchParams();
+    if (grupoSelecionado && grupoSelecionado !== 'todos') {
+        params.set('grupo', grupoSelecionado);
+    }
+    if (includeGrupo) {
+        params.set('include_grupo', 'true');
+    }
+
+    const botao = document.getElementById('btn-exportar');
+    if (botao) {
+        botao.disabled = true;
+        botao.dataset.label = botao.dataset.label || botao.innerHTML;
+        botao.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Gerando...';
+    }
+
+    function finalizar() {
+        if (botao) {
+            botao.disabled = false;
+            botao.innerHTML = botao.dataset.label;
+        }
+    }
+
+    function acompanhar(url) {
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'concluido') {
+                    finalizar();
+                    window.location.href = job.download_url;
+                } else if (job.status === 'erro' || !job.status_url) {
+                    finalizar();
+                    alert(job.error || 'Erro ao exportar dados');
+                } else {
+                    setTimeout(() => acompanhar(job.status_url), 1000);
+                }
+            })
+            .catch(error => {
+                console.error('Erro ao exportar:', error);
+                finalizar();
+                alert('Erro ao exportar dados');
+            });
+    }
+
+    acompanhar(exportUrl + (params.toString() ? '?' + params.toString() : ''));
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.body.classList.add('page-loaded');
+
+    // Highlight selected group in the select
+    const grupoSelect = document.getElementById('grupo-select');
+    if (grupoSelect) {
+        grupoSelect.addEventListener('change', function() {
+            this.style.borderColor = 'var(--primary-green)';
+            setTimeout(() => {
+                this.style.borderColor = 'var(--border-color)';
+            }, 1000);
+        });
+    }
+
+    // Add tooltips for buttons
+    const buttons = document.querySelectorAll('.btn[title]');
+    buttons.forEach(button => {
+        button.addEventListener('mouseenter', function() {
+            this.style.transform = 'translateY(-2px) scale(1.05)';
+        });
+
+        button.addEventListener('mouseleave', function() {
+            this.style.transform = 'translateY(0) scale(1)';
+        });
+    });
+
+    // Improve table accessibility
+    const table = document.querySelector('.table-wrapper table');
+    if (table) {
+        table.setAttribute('role', 'table');
+        table.setAttribute('aria-label', 'Dados de controle de ruptura');
+
+        const headers = table.querySelectorAll('th');
+        headers.forEach((header, index) => {
+            header.setAttribute('scope', 'col');
+            header.setAttribute('aria-sort', 'none');
+        });
+
+        table.setAttribute('tabindex', '0');
+        table.addEventListener('keydown', function(e) {
+            if (e.key === 'Enter' || e.key === ' ') {
+                e.preventDefault();
+                const firstPageLink = document.querySelector('.pagination .page-link');
+                if (firstPageLink) firstPageLink.focus();
+            }
+        });
+    }
+
+    // Add loading state for pagination links
+    const pageLinks = document.querySelectorAll('.pagination .page-link');
+    pageLinks.forEach(link => {
+        link.addEventListener('click', function() {
+            if (!this.closest('.page-item').classList.contains('disabled')) {
+                document.body.classList.add('loading');
+            }
+        });
+    });
+
+    // Show current filter status
+    const grupoSelecionado = rupturaConfig().grupo;
+    if (grupoSelecionado && grupoSelecionado !== 'todos') {
+        console.log('Filtro ativo para grupo:', grupoSelecionado);
+    }
+});
+
+window.addEventListener('beforeprint', function() {
+    console.log('Preparando para impressão...');
+});
+
+window.addEventListener('afterprint', function() {
+    console.log('Impressão concluída');
+    document.body.classList.remove('loading');
+});
+
+// Inicialização para prevenir FOUC e melhorar transições
+document.addEventListener('DOMContentLoaded', function() {
+    // Remove loading state se existir
+    document.body.classList.remove('loading');
+
+    // Marca HTML como carregado para prevenir FOUC
+    document.documentElement.classList.add('loaded');
+
+    // Otimização do select de grupo
+    const grupoSelect = document.getElementById('grupo-select');
+    if (grupoSelect) {
+        // Adiciona transição suave ao select
+        grupoSelect.style.transition = 'all 0.2s ease';
+
+        // Melhora a responsividade do select
+        grupoSelect.addEventListener('change', function() {
+            // Adiciona feedback visual imediato
+            this.style.opacity = '0.7';
+            setTimeout(() => {
+                filtrarPorGrupo(this.value);
+            }, 100);
+        });
+    }
+});
+
+// Garante que o loading state seja removido quando a página carregar completamente
+window.addEventListener('load', function() {
+    document.body.classList.remove('loading');
+    document.documentElement.classList.add('loaded');
+});
+
+// Remove loading state se a página for carregada via back/forward
+window.addEventListener('pageshow', function(event) {
+    if (event.persisted) {
+        document.body.classList.remove('loading');
+        document.documentElement.classList.add('loaded');
+    }
+});
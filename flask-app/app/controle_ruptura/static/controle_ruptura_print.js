@@ -0,0 +1,22 @@
+// Definir data e hora atuais
+document.addEventListener('DOMContentLoaded', function() {
+    const now = new Date();
+    const dateOptions = { 
+        year: 'numeric', 
+        month: '2-digit', 
+        day: '2-digit' 
+    };
+    const timeOptions = { 
+        hour: '2-digit', 
+        minute: '2-digit', 
+        second: '2-digit' 
+    };
+
+    document.getElementById('print-date').textContent = now.toLocaleDateString('pt-BR', dateOptions);
+    document.getElementById('print-time').textContent = now.toLocaleTimeString('pt-BR', timeOptions);
+});
+
+// Auto-impressão opcional (descomentado se necessário)
+// window.onload = function() { 
+//     setTimeout(() => window.print(), 500); 
+// }
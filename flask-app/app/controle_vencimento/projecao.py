@@ -0,0 +1,173 @@
+"""
+Projeção de venda dos lotes a vencer (risco de perda).
+
+Cada lote do SAEOU060 é cruzado, pelo código do produto, com o giro do
+produto no smg12. A venda diária (em EMB1) é estimada pela idade do estoque:
+``ESTOQ EMB1 / IDADE``, com IDADE em dias de estoque. Um produto sem venda há
+``VENCIMENTO_DIAS_PARADO`` dias ou mais conta como parado (venda zero). Os
+dias sem venda são contados pela DT ULT VND quando ela existe, e pela
+coluna DIAS S/VND quando não existe.
+
+Os lotes de um produto saem na ordem de vencimento (o que vence primeiro
+vende primeiro). Até o vencimento de um lote, a venda projetada
+(``venda diária * dias``) consome antes o estoque dos lotes anteriores; o
+que não couber nessa venda é a sobra projetada do lote. O valor em risco é
+a fração do VALOR A VENCER correspondente à sobra.
+
+``ProjecaoVencimento`` guarda as colunas fixas de uma carga: giro, estoque
+à frente de cada lote e vencimento em dias. A projeção de cada data é uma
+passada vetorizada sobre esses arrays, calculada na primeira consulta do
+dia e reaproveitada pelas páginas e exportações.
+"""
+import threading
+
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+COLUNAS_RISCO = ['CODIGO', 'DESCRICAO', 'EMBALAGEM', 'FORNECEDOR', 'VENCIMENTO', 'DIAS_PARA_VENCER',
+                 'ESTOQ.EMB1', 'VENDA_DIA', 'VENDA_DIA_NECESSARIA', 'SOBRA_PROJETADA',
+                 'PERC_RISCO', 'VALOR A VENCER', 'VALOR_EM_RISCO']
+
+
+def codigo_produto(serie):
+    """Código numérico do produto, nos 5 últimos dígitos (mesmo padrão do ISV)."""
+    return pd.to_numeric(serie, errors='coerce') % 100000
+
+
+def giro_smg12(smg12_df, dia, dias_parado=30):
+    """
+    Venda diária estimada (EMB1/dia) de cada produto do smg12.
+
+    Args:
+        dia: data de referência para os dias sem venda
+        dias_parado: dias sem venda a partir dos quais o produto conta como parado
+
+    Returns:
+        pd.Series: venda diária indexada pelo código do produto
+    """
+    codigo = codigo_produto(smg12_df['MERC'])
+    estoque = _numero(smg12_df, 'ESTOQ EMB1')
+    idade = _numero(smg12_df, 'IDADE')
+    sem_venda = _numero(smg12_df, 'DIAS S/VND').to_numpy()
+
+    if 'DT ULT VND' in smg12_df.columns:
+        ultima = pd.to_datetime(smg12_df['DT ULT VND'], format='%d/%m/%Y', errors='coerce')
+        desde_ultima = (pd.Timestamp(dia).normalize() - ultima).dt.days.to_numpy(dtype=float)
+        sem_venda = np.where(np.isnan(desde_ultima), sem_venda, desde_ultima)
+
+    venda = np.where(idade > 0, estoque.clip(lower=0) / idade.where(idade > 0, 1), 0.0)
+    venda = np.where(sem_venda >= dias_parado, 0.0, venda)
+
+    giro = pd.Series(venda, index=codigo.to_numpy())
+    giro = giro[giro.index.notna()]
+    return giro[~giro.index.duplicated()]
+
+
+def _numero(df, coluna):
+    """Coluna numérica (decimais com vírgula); ausente ou inválida vira 0."""
+    if coluna not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    serie = df[coluna]
+    if serie.dtype == object:
+        serie = serie.astype(str).str.strip().str.replace(',', '.', regex=False)
+    return pd.to_numeric(serie, errors='coerce').fillna(0).astype(float)
+
+
+class ProjecaoVencimento:
+    """Colunas fixas da projeção de uma carga e as projeções de cada dia."""
+
+    def __init__(self, tabela_df, giro, versao=None):
+        """
+        Args:
+            tabela_df: lotes (``montar_tabela`` do controle de vencimento)
+            giro: venda diária por código do produto (``giro_smg12``)
+        """
+        self.versao = versao
+        self.tabela = tabela_df
+        n = len(tabela_df)
+        codigo = codigo_produto(tabela_df['CODIGO']).to_numpy()
+        self.quantidade = pd.to_numeric(tabela_df['ESTOQ.EMB1'], errors='coerce').fillna(0).clip(lower=0).to_numpy(dtype=float)
+        self.valor = pd.to_numeric(tabela_df['VALOR A VENCER'], errors='coerce').fillna(0).to_numpy(dtype=float)
+        self.venda_dia = giro.reindex(codigo).fillna(0).to_numpy(dtype=float)
+        vencimento = tabela_df['VENCIMENTO']
+        # Dias desde a época (vencimento em dias inteiros); sem data fica NaN
+        self.vencimento = np.where(vencimento.notna(), vencimento.to_numpy().astype('datetime64[D]').astype(float), np.nan)
+
+        # Estoque à frente de cada lote: soma dos lotes do mesmo produto que vencem antes
+        produto, _ = pd.factorize(codigo)
+        ordem = np.lexsort((np.arange(n), np.nan_to_num(self.vencimento, nan=np.inf), produto))
+        acumulado = np.cumsum(self.quantidade[ordem])
+        inicio = np.ones(n, dtype=bool)
+        inicio[1:] = produto[ordem][1:] != produto[ordem][:-1]
+        base = np.maximum.accumulate(np.where(inicio, np.arange(n), 0)) if n else np.array([], dtype=int)
+        antes_do_grupo = np.where(base > 0, acumulado[base - 1], 0.0) if n else np.array([])
+        self.a_frente = np.empty(n)
+        self.a_frente[ordem] = acumulado - self.quantidade[ordem] - antes_do_grupo
+
+        self._dias = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Para o snapshot em disco (app.spill): sem a trava e sem as projeções do dia
+        estado = dict(self.__dict__)
+        del estado['_lock']
+        estado['_dias'] = {}
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def projetar(self, dia):
+        """
+        Projeção dos lotes não vencidos em ``dia`` (um DataFrame por data, em cache).
+
+        Returns:
+            pd.DataFrame: ``COLUNAS_RISCO``, com valores numéricos
+        """
+        dia = pd.Timestamp(dia).normalize()
+        with self._lock:
+            projecao = self._dias.get(dia)
+        if projecao is not None:
+            return projecao
+
+        projecao = self._calcular(dia)
+        with self._lock:
+            # Só a data consultada fica guardada: as anteriores não voltam
+            self._dias = {dia: self._dias.get(dia, projecao)}
+            return self._dias[dia]
+
+    def _calcular(self, dia):
+        hoje = float(np.datetime64(dia.date(), 'D').astype(float))
+        dias = self.vencimento - hoje
+        validos = np.flatnonzero(~np.isnan(dias) & (dias >= 0))
+        dias = dias[validos]
+        quantidade = self.quantidade[validos]
+        a_frente = self.a_frente[validos]
+        venda_dia = self.venda_dia[validos]
+
+        vendido = np.clip(venda_dia * dias - a_frente, 0, quantidade)
+        sobra = quantidade - vendido
+        fracao = np.divide(sobra, quantidade, out=np.zeros_like(sobra), where=quantidade > 0)
+        # Venda diária que esvaziaria o lote (e os anteriores) até o vencimento
+        necessaria = np.divide(a_frente + quantidade, dias, out=np.full_like(dias, np.inf), where=dias > 0)
+
+        linhas = self.tabela.iloc[validos]
+        projecao = pd.DataFrame({
+            'CODIGO': linhas['CODIGO'].to_numpy(),
+            'DESCRICAO': linhas['DESCRICAO'].to_numpy(),
+            'EMBALAGEM': linhas['EMBALAGEM'].to_numpy() if 'EMBALAGEM' in linhas.columns else None,
+            'FORNECEDOR': linhas['FORNECEDOR'].to_numpy() if 'FORNECEDOR' in linhas.columns else None,
+            'VENCIMENTO': linhas['VENCIMENTO'].to_numpy(),
+            'DIAS_PARA_VENCER': dias.astype(int),
+            'ESTOQ.EMB1': quantidade,
+            'VENDA_DIA': venda_dia,
+            'VENDA_DIA_NECESSARIA': necessaria,
+            'SOBRA_PROJETADA': sobra,
+            'PERC_RISCO': fracao * 100,
+            'VALOR A VENCER': self.valor[validos],
+            'VALOR_EM_RISCO': self.valor[validos] * fracao,
+        }, columns=COLUNAS_RISCO)
+        return projecao
@@ -1,48 +1,50 @@
-from flask import render_template, request, send_file, make_response, flash, redirect, url_for
+from flask import render_template, request, send_file, make_response, flash, redirect, url_for, current_app
 from . import controle_vencimento
-import pandas as pd
-import openpyxl
+from .projecao import COLUNAS_RISCO, ProjecaoVencimento, giro_smg12
+from app.cache import cached
+from app.colunar import DadosColunares, registrar_colunar
+from app.cursores import Ordem, cursor, semear
+from app.fragments import render_page
+from app.lojas import dataset, versao_fontes
+from app.offline import DatasetOffline, registrar_offline
+from app.relatorios import Relatorio, registrar_relatorio, servir_relatorio
+from app.saude import ler_fonte, registrar_aquecimento, registrar_carga
+from app.lazy import lazy_import
 from math import ceil
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
 import io
 from io import StringIO, BytesIO
 
+pd = lazy_import('pandas')
 
-# Carregar os dados uma vez na inicialização
-try:
-    # Tentar carregar dados da rede primeiro
-    fornecedor_df = pd.read_csv("//10.122.244.3/publico/ControleVencimento/Forn.csv", sep=";", encoding="latin1")
-    vencimento_df = pd.read_excel("//10.122.244.3/publico/ControleVencimento/SAEOU060.xlsx")
-except Exception as e:
-    # Se falhar, usar dados de teste locais
-    import os
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    test_data_dir = os.path.join(base_dir, 'test_data')
-    
-    fornecedor_df = pd.read_csv(os.path.join(test_data_dir, "Forn.csv"), sep=";", encoding="latin1")
-    vencimento_df = pd.read_excel(os.path.join(test_data_dir, "SAEOU060.xlsx"))
-
-def formatar_dados(df):
-    # Garantir que a coluna CODIGO seja string e remova o ".0"
-    df["CODIGO"] = df["CODIGO"].astype(str).str.replace(r"\.0$", "", regex=True)
-
-    # Converter as colunas ESTOQ.EMB1 e ESTOQ.EMB9 para inteiros
-    df["ESTOQ.EMB1"] = pd.to_numeric(df["ESTOQ.EMB1"], errors="coerce").fillna(0).astype(int)
-    df["ESTOQ.EMB9"] = pd.to_numeric(df["ESTOQ.EMB9"], errors="coerce").fillna(0).astype(int)
-
-    # Formatar a coluna VALOR A VENCER como moeda em reais
-    df["VALOR A VENCER"] = df["VALOR A VENCER"].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-
-    return df
 
+def carregar_dados(loja=None):
+    """Lê os fornecedores e o SAEOU060 (lotes com vencimento) da loja"""
+    try:
+        # Tentar carregar dados da rede primeiro
+        fornecedor_df = ler_fonte("forn_vencimento", loja, pd.read_csv, sep=";", encoding="latin1")
+        vencimento_df = ler_fonte("saeou060", loja, pd.read_excel)
+    except Exception as e:
+        # Se falhar, usar dados de teste locais (fica marcado como fallback em /saude)
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        test_data_dir = os.path.join(base_dir, 'test_data')
 
+        fornecedor_df = ler_fonte("forn_vencimento", loja, pd.read_csv, fallback=True,
+                                  caminho=os.path.join(test_data_dir, "Forn.csv"), sep=";", encoding="latin1")
+        vencimento_df = ler_fonte("saeou060", loja, pd.read_excel, fallback=True,
+                                  caminho=os.path.join(test_data_dir, "SAEOU060.xlsx"))
 
-@controle_vencimento.route("/", methods=["GET", "POST"])
-def home():
-    global fornecedor_df, vencimento_df
+    return fornecedor_df, vencimento_df
 
+def montar_tabela(loja=None):
+    """
+    Lotes do SAEOU060 com o fornecedor de cada item, sem filtros.
 
+    É a base de todas as telas, impressões e exportações; fica no cache por
+    loja e é montada uma vez por versão dos arquivos.
+    """
+    fornecedor_df, vencimento_df = carregar_dados(loja)
 
     # Renomear colunas
     fornecedor_df_renomeado = fornecedor_df.rename(columns={"Item Produto": "CODIGO",
@@ -62,24 +64,110 @@ def home():
     })
 
     # Merge dos DataFrames
-    vencimento_controle_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
+    tabela_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
 
     # Converter a coluna VENCIMENTO para datetime
-    vencimento_controle_df["VENCIMENTO"] = pd.to_datetime(vencimento_controle_df["VENCIMENTO"], errors="coerce")
+    tabela_df["VENCIMENTO"] = pd.to_datetime(tabela_df["VENCIMENTO"], errors="coerce")
+    return tabela_df
+
+# Ordenações das telas; DIAS_PARA_VENCER acompanha VENCIMENTO, então
+# "vencimento" serve também para a ordem por dias para vencer
+ORDENS_VENCIMENTO = {
+    "vencimento": Ordem(["VENCIMENTO"]),
+    "valor": Ordem(["VALOR A VENCER"], ascendente=False),
+}
+
+def tabela_vencimento(loja=None):
+    """Tabela de vencimentos da loja (a atual por padrão), com as ordenações já calculadas"""
+    tabela_df = dataset("vencimento_tabela", montar_tabela, ("forn_vencimento", "saeou060"), loja=loja)
+    semear(tabela_df, ORDENS_VENCIMENTO)
+    return tabela_df
+
+registrar_carga(("forn_vencimento", "saeou060"), tabela_vencimento)
+
+# Primeira página da tela principal, renderizada no aquecimento do worker
+registrar_aquecimento("controle_vencimento.home", prioridade=10)
+
+# Cópia no aparelho para o modo offline; um produto tem um lote por data de vencimento
+registrar_offline(DatasetOffline(
+    "vencimento", "Vencimentos", ("forn_vencimento", "saeou060"), tabela_vencimento,
+    chave=["CODIGO", "VENCIMENTO"],
+    colunas=["CODIGO", "DESCRICAO", "EMBALAGEM", "FORNECEDOR", "VENCIMENTO",
+             "ESTOQ.EMB1", "ESTOQ.EMB9", "VALOR A VENCER"],
+    faceta="FORNECEDOR",
+))
+
+def dias_para_vencer(df):
+    """Dias até o vencimento, contados a partir de agora (negativo = vencido)"""
+    return (df["VENCIMENTO"] - datetime.now()).dt.days
+
+def posicoes_vencimento(tabela_df, ordem, filtro="", dias_vencimento="", dias_maximo=None):
+    """
+    Posições (cursor em cache) dos lotes ainda não vencidos que passam nos
+    filtros, na ``ordem`` de ``ORDENS_VENCIMENTO``.
+
+    Args:
+        filtro: texto buscado em código, descrição e fornecedor
+        dias_vencimento: vence em até N dias (texto do formulário)
+        dias_maximo: limite fixo de dias (ex.: 45 na tela de vencendo em 45 dias)
+    """
+    try:
+        dias_limite = int(dias_vencimento) if dias_vencimento else None
+    except (ValueError, TypeError):
+        dias_limite = None
+    limites = [d for d in (dias_limite, dias_maximo) if d is not None]
+    dias_limite = min(limites) if limites else None
+
+    def mascara(df):
+        dias = dias_para_vencer(df)
+        # Filtrar apenas produtos que ainda não venceram (dias >= 0)
+        selecionados = dias >= 0
+        if dias_limite is not None:
+            selecionados &= dias <= dias_limite
+        if filtro:
+            codigo = df["CODIGO"].astype(str).str.replace(r"\.0$", "", regex=True)
+            selecionados &= (
+                codigo.str.contains(filtro, case=False, na=False) |
+                df["DESCRICAO"].astype(str).str.contains(filtro, case=False, na=False) |
+                df["FORNECEDOR"].astype(str).str.contains(filtro, case=False, na=False)
+            )
+        return selecionados.to_numpy()
+
+    # Os dias para vencer mudam com a data, que também entra na chave do cursor
+    chave = (date.today().isoformat(), filtro, dias_limite)
+    return cursor(tabela_df, ORDENS_VENCIMENTO, ordem, chave, mascara)
+
+# Download colunar (app.colunar) com os filtros e a ordem da tela principal
+registrar_colunar(DadosColunares(
+    "vencimento", "Vencimentos", ("forn_vencimento", "saeou060"), tabela_vencimento,
+    filtros={"filtro": "texto em código, descrição ou fornecedor", "dias_vencimento": "vence em até N dias"},
+    posicoes=lambda df, args: posicoes_vencimento(df, "vencimento", args.get("filtro", "").strip(),
+                                                  args.get("dias_vencimento", "").strip()),
+))
+
+def linhas_vencimento(tabela_df, posicoes):
+    """Linhas das posições (uma fatia do cursor) com DIAS_PARA_VENCER calculado"""
+    linhas_df = tabela_df.iloc[posicoes].copy()
+    linhas_df["DIAS_PARA_VENCER"] = dias_para_vencer(linhas_df)
+    return linhas_df
+
+def formatar_dados(df):
+    # Garantir que a coluna CODIGO seja string e remova o ".0"
+    df["CODIGO"] = df["CODIGO"].astype(str).str.replace(r"\.0$", "", regex=True)
+
+    # Converter as colunas ESTOQ.EMB1 e ESTOQ.EMB9 para inteiros
+    df["ESTOQ.EMB1"] = pd.to_numeric(df["ESTOQ.EMB1"], errors="coerce").fillna(0).astype(int)
+    df["ESTOQ.EMB9"] = pd.to_numeric(df["ESTOQ.EMB9"], errors="coerce").fillna(0).astype(int)
 
-    # Calcular dias para vencer
-    hoje = datetime.now()
-    vencimento_controle_df["DIAS_PARA_VENCER"] = (vencimento_controle_df["VENCIMENTO"] - hoje).dt.days
+    # Formatar a coluna VALOR A VENCER como moeda em reais
+    df["VALOR A VENCER"] = df["VALOR A VENCER"].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
 
-    # Filtrar apenas produtos que ainda não venceram (dias >= 0)
-    vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] >= 0]
+    return df
 
-    # Formatar os dados
-    vencimento_controle_df = formatar_dados(vencimento_controle_df)
 
-    # Ordenar o DataFrame pela coluna "VENCIMENTO"
-    vencimento_controle_df = vencimento_controle_df.sort_values(by="VENCIMENTO", ascending=True)
 
+@controle_vencimento.route("/", methods=["GET", "POST"])
+def home():
     filtro = ""
     dias_vencimento = ""
     
@@ -90,45 +178,33 @@ def home():
         filtro = request.args.get("filtro", "").strip()
         dias_vencimento = request.args.get("dias_vencimento", "").strip()
 
-    # Filtro de texto
-    if filtro:
-        vencimento_controle_df = vencimento_controle_df[
-            vencimento_controle_df["CODIGO"].astype(str).str.contains(filtro, case=False, na=False) |
-            vencimento_controle_df["DESCRICAO"].str.contains(filtro, case=False, na=False) |
-            vencimento_controle_df["FORNECEDOR"].str.contains(filtro, case=False, na=False)
-        ]
-
-    # Filtro de dias para vencimento
-    if dias_vencimento:
-        try:
-            dias_limite = int(dias_vencimento)
-            # Filtrar produtos que vencem em até X dias
-            vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] <= dias_limite]
-        except (ValueError, TypeError):
-            pass
+    # Lotes filtrados e ordenados pela coluna "VENCIMENTO" (cursor em cache por filtro)
+    tabela_df = tabela_vencimento()
+    posicoes = posicoes_vencimento(tabela_df, "vencimento", filtro, dias_vencimento)
 
     # Paginação
-    page = int(request.args.get("page", 1))
+    page = max(1, request.args.get("page", 1, type=int))
     per_page = 50
-    total_items = len(vencimento_controle_df)
+    total_items = len(posicoes)
     total_pages = ceil(total_items / per_page)
 
+    start_index = (page - 1) * per_page
+    end_index = start_index + per_page
+    paginated_df = formatar_dados(linhas_vencimento(tabela_df, posicoes[start_index:end_index]))
+
     # Definir colunas visíveis conforme especificado
     colunas_visiveis = ["CODIGO", "DESCRICAO", "COMPLEMENTO", "EMBALAGEM", "FORNECEDOR", "ESTOQ.EMB1", "ESTOQ.EMB9", "VALOR A VENCER", "VENCIMENTO"]
     
     # Filtrar para exibir apenas as colunas especificadas que existem no DataFrame
-    colunas_existentes = [col for col in colunas_visiveis if col in vencimento_controle_df.columns]
-    vencimento_controle_df = vencimento_controle_df[colunas_existentes]
-
-    start_index = (page - 1) * per_page
-    end_index = start_index + per_page
-    paginated_df = vencimento_controle_df.iloc[start_index:end_index]
+    colunas_existentes = [col for col in colunas_visiveis if col in paginated_df.columns]
+    paginated_df = paginated_df[colunas_existentes]
 
     # Converter para HTML
     vencimento_html = paginated_df.to_html(index=False, classes="styled-table")
 
-    return render_template(
+    return render_page(
         "home.html",
+        "vencimento_tabela.html",
         vencimento=vencimento_html,
         page=page,
         total_pages=total_pages,
@@ -138,57 +214,26 @@ def home():
 
 @controle_vencimento.route("/valoravencer", methods=["GET"])
 def valoravencer():
-    global fornecedor_df, vencimento_df
-
-    # Renomear e preparar os DataFrames (usando o mesmo mapeamento da rota principal)
-    fornecedor_df_renomeado = fornecedor_df.rename(columns={"Item Produto": "CODIGO",
-                                                           "Fornecedor Atual": "CPF/CNPJ",
-                                                           "FORNECEDOR": "FORNECEDOR"})
-    fornecedor_final_df = fornecedor_df_renomeado[["CODIGO", "CPF/CNPJ", "FORNECEDOR"]].dropna(subset=["FORNECEDOR"])
-
-    vencimento_df_renomeado = vencimento_df.rename(columns={
-        "CÓDIGO": "CODIGO",
-        "DESCRIÇÃO MERCADORIA": "DESCRICAO",
-        "DATA VENCIMENTO": "VENCIMENTO",
-        "EST. LÍQ. EMB1": "ESTOQ.EMB1",
-        "EST. LÍQ. EMB9": "ESTOQ.EMB9",
-        "VALOR VENCIMENTO": "VALOR A VENCER"
-    })
-
-    # Merge dos DataFrames
-    vencimento_controle_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
-
-    # Converter a coluna VENCIMENTO para datetime
-    vencimento_controle_df["VENCIMENTO"] = pd.to_datetime(vencimento_controle_df["VENCIMENTO"], errors="coerce")
-
-    # Calcular dias para vencer
-    hoje = datetime.now()
-    vencimento_controle_df["DIAS_PARA_VENCER"] = (vencimento_controle_df["VENCIMENTO"] - hoje).dt.days
-
-    # Filtrar apenas produtos que ainda não venceram (dias >= 0)
-    vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] >= 0]
-
-    # Formatar os dados
-    vencimento_controle_df = formatar_dados(vencimento_controle_df)
-
-    # Ordenar por valor a vencer (descendente)
-    vencimento_controle_df = vencimento_controle_df.sort_values(by="VALOR A VENCER", ascending=False)
+    # Lotes não vencidos por valor a vencer (descendente), do cursor em cache
+    tabela_df = tabela_vencimento()
+    posicoes = posicoes_vencimento(tabela_df, "valor")
 
     # Paginação
-    page = int(request.args.get("page", 1))
+    page = max(1, request.args.get("page", 1, type=int))
     per_page = 50
-    total_items = len(vencimento_controle_df)
+    total_items = len(posicoes)
     total_pages = ceil(total_items / per_page)
 
     start_index = (page - 1) * per_page
     end_index = start_index + per_page
-    paginated_df = vencimento_controle_df.iloc[start_index:end_index]
+    paginated_df = formatar_dados(linhas_vencimento(tabela_df, posicoes[start_index:end_index]))
 
     # Converter para HTML
     vencimento_html = paginated_df.to_html(index=False, classes="styled-table")
 
-    return render_template(
+    return render_page(
         "valoravencer.html",
+        "valoravencer_tabela.html",
         vencimento=vencimento_html,
         page=page,
         total_pages=total_pages,
@@ -196,65 +241,14 @@ def valoravencer():
     )
 
 
-@controle_vencimento.route("/imprimir", methods=["GET"])
-def imprimir():
-    global fornecedor_df, vencimento_df
-
-    # Obter parâmetros de filtro da URL
-    filtro = request.args.get('filtro', '').strip()
-    dias_vencimento = request.args.get('dias_vencimento', '').strip()
-
-    # Renomear e preparar os DataFrames (pode ser extraído para função auxiliar)
-    fornecedor_df_renomeado = fornecedor_df.rename(columns={
-        "Item Produto": "CODIGO",
-        "Fornecedor Atual": "CPF/CNPJ",
-        "FORNECEDOR": "FORNECEDOR",
-    })
-    fornecedor_final_df = fornecedor_df_renomeado[["CODIGO", "CPF/CNPJ", "FORNECEDOR"]].dropna(subset=["FORNECEDOR"])
-
-    vencimento_df_renomeado = vencimento_df.rename(columns={
-        "CÓDIGO": "CODIGO",
-        "DESCRIÇÃO MERCADORIA": "DESCRICAO",
-        "COMPLEMENTO": "COMPLEMENTO",
-        "EMBALAGEM": "EMBALAGEM",
-        "DATA VENCIMENTO": "VENCIMENTO",
-        "EST. LÍQ. EMB1": "ESTOQ.EMB1",
-        "EST. LÍQ. EMB9": "ESTOQ.EMB9",
-        "VALOR VENCIMENTO": "VALOR A VENCER"
-    })
-
-    # Merge dos DataFrames
-    vencimento_controle_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
-
-    # Converter a coluna VENCIMENTO para datetime
-    vencimento_controle_df["VENCIMENTO"] = pd.to_datetime(vencimento_controle_df["VENCIMENTO"], errors="coerce")
-
-    # Calcular dias para vencer
-    hoje = datetime.now()
-    vencimento_controle_df["DIAS_PARA_VENCER"] = (vencimento_controle_df["VENCIMENTO"] - hoje).dt.days
-
-    # Filtrar apenas produtos que ainda não venceram (dias >= 0)
-    vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] >= 0]
-
-    # Aplicar filtro de texto se fornecido
-    if filtro:
-        mask = (
-            vencimento_controle_df["CODIGO"].astype(str).str.contains(filtro, case=False, na=False) |
-            vencimento_controle_df["DESCRICAO"].astype(str).str.contains(filtro, case=False, na=False) |
-            vencimento_controle_df["FORNECEDOR"].astype(str).str.contains(filtro, case=False, na=False)
-        )
-        vencimento_controle_df = vencimento_controle_df[mask]
-
-    # Aplicar filtro de dias para vencimento se fornecido
-    if dias_vencimento:
-        try:
-            dias_limite = int(dias_vencimento)
-            vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] <= dias_limite]
-        except ValueError:
-            pass
+def render_impressao(filtro, dias_vencimento):
+    """Página de impressão com os filtros aplicados, sem paginação."""
+    # Mesmas linhas e ordem (data de vencimento) da tela principal
+    tabela_df = tabela_vencimento()
+    posicoes = posicoes_vencimento(tabela_df, "vencimento", filtro, dias_vencimento)
 
     # Formatar os dados
-    vencimento_controle_df = formatar_dados(vencimento_controle_df)
+    vencimento_controle_df = formatar_dados(linhas_vencimento(tabela_df, posicoes))
 
     # Definir colunas visíveis conforme especificado
     colunas_visiveis = ["CODIGO", "DESCRICAO", "COMPLEMENTO", "EMBALAGEM", "FORNECEDOR", "ESTOQ.EMB1", "ESTOQ.EMB9", "VALOR A VENCER", "VENCIMENTO"]
@@ -263,9 +257,6 @@ def imprimir():
     colunas_existentes = [col for col in colunas_visiveis if col in vencimento_controle_df.columns]
     vencimento_controle_df = vencimento_controle_df[colunas_existentes]
 
-    # Ordenar por data de vencimento
-    vencimento_controle_df = vencimento_controle_df.sort_values(by="VENCIMENTO")
-
     vencimento_html = vencimento_controle_df.to_html(classes="styled-table", index=False, border=0, justify="center")
 
     return render_template(
@@ -276,224 +267,273 @@ def imprimir():
         total_items=len(vencimento_controle_df)
     )
 
-@controle_vencimento.route("/vencendo45", methods=["GET"])
-def vencendo45():
-    global fornecedor_df, vencimento_df
-
-    # Renomear e preparar os DataFrames (pode ser extraído para função auxiliar)
-    fornecedor_df_renomeado = fornecedor_df.rename(columns={
-        "Item Produto": "CODIGO",
-        "Fornecedor Atual": "CPF/CNPJ",
-        "FORNECEDOR": "FORNECEDOR",
-    })
-    fornecedor_final_df = fornecedor_df_renomeado[["CODIGO", "CPF/CNPJ", "FORNECEDOR"]].dropna(subset=["FORNECEDOR"])
 
-    vencimento_df_renomeado = vencimento_df.rename(columns={
-        "CÓDIGO": "CODIGO",
-        "DESCRIÇÃO MERCADORIA": "DESCRICAO",
-        "DATA VENCIMENTO": "VENCIMENTO",
-        "EST. LÍQ. EMB1": "ESTOQ.EMB1",
-        "EST. LÍQ. EMB9": "ESTOQ.EMB9",
-        "VALOR VENCIMENTO": "VALOR A VENCER"
-    })
-
-    # Merge dos DataFrames
-    vencimento_controle_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
-
-    # Converter a coluna VENCIMENTO para datetime
-    vencimento_controle_df["VENCIMENTO"] = pd.to_datetime(vencimento_controle_df["VENCIMENTO"], errors="coerce")
-
-    # Calcular dias para vencer
-    hoje = datetime.now()
-    vencimento_controle_df["DIAS_PARA_VENCER"] = (vencimento_controle_df["VENCIMENTO"] - hoje).dt.days
+@controle_vencimento.route("/imprimir", methods=["GET"])
+def imprimir():
+    # Obter parâmetros de filtro da URL
+    filtro = request.args.get('filtro', '').strip()
+    dias_vencimento = request.args.get('dias_vencimento', '').strip()
 
-    # Filtrar produtos que vencem em até 45 dias
-    vencimento_controle_df = vencimento_controle_df[
-        (vencimento_controle_df["DIAS_PARA_VENCER"] >= 0) & 
-        (vencimento_controle_df["DIAS_PARA_VENCER"] <= 45)
-    ]
+    # Impressão sem filtros pré-gerada do dia (app.relatorios)
+    pronto = servir_relatorio("vencimento_imprimir", {"filtro": filtro, "dias_vencimento": dias_vencimento})
+    if pronto is not None:
+        return pronto
 
-    # Formatar os dados
-    vencimento_controle_df = formatar_dados(vencimento_controle_df)
+    # Compartilhada entre os nós por versão dos dados; os dias para vencer
+    # mudam com a data, que também entra na chave
+    return cached("vencimento_imprimir", ("forn_vencimento", "saeou060"),
+                  lambda: render_impressao(filtro, dias_vencimento),
+                  filtro, dias_vencimento, date.today().isoformat())
 
-    # Ordenar por dias para vencer (ascendente)
-    vencimento_controle_df = vencimento_controle_df.sort_values(by="DIAS_PARA_VENCER", ascending=True)
+@controle_vencimento.route("/vencendo45", methods=["GET"])
+def vencendo45():
+    # Produtos que vencem em até 45 dias, por dias para vencer (ascendente)
+    tabela_df = tabela_vencimento()
+    posicoes = posicoes_vencimento(tabela_df, "vencimento", dias_maximo=45)
 
     # Paginação
-    page = int(request.args.get("page", 1))
+    page = max(1, request.args.get("page", 1, type=int))
     per_page = 50
-    total_items = len(vencimento_controle_df)
+    total_items = len(posicoes)
     total_pages = ceil(total_items / per_page)
 
     start_index = (page - 1) * per_page
     end_index = start_index + per_page
-    paginated_df = vencimento_controle_df.iloc[start_index:end_index]
+    paginated_df = formatar_dados(linhas_vencimento(tabela_df, posicoes[start_index:end_index]))
 
     # Converter para HTML
     vencendo_html = paginated_df.to_html(index=False, classes="styled-table")
 
-    return render_template(
+    return render_page(
         "vencendo45.html",
+        "vencendo45_tabela.html",
         vencimento=vencendo_html,
         page=page,
         total_pages=total_pages,
         total_items=total_items
     )
 
-@controle_vencimento.route("/vencendo45/exportar")
-def exportar_vencendo45():
-    global fornecedor_df, vencimento_df
-
-    # Preparar dados (mesmo código da rota vencendo45)
-    fornecedor_df_renomeado = fornecedor_df.rename(columns={
-        "Item Produto": "CODIGO",
-        "Fornecedor Atual": "CPF/CNPJ",
-        "FORNECEDOR": "FORNECEDOR",
-    })
-    fornecedor_final_df = fornecedor_df_renomeado[["CODIGO", "CPF/CNPJ", "FORNECEDOR"]].dropna(subset=["FORNECEDOR"])
-
-    vencimento_df_renomeado = vencimento_df.rename(columns={
-        "CÓDIGO": "CODIGO",
-        "DESCRIÇÃO MERCADORIA": "DESCRICAO",
-        "DATA VENCIMENTO": "VENCIMENTO",
-        "EST. LÍQ. EMB1": "ESTOQ.EMB1",
-        "EST. LÍQ. EMB9": "ESTOQ.EMB9",
-        "VALOR VENCIMENTO": "VALOR A VENCER"
-    })
-
-    vencimento_controle_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
-    vencimento_controle_df["VENCIMENTO"] = pd.to_datetime(vencimento_controle_df["VENCIMENTO"], errors="coerce")
-
-    hoje = datetime.now()
-    vencimento_controle_df["DIAS_PARA_VENCER"] = (vencimento_controle_df["VENCIMENTO"] - hoje).dt.days
-
-    # Filtrar produtos que vencem em até 45 dias
-    vencimento_controle_df = vencimento_controle_df[
-        (vencimento_controle_df["DIAS_PARA_VENCER"] >= 0) & 
-        (vencimento_controle_df["DIAS_PARA_VENCER"] <= 45)
-    ]
-
-    # Exporta para CSV em memória (BytesIO)
+def exportar_csv(vencimento_controle_df, nome_arquivo):
+    """Envia o DataFrame como CSV (;) montado em memória"""
     output = BytesIO()
     vencimento_controle_df.to_csv(output, index=False, sep=";", encoding="utf-8")
     output.seek(0)
 
     return send_file(
         output,
-        download_name="vencendo_45_dias.csv",
+        download_name=nome_arquivo,
         as_attachment=True,
         mimetype="text/csv"
     )
 
-@controle_vencimento.route("/valoravencer/exportar")
-def exportar_valoravencer():
-    global fornecedor_df, vencimento_df
+def linhas_vencendo45():
+    # Mesmas linhas da tela vencendo45 (fatia inteira do cursor)
+    tabela_df = tabela_vencimento()
+    posicoes = posicoes_vencimento(tabela_df, "vencimento", dias_maximo=45)
+    return linhas_vencimento(tabela_df, posicoes)
 
-    # Preparar dados (mesmo código da rota valoravencer)
-    fornecedor_df_renomeado = fornecedor_df.rename(columns={
-        "Item Produto": "CODIGO",
-        "Fornecedor Atual": "CPF/CNPJ",
-        "FORNECEDOR": "FORNECEDOR",
-    })
-    fornecedor_final_df = fornecedor_df_renomeado[["CODIGO", "CPF/CNPJ", "FORNECEDOR"]].dropna(subset=["FORNECEDOR"])
+def linhas_valoravencer():
+    # Mesmas linhas e ordem da tela valoravencer
+    tabela_df = tabela_vencimento()
+    posicoes = posicoes_vencimento(tabela_df, "valor")
+    return linhas_vencimento(tabela_df, posicoes)
 
-    vencimento_df_renomeado = vencimento_df.rename(columns={
-        "CÓDIGO": "CODIGO",
-        "DESCRIÇÃO MERCADORIA": "DESCRICAO",
-        "DATA VENCIMENTO": "VENCIMENTO",
-        "EST. LÍQ. EMB1": "ESTOQ.EMB1",
-        "EST. LÍQ. EMB9": "ESTOQ.EMB9",
-        "VALOR VENCIMENTO": "VALOR A VENCER"
-    })
+def linhas_exportar(filtro, dias_vencimento):
+    # Mesmas linhas e ordem da tela principal com os filtros
+    tabela_df = tabela_vencimento()
+    posicoes = posicoes_vencimento(tabela_df, "vencimento", filtro, dias_vencimento)
+    vencimento_controle_df = linhas_vencimento(tabela_df, posicoes)
 
-    vencimento_controle_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
-    vencimento_controle_df["VENCIMENTO"] = pd.to_datetime(vencimento_controle_df["VENCIMENTO"], errors="coerce")
+    # Definir colunas visíveis
+    colunas_visiveis = ["CODIGO", "DESCRICAO", "VENCIMENTO", "ESTOQ.EMB1", "ESTOQ.EMB9", "VALOR A VENCER", "FORNECEDOR"]
 
-    hoje = datetime.now()
-    vencimento_controle_df["DIAS_PARA_VENCER"] = (vencimento_controle_df["VENCIMENTO"] - hoje).dt.days
-    vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] >= 0]
+    # Filtrar para garantir que só exporta as colunas visíveis
+    return vencimento_controle_df[[col for col in colunas_visiveis if col in vencimento_controle_df.columns]]
 
-    # Exporta para CSV em memória (BytesIO)
-    output = BytesIO()
-    vencimento_controle_df.to_csv(output, index=False, sep=";", encoding="utf-8")
-    output.seek(0)
+@controle_vencimento.route("/vencendo45/exportar")
+def exportar_vencendo45():
+    pronto = servir_relatorio("vencendo45_exportar")
+    if pronto is not None:
+        return pronto
+    return exportar_csv(linhas_vencendo45(), "vencendo_45_dias.csv")
 
-    return send_file(
-        output,
-        download_name="valor_a_vencer.csv",
-        as_attachment=True,
-        mimetype="text/csv"
-    )
+@controle_vencimento.route("/valoravencer/exportar")
+def exportar_valoravencer():
+    pronto = servir_relatorio("valoravencer_exportar")
+    if pronto is not None:
+        return pronto
+    return exportar_csv(linhas_valoravencer(), "valor_a_vencer.csv")
 
 @controle_vencimento.route("/exportar", methods=["GET"])
 def exportar():
-    global fornecedor_df, vencimento_df
-
     # Obter filtros da URL
     filtro = request.args.get("filtro", "").strip()
     dias_vencimento = request.args.get("dias_vencimento", "").strip()
 
-    # Preparar dados (mesmo código da rota home)
-    fornecedor_df_renomeado = fornecedor_df.rename(columns={
-        "Item Produto": "CODIGO",
-        "Fornecedor Atual": "CPF/CNPJ",
-        "FORNECEDOR": "FORNECEDOR",
-    })
-    fornecedor_final_df = fornecedor_df_renomeado[["CODIGO", "CPF/CNPJ", "FORNECEDOR"]].dropna(subset=["FORNECEDOR"])
-
-    vencimento_df_renomeado = vencimento_df.rename(columns={
-        "CÓDIGO": "CODIGO",
-        "DESCRIÇÃO MERCADORIA": "DESCRICAO",
-        "DATA VENCIMENTO": "VENCIMENTO",
-        "EST. LÍQ. EMB1": "ESTOQ.EMB1",
-        "EST. LÍQ. EMB9": "ESTOQ.EMB9",
-        "VALOR VENCIMENTO": "VALOR A VENCER"
+    pronto = servir_relatorio("vencimento_exportar", {"filtro": filtro, "dias_vencimento": dias_vencimento})
+    if pronto is not None:
+        return pronto
+
+    return exportar_csv(linhas_exportar(filtro, dias_vencimento), "vencimentos_filtrados.csv")
+
+# =============== RISCO DE PERDA ===============
+# Projeção de venda dos lotes até o vencimento (projecao.py): o que deve
+# sobrar de cada lote e quanto vale, para remarcar antes da perda
+
+FONTES_RISCO = ("forn_vencimento", "saeou060", "smg12")
+
+@controle_vencimento.record_once
+def configurar_risco(state):
+    """Dias sem venda a partir dos quais o produto conta como parado na projeção"""
+    state.app.config.setdefault("VENCIMENTO_DIAS_PARADO", 30)
+
+ORDENS_RISCO = {
+    "valor": Ordem(["VALOR_EM_RISCO"], ascendente=False),
+    "percentual": Ordem(["PERC_RISCO", "VALOR_EM_RISCO"], ascendente=False),
+    "sobra": Ordem(["SOBRA_PROJETADA"], ascendente=False),
+    "vencimento": Ordem(["VENCIMENTO"]),
+}
+
+def montar_projecao(loja):
+    """Lotes da loja com o giro do smg12 (dias sem venda contados a partir da carga)"""
+    smg12_df = ler_fonte("smg12", loja, pd.read_csv, sep=";", encoding="latin-1")
+    giro = giro_smg12(smg12_df, date.today(), current_app.config["VENCIMENTO_DIAS_PARADO"])
+    return ProjecaoVencimento(tabela_vencimento(loja), giro, versao_fontes(FONTES_RISCO, [loja]))
+
+def projecao_vencimento(loja=None):
+    """Projeção da loja (a atual por padrão), montada uma vez por versão dos arquivos"""
+    return dataset("vencimento_projecao", montar_projecao, FONTES_RISCO, loja=loja)
+
+registrar_carga(("smg12",), projecao_vencimento)
+registrar_aquecimento("controle_vencimento.risco")
+
+def posicoes_risco(risco_df, ordem, filtro="", somente_risco=True):
+    """
+    Posições (cursor em cache) dos lotes da projeção do dia na ``ordem`` de ``ORDENS_RISCO``.
+
+    Args:
+        filtro: texto buscado em código, descrição e fornecedor
+        somente_risco: só os lotes com sobra projetada
+    """
+    def mascara(df):
+        selecionados = df["SOBRA_PROJETADA"] > 0 if somente_risco else pd.Series(True, index=df.index)
+        if filtro:
+            codigo = df["CODIGO"].astype(str).str.replace(r"\.0$", "", regex=True)
+            selecionados &= (
+                codigo.str.contains(filtro, case=False, na=False) |
+                df["DESCRICAO"].astype(str).str.contains(filtro, case=False, na=False) |
+                df["FORNECEDOR"].astype(str).str.contains(filtro, case=False, na=False)
+            )
+        return selecionados.to_numpy()
+
+    return cursor(risco_df, ORDENS_RISCO, ordem, (filtro, somente_risco), mascara)
+
+def formatar_risco(df):
+    """Linhas da projeção para exibição (moeda, quantidades e percentuais)"""
+    df = df.copy()
+    df["CODIGO"] = df["CODIGO"].astype(str).str.replace(r"\.0$", "", regex=True)
+    df["VENCIMENTO"] = pd.to_datetime(df["VENCIMENTO"]).dt.strftime("%d/%m/%Y")
+    df["ESTOQ.EMB1"] = df["ESTOQ.EMB1"].round().astype(int)
+    df["SOBRA_PROJETADA"] = df["SOBRA_PROJETADA"].round().astype(int)
+    df["VENDA_DIA"] = df["VENDA_DIA"].map(lambda x: f"{x:,.1f}".replace(",", "X").replace(".", ",").replace("X", "."))
+    df["VENDA_DIA_NECESSARIA"] = df["VENDA_DIA_NECESSARIA"].map(
+        lambda x: "-" if x == float("inf") else f"{x:,.1f}".replace(",", "X").replace(".", ",").replace("X", "."))
+    df["PERC_RISCO"] = df["PERC_RISCO"].map(lambda x: f"{x:.0f}%")
+    for coluna in ("VALOR A VENCER", "VALOR_EM_RISCO"):
+        df[coluna] = df[coluna].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+    return df.rename(columns={
+        "DIAS_PARA_VENCER": "DIAS",
+        "VENDA_DIA": "VENDA/DIA",
+        "VENDA_DIA_NECESSARIA": "VENDA/DIA NECESSÁRIA",
+        "SOBRA_PROJETADA": "SOBRA PROJETADA",
+        "PERC_RISCO": "% EM RISCO",
+        "VALOR_EM_RISCO": "VALOR EM RISCO",
     })
 
-    vencimento_controle_df = pd.merge(vencimento_df_renomeado, fornecedor_final_df, on="CODIGO", how="left")
-    vencimento_controle_df["VENCIMENTO"] = pd.to_datetime(vencimento_controle_df["VENCIMENTO"], errors="coerce")
+def parametros_risco(args):
+    """Ordem, filtro e "só em risco" da query string (ordem desconhecida vira "valor")"""
+    ordem = args.get("ordem", "valor")
+    if ordem not in ORDENS_RISCO:
+        ordem = "valor"
+    filtro = args.get("filtro", "").strip()
+    somente_risco = args.get("todos", "") != "1"
+    return ordem, filtro, somente_risco
+
+registrar_colunar(DadosColunares(
+    "vencimento_risco", "Risco de perda no vencimento", FONTES_RISCO,
+    lambda loja: projecao_vencimento(loja).projetar(date.today()),
+    filtros={"filtro": "texto em código, descrição ou fornecedor", "ordem": "valor, percentual, sobra ou vencimento",
+             "todos": "1 inclui os lotes sem risco"},
+    posicoes=lambda df, args: posicoes_risco(df, *parametros_risco(args)),
+))
+
+@controle_vencimento.route("/risco", methods=["GET"])
+def risco():
+    ordem, filtro, somente_risco = parametros_risco(request.args)
+    risco_df = projecao_vencimento().projetar(date.today())
+    posicoes = posicoes_risco(risco_df, ordem, filtro, somente_risco)
 
-    hoje = datetime.now()
-    vencimento_controle_df["DIAS_PARA_VENCER"] = (vencimento_controle_df["VENCIMENTO"] - hoje).dt.days
-    vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] >= 0]
-
-    # Aplicar filtros
-    if filtro:
-        vencimento_controle_df = vencimento_controle_df[
-            vencimento_controle_df["CODIGO"].astype(str).str.contains(filtro, case=False, na=False) |
-            vencimento_controle_df["DESCRICAO"].str.contains(filtro, case=False, na=False) |
-            vencimento_controle_df["FORNECEDOR"].str.contains(filtro, case=False, na=False)
-        ]
-
-    if dias_vencimento:
-        try:
-            dias_limite = int(dias_vencimento)
-            vencimento_controle_df = vencimento_controle_df[vencimento_controle_df["DIAS_PARA_VENCER"] <= dias_limite]
-        except ValueError:
-            pass
-
-    # Definir colunas visíveis
-    colunas_visiveis = ["CODIGO", "DESCRICAO", "VENCIMENTO", "ESTOQ.EMB1", "ESTOQ.EMB9", "VALOR A VENCER", "FORNECEDOR"]
-
-    # Filtrar para garantir que só exporta as colunas visíveis
-    vencimento_controle_df = vencimento_controle_df[[col for col in colunas_visiveis if col in vencimento_controle_df.columns]]
+    # Paginação
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = 50
+    total_items = len(posicoes)
+    total_pages = ceil(total_items / per_page)
 
-    # Exporta para CSV em memória (BytesIO)
-    output = BytesIO()
-    vencimento_controle_df.to_csv(output, index=False, sep=";", encoding="utf-8")
-    output.seek(0)
+    start_index = (page - 1) * per_page
+    paginated_df = formatar_risco(risco_df.iloc[posicoes[start_index:start_index + per_page]])
 
-    return send_file(
-        output,
-        download_name="vencimentos_filtrados.csv",
-        as_attachment=True,
-        mimetype="text/csv"
+    return render_page(
+        "risco.html",
+        "risco_tabela.html",
+        vencimento=paginated_df.to_html(index=False, classes="styled-table"),
+        page=page,
+        total_pages=total_pages,
+        total_items=total_items,
+        valor_em_risco=float(risco_df["VALOR_EM_RISCO"].iloc[posicoes].sum()),
+        ordem=ordem,
+        filtro=filtro,
+        todos="" if somente_risco else "1",
     )
 
+@controle_vencimento.route("/risco/exportar", methods=["GET"])
+def exportar_risco():
+    ordem, filtro, somente_risco = parametros_risco(request.args)
+    risco_df = projecao_vencimento().projetar(date.today())
+    posicoes = posicoes_risco(risco_df, ordem, filtro, somente_risco)
+    return exportar_csv(risco_df.iloc[posicoes][COLUNAS_RISCO].round(2), "risco_de_perda.csv")
+
+# =============== RELATÓRIOS PRÉ-GERADOS ===============
+# Os dias para vencer mudam com a data: os arquivos são refeitos a cada dia
+
+FONTES_VENCIMENTO = ("forn_vencimento", "saeou060")
+SEM_FILTROS = [{"filtro": "", "dias_vencimento": ""}]
+
+def gravar_csv(vencimento_controle_df, destino):
+    vencimento_controle_df.to_csv(destino, index=False, sep=";", encoding="utf-8")
+
+registrar_relatorio(Relatorio(
+    "vencimento_imprimir", FONTES_VENCIMENTO,
+    lambda params, destino: render_impressao(params["filtro"], params["dias_vencimento"]),
+    variantes=lambda: SEM_FILTROS, diario=True,
+))
+registrar_relatorio(Relatorio(
+    "vencimento_exportar", FONTES_VENCIMENTO,
+    lambda params, destino: gravar_csv(linhas_exportar(params["filtro"], params["dias_vencimento"]), destino),
+    variantes=lambda: SEM_FILTROS, extensao=".csv", mimetype="text/csv",
+    download="vencimentos_filtrados.csv", diario=True,
+))
+registrar_relatorio(Relatorio(
+    "vencendo45_exportar", FONTES_VENCIMENTO,
+    lambda params, destino: gravar_csv(linhas_vencendo45(), destino),
+    extensao=".csv", mimetype="text/csv", download="vencendo_45_dias.csv", diario=True,
+))
+registrar_relatorio(Relatorio(
+    "valoravencer_exportar", FONTES_VENCIMENTO,
+    lambda params, destino: gravar_csv(linhas_valoravencer(), destino),
+    extensao=".csv", mimetype="text/csv", download="valor_a_vencer.csv", diario=True,
+))
+
 @controle_vencimento.route('/page')
 def vencimento_page():
-    """Página principal do controle de vencimento"""
-    try:
-        return render_template('vencimento_page.html')
-    except Exception as e:
-        return render_template('vencimento_page.html', error=str(e))
\ No newline at end of file
+    """Endereço antigo da página principal do controle de vencimento"""
+    return redirect(url_for('controle_vencimento.home', **request.args))
\ No newline at end of file
@@ -0,0 +1,52 @@
+function imprimirFiltrado() {
+    // Capturar os valores dos filtros atuais
+    const filtro = document.querySelector('input[name="filtro"]').value || '';
+    const diasVencimento = document.querySelector('input[name="dias_vencimento"]').value || '';
+
+    // Construir a URL com os parâmetros
+    let url = document.querySelector('.vencimento-filters').dataset.printUrl;
+    const params = new URLSearchParams();
+
+    if (filtro) {
+        params.append('filtro', filtro);
+    }
+
+    if (diasVencimento) {
+        params.append('dias_vencimento', diasVencimento);
+    }
+
+    if (params.toString()) {
+        url += '?' + params.toString();
+    }
+
+    // Abrir em nova aba
+    window.open(url, '_blank');
+}
+
+// Garantir que o input dias_vencimento funcione corretamente
+document.addEventListener('DOMContentLoaded', function() {
+    const diasInput = document.getElementById('dias_vencimento');
+    const form = document.querySelector('.vencimento-filters');
+
+    if (diasInput) {
+        // Permitir apenas números
+        diasInput.addEventListener('input', function(e) {
+            let value = e.target.value;
+            // Remover caracteres não numéricos
+            value = value.replace(/[^0-9]/g, '');
+            e.target.value = value;
+        });
+
+        // Validar no submit
+        form.addEventListener('submit', function(e) {
+            const diasValue = diasInput.value.trim();
+
+            if (diasValue && (isNaN(diasValue) || parseInt(diasValue) < 0)) {
+                e.preventDefault();
+                alert('Por favor, insira um número válido para os dias de vencimento.');
+                diasInput.focus();
+                return false;
+            }
+        });
+    }
+});
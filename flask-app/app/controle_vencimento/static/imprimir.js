@@ -0,0 +1,25 @@
+// Auto-print quando a página carregar (opcional)
+// window.onload = function() { window.print(); }
+
+// Função para voltar
+function goBack() {
+    window.history.back();
+}
+
+// Preencher datas com JavaScript
+document.addEventListener('DOMContentLoaded', function() {
+    const now = new Date();
+    const dateStr = now.toLocaleDateString('pt-BR') + ' ' + now.toLocaleTimeString('pt-BR');
+
+    // Preencher data de geração
+    const dataGeracaoEl = document.getElementById('data-geracao');
+    if (dataGeracaoEl) {
+        dataGeracaoEl.textContent = 'Data de Geração: ' + dateStr;
+    }
+
+    // Preencher copyright
+    const copyrightEl = document.getElementById('copyright');
+    if (copyrightEl) {
+        copyrightEl.textContent = '© ' + now.getFullYear() + ' - Portal 888 - Todos os direitos reservados';
+    }
+});
@@ -0,0 +1,201 @@
+"""
+Cursores de paginação: posições das linhas filtradas e ordenadas.
+
+Paginar não deveria refazer filtro e ordenação da tabela inteira a cada
+clique. Para cada (DataFrame preparado, ordenação, filtro) o resultado é um
+array com as posições das linhas, na ordem de exibição, guardado em um LRU
+com orçamento de memória (``CURSORES_MEMORIA_MB``); a página N, a impressão
+e a exportação com os mesmos filtros são fatias desse array
+(``df.iloc[posicoes[inicio:fim]]``).
+
+As ordenações comuns de cada tabela são declaradas com ``Ordem`` e
+calculadas uma vez por carga (``semear``); o cursor de um filtro é a
+permutação da ordenação com a máscara do filtro aplicada, sem ordenar de
+novo. Os itens são presos ao objeto DataFrame: quando a versão dos dados
+muda, o ``app.lojas`` carrega um DataFrame novo e os cursores do antigo
+saem do cache assim que ele é coletado.
+
+Rota:
+    GET /metricas/cursores   uso de memória, acertos e descartes
+"""
+import threading
+import weakref
+from collections import OrderedDict, deque
+
+from flask import current_app, jsonify
+
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Chave do filtro da permutação completa (sem filtro)
+SEM_FILTRO = ()
+
+
+class Ordem:
+    """Ordenação estável por uma ou mais colunas (valores vazios por último)."""
+
+    def __init__(self, colunas, ascendente=True):
+        self.colunas = list(colunas)
+        self.ascendente = ascendente
+
+    def permutacao(self, df):
+        """Posições das linhas de ``df`` nesta ordem."""
+        chaves = []
+        # lexsort usa a última chave como a principal
+        for coluna in reversed(self.colunas):
+            codigos, valores = pd.factorize(df[coluna], sort=True)
+            if not self.ascendente:
+                codigos = np.where(codigos >= 0, len(valores) - 1 - codigos, codigos)
+            chaves.append(np.where(codigos < 0, len(valores), codigos))
+        if not chaves:
+            return _compacto(np.arange(len(df)))
+        return _compacto(np.lexsort(chaves))
+
+
+def _compacto(posicoes):
+    """Posições em int32 quando cabem (metade da memória) e somente leitura."""
+    posicoes = np.asarray(posicoes)
+    if len(posicoes) < 2 ** 31:
+        posicoes = posicoes.astype(np.int32, copy=False)
+    posicoes.flags.writeable = False
+    return posicoes
+
+
+class CursorCache:
+    """LRU de arrays de posições, por (DataFrame, ordenação, filtro), com orçamento em bytes."""
+
+    def __init__(self, orcamento_bytes):
+        self.orcamento_bytes = orcamento_bytes
+        self._itens = OrderedDict()
+        self._por_df = {}  # id(df) -> chaves dos itens do DataFrame
+        self._coletados = deque()  # ids de DataFrames coletados, ainda com itens
+        self._lock = threading.Lock()
+        self._calculando = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.descartes = 0
+
+    def _monitorar(self, df):
+        ident = id(df)
+        if ident not in self._por_df:
+            self._por_df[ident] = set()
+            weakref.finalize(df, self._coletados.append, ident)
+        return ident
+
+    def _limpar_coletados(self):
+        # O finalize roda no meio de qualquer alocação (até com a trava tomada),
+        # por isso só anota o id; a limpeza acontece aqui, antes de qualquer
+        # consulta, então um id reaproveitado nunca encontra itens antigos
+        while self._coletados:
+            for chave in self._por_df.pop(self._coletados.popleft(), ()):
+                posicoes = self._itens.pop(chave, None)
+                if posicoes is not None:
+                    self.total_bytes -= posicoes.nbytes
+
+    def _remover(self, chave):
+        posicoes = self._itens.pop(chave, None)
+        if posicoes is not None:
+            self.total_bytes -= posicoes.nbytes
+        conjunto = self._por_df.get(chave[0])
+        if conjunto is not None:
+            conjunto.discard(chave)
+
+    def get(self, df, ordem, filtro, calcular):
+        """Posições em cache ou ``calcular()`` (uma vez por chave, mesmo com threads concorrentes)."""
+        with self._lock:
+            self._limpar_coletados()
+            chave = (self._monitorar(df), ordem, filtro)
+            posicoes = self._itens.get(chave)
+            if posicoes is not None:
+                self._itens.move_to_end(chave)
+                self.hits += 1
+                return posicoes
+            calculando = self._calculando.setdefault(chave, threading.Lock())
+
+        try:
+            with calculando:
+                with self._lock:
+                    posicoes = self._itens.get(chave)
+                    if posicoes is not None:
+                        self.hits += 1
+                        return posicoes
+                    self.misses += 1
+                posicoes = _compacto(calcular())
+                with self._lock:
+                    # O DataFrame pode ter sido coletado durante o cálculo
+                    if chave[0] in self._por_df:
+                        self._itens[chave] = posicoes
+                        self._por_df[chave[0]].add(chave)
+                        self.total_bytes += posicoes.nbytes
+                        self._descartar(chave)
+                return posicoes
+        finally:
+            with self._lock:
+                self._calculando.pop(chave, None)
+
+    def _descartar(self, protegida):
+        # Permutações completas (sem filtro) saem por último: refazê-las custa uma ordenação
+        while self.total_bytes > self.orcamento_bytes:
+            vitima = next((c for c in self._itens if c != protegida and c[2] != SEM_FILTRO), None)
+            if vitima is None:
+                vitima = next((c for c in self._itens if c != protegida), None)
+            if vitima is None:
+                break
+            self._remover(vitima)
+            self.descartes += 1
+
+    def snapshot(self):
+        with self._lock:
+            self._limpar_coletados()
+            return {
+                'orcamento_mb': round(self.orcamento_bytes / 2 ** 20, 1),
+                'uso_mb': round(self.total_bytes / 2 ** 20, 2),
+                'itens': len(self._itens),
+                'tabelas': len(self._por_df),
+                'hits': self.hits,
+                'misses': self.misses,
+                'descartes': self.descartes,
+            }
+
+
+def get_cursores():
+    return current_app.extensions['cursores']
+
+
+def semear(df, ordens):
+    """Calcula (se ainda não estão em cache) as permutações das ``ordens`` de ``df``."""
+    cache = get_cursores()
+    for nome, ordem in ordens.items():
+        cache.get(df, nome, SEM_FILTRO, lambda ordem=ordem: ordem.permutacao(df))
+
+
+def cursor(df, ordens, ordem, filtro=SEM_FILTRO, mascara=None):
+    """
+    Posições das linhas de ``df`` que passam no filtro, na ordem ``ordem``.
+
+    Args:
+        ordens: {nome: Ordem} da tabela (as mesmas passadas a ``semear``)
+        ordem: nome da ordenação em ``ordens``
+        filtro: tupla que identifica o filtro (parâmetros já normalizados);
+            vazia quando não há filtro
+        mascara: ``mascara(df)`` -> array booleano das linhas que passam
+    """
+    cache = get_cursores()
+    base = cache.get(df, ordem, SEM_FILTRO, lambda: ordens[ordem].permutacao(df))
+    if not filtro:
+        return base
+    return cache.get(df, ordem, tuple(filtro), lambda: base[np.asarray(mascara(df), dtype=bool)[base]])
+
+
+def cursores_metrics():
+    """Estado do cache de cursores de paginação."""
+    return jsonify(get_cursores().snapshot())
+
+
+def init_app(app):
+    app.config.setdefault('CURSORES_MEMORIA_MB', 64)
+    app.extensions['cursores'] = CursorCache(app.config['CURSORES_MEMORIA_MB'] * 2 ** 20)
+    app.add_url_rule('/metricas/cursores', 'cursores_metrics', cursores_metrics)
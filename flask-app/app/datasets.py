@@ -0,0 +1,70 @@
+"""
+Utilitários comuns às fontes de dados (planilhas e CSVs da rede).
+
+Os caminhos das fontes ficam centralizados em ``SOURCES`` e são
+parametrizados pelo código da loja (filial): ``{loja}`` no caminho é
+trocado pelo código, e ``configure_stores`` registra caminhos próprios de
+cada loja (``LOJAS_FONTES`` na configuração do app).
+
+Definindo a variável de ambiente ``PORTAL_DATA_DIR`` todas as fontes passam
+a ser lidas de uma pasta local, com a mesma estrutura de ``LOCAL_NAMES``
+(usado pelo teste de carga com dados gerados e em desenvolvimento). Se
+existir a subpasta ``PORTAL_DATA_DIR/<loja>``, ela é usada para a loja.
+"""
+import os
+
+DEFAULT_STORE = '888'
+
+SOURCES = {
+    'smg12': r'\\10.122.244.1\files\gerencial\gerencia\edvan\smg12.f{loja}.csv',
+    'forn_isv': '//10.122.244.1/files/gerencial/WebISV/Forn.csv',
+    'forn_vencimento': '//10.122.244.3/publico/ControleVencimento/Forn.csv',
+    'saeou060': '//10.122.244.3/publico/ControleVencimento/SAEOU060.xlsx',
+    'saeoi051': '//10.122.244.3/publico/ISV/SAEOI051.xlsx',
+}
+
+# Caminho relativo de cada fonte dentro de PORTAL_DATA_DIR
+LOCAL_NAMES = {
+    'smg12': 'smg12.f888.csv',
+    'forn_isv': 'WebISV/Forn.csv',
+    'forn_vencimento': 'ControleVencimento/Forn.csv',
+    'saeou060': 'ControleVencimento/SAEOU060.xlsx',
+    'saeoi051': 'ISV/SAEOI051.xlsx',
+}
+
+# {loja: {fonte: caminho}} com os caminhos que fogem do padrão de SOURCES
+_store_sources = {}
+
+
+def configure_stores(store_sources):
+    """Registra os caminhos específicos de cada loja (``LOJAS_FONTES``)."""
+    _store_sources.clear()
+    _store_sources.update({str(loja): dict(fontes) for loja, fontes in (store_sources or {}).items()})
+
+
+def source_path(name, loja=None):
+    """Caminho da fonte ``name`` da loja, respeitando o PORTAL_DATA_DIR se definido."""
+    loja = str(loja or DEFAULT_STORE)
+    data_dir = os.environ.get('PORTAL_DATA_DIR')
+    if data_dir:
+        store_dir = os.path.join(data_dir, loja)
+        if os.path.isdir(store_dir):
+            data_dir = store_dir
+        return os.path.join(data_dir, *LOCAL_NAMES[name].split('/'))
+    path = _store_sources.get(loja, {}).get(name, SOURCES[name])
+    return path.replace('{loja}', loja)
+
+
+def file_version(path):
+    """
+    Identifica a versão de um arquivo de origem pelo mtime e tamanho.
+
+    Returns:
+        str | None: versão no formato '<mtime_ns>-<tamanho>' ou None se o
+        arquivo não estiver acessível.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f'{stat.st_mtime_ns}-{stat.st_size}'
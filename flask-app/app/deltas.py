@@ -0,0 +1,348 @@
+"""
+Diferenças linha a linha entre versões de um dataset.
+
+Quando uma nova versão de um arquivo de origem é carregada, as linhas são
+comparadas com a versão anterior por uma chave (produto, evento...) e pelo
+hash do conteúdo, e classificadas em inseridas, removidas ou alteradas:
+
+- a preparação do dataset (``Incremental.preparar``) roda só sobre as linhas
+  das chaves afetadas, e o resultado é encaixado no dataset anterior;
+- o delta fica em um histórico curto por (loja, dataset), usado pelos
+  endpoints "mudanças desde a versão N" de cada módulo.
+
+A versão é a do arquivo (``file_version``), e não um contador local. Cada
+delta é gravado em ``DELTAS_DIR`` pela versão de origem, então qualquer
+worker do gunicorn (ou nó, com a pasta em disco compartilhado) responde
+"mudanças desde N" seguindo a cadeia de deltas gravados até a versão que ele
+tem carregada, mesmo sem ter visto N. Se a cadeia não chega lá (a versão saiu
+do histórico), ``mudancas_desde`` devolve None e o cliente deve recarregar
+tudo.
+
+O ``Snapshot`` não guarda o arquivo bruto inteiro: depois dos hashes, ficam só
+as colunas da chave (as linhas removidas na próxima versão saem com elas),
+ou o próprio dataset pronto quando ele é o bruto sem preparação.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+STATUS_INSERIDO = 'inserido'
+STATUS_REMOVIDO = 'removido'
+STATUS_ALTERADO = 'alterado'
+
+# Acima desta fração de linhas afetadas é mais barato preparar tudo de novo
+LIMITE_INCREMENTAL = 0.5
+
+
+class Incremental:
+    """
+    Como ler, comparar e preparar um dataset por partes.
+
+    Args:
+        ler: ``ler(loja)`` devolve o DataFrame bruto do arquivo
+        chave: colunas do arquivo bruto que identificam a linha
+        preparar: ``preparar(df_bruto)`` devolve o dataset pronto (só pode
+            depender das próprias linhas); None usa o bruto como está
+        chave_preparada: coluna do dataset pronto com o valor de ``chave[0]``
+        ordenar: colunas para reordenar o dataset depois de encaixar o delta
+    """
+
+    def __init__(self, ler, chave, preparar=None, chave_preparada=None, ordenar=None):
+        self.ler = ler
+        self.chave = list(chave)
+        self.preparar = preparar
+        self.chave_preparada = chave_preparada or self.chave[0]
+        self.ordenar = ordenar
+
+
+class Snapshot:
+    """
+    Versão carregada de um dataset: colunas do bruto, hashes por chave e dataset pronto.
+
+    ``linhas`` são as linhas brutas que vão para o delta quando forem
+    removidas na versão seguinte (mesma ordem de ``hashes``): o próprio
+    dataset quando não há preparação, senão só as colunas da chave.
+    """
+
+    def __init__(self, versao, colunas, hashes, linhas, df):
+        self.versao = versao
+        self.colunas = list(colunas)
+        self.hashes = hashes
+        self.linhas = linhas
+        self.df = df
+
+
+def _snapshot(spec, versao, bruto, hashes, df):
+    linhas = bruto if spec.preparar is None else bruto[spec.chave]
+    return Snapshot(versao, bruto.columns, hashes, linhas, df)
+
+
+class Delta:
+    """Linhas inseridas, removidas e alteradas entre duas versões."""
+
+    def __init__(self, versao_anterior, versao, inseridos, removidos, alterados):
+        self.versao_anterior = versao_anterior
+        self.versao = versao
+        self.inseridos = inseridos
+        self.removidos = removidos
+        self.alterados = alterados
+        self.momento = time.time()
+
+    def __len__(self):
+        return len(self.inseridos) + len(self.removidos) + len(self.alterados)
+
+    def linhas(self):
+        """Todas as linhas do delta com a coluna STATUS."""
+        partes = [df.assign(STATUS=status) for status, df in (
+            (STATUS_INSERIDO, self.inseridos),
+            (STATUS_REMOVIDO, self.removidos),
+            (STATUS_ALTERADO, self.alterados),
+        ) if not df.empty]
+        return pd.concat(partes) if partes else pd.DataFrame(columns=['STATUS'])
+
+
+def hashes_por_chave(df, chave):
+    """
+    Hash do conteúdo de cada linha, indexado pela chave.
+
+    Chaves repetidas (ex.: dois eventos iguais do mesmo produto no mesmo dia)
+    recebem um número de ocorrência para que o índice seja único.
+    """
+    hash_chave = pd.util.hash_pandas_object(df[chave], index=False).to_numpy()
+    ocorrencia = pd.Series(hash_chave).groupby(hash_chave).cumcount().to_numpy()
+    indice = pd.MultiIndex.from_arrays([hash_chave, ocorrencia])
+    return pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy(), index=indice)
+
+
+def calcular_delta(anterior, versao, bruto, hashes):
+    """
+    Compara o bruto novo com o ``Snapshot`` anterior.
+
+    As linhas do delta ficam indexadas pela chave (a mesma de ``hashes``).
+    """
+    antigos = anterior.hashes
+    existia = hashes.index.isin(antigos.index)
+    continua = antigos.index.isin(hashes.index)
+    mudou = existia & (hashes.to_numpy() != antigos.reindex(hashes.index).to_numpy())
+
+    novos = bruto.set_axis(hashes.index)
+    return Delta(
+        anterior.versao,
+        versao,
+        inseridos=novos[~existia],
+        removidos=anterior.linhas.set_axis(antigos.index)[~continua],
+        alterados=novos[mudou],
+    )
+
+
+def _preparar(spec, bruto):
+    """Preparação completa: mesma ordem e índice (0..n-1) do encaixe."""
+    return _finalizar(spec, spec.preparar(bruto))
+
+
+def _finalizar(spec, df):
+    ordenar = [c for c in spec.ordenar or () if c in df.columns]
+    if ordenar:
+        df = df.sort_values(by=ordenar, kind='stable')
+    return df.reset_index(drop=True)
+
+
+def _encaixar(spec, anterior, bruto, delta):
+    """Dataset pronto novo a partir do anterior, preparando só as chaves afetadas."""
+    coluna = spec.chave[0]
+    afetadas = pd.concat([delta.inseridos[coluna], delta.removidos[coluna], delta.alterados[coluna]]).unique()
+    mantidos = anterior.df[~anterior.df[spec.chave_preparada].isin(afetadas)]
+    novos = spec.preparar(bruto[bruto[coluna].isin(afetadas)])
+    # Os rótulos dos mantidos e dos novos se repetem: o índice recomeça do zero
+    return _finalizar(spec, pd.concat([mantidos, novos]))
+
+
+def carregar(spec, loja, versao, anterior, nome=None):
+    """
+    Lê a versão nova e devolve o ``Snapshot``; com um anterior compatível,
+    registra o delta e prepara só as linhas afetadas.
+    """
+    bruto = spec.ler(loja)
+    hashes = hashes_por_chave(bruto, spec.chave)
+
+    compativel = (anterior is not None and anterior.versao != versao
+                  and anterior.colunas == list(bruto.columns))
+    if not compativel:
+        df = _preparar(spec, bruto) if spec.preparar else bruto
+        if nome is not None:
+            get_log().reiniciar(loja, nome, versao)
+        return _snapshot(spec, versao, bruto, hashes, df)
+
+    delta = calcular_delta(anterior, versao, bruto, hashes)
+    if spec.preparar is None:
+        df = bruto
+    elif len(delta) > LIMITE_INCREMENTAL * max(len(bruto), 1):
+        df = _preparar(spec, bruto)
+    else:
+        df = _encaixar(spec, anterior, bruto, delta)
+
+    if nome is not None:
+        get_log().registrar(loja, nome, delta)
+    return _snapshot(spec, versao, bruto, hashes, df)
+
+
+def para_registros(df):
+    """Linhas como lista de dicts prontos para JSON (datas em dd/mm/aaaa, NaN vira None)."""
+    if df.empty:
+        return []
+    df = df.copy()
+    for coluna in df.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        df[coluna] = df[coluna].dt.strftime('%d/%m/%Y')
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+# =============== HISTÓRICO ===============
+
+def _compor(deltas):
+    """Junta deltas consecutivos no efeito líquido por linha (chave)."""
+    partes = [delta.linhas() for delta in deltas]
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame(columns=['STATUS'])
+
+    # Em ordem cronológica: o primeiro status de cada chave e a última linha
+    todas = pd.concat(partes)
+    primeiro = todas.groupby(level=[0, 1], sort=False)['STATUS'].transform('first').to_numpy()
+    ultima = ~todas.index.duplicated(keep='last')
+    primeiro = primeiro[ultima]
+    todas = todas[ultima]
+
+    status = todas['STATUS'].to_numpy().copy()
+    removida = status == STATUS_REMOVIDO
+    status[(primeiro == STATUS_INSERIDO) & ~removida] = STATUS_INSERIDO
+    status[(primeiro == STATUS_REMOVIDO) & ~removida] = STATUS_ALTERADO
+    todas = todas.assign(STATUS=status)
+    # Inserida e removida dentro do intervalo: não aparece
+    todas = todas[~((primeiro == STATUS_INSERIDO) & removida)]
+    return todas.reset_index(drop=True)
+
+
+class DeltaLog:
+    """
+    Deltas de cada (loja, dataset), pela versão de origem.
+
+    Cada delta vira um arquivo em ``pasta/<loja>/<dataset>/`` (gravado de
+    forma atômica, pickle: só o próprio portal escreve na pasta), lido por
+    qualquer worker; os lidos ou gravados ficam também em memória. Acima de
+    ``historico`` deltas por (loja, dataset), os mais antigos saem.
+    """
+
+    def __init__(self, pasta=None, historico=24):
+        self.pasta = pasta
+        self.historico = historico
+        self._deltas = {}
+        self._atual = {}
+        self._lock = threading.Lock()
+
+    def _caminho(self, loja, nome, versao_anterior):
+        pasta = os.path.join(self.pasta, re.sub(r'[^\w.-]', '_', str(loja)), re.sub(r'[^\w.-]', '_', nome))
+        chave = hashlib.sha1(str(versao_anterior).encode('utf-8')).hexdigest()[:20]
+        return pasta, os.path.join(pasta, chave + '.delta')
+
+    def _lembrar(self, loja, nome, delta):
+        with self._lock:
+            deltas = self._deltas.setdefault((loja, nome), OrderedDict())
+            deltas[delta.versao_anterior] = delta
+            deltas.move_to_end(delta.versao_anterior)
+            while len(deltas) > self.historico:
+                deltas.popitem(last=False)
+
+    def reiniciar(self, loja, nome, versao):
+        """Carga completa sem anterior: este worker passa a responder a partir desta versão."""
+        with self._lock:
+            self._atual[(loja, nome)] = versao
+
+    def registrar(self, loja, nome, delta):
+        self._lembrar(loja, nome, delta)
+        with self._lock:
+            self._atual[(loja, nome)] = delta.versao
+        if not self.pasta:
+            return
+        pasta, caminho = self._caminho(loja, nome, delta.versao_anterior)
+        try:
+            os.makedirs(pasta, exist_ok=True)
+            # Os outros workers calculam o mesmo delta ao recarregar: basta um arquivo
+            if not os.path.exists(caminho):
+                tmp = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp, 'wb') as f:
+                    pickle.dump(delta, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, caminho)
+            self._podar(pasta)
+        except OSError as e:
+            logger.warning('Deltas: %s/%s não gravado (%s)', loja, nome, e)
+
+    def _podar(self, pasta):
+        arquivos = sorted((os.path.join(pasta, n) for n in os.listdir(pasta) if n.endswith('.delta')),
+                          key=os.path.getmtime)
+        for caminho in arquivos[:max(0, len(arquivos) - self.historico)]:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+    def _delta(self, loja, nome, versao_anterior):
+        """Delta que sai de ``versao_anterior`` (memória, depois disco) ou None."""
+        with self._lock:
+            delta = self._deltas.get((loja, nome), {}).get(versao_anterior)
+        if delta is not None or not self.pasta:
+            return delta
+        try:
+            with open(self._caminho(loja, nome, versao_anterior)[1], 'rb') as f:
+                delta = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        self._lembrar(loja, nome, delta)
+        return delta
+
+    def versao_atual(self, loja, nome):
+        return self._atual.get((loja, nome))
+
+    def mudancas_desde(self, loja, nome, versao):
+        """
+        Linhas que mudaram depois de ``versao`` (coluna STATUS).
+
+        Returns:
+            pd.DataFrame | None: None se não há cadeia de deltas de ``versao``
+            até a versão atual deste worker
+        """
+        atual = self._atual.get((loja, nome))
+        if versao == atual:
+            return pd.DataFrame(columns=['STATUS'])
+        deltas = []
+        for _ in range(self.historico):
+            delta = self._delta(loja, nome, versao)
+            if delta is None:
+                return None
+            deltas.append(delta)
+            versao = delta.versao
+            if versao == atual:
+                return _compor(deltas)
+        return None
+
+
+def get_log():
+    return current_app.extensions['deltas']
+
+
+def init_app(app):
+    app.config.setdefault('DELTAS_HISTORICO', 24)
+    app.config.setdefault('DELTAS_DIR', os.path.join(app.instance_path, 'deltas'))
+    app.extensions['deltas'] = DeltaLog(app.config['DELTAS_DIR'], app.config['DELTAS_HISTORICO'])
@@ -0,0 +1,217 @@
+"""
+Aviso de versões novas dos dados por server-sent events.
+
+As telas que ficam abertas (totalperdas, ruptura, vencimento) abrem uma
+conexão ``EventSource`` em ``/eventos``. Um único observador por worker
+confere a versão dos arquivos de origem de todas as lojas a cada
+``EVENTOS_INTERVALO`` segundos; quando uma versão muda, ele pede ao cache a
+recarga dos dados daquela loja em segundo plano (``StoreCache.recarregar``)
+e acorda as conexões, que enviam ``event: versao`` com a fonte alterada. O navegador
+(main/static/eventos.js) busca de novo só os blocos ``[data-fonte]`` que
+dependem daquela fonte.
+
+Cada conexão ocupa uma thread do worker: o ``gunicorn.conf.py`` usa o
+worker ``gthread`` e, no gunicorn, ``limitar_ao_worker`` deixa no máximo
+``threads - 1`` conexões por worker (sobra sempre uma thread para as
+páginas; com uma thread só, nenhuma). Acima desse limite (ou de
+``EVENTOS_MAX_CONEXOES``) a resposta é 503 e o navegador passa a consultar
+``/eventos/versoes`` de tempos em tempos.
+As conexões se encerram após ``EVENTOS_DURACAO`` segundos e o navegador
+reconecta sozinho.
+
+Rotas:
+    GET /eventos          fluxo text/event-stream da loja atual
+    GET /eventos/versoes  versões atuais das fontes da loja (JSON)
+"""
+import json
+import logging
+import threading
+import time
+
+from flask import Blueprint, Response, current_app, jsonify
+
+from app.datasets import SOURCES, file_version, source_path
+from app.lojas import loja_atual
+
+logger = logging.getLogger(__name__)
+
+eventos = Blueprint('eventos', __name__)
+
+RETRY_MS = 5000
+
+
+class VersionWatcher:
+    """Observa a versão dos arquivos de origem e avisa quem está esperando."""
+
+    def __init__(self, lojas, intervalo=5, ao_mudar=None):
+        self.lojas = list(lojas)
+        self.intervalo = intervalo
+        self.ao_mudar = ao_mudar
+        self.versoes = {}
+        self.seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ler(self):
+        return {(loja, fonte): file_version(source_path(fonte, loja))
+                for loja in self.lojas for fonte in SOURCES}
+
+    def start(self):
+        """Inicia a thread no processo atual (depois do fork do gunicorn)."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.versoes = self._ler()
+                self._thread = threading.Thread(target=self._run, name='eventos-watcher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                atuais = self._ler()
+            except Exception as e:
+                logger.error(f'Erro ao conferir versões: {e}')
+                continue
+            mudancas = [chave for chave, versao in atuais.items() if self.versoes.get(chave) != versao]
+            if not mudancas:
+                continue
+            if self.ao_mudar:
+                for loja in {loja for loja, _ in mudancas}:
+                    self.ao_mudar(loja)
+            with self._cond:
+                self.versoes = atuais
+                self.seq += 1
+                self._cond.notify_all()
+
+    def esperar(self, seq, timeout):
+        """Espera uma mudança depois de ``seq``; devolve o seq atual."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq, timeout=timeout)
+            return self.seq
+
+    def versoes_da_loja(self, loja):
+        return {fonte: versao for (l, fonte), versao in self.versoes.items() if l == loja}
+
+
+def _evento(nome, dados):
+    return f'event: {nome}\ndata: {json.dumps(dados)}\n\n'
+
+
+class EventStreams:
+    """Conexões SSE abertas neste worker."""
+
+    def __init__(self, watcher, max_conexoes, duracao, heartbeat):
+        self.watcher = watcher
+        self.max_conexoes = max_conexoes
+        self.duracao = duracao
+        self.heartbeat = heartbeat
+        self.abertas = 0
+        self._lock = threading.Lock()
+
+    def reservar(self):
+        with self._lock:
+            if self.abertas >= self.max_conexoes:
+                return False
+            self.abertas += 1
+            return True
+
+    def liberar(self):
+        with self._lock:
+            self.abertas -= 1
+
+    def gerar(self, loja):
+        """
+        Gerador do fluxo de eventos de uma conexão.
+
+        Não libera a vaga: um gerador fechado antes do primeiro ``next`` (cliente
+        que desconectou antes do primeiro bloco) nem chega a rodar o ``finally``.
+        Quem reservou libera no fechamento da resposta (``stream``).
+        """
+        versoes = self.watcher.versoes_da_loja(loja)
+        seq = self.watcher.seq
+        yield f'retry: {RETRY_MS}\n'
+        yield _evento('versoes', {'loja': loja, 'versoes': versoes})
+
+        fim = time.monotonic() + self.duracao
+        while time.monotonic() < fim:
+            novo_seq = self.watcher.esperar(seq, self.heartbeat)
+            if novo_seq == seq:
+                yield ': ping\n\n'
+                continue
+            seq = novo_seq
+            atuais = self.watcher.versoes_da_loja(loja)
+            for fonte, versao in atuais.items():
+                if versoes.get(fonte) != versao:
+                    yield _evento('versao', {'loja': loja, 'fonte': fonte, 'versao': versao})
+            versoes = atuais
+
+
+def limitar_ao_worker(app, worker_class, threads):
+    """
+    Ajusta o limite de conexões às threads do worker do gunicorn (no ``post_worker_init``).
+
+    Workers gevent/eventlet não prendem uma thread por conexão e ficam com
+    ``EVENTOS_MAX_CONEXOES``; nos demais o limite é ``threads - 1``, que
+    ``app.admission.ajustar_ao_worker`` ainda reduz para caber as rotas pesadas.
+    """
+    if any(nome in str(worker_class).lower() for nome in ('gevent', 'eventlet')):
+        return
+    streams = app.extensions['eventos']
+    streams.max_conexoes = max(0, min(app.config['EVENTOS_MAX_CONEXOES'], threads - 1))
+    if not streams.max_conexoes:
+        logger.warning('Eventos: worker %s com %s thread(s), atualização ao vivo só por consulta',
+                       worker_class, threads)
+
+
+def get_streams():
+    return current_app.extensions['eventos']
+
+
+@eventos.route('')
+def stream():
+    streams = get_streams()
+    if not streams.reservar():
+        response = jsonify({'error': 'Muitas conexões de eventos neste servidor'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+
+    # A vaga volta quando o servidor fecha a resposta, tenha o gerador
+    # começado ou não; se algo falhar antes disso, volta aqui
+    try:
+        streams.watcher.start()
+        response = Response(streams.gerar(loja_atual()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.call_on_close(streams.liberar)
+    except BaseException:
+        streams.liberar()
+        raise
+    return response
+
+
+@eventos.route('/versoes')
+def versoes():
+    watcher = get_streams().watcher
+    watcher.start()
+    loja = loja_atual()
+    return jsonify({'loja': loja, 'versoes': watcher.versoes_da_loja(loja)})
+
+
+def init_app(app):
+    app.config.setdefault('EVENTOS_INTERVALO', 5)
+    app.config.setdefault('EVENTOS_MAX_CONEXOES', 4)
+    app.config.setdefault('EVENTOS_DURACAO', 300)
+    app.config.setdefault('EVENTOS_HEARTBEAT', 20)
+
+    cache = app.extensions['lojas_cache']
+    watcher = VersionWatcher(app.config['LOJAS'], app.config['EVENTOS_INTERVALO'],
+                             ao_mudar=cache.recarregar)
+    app.extensions['eventos'] = EventStreams(
+        watcher,
+        max_conexoes=app.config['EVENTOS_MAX_CONEXOES'],
+        duracao=app.config['EVENTOS_DURACAO'],
+        heartbeat=app.config['EVENTOS_HEARTBEAT'],
+    )
+    app.register_blueprint(eventos, url_prefix='/eventos')
@@ -0,0 +1,308 @@
+"""
+Fila de exportações em segundo plano.
+
+Exportações pesadas (ex.: Excel de todos os grupos da ruptura) rodam em um
+pool de processos limitado em vez de prender o worker do gunicorn. Cada job
+é identificado por um hash de (tipo, versão dos dados, filtros), então:
+
+- pedidos idênticos simultâneos viram um único job;
+- o arquivo gerado fica em cache em disco (``instance/exports``) e é
+  reaproveitado enquanto a versão dos dados não mudar.
+
+O estado do job fica em disco (arquivo final, ``.lock`` enquanto executa e
+``.json`` com os metadados), de forma que qualquer worker do gunicorn
+responde o status e o download, não só o que recebeu o pedido.
+
+Rotas:
+    GET /exportacoes/<job_id>           status do job (JSON)
+    GET /exportacoes/<job_id>/download  arquivo pronto
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Blueprint, current_app, jsonify, send_file, url_for
+
+from app.processos import criar_pool, executar
+
+logger = logging.getLogger(__name__)
+
+exportacoes = Blueprint('exportacoes', __name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_EXECUTANDO = 'executando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+
+def make_job_id(kind, version, params):
+    """Gera o id estável do job a partir do tipo, versão e filtros."""
+    payload = json.dumps([kind, version, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _run_job(func, args, tmp_path, final_path):
+    """Executa no processo filho: gera o arquivo e publica de forma atômica."""
+    func(*args, tmp_path)
+    os.replace(tmp_path, final_path)
+
+
+def remover_lock_vencido(lock_path, timeout):
+    """
+    Apaga o ``lock_path`` se ele tem mais de ``timeout`` segundos.
+
+    O arquivo é renomeado antes de apagar e a idade é conferida de novo: se
+    outro processo apagou o vencido e criou um novo no meio, o novo volta
+    para o lugar em vez de ser apagado.
+    """
+    try:
+        if time.time() - os.path.getmtime(lock_path) <= timeout:
+            return False
+    except OSError:
+        return False
+    vencido = f'{lock_path}.{os.getpid()}.{threading.get_ident()}.vencido'
+    try:
+        os.rename(lock_path, vencido)
+    except OSError:
+        return False
+    try:
+        if time.time() - os.path.getmtime(vencido) <= timeout:
+            try:
+                os.link(vencido, lock_path)
+            except OSError:
+                pass
+            return False
+        return True
+    finally:
+        try:
+            os.remove(vencido)
+        except OSError:
+            pass
+
+
+class ExportQueue:
+    """Pool de processos + cache de arquivos para exportações."""
+
+    def __init__(self, cache_dir, max_workers=2, max_files=100, job_timeout=600, unversioned_ttl=300):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_files = max_files
+        self.job_timeout = job_timeout
+        self.unversioned_ttl = unversioned_ttl
+        self._executor = None
+        self._futures = {}
+        self._locks = {}  # job_id -> inode do .lock criado por este worker
+        self._lock = threading.RLock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            # forkserver: o worker já tem outras threads (app.processos)
+            self._executor = criar_pool(self.max_workers)
+        return self._executor
+
+    def _paths(self, job_id):
+        base = os.path.join(self.cache_dir, job_id)
+        return base + '.dat', base + '.json', base + '.lock'
+
+    def _read_meta(self, job_id):
+        meta_path = self._paths(job_id)[1]
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, job_id, meta):
+        meta_path = self._paths(job_id)[1]
+        tmp = meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def status(self, job_id):
+        """Estado atual do job, lido do disco (vale para qualquer worker)."""
+        data_path, _, lock_path = self._paths(job_id)
+        meta = self._read_meta(job_id)
+        if meta is None:
+            return None
+
+        if os.path.exists(data_path):
+            meta['status'] = STATUS_CONCLUIDO
+        elif os.path.exists(lock_path):
+            idade = time.time() - os.path.getmtime(lock_path)
+            if idade > self.job_timeout:
+                meta['status'] = STATUS_ERRO
+                meta['error'] = 'Tempo limite da exportação excedido'
+            else:
+                future = self._futures.get(job_id)
+                running = future is None or future.running()
+                meta['status'] = STATUS_EXECUTANDO if running else STATUS_PENDENTE
+        elif meta.get('status') != STATUS_ERRO:
+            meta['status'] = STATUS_ERRO
+            meta.setdefault('error', 'Exportação interrompida')
+        meta['job_id'] = job_id
+        return meta
+
+    def submit(self, kind, version, params, func, args, download_name, mimetype):
+        """
+        Enfileira uma exportação (ou reaproveita job/arquivo existente).
+
+        Args:
+            kind (str): tipo da exportação, ex. 'controle_ruptura'
+            version (str | None): versão dos dados de origem
+            params (dict): filtros que definem o conteúdo do arquivo
+            func (callable): função de nível de módulo chamada como
+                func(*args, caminho_destino) no processo filho
+            download_name (str): nome do arquivo para o usuário
+            mimetype (str): tipo do arquivo gerado
+
+        Returns:
+            dict: estado do job
+        """
+        if version is None:
+            # Sem versão conhecida, o cache vale só por uma janela de tempo
+            version = f'ttl-{int(time.time() // self.unversioned_ttl)}'
+        job_id = make_job_id(kind, version, params)
+        data_path, _, lock_path = self._paths(job_id)
+
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            atual = self.status(job_id)
+            if atual and atual['status'] != STATUS_ERRO:
+                return atual
+
+            # Os metadados vão antes do .lock: quem vir o .lock já encontra o
+            # job (executando) e não tenta pegá-lo de novo
+            self._write_meta(job_id, {
+                'kind': kind,
+                'version': version,
+                'params': params,
+                'download_name': download_name,
+                'mimetype': mimetype,
+                'status': STATUS_PENDENTE,
+                'created': time.time(),
+            })
+            # Só o .lock vencido sai; um recente é de outro worker executando o job
+            remover_lock_vencido(lock_path, self.job_timeout)
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # Outro worker acabou de pegar o mesmo job
+                return self.status(job_id)
+            self._locks[job_id] = os.fstat(fd).st_ino
+            os.close(fd)
+            self._prune()
+
+            # O temporário mantém a extensão final (o pandas escolhe o writer por ela)
+            extensao = os.path.splitext(download_name)[1]
+            tmp_path = f'{data_path}.{os.getpid()}.tmp{extensao}'
+            future = self._get_executor().submit(executar, _run_job, func, args, tmp_path, data_path)
+            self._futures[job_id] = future
+            future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+
+        return self.status(job_id)
+
+    def _finish(self, job_id, future):
+        _, _, lock_path = self._paths(job_id)
+        error = future.exception()
+        meta = self._read_meta(job_id) or {}
+        meta['finished'] = time.time()
+        if error is not None:
+            logger.error(f"Erro na exportação {job_id}: {error}")
+            meta['status'] = STATUS_ERRO
+            meta['error'] = str(error)
+        else:
+            meta['status'] = STATUS_CONCLUIDO
+        self._write_meta(job_id, meta)
+        with self._lock:
+            self._futures.pop(job_id, None)
+            inode = self._locks.pop(job_id, None)
+        # Só apaga o .lock deste job: se ele venceu, outro worker pode ter criado um novo
+        try:
+            if os.stat(lock_path).st_ino == inode:
+                os.remove(lock_path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        """Remove os arquivos mais antigos quando o cache passa do limite."""
+        arquivos = [os.path.join(self.cache_dir, n) for n in os.listdir(self.cache_dir) if n.endswith('.dat')]
+        if len(arquivos) <= self.max_files:
+            return
+        arquivos.sort(key=os.path.getmtime)
+        for path in arquivos[:len(arquivos) - self.max_files]:
+            for suffix in ('.dat', '.json'):
+                try:
+                    os.remove(path[:-4] + suffix)
+                except OSError:
+                    pass
+
+    def path_for(self, job_id):
+        return self._paths(job_id)[0]
+
+
+def get_queue():
+    return current_app.extensions['export_queue']
+
+
+def job_response(job):
+    """Serializa o estado do job com as URLs de status e download."""
+    body = {
+        'success': job['status'] != STATUS_ERRO,
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'download_name': job.get('download_name'),
+        'status_url': url_for('exportacoes.status', job_id=job['job_id']),
+        'download_url': url_for('exportacoes.download', job_id=job['job_id']),
+    }
+    if job.get('error'):
+        body['error'] = job['error']
+    code = 200 if job['status'] in (STATUS_CONCLUIDO, STATUS_ERRO) else 202
+    return jsonify(body), code
+
+
+def submit_export(kind, version, params, func, args, download_name, mimetype):
+    """Atalho para as rotas: enfileira e devolve a resposta JSON do job."""
+    job = get_queue().submit(kind, version, params, func, args, download_name, mimetype)
+    return job_response(job)
+
+
+@exportacoes.route('/<job_id>')
+def status(job_id):
+    job = get_queue().status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Exportação não encontrada'}), 404
+    return job_response(job)
+
+
+@exportacoes.route('/<job_id>/download')
+def download(job_id):
+    queue = get_queue()
+    job = queue.status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Exportação não encontrada'}), 404
+    if job['status'] != STATUS_CONCLUIDO:
+        return job_response(job)
+    return send_file(
+        queue.path_for(job_id),
+        mimetype=job['mimetype'],
+        as_attachment=True,
+        download_name=job['download_name']
+    )
+
+
+def init_app(app):
+    app.config.setdefault('EXPORT_CACHE_DIR', os.path.join(app.instance_path, 'exports'))
+    app.config.setdefault('EXPORT_MAX_WORKERS', 2)
+    app.config.setdefault('EXPORT_MAX_FILES', 100)
+    app.config.setdefault('EXPORT_JOB_TIMEOUT', 600)
+    app.extensions['export_queue'] = ExportQueue(
+        app.config['EXPORT_CACHE_DIR'],
+        max_workers=app.config['EXPORT_MAX_WORKERS'],
+        max_files=app.config['EXPORT_MAX_FILES'],
+        job_timeout=app.config['EXPORT_JOB_TIMEOUT'],
+    )
+    app.register_blueprint(exportacoes, url_prefix='/exportacoes')
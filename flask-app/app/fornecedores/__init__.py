@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+fornecedores = Blueprint('fornecedores', __name__,
+                         template_folder='templates',
+                         static_folder='static',)
+
+from . import routes
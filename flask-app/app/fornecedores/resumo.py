@@ -0,0 +1,147 @@
+"""
+Resumo por fornecedor: ISV, vencimento e perdas agregados por FORNECEDOR.
+
+Os compradores negociam por fornecedor. As somas saem das tabelas que os
+módulos já mantêm em memória, sem merge por requisição:
+
+- ISV (``IsvIndex``): itens, itens parados (DIAS S/VND a partir de
+  ``dias_parado``), estoque parado em EMB1 e idade média do estoque, pelos
+  códigos de fornecedor que o índice já tem (``factorize``);
+- vencimento (tabela do SAEOU060): valor a vencer em até 7/15/30/45 dias,
+  pelo FORNECEDOR do arquivo de fornecedores do vencimento;
+- perdas (``TabelaPerdas``): VLR.TOTAL por tipo de evento da taxonomia. O
+  SAEOI051 não tem fornecedor: a MERCADORIA é ligada ao fornecedor do ISV
+  pelo código do produto.
+
+Tudo que não depende da data é agregado uma vez por carga. O vencimento fica
+somado por (fornecedor, dia de vencimento); as janelas de cada data são
+somas sobre essa tabela pequena, calculadas na primeira consulta do dia.
+"""
+import threading
+
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+SEM_FORNECEDOR = 'SEM FORNECEDOR'
+JANELAS_PADRAO = (7, 15, 30, 45)
+
+
+def _nomes(serie):
+    """Nomes de fornecedor sem espaços nas pontas; vazio vira ``SEM_FORNECEDOR``."""
+    return serie.fillna('').astype(str).str.strip().replace('', SEM_FORNECEDOR)
+
+
+def _codigo_produto(serie):
+    """Código numérico do produto nos 5 últimos dígitos (padrão do ISV)."""
+    return pd.to_numeric(serie, errors='coerce') % 100000
+
+
+class ResumoFornecedores:
+    """Agregados por fornecedor de uma carga dos três módulos."""
+
+    def __init__(self, isv, vencimento_df, perdas, dias_parado=30, janelas=JANELAS_PADRAO, versao=None):
+        """
+        Args:
+            isv: ``IsvIndex`` do ISV da loja
+            vencimento_df: lotes do controle de vencimento (com FORNECEDOR)
+            perdas: ``TabelaPerdas`` da carga do SAEOI051
+            dias_parado: dias sem venda a partir dos quais o item conta como parado
+            janelas: dias das colunas de valor a vencer
+        """
+        self.versao = versao
+        self.janelas = tuple(janelas)
+
+        nomes_isv = _nomes(pd.Series(isv.fornecedores))
+        fornecedor_lote = _nomes(vencimento_df['FORNECEDOR']) if 'FORNECEDOR' in vencimento_df.columns \
+            else pd.Series(SEM_FORNECEDOR, index=vencimento_df.index)
+        self.fornecedores = pd.Index(sorted(set(nomes_isv) | set(fornecedor_lote) | {SEM_FORNECEDOR}))
+        n = len(self.fornecedores)
+
+        # ISV: código de cada linha no índice -> código no resumo
+        codigo_isv = self.fornecedores.get_indexer(nomes_isv)[isv.codigos_fornecedor]
+        dias = isv.df['DIAS S/VND'].to_numpy()
+        parado = dias >= dias_parado
+        itens = np.bincount(codigo_isv, minlength=n)
+        self.colunas_fixas = {
+            'ITENS': itens,
+            'ITENS_PARADOS': np.bincount(codigo_isv, weights=parado, minlength=n).astype(int),
+            'ESTOQUE_PARADO_EMB1': np.bincount(codigo_isv, weights=isv.df['ESTOQUE EMB1'].to_numpy() * parado,
+                                               minlength=n).astype(int),
+            'IDADE_MEDIA': np.divide(np.bincount(codigo_isv, weights=isv.df['IDADE'].to_numpy(), minlength=n),
+                                     itens, out=np.zeros(n), where=itens > 0),
+        }
+
+        # Perdas: MERCADORIA -> fornecedor pelo produto no ISV; tipo do evento pela taxonomia
+        fornecedor_produto = pd.Series(codigo_isv, index=_codigo_produto(isv.df['CODIGO']).to_numpy())
+        fornecedor_produto = fornecedor_produto[~fornecedor_produto.index.duplicated()]
+        mercadoria = _codigo_produto(perdas.df['MERCADORIA']) if 'MERCADORIA' in perdas.df.columns \
+            else pd.Series(np.nan, index=perdas.df.index)
+        sem_fornecedor = self.fornecedores.get_loc(SEM_FORNECEDOR)
+        codigo_perda = fornecedor_produto.reindex(mercadoria.to_numpy()).fillna(sem_fornecedor).to_numpy(dtype=np.int64)
+        taxonomia = perdas.taxonomia
+        evento = perdas.classificacao['CATEGORIA_PERDA'].cat.codes.to_numpy() // len(taxonomia.operacoes)
+        tipos = len(taxonomia.eventos)
+        por_tipo = np.bincount(codigo_perda * tipos + evento, weights=np.nan_to_num(perdas.valor),
+                               minlength=n * tipos).reshape(n, tipos)
+        for posicao, tipo in enumerate(taxonomia.eventos):
+            self.colunas_fixas[f'PERDA_{tipo}'] = por_tipo[:, posicao]
+        self.colunas_fixas['PERDA_TOTAL'] = por_tipo.sum(axis=1)
+
+        # Vencimento: valor somado por (fornecedor, dia de vencimento)
+        vencimento = vencimento_df['VENCIMENTO']
+        validos = vencimento.notna().to_numpy()
+        lotes = pd.DataFrame({
+            'fornecedor': self.fornecedores.get_indexer(fornecedor_lote[validos]),
+            'dia': vencimento[validos].to_numpy().astype('datetime64[D]').astype(np.int64),
+            'valor': pd.to_numeric(vencimento_df['VALOR A VENCER'][validos], errors='coerce').fillna(0).to_numpy(),
+        })
+        somas = lotes.groupby(['fornecedor', 'dia'], sort=False)['valor'].sum()
+        self._venc_fornecedor = somas.index.get_level_values(0).to_numpy()
+        self._venc_dia = somas.index.get_level_values(1).to_numpy()
+        self._venc_valor = somas.to_numpy()
+
+        self._dias = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Para o snapshot em disco (app.spill): sem a trava e sem os resumos do dia
+        estado = dict(self.__dict__)
+        del estado['_lock']
+        estado['_dias'] = {}
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    @property
+    def colunas(self):
+        """Colunas do resumo, na ordem de exibição."""
+        return (['FORNECEDOR', 'ITENS', 'ITENS_PARADOS', 'ESTOQUE_PARADO_EMB1', 'IDADE_MEDIA']
+                + [f'VENCE_{dias}D' for dias in self.janelas]
+                + [c for c in self.colunas_fixas if c.startswith('PERDA_')])
+
+    def resumo(self, dia):
+        """Resumo de todos os fornecedores com o valor a vencer contado a partir de ``dia`` (em cache por data)."""
+        dia = pd.Timestamp(dia).normalize()
+        with self._lock:
+            resumo = self._dias.get(dia)
+        if resumo is not None:
+            return resumo
+
+        hoje = np.datetime64(dia.date(), 'D').astype(np.int64)
+        n = len(self.fornecedores)
+        colunas = {'FORNECEDOR': self.fornecedores.to_numpy()}
+        colunas.update(self.colunas_fixas)
+        faltam = self._venc_dia - hoje
+        for dias in self.janelas:
+            janela = (faltam >= 0) & (faltam <= dias)
+            colunas[f'VENCE_{dias}D'] = np.bincount(self._venc_fornecedor[janela], weights=self._venc_valor[janela],
+                                                    minlength=n)
+        resumo = pd.DataFrame(colunas, columns=self.colunas)
+        with self._lock:
+            # Só a data consultada fica guardada: as anteriores não voltam
+            self._dias = {dia: self._dias.get(dia, resumo)}
+            return self._dias[dia]
@@ -0,0 +1,121 @@
+from flask import current_app, jsonify, request
+from . import fornecedores
+from .resumo import JANELAS_PADRAO, ResumoFornecedores
+from app.colunar import DadosColunares, registrar_colunar
+from app.controle_de_isv.routes import indice_isv
+from app.controle_de_perdas.routes import caixas_perdas
+from app.controle_vencimento.routes import tabela_vencimento
+from app.cursores import Ordem, cursor, semear
+from app.fragments import render_page
+from app.lojas import dataset, versao_fontes
+from app.saude import registrar_aquecimento
+from datetime import date
+from math import ceil
+
+FONTES_FORNECEDORES = ("forn_isv", "smg12", "forn_vencimento", "saeou060", "saeoi051")
+
+@fornecedores.record_once
+def configurar_resumo(state):
+    """Dias sem venda de um item parado e janelas (dias) do valor a vencer"""
+    state.app.config.setdefault("FORNECEDORES_DIAS_PARADO", 30)
+    state.app.config.setdefault("FORNECEDORES_JANELAS", JANELAS_PADRAO)
+
+def montar_resumo(loja):
+    """Agregados por fornecedor a partir dos dados já preparados de ISV, vencimento e perdas da loja"""
+    config = current_app.config
+    return ResumoFornecedores(indice_isv(loja), tabela_vencimento(loja), caixas_perdas(loja).tabela,
+                              dias_parado=config["FORNECEDORES_DIAS_PARADO"],
+                              janelas=config["FORNECEDORES_JANELAS"],
+                              versao=versao_fontes(FONTES_FORNECEDORES, [loja]))
+
+def resumo_fornecedores(loja=None):
+    """Resumo da loja (a atual por padrão), montado uma vez por versão dos arquivos"""
+    return dataset("fornecedores_resumo", montar_resumo, FONTES_FORNECEDORES, loja=loja)
+
+# Renderizada no aquecimento do worker (monta o resumo depois das cargas dos módulos)
+registrar_aquecimento("fornecedores.index")
+
+def ordens_resumo(resumo):
+    """Uma ordenação por coluna: FORNECEDOR em ordem alfabética, as numéricas da maior para a menor"""
+    return {coluna: Ordem([coluna], ascendente=coluna == "FORNECEDOR") for coluna in resumo.colunas}
+
+def tabela_do_dia(loja=None):
+    """Resumo de hoje e as ordenações da tabela (calculadas uma vez por dia)"""
+    resumo = resumo_fornecedores(loja)
+    ordens = ordens_resumo(resumo)
+    resumo_df = resumo.resumo(date.today())
+    semear(resumo_df, ordens)
+    return resumo_df, ordens
+
+def posicoes_fornecedores(resumo_df, ordens, ordem, busca=""):
+    """Posições (cursor em cache) dos fornecedores que contêm ``busca``, na ordem pedida"""
+    if not busca:
+        return cursor(resumo_df, ordens, ordem)
+    return cursor(resumo_df, ordens, ordem, ("busca", busca),
+                  lambda df: df["FORNECEDOR"].str.contains(busca, case=False, regex=False).to_numpy())
+
+def parametros(ordens):
+    """Ordem (padrão PERDA_TOTAL) e busca da query string"""
+    ordem = request.args.get("ordem", "PERDA_TOTAL")
+    if ordem not in ordens:
+        ordem = "PERDA_TOTAL"
+    return ordem, request.args.get("busca", "").strip()
+
+def moeda(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+@fornecedores.route("/", methods=["GET"])
+def index():
+    resumo_df, ordens = tabela_do_dia()
+    ordem, busca = parametros(ordens)
+    posicoes = posicoes_fornecedores(resumo_df, ordens, ordem, busca)
+
+    # Paginação
+    page = request.args.get("page", 1, type=int)
+    per_page = 50
+    total_items = len(posicoes)
+    total_pages = ceil(total_items / per_page)
+    start_index = (page - 1) * per_page
+    linhas = resumo_df.iloc[posicoes[start_index:start_index + per_page]].to_dict(orient="records")
+
+    return render_page(
+        "fornecedores.html",
+        "fornecedores_tabela.html",
+        linhas=linhas,
+        colunas=list(resumo_df.columns),
+        moeda=moeda,
+        page=page,
+        total_pages=total_pages,
+        total_items=total_items,
+        ordem=ordem,
+        busca=busca,
+    )
+
+@fornecedores.route("/api", methods=["GET"])
+def api():
+    """Resumo por fornecedor em JSON (``ordem``, ``busca`` e ``limite`` na query string)"""
+    resumo_df, ordens = tabela_do_dia()
+    ordem, busca = parametros(ordens)
+    posicoes = posicoes_fornecedores(resumo_df, ordens, ordem, busca)
+    # Total de fornecedores da busca, antes do corte pelo limite
+    total = len(posicoes)
+    limite = request.args.get("limite", type=int)
+    if limite is not None:
+        posicoes = posicoes[:max(0, limite)]
+    return jsonify({
+        "versao": resumo_fornecedores().versao,
+        "data": date.today().isoformat(),
+        "ordem": ordem,
+        "colunas": list(resumo_df.columns),
+        "total": int(total),
+        "fornecedores": resumo_df.iloc[posicoes].round(2).to_dict(orient="records"),
+    })
+
+# Download colunar (app.colunar) do resumo do dia
+registrar_colunar(DadosColunares(
+    "fornecedores", "Resumo por fornecedor", FONTES_FORNECEDORES,
+    lambda loja: tabela_do_dia(loja)[0],
+    filtros={"busca": "texto no nome do fornecedor"},
+    posicoes=lambda df, args: posicoes_fornecedores(df, ordens_resumo(resumo_fornecedores()), "FORNECEDOR",
+                                                    args.get("busca", "").strip()),
+))
@@ -0,0 +1,21 @@
+"""
+Renderização parcial das páginas paginadas.
+
+Os links de paginação (main/static/fragments.js) fazem a requisição com o
+cabeçalho ``X-Requested-With: XMLHttpRequest``; nesse caso a rota devolve
+apenas o template do fragmento da tabela em vez da página inteira.
+"""
+from flask import make_response, render_template, request
+
+
+def wants_fragment():
+    """Indica se a requisição pediu só o fragmento da tabela."""
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def render_page(template, fragment_template, **context):
+    """Renderiza a página completa ou só o fragmento, conforme a requisição."""
+    name = fragment_template if wants_fragment() else template
+    response = make_response(render_template(name, **context))
+    response.vary.add('X-Requested-With')
+    return response
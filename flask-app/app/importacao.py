@@ -0,0 +1,112 @@
+"""
+Relatório do tempo de inicialização (import + create_app).
+
+``flask importacao`` roda, em um interpretador novo, ``python -X importtime``
+importando o pacote e chamando ``create_app()``; mostra o tempo total (mediana
+de algumas repetições), os módulos mais caros e se algum módulo pesado
+(pandas, numpy, openpyxl) foi carregado na subida, o que não deveria
+acontecer: eles são importados no primeiro uso (``app.lazy``).
+
+Com ``--limite-ms`` o comando sai com erro quando a subida passa do limite,
+para que uma regressão apareça no CI ou no deploy.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import click
+
+MODULOS_PESADOS = ('pandas', 'numpy', 'openpyxl')
+
+SCRIPT = f"""
+import json, sys, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+create_app()
+fim = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (importado - inicio) * 1000,
+    'create_app_ms': (fim - importado) * 1000,
+    'pesados': [m for m in {MODULOS_PESADOS!r} if m in sys.modules],
+}}))
+"""
+
+
+def medir():
+    """Roda uma subida em um processo novo; devolve (medidas, linhas do importtime)."""
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [raiz, os.environ.get('PYTHONPATH')])))
+    processo = subprocess.run([sys.executable, '-X', 'importtime', '-c', SCRIPT],
+                              cwd=raiz, env=ambiente, capture_output=True, text=True)
+    if processo.returncode != 0:
+        raise click.ClickException(f'Falha ao subir o app:\n{processo.stderr[-2000:]}')
+    medidas = json.loads(processo.stdout.strip().splitlines()[-1])
+    return medidas, processo.stderr.splitlines()
+
+
+def modulos(linhas):
+    """
+    Tempos do ``-X importtime`` por módulo.
+
+    Returns:
+        list: (nome, próprio_ms, acumulado_ms, nível) na ordem do import
+    """
+    resultado = []
+    for linha in linhas:
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        proprio, acumulado, nome = linha[len('import time:'):].split('|')
+        # Depois do separador vem um espaço e dois por nível de aninhamento
+        nivel = (len(nome) - len(nome.lstrip()) - 1) // 2
+        resultado.append((nome.strip(), int(proprio) / 1000, int(acumulado) / 1000, nivel))
+    return resultado
+
+
+@click.command('importacao')
+@click.option('--repeticoes', default=3, show_default=True, help='Subidas medidas (vale a mediana).')
+@click.option('--top', default=15, show_default=True, help='Módulos mais caros listados.')
+@click.option('--limite-ms', type=float, default=None, help='Falha se import + create_app passar disso.')
+@click.option('--json', 'como_json', is_flag=True, help='Saída em JSON.')
+def importacao_cli(repeticoes, top, limite_ms, como_json):
+    """Mede o tempo de import e do create_app()."""
+    rodadas = [medir() for _ in range(max(1, repeticoes))]
+    totais = [m['import_ms'] + m['create_app_ms'] for m, _ in rodadas]
+    medidas, linhas = rodadas[-1]
+    tempos = modulos(linhas)
+    # O app e o que ele importa diretamente (níveis mais fundos já estão no acumulado)
+    raiz = sorted((t for t in tempos if t[3] <= 1), key=lambda t: -t[2])[:top]
+    do_app = [t for t in tempos if t[0] == 'app' or t[0].startswith('app.')]
+
+    relatorio = {
+        'total_ms': round(statistics.median(totais), 1),
+        'import_ms': round(statistics.median(m['import_ms'] for m, _ in rodadas), 1),
+        'create_app_ms': round(statistics.median(m['create_app_ms'] for m, _ in rodadas), 1),
+        'pesados_carregados': medidas['pesados'],
+        'modulos': [{'modulo': n, 'proprio_ms': round(p, 1), 'acumulado_ms': round(a, 1)} for n, p, a, _ in raiz],
+        'app': [{'modulo': n, 'proprio_ms': round(p, 1), 'acumulado_ms': round(a, 1)} for n, p, a, _ in do_app],
+    }
+
+    if como_json:
+        click.echo(json.dumps(relatorio, indent=2))
+    else:
+        click.echo(f'Subida: {relatorio["total_ms"]} ms (import {relatorio["import_ms"]} ms, '
+                   f'create_app {relatorio["create_app_ms"]} ms; mediana de {len(rodadas)})')
+        click.echo(f'Módulos pesados carregados: {", ".join(medidas["pesados"]) or "nenhum"}')
+        click.echo('\nMódulos mais caros (acumulado):')
+        for item in relatorio['modulos']:
+            click.echo(f'  {item["acumulado_ms"]:8.1f} ms  {item["modulo"]}')
+        click.echo('\nMódulos do app (próprio / acumulado):')
+        for item in relatorio['app']:
+            click.echo(f'  {item["proprio_ms"]:7.1f} / {item["acumulado_ms"]:7.1f} ms  {item["modulo"]}')
+
+    if medidas['pesados']:
+        click.echo(f'Aviso: {", ".join(medidas["pesados"])} carregado(s) na subida', err=True)
+    if limite_ms is not None and relatorio['total_ms'] > limite_ms:
+        raise click.ClickException(f'Subida de {relatorio["total_ms"]} ms passou do limite de {limite_ms} ms')
+
+
+def init_app(app):
+    app.cli.add_command(importacao_cli)
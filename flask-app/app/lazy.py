@@ -0,0 +1,50 @@
+"""
+Importação preguiçosa dos módulos pesados (pandas, numpy).
+
+``pd = lazy_import('pandas')`` devolve um substituto do módulo: o import de
+verdade acontece no primeiro acesso a um atributo (``pd.DataFrame``...), e
+não quando o ``create_app`` importa os blueprints. Assim o worker sobe sem
+pagar o import do pandas e a primeira requisição (ou a carga de prontidão
+de ``app.saude``) é quem carrega.
+
+Cada atributo usado é copiado para o substituto no primeiro acesso; dali em
+diante o acesso é um atributo comum, sem custo extra. O import é protegido
+por trava porque as cargas de prontidão rodam em outra thread.
+"""
+import importlib
+import sys
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Substituto de um módulo que só é importado no primeiro uso."""
+
+    def __init__(self, nome):
+        super().__init__(nome)
+        self.__dict__['_modulo'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _carregar(self):
+        modulo = self.__dict__['_modulo']
+        if modulo is None:
+            with self.__dict__['_lock']:
+                modulo = self.__dict__['_modulo']
+                if modulo is None:
+                    modulo = importlib.import_module(self.__name__)
+                    self.__dict__['_modulo'] = modulo
+        return modulo
+
+    def __getattr__(self, atributo):
+        valor = getattr(self._carregar(), atributo)
+        self.__dict__[atributo] = valor
+        return valor
+
+    def __dir__(self):
+        return dir(self._carregar())
+
+
+def lazy_import(nome):
+    """Módulo ``nome`` se já foi importado; senão um ``LazyModule`` que importa no primeiro uso."""
+    modulo = sys.modules.get(nome)
+    return modulo if modulo is not None else LazyModule(nome)
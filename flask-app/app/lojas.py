@@ -0,0 +1,697 @@
+"""
+Lojas (filiais) atendidas pelo portal.
+
+Cada requisição trabalha com uma loja: ``?loja=<código>`` troca a loja e
+grava um cookie, as seguintes usam o cookie e, sem nenhum dos dois, vale
+``LOJA_PADRAO``. Os blueprints pedem os dados já preparados por
+``dataset(nome, loader, fontes)``, que guarda um item por (loja, nome) em um
+cache com orçamento de memória:
+
+- o item é recarregado (de forma preguiçosa, no próximo acesso) quando a
+  versão dos arquivos de origem muda; a versão é conferida no máximo a cada
+  ``LOJAS_VERIFICAR_S`` segundos;
+- acima de ``LOJAS_MEMORIA_MB``, os itens usados há mais tempo (primeiro os
+  das outras lojas) saem da memória: são gravados em um snapshot mapeado em
+  memória em ``LOJAS_SPILL_DIR`` (``app.spill``) e voltam dele no próximo
+  acesso, sem ler os arquivos do ERP de novo. Com ``LOJAS_SPILL_DIR = None``
+  são só descartados.
+
+Cada item é uma ``VersaoDataset``: o valor carregado e a versão das fontes
+de que ele saiu, que não mudam depois de criados. Uma recarga monta outra
+versão e troca a referência no cache de uma vez; a leitura não pega trava,
+só lê a referência atual. Quando o observador de versões (``app.eventos``)
+ou uma leitura percebe que os arquivos mudaram e já há uma versão em
+memória, a nova é carregada em segundo plano
+(``LOJAS_RECARGA_SEGUNDO_PLANO``) e as requisições seguem com a anterior até
+a troca.
+
+Cada requisição fixa a versão de cada dataset na primeira leitura (em
+``g``): as leituras seguintes do mesmo dataset na mesma requisição devolvem
+os mesmos dados, mesmo que uma recarga tenha terminado no meio. A versão dos
+arquivos (``versao_fontes``) também fica fixa na requisição, e é a dos
+datasets já fixados, então as chaves do cache compartilhado e as ETags
+batem com os dados servidos.
+
+As visões regionais (``consolidado``) calculam um resumo por loja em
+paralelo, um processo por loja, juntam os resultados e ficam em cache até
+algum arquivo de origem de alguma loja mudar.
+
+Configuração:
+    LOJAS              {código: nome}; padrão vem de PORTAL_LOJAS
+                       ("888:Loja 888,889:Loja 889") ou só a loja 888
+    LOJA_PADRAO        loja quando não há ?loja= nem cookie
+    LOJAS_FONTES       {código: {fonte: caminho}} fora do padrão de SOURCES
+    LOJAS_MEMORIA_MB   orçamento do cache de datasets por worker
+    LOJAS_SPILL_DIR    pasta dos snapshots (padrão instance/spill)
+    LOJAS_RECARGA_SEGUNDO_PLANO  recarrega em segundo plano quando já há
+                       uma versão em memória (padrão True)
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g, has_request_context, jsonify, request
+
+from app import deltas, spill
+from app.datasets import DEFAULT_STORE, configure_stores, file_version, source_path
+from app.lazy import lazy_import
+from app.processos import criar_pool, executar
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = 'loja'
+COOKIE_MAX_AGE = 365 * 24 * 3600
+REGIONAL = '*regional*'
+
+
+def _lojas_do_ambiente(texto=None):
+    """{código: nome} de "888:Loja 888,889:Loja 889" (padrão: PORTAL_LOJAS)."""
+    if texto is None:
+        texto = os.environ.get('PORTAL_LOJAS', '')
+    lojas = {}
+    for parte in str(texto).split(','):
+        codigo, _, nome = parte.strip().partition(':')
+        if codigo:
+            lojas[codigo] = nome or f'Loja {codigo}'
+    return lojas or {DEFAULT_STORE: f'Loja {DEFAULT_STORE}'}
+
+
+def lojas_configuradas():
+    """{código: nome} das lojas do portal."""
+    return current_app.config['LOJAS']
+
+
+def loja_atual():
+    """Código da loja da requisição (ou a padrão fora de requisição)."""
+    if not has_request_context():
+        return current_app.config['LOJA_PADRAO']
+    if 'loja' not in g:
+        lojas = lojas_configuradas()
+        loja = request.args.get('loja') or request.cookies.get(COOKIE_NAME)
+        g.loja = loja if loja in lojas else current_app.config['LOJA_PADRAO']
+    return g.loja
+
+
+def _tamanho(valor, profundidade=0):
+    """Estimativa do tamanho em bytes de um item do cache."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if profundidade >= 3:
+        return sys.getsizeof(valor)
+    if isinstance(valor, (list, tuple)):
+        return sum(_tamanho(v, profundidade + 1) for v in valor)
+    if isinstance(valor, dict):
+        return sum(_tamanho(v, profundidade + 1) for v in valor.values())
+    if hasattr(valor, '__dict__'):
+        return _tamanho(vars(valor), profundidade + 1)
+    return sys.getsizeof(valor)
+
+
+class VersaoDataset:
+    """
+    Uma versão carregada de um dataset da loja: o valor e a versão das fontes.
+
+    ``valor`` e ``versao`` não mudam depois de criados. A recarga cria outra
+    versão e a gravação em disco troca o item por uma versão sem o valor
+    (``em_disco``); quem já pegou a versão continua com os mesmos dados.
+    ``verificado_em`` e ``usado_em`` são só a contabilidade do cache.
+    """
+    __slots__ = ('valor', 'versao', 'tamanho', 'verificado_em', 'usado_em', 'snapshot', 'carregar', 'versao_fn')
+
+    def __init__(self, valor, versao, tamanho, carregar=None, versao_fn=None):
+        self.valor = valor
+        self.versao = versao
+        self.tamanho = tamanho
+        self.verificado_em = time.monotonic()
+        self.usado_em = 0
+        self.snapshot = None  # base do snapshot em disco desta versão (app.spill)
+        # Como carregar de novo (recarga em segundo plano)
+        self.carregar = carregar
+        self.versao_fn = versao_fn
+
+    @property
+    def em_disco(self):
+        return self.valor is _EM_DISCO
+
+    def _em_disco(self):
+        """A mesma versão, só no snapshot em disco."""
+        item = VersaoDataset(_EM_DISCO, self.versao, self.tamanho, self.carregar, self.versao_fn)
+        item.snapshot = self.snapshot
+        item.usado_em = self.usado_em
+        return item
+
+
+# Valor de um item que saiu da memória e está só no snapshot
+_EM_DISCO = object()
+
+
+class StoreCache:
+    """
+    Datasets preparados por loja, com orçamento de memória e LRU por item.
+
+    Acima do orçamento, os itens usados há mais tempo (primeiro os das outras
+    lojas) saem da memória. Com ``spill_dir``, o item é gravado antes em um
+    snapshot (``app.spill``) e volta dele no próximo acesso, enquanto a versão
+    dos arquivos não muda; sem ``spill_dir`` (ou se o valor não pode ser
+    gravado) ele é descartado e o próximo acesso carrega de novo.
+
+    A leitura de um item em memória e dentro do intervalo de verificação não
+    pega a trava: os itens só são trocados inteiros (sob a trava), nunca
+    alterados. Por isso os contadores de acertos são aproximados.
+    """
+
+    def __init__(self, budget_bytes, check_interval=30, spill_dir=None, app=None, segundo_plano=False):
+        """
+        Args:
+            app: aplicação para o contexto das recargas em segundo plano
+            segundo_plano: versão nova carregada em segundo plano quando já há
+                uma em memória (requer ``app``)
+        """
+        self.budget_bytes = budget_bytes
+        self.check_interval = check_interval
+        self.spill_dir = spill_dir
+        self.app = app
+        self.segundo_plano = segundo_plano and app is not None
+        self._lojas = OrderedDict()  # loja -> {nome: VersaoDataset}, na ordem da última carga
+        self._lock = threading.RLock()
+        self._carregando = {}
+        self._recarregando = set()  # (loja, nome) com recarga em segundo plano pendente
+        self._executor = None
+        self._local = threading.local()  # profundidade de cargas em andamento na thread
+        self._usos = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+        self.restores = 0
+        self.recargas = 0
+        self.versoes_anteriores = 0
+
+    @property
+    def total_bytes(self):
+        """Bytes dos itens em memória (os que estão só em disco não contam)."""
+        return sum(item.tamanho for itens in self._lojas.values() for item in itens.values() if not item.em_disco)
+
+    def _usar(self, item):
+        # Sem trava: dois usos simultâneos podem ganhar o mesmo número, o que não muda o LRU
+        self._usos += 1
+        item.usado_em = self._usos
+
+    def get(self, loja, nome, loader, versao_fn):
+        """Valor do item ``nome`` da loja (``obter(...).valor``)."""
+        return self.obter(loja, nome, loader, versao_fn).valor
+
+    def obter(self, loja, nome, loader, versao_fn, sincrono=False):
+        """
+        ``VersaoDataset`` atual do item ``nome`` da loja; chama ``loader()`` se
+        faltar ou estiver velho.
+
+        Args:
+            versao_fn: função sem argumentos que devolve a versão atual das
+                fontes do item (comparada com a versão de quando carregou)
+            sincrono: confere a versão agora e espera a carga da atual, sem
+                devolver a anterior enquanto recarrega
+        """
+        if sincrono or getattr(self._local, 'carregando', 0):
+            # Dentro de uma carga (um dataset montado a partir de outro), a
+            # versão anterior daria à nova uma etiqueta de versão errada
+            return self._carregar(loja, nome, loader, versao_fn, versao_fn())
+        # Caminho sem trava: a referência atual, se está em memória e foi conferida há pouco
+        item = self._lojas.get(loja, {}).get(nome)
+        if item is not None and not item.em_disco:
+            if time.monotonic() - item.verificado_em < self.check_interval:
+                self._usar(item)
+                self.hits += 1
+                return item
+            if (loja, nome) in self._recarregando:
+                # A versão nova está sendo carregada: segue com a atual até a troca
+                self._usar(item)
+                self.versoes_anteriores += 1
+                return item
+
+        versao = versao_fn()
+        if item is not None and not item.em_disco and self.segundo_plano:
+            if item.versao == versao:
+                item.verificado_em = time.monotonic()
+                self._usar(item)
+                self.hits += 1
+                return item
+            # Uma tentativa por intervalo: se a recarga falhar, a próxima fica para depois
+            item.verificado_em = time.monotonic()
+            self._agendar(loja, nome, loader, versao_fn)
+            self._usar(item)
+            self.versoes_anteriores += 1
+            return item
+        return self._carregar(loja, nome, loader, versao_fn, versao)
+
+    def _carregar(self, loja, nome, loader, versao_fn, versao):
+        """Carrega (ou restaura do disco) a ``versao`` do item e troca no cache."""
+        with self._lock:
+            carregando = self._carregando.setdefault((loja, nome), threading.Lock())
+        with carregando:
+            item = self._lojas.get(loja, {}).get(nome)
+            if item is not None and item.versao == versao and not item.em_disco:
+                item.verificado_em = time.monotonic()
+                self._usar(item)
+                self.hits += 1
+                return item
+
+            valor = None
+            if item is not None and item.versao == versao:
+                valor = self._restaurar(item)
+            if valor is not None:
+                novo = VersaoDataset(valor, versao, _tamanho(valor), loader, versao_fn)
+                novo.snapshot = item.snapshot
+                with self._lock:
+                    self.restores += 1
+            else:
+                with self._lock:
+                    self.misses += 1
+                self._local.carregando = getattr(self._local, 'carregando', 0) + 1
+                try:
+                    valor = loader()
+                finally:
+                    self._local.carregando -= 1
+                novo = VersaoDataset(valor, versao, _tamanho(valor), loader, versao_fn)
+                if item is not None and item.snapshot:
+                    spill.remover_snapshot(item.snapshot)
+
+            with self._lock:
+                self._lojas.setdefault(loja, {})[nome] = novo
+                self._lojas.move_to_end(loja)
+                self._usar(novo)
+                vitimas = self._escolher_vitimas(protegida=(loja, nome))
+            self._liberar(vitimas)
+            return novo
+
+    # =============== RECARGA EM SEGUNDO PLANO ===============
+
+    def _agendar(self, loja, nome, loader, versao_fn):
+        """Agenda a recarga do item (uma por vez por item, uma thread por worker)."""
+        with self._lock:
+            if (loja, nome) in self._recarregando:
+                return
+            self._recarregando.add((loja, nome))
+            if self._executor is None:
+                # Criado no primeiro uso, já no worker (depois do fork do gunicorn)
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lojas-recarga')
+            executor = self._executor
+        try:
+            executor.submit(self._recarregar, loja, nome, loader, versao_fn)
+        except RuntimeError:
+            # Processo encerrando: a versão atual segue até o fim
+            with self._lock:
+                self._recarregando.discard((loja, nome))
+
+    def _recarregar(self, loja, nome, loader, versao_fn):
+        try:
+            with self.app.app_context():
+                self._carregar(loja, nome, loader, versao_fn, versao_fn())
+            with self._lock:
+                self.recargas += 1
+            logger.info('Cache de lojas: %s/%s recarregado em segundo plano', loja, nome)
+        except Exception:
+            # A versão anterior continua; a próxima leitura depois do intervalo tenta de novo
+            logger.exception('Cache de lojas: falha ao recarregar %s/%s', loja, nome)
+        finally:
+            with self._lock:
+                self._recarregando.discard((loja, nome))
+
+    def recarregar(self, loja):
+        """
+        Os arquivos da loja mudaram: recarrega em segundo plano os itens em
+        memória (sem segundo plano, só força a conferência no próximo acesso).
+        """
+        if not self.segundo_plano:
+            self.expire(loja)
+            return
+        with self._lock:
+            itens = [(nome, item) for nome, item in self._lojas.get(loja, {}).items()
+                     if not item.em_disco and item.carregar is not None]
+        for nome, item in itens:
+            if item.versao_fn() != item.versao:
+                self._agendar(loja, nome, item.carregar, item.versao_fn)
+
+    def _restaurar(self, item):
+        """Valor do snapshot em disco do item, ou None se não houver (ou falhar)."""
+        if not item.snapshot:
+            return None
+        try:
+            return spill.abrir_snapshot(item.snapshot)
+        except Exception as e:
+            logger.warning('Cache de lojas: snapshot %s ilegível (%s), recarregando', item.snapshot, e)
+            return None
+
+    def _escolher_vitimas(self, protegida):
+        """Itens a tirar da memória até caber no orçamento: outras lojas primeiro, depois LRU."""
+        excesso = self.total_bytes - self.budget_bytes
+        if excesso <= 0:
+            return []
+        loja_protegida = protegida[0]
+        candidatos = sorted(
+            ((loja, nome, item) for loja, itens in self._lojas.items() for nome, item in itens.items()
+             if not item.em_disco and (loja, nome) != protegida),
+            key=lambda c: (c[0] == loja_protegida, c[2].usado_em),
+        )
+        vitimas = []
+        for loja, nome, item in candidatos:
+            if excesso <= 0:
+                break
+            vitimas.append((loja, nome, item))
+            excesso -= item.tamanho
+        return vitimas
+
+    def _liberar(self, vitimas):
+        # A gravação do snapshot fica fora da trava: as outras requisições seguem
+        for loja, nome, item in vitimas:
+            gravado = bool(item.snapshot)
+            if not gravado and self.spill_dir:
+                base = self._base_snapshot(loja, nome, item.versao)
+                try:
+                    spill.gravar_snapshot(item.valor, base)
+                    item.snapshot = base
+                    gravado = True
+                except Exception as e:
+                    spill.remover_snapshot(base)
+                    logger.info('Cache de lojas: %s/%s sem snapshot (%s), descartado', loja, nome, e)
+            with self._lock:
+                itens = self._lojas.get(loja, {})
+                # Outro thread pode ter trocado o item enquanto gravava
+                if itens.get(nome) is not item:
+                    if item.snapshot:
+                        spill.remover_snapshot(item.snapshot)
+                    continue
+                if gravado:
+                    # Troca pela versão sem valor: quem já pegou esta segue com os dados
+                    itens[nome] = item._em_disco()
+                    self.spills += 1
+                    logger.info('Cache de lojas: %s/%s gravado em disco (orçamento de memória)', loja, nome)
+                else:
+                    del itens[nome]
+                    self.evictions += 1
+                    logger.info('Cache de lojas: %s/%s descartado (orçamento de memória)', loja, nome)
+
+    def _base_snapshot(self, loja, nome, versao):
+        # Uma pasta por processo: cada worker grava e apaga só os seus
+        pasta = os.path.join(self.spill_dir, str(os.getpid()))
+        os.makedirs(pasta, exist_ok=True)
+        chave = hashlib.sha1(str(versao).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(pasta, re.sub(r'[^\w.-]', '_', f'{loja}-{nome}') + '-' + chave)
+
+    def peek(self, loja, nome):
+        """Valor em cache sem conferir versão nem mexer na ordem do LRU."""
+        with self._lock:
+            item = self._lojas.get(loja, {}).get(nome)
+        if item is None:
+            return None
+        if item.em_disco:
+            return self._restaurar(item)
+        return item.valor
+
+    def expire(self, loja):
+        """Força a conferência de versão no próximo acesso aos itens da loja."""
+        with self._lock:
+            for item in self._lojas.get(loja, {}).values():
+                item.verificado_em = float('-inf')
+
+    def invalidate(self, loja=None):
+        with self._lock:
+            if loja is None:
+                removidas = list(self._lojas.values())
+                self._lojas.clear()
+            else:
+                removidas = [self._lojas.pop(loja, {})]
+        for itens in removidas:
+            for item in itens.values():
+                if item.snapshot:
+                    spill.remover_snapshot(item.snapshot)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'orcamento_mb': round(self.budget_bytes / 2 ** 20, 1),
+                'uso_mb': round(self.total_bytes / 2 ** 20, 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'descartes': self.evictions,
+                'gravados_em_disco': self.spills,
+                'restaurados_do_disco': self.restores,
+                'recargas_segundo_plano': self.recargas,
+                'versoes_anteriores_servidas': self.versoes_anteriores,
+                'recarregando': sorted('/'.join(chave) for chave in self._recarregando),
+                'lojas': {
+                    loja: {nome: {'versao': item.versao, 'mb': round(item.tamanho / 2 ** 20, 2),
+                                  'estado': 'disco' if item.em_disco else 'memoria'}
+                           for nome, item in itens.items()}
+                    for loja, itens in self._lojas.items()
+                },
+            }
+
+
+def _limpar_snapshots_orfaos(spill_dir):
+    """Apaga as pastas de snapshots de processos que já terminaram."""
+    try:
+        pastas = os.listdir(spill_dir)
+    except OSError:
+        return
+    for pasta in pastas:
+        if not pasta.isdigit() or int(pasta) == os.getpid():
+            continue
+        try:
+            os.kill(int(pasta), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(spill_dir, pasta), ignore_errors=True)
+        except OSError:
+            pass
+
+
+def get_cache():
+    return current_app.extensions['lojas_cache']
+
+
+def _arquivos(fontes, lojas):
+    return [(loja, fonte) for loja in lojas for fonte in fontes]
+
+
+def _versao_arquivos(fontes, lojas):
+    """Versão combinada atual dos arquivos, sem a fixação da requisição."""
+    return '|'.join(str(file_version(source_path(fonte, loja))) for loja, fonte in _arquivos(fontes, lojas))
+
+
+def _versoes_fixadas():
+    """{(loja, fonte): versão} fixadas na requisição, ou None fora de requisição."""
+    if not has_request_context():
+        return None
+    return g.setdefault('versoes_fontes', {})
+
+
+def versao_fontes(fontes, lojas):
+    """
+    Versão combinada dos arquivos ``fontes`` das ``lojas``.
+
+    Na requisição, cada arquivo fica com a versão da primeira consulta (ou a
+    do dataset já fixado que saiu dele): as chaves e ETags montadas com ela
+    são as dos dados que a requisição está usando.
+    """
+    fixadas = _versoes_fixadas()
+    if fixadas is None:
+        return _versao_arquivos(fontes, lojas)
+    partes = []
+    for loja, fonte in _arquivos(fontes, lojas):
+        if (loja, fonte) not in fixadas:
+            fixadas[(loja, fonte)] = str(file_version(source_path(fonte, loja)))
+        partes.append(fixadas[(loja, fonte)])
+    return '|'.join(partes)
+
+
+def _fixar(nome, loja, carregar, fontes):
+    """
+    ``VersaoDataset`` do dataset para a requisição: a primeira leitura fixa a
+    versão (em ``g``) e as seguintes devolvem a mesma.
+    """
+    cache = get_cache()
+
+    def versao_fn():
+        return _versao_arquivos(fontes, [loja])
+
+    if not has_request_context():
+        return cache.obter(loja, nome, carregar, versao_fn)
+    fixados = g.setdefault('datasets_fixados', {})
+    item = fixados.get((loja, nome))
+    if item is not None:
+        return item
+
+    item = cache.obter(loja, nome, carregar, versao_fn)
+    fixadas = _versoes_fixadas()
+    arquivos = _arquivos(fontes, [loja])
+    versoes = item.versao.split('|')
+    if any(fixadas.get(arquivo, versao) != versao for arquivo, versao in zip(arquivos, versoes)):
+        # A requisição já usou uma versão mais nova dos arquivos (em uma chave
+        # ou ETag) do que a do cache: espera a carga dela em vez da anterior
+        item = cache.obter(loja, nome, carregar, versao_fn, sincrono=True)
+        versoes = item.versao.split('|')
+    for arquivo, versao in zip(arquivos, versoes):
+        fixadas.setdefault(arquivo, versao)
+    fixados[(loja, nome)] = item
+    return item
+
+
+def dataset_fixado(nome, loader, fontes, loja=None):
+    """Como ``dataset``, mas devolve a ``VersaoDataset`` (valor e versão)."""
+    loja = loja or loja_atual()
+    return _fixar(nome, loja, lambda: loader(loja), fontes)
+
+
+def dataset(nome, loader, fontes, loja=None):
+    """
+    Dataset preparado ``nome`` da loja (por padrão a da requisição).
+
+    Na mesma requisição, todas as leituras devolvem a mesma versão.
+
+    Args:
+        loader: função ``loader(loja)`` que lê e prepara os dados
+        fontes: nomes em ``app.datasets.SOURCES`` de que o dataset depende
+    """
+    return dataset_fixado(nome, loader, fontes, loja).valor
+
+
+def dataset_incremental(nome, spec, fontes, loja=None):
+    """
+    Como ``dataset``, mas a recarga compara as linhas com a versão anterior
+    (``app.deltas``): registra o delta e prepara só as linhas afetadas.
+    """
+    loja = loja or loja_atual()
+    cache = get_cache()
+
+    def carregar():
+        return deltas.carregar(spec, loja, _versao_arquivos(fontes, [loja]), cache.peek(loja, nome), nome=nome)
+
+    return _fixar(nome, loja, carregar, fontes).valor.df
+
+
+def mudancas(nome, desde, loja=None):
+    """
+    Mudanças do dataset ``nome`` desde a versão ``desde``.
+
+    Returns:
+        tuple: (versão atual, DataFrame com STATUS ou None se ``desde`` saiu
+        do histórico deste worker)
+    """
+    loja = loja or loja_atual()
+    log = deltas.get_log()
+    return log.versao_atual(loja, nome), log.mudancas_desde(loja, nome, desde)
+
+
+# =============== VISÕES REGIONAIS ===============
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = current_app.config['LOJAS_REGIONAL_WORKERS'] or len(lojas_configuradas())
+            # forkserver: o worker já tem outras threads (app.processos)
+            _pool = criar_pool(max(1, workers))
+        return _pool
+
+
+def executar_por_loja(func, lojas=None):
+    """
+    Roda ``func(loja)`` para cada loja em paralelo (um processo por loja).
+
+    ``func`` precisa ser uma função de módulo que recebe só o código da loja.
+    Lojas que falham ficam de fora do resultado (e vão para o log).
+
+    Returns:
+        dict: {loja: resultado}
+    """
+    lojas = list(lojas or lojas_configuradas())
+    pool = _get_pool()
+    futuros = {loja: pool.submit(executar, func, loja) for loja in lojas}
+    resultados = {}
+    for loja, futuro in futuros.items():
+        try:
+            resultados[loja] = futuro.result(timeout=current_app.config['LOJAS_REGIONAL_TIMEOUT'])
+        except Exception as e:
+            logger.error(f'Erro na visão regional da loja {loja}: {e}')
+    return resultados
+
+
+def consolidado(nome, func, fontes):
+    """
+    Resumo regional: ``func(loja)`` em paralelo para todas as lojas e
+    resultados (DataFrames) concatenados com a coluna LOJA.
+    """
+    lojas = list(lojas_configuradas())
+
+    def carregar():
+        partes = []
+        for loja, df in executar_por_loja(func, lojas).items():
+            if df is not None and not df.empty:
+                partes.append(df.assign(LOJA=loja))
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    return get_cache().get(REGIONAL, nome, carregar, lambda: versao_fontes(fontes, lojas))
+
+
+# =============== FLASK ===============
+
+def _salvar_loja(response):
+    loja = request.args.get('loja')
+    if loja and loja in lojas_configuradas() and request.cookies.get(COOKIE_NAME) != loja:
+        response.set_cookie(COOKIE_NAME, loja, max_age=COOKIE_MAX_AGE, samesite='Lax')
+    return response
+
+
+def _contexto_lojas():
+    return {'lojas': lojas_configuradas(), 'loja_atual': loja_atual()}
+
+
+def lojas_metrics():
+    """Estado do cache de datasets por loja."""
+    return jsonify(get_cache().snapshot())
+
+
+def init_app(app):
+    app.config.setdefault('LOJAS', _lojas_do_ambiente())
+    if not isinstance(app.config['LOJAS'], dict):
+        # PORTAL_LOJAS chega pela configuração do ambiente ainda no formato de texto
+        app.config['LOJAS'] = _lojas_do_ambiente(app.config['LOJAS'])
+    app.config.setdefault('LOJA_PADRAO', next(iter(app.config['LOJAS'])))
+    app.config.setdefault('LOJAS_FONTES', {})
+    app.config.setdefault('LOJAS_MEMORIA_MB', 1024)
+    app.config.setdefault('LOJAS_VERIFICAR_S', 30)
+    app.config.setdefault('LOJAS_REGIONAL_WORKERS', None)
+    app.config.setdefault('LOJAS_REGIONAL_TIMEOUT', 300)
+    configure_stores(app.config['LOJAS_FONTES'])
+    app.config.setdefault('LOJAS_SPILL_DIR', os.path.join(app.instance_path, 'spill'))
+    app.config.setdefault('LOJAS_RECARGA_SEGUNDO_PLANO', True)
+    if app.config['LOJAS_SPILL_DIR']:
+        _limpar_snapshots_orfaos(app.config['LOJAS_SPILL_DIR'])
+    app.extensions['lojas_cache'] = StoreCache(
+        int(float(app.config['LOJAS_MEMORIA_MB']) * 2 ** 20),
+        check_interval=app.config['LOJAS_VERIFICAR_S'],
+        spill_dir=app.config['LOJAS_SPILL_DIR'],
+        app=app,
+        segundo_plano=app.config['LOJAS_RECARGA_SEGUNDO_PLANO'],
+    )
+    app.after_request(_salvar_loja)
+    app.context_processor(_contexto_lojas)
+    app.add_url_rule('/metricas/lojas', 'lojas_metrics', lojas_metrics)
@@ -0,0 +1,190 @@
+// Loading Overlay Control
+function showLoading() {
+    const overlay = document.getElementById('loadingOverlay');
+    if (overlay) {
+        overlay.classList.add('show');
+    }
+}
+
+function hideLoading() {
+    const overlay = document.getElementById('loadingOverlay');
+    if (overlay) {
+        overlay.classList.remove('show');
+    }
+}
+
+// Hide loading when page is fully loaded
+window.addEventListener('load', function() {
+    hideLoading();
+});
+
+// Show loading for navigation links
+document.addEventListener('DOMContentLoaded', function() {
+    // Hide loading overlay on page load
+    hideLoading();
+
+    // Add loading to navigation links that load new pages
+    document.querySelectorAll('a[href]:not([href^="#"]):not([href^="javascript:"])').forEach(link => {
+        link.addEventListener('click', function(e) {
+            // Don't show loading for dropdown toggles
+            if (!this.getAttribute('aria-haspopup')) {
+                showLoading();
+            }
+        });
+    });
+});
+
+// Troca de loja: recarrega a página com ?loja= (o servidor grava o cookie)
+document.addEventListener('DOMContentLoaded', function() {
+    const seletor = document.getElementById('loja-select');
+    if (!seletor) return;
+    seletor.addEventListener('change', function() {
+        const url = new URL(window.location.href);
+        url.searchParams.set('loja', this.value);
+        url.searchParams.delete('page');
+        showLoading();
+        window.location.href = url.toString();
+    });
+});
+
+// Smooth scrolling for anchor links
+document.querySelectorAll('a[href^="#"]').forEach(anchor => {
+    anchor.addEventListener('click', function (e) {
+        e.preventDefault();
+        const target = document.querySelector(this.getAttribute('href'));
+        if (target) {
+            target.scrollIntoView({
+                behavior: 'smooth',
+                block: 'start'
+            });
+        }
+    });
+});
+
+// Add loading animation to external links
+document.querySelectorAll('a[href^="http"]').forEach(link => {
+    link.addEventListener('click', function() {
+        this.innerHTML += ' <span class="loading"></span>';
+    });
+});
+
+// Intersection Observer for animations
+const observerOptions = {
+    threshold: 0.1,
+    rootMargin: '0px 0px -50px 0px'
+};
+
+const observer = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            entry.target.style.opacity = '1';
+            entry.target.style.transform = 'translateY(0)';
+        }
+    });
+}, observerOptions);
+
+// Observe feature cards
+document.querySelectorAll('.feature-card, .stat-card').forEach(card => {
+    card.style.opacity = '0';
+    card.style.transform = 'translateY(20px)';
+    card.style.transition = 'opacity 0.6s ease, transform 0.6s ease';
+    observer.observe(card);
+});
+
+// Add hover effects to navigation
+document.querySelectorAll('.nav-link').forEach(link => {
+    link.addEventListener('mouseenter', function() {
+        this.style.transform = 'translateY(-2px) scale(1.05)';
+    });
+
+    link.addEventListener('mouseleave', function() {
+        this.style.transform = 'translateY(0) scale(1)';
+    });
+});
+
+// Função para carregar conteúdo ISV via AJAX do blueprint
+function loadISVContent() {
+    console.log('=== loadISVContent INICIADA ===');
+
+    try {
+        const isvSection = document.getElementById('isv-content');
+        const welcomeSection = document.getElementById('welcome-section');
+
+        console.log('Elementos encontrados:', {
+            isvSection: !!isvSection,
+            welcomeSection: !!welcomeSection
+        });
+
+        if (!isvSection) {
+            console.error('Elemento isv-content não encontrado!');
+            return;
+        }
+
+        // Mostrar loading
+        isvSection.innerHTML = '<div class="loading-spinner" style="text-align: center; padding: 50px;">Carregando dados ISV...</div>';
+
+        // Mostrar seção ISV e ocultar outras
+        isvSection.style.display = 'block';
+        if (welcomeSection) welcomeSection.style.display = 'none';
+
+        console.log('Fazendo fetch para /controle-isv/content...');
+
+        // Carregar template HTML do blueprint ISV
+        fetch('/controle-isv/content')
+        .then(response => response.text())
+        .then(html => {
+            isvSection.innerHTML = html;
+            console.log('Template ISV carregado com sucesso');
+
+            // Função para aguardar jQuery estar disponível
+            function waitForJQuery(callback) {
+                if (typeof $ !== 'undefined' && $.fn && $.fn.dataTable) {
+                    callback();
+                } else {
+                    console.log('Aguardando jQuery e DataTables...');
+                    setTimeout(() => waitForJQuery(callback), 100);
+                }
+            }
+
+            // Verificar se o script já foi carregado
+            if (!document.querySelector('script[src="/controle-isv/static/isv_functions.js"]')) {
+                // Carregar e executar o JavaScript do ISV
+                const script = document.createElement('script');
+                script.src = '/controle-isv/static/isv_functions.js';
+                script.onload = function() {
+                    console.log('JavaScript ISV carregado, aguardando jQuery...');
+                    waitForJQuery(() => {
+                        console.log('jQuery disponível, iniciando loadISVData...');
+                        if (typeof loadISVData === 'function') {
+                            loadISVData();
+                        } else {
+                            console.error('Função loadISVData não encontrada');
+                        }
+                    });
+                };
+                script.onerror = function() {
+                    console.error('Erro ao carregar script ISV');
+                };
+                document.head.appendChild(script);
+            } else {
+                // Script já carregado, executar diretamente
+                console.log('Script ISV já carregado, aguardando jQuery...');
+                waitForJQuery(() => {
+                    console.log('jQuery disponível, executando loadISVData...');
+                    if (typeof loadISVData === 'function') {
+                        loadISVData();
+                    } else {
+                        console.error('Função loadISVData não encontrada');
+                    }
+                });
+            }
+        })
+        .catch(error => {
+            console.error('Erro ao carregar template ISV:', error);
+            isvSection.innerHTML = '<div class="error-message" style="color: red; text-align: center; padding: 50px;">Erro ao carregar página ISV: ' + error.message + '</div>';
+        });
+    } catch (error) {
+        console.error('Erro geral na função loadISVContent:', error);
+        alert('Erro ao carregar ISV: ' + error.message);
+    }
+}
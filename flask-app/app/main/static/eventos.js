@@ -0,0 +1,110 @@
+// Atualização ao vivo: os blocos marcados com data-fonte="<fonte> ..." são
+// buscados de novo quando o servidor avisa (SSE em /eventos) que uma dessas
+// fontes ganhou versão nova. Só os blocos afetados são trocados; o restante
+// da página, filtros e rolagem ficam como estão.
+(function () {
+    const script = document.currentScript;
+    const URL_EVENTOS = script.dataset.eventosUrl;
+    const URL_VERSOES = script.dataset.versoesUrl;
+    const INTERVALO_CONSULTA = 60000;
+    // Espalha as recargas das várias telas abertas no mesmo instante
+    const ESPALHAR_MS = 2000;
+
+    let versoes = {};
+    const pendentes = new Set();
+    let agendado = null;
+
+    function blocosAfetados(fontes) {
+        return Array.from(document.querySelectorAll('[data-fonte]')).filter(bloco =>
+            bloco.id && bloco.dataset.fonte.split(/\s+/).some(fonte => fontes.has(fonte)));
+    }
+
+    function atualizar() {
+        agendado = null;
+        if (document.hidden) {
+            // Aba em segundo plano: atualiza quando voltar a ficar visível
+            return;
+        }
+        const blocos = blocosAfetados(pendentes);
+        pendentes.clear();
+        if (!blocos.length) {
+            return;
+        }
+        fetch(window.location.href, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.text();
+            })
+            .then(html => {
+                const recebido = document.createElement('template');
+                recebido.innerHTML = html;
+                blocos.forEach(bloco => {
+                    const novo = recebido.content.getElementById(bloco.id);
+                    if (novo) {
+                        bloco.replaceWith(novo);
+                        document.dispatchEvent(new CustomEvent('fragment:loaded', { detail: { id: bloco.id } }));
+                    }
+                });
+            })
+            .catch(error => console.error('Erro ao atualizar dados:', error));
+    }
+
+    function marcarMudanca(fonte) {
+        pendentes.add(fonte);
+        if (agendado === null) {
+            agendado = setTimeout(atualizar, Math.random() * ESPALHAR_MS);
+        }
+    }
+
+    function comparar(atuais) {
+        Object.keys(atuais).forEach(fonte => {
+            if (fonte in versoes && versoes[fonte] !== atuais[fonte]) {
+                marcarMudanca(fonte);
+            }
+        });
+        versoes = atuais;
+    }
+
+    function consultar() {
+        // Sem SSE (servidor lotado ou proxy que não repassa o fluxo)
+        fetch(URL_VERSOES)
+            .then(response => response.ok ? response.json() : null)
+            .then(dados => dados && comparar(dados.versoes))
+            .catch(() => {})
+            .finally(() => setTimeout(consultar, INTERVALO_CONSULTA));
+    }
+
+    function conectar() {
+        const fonte = new EventSource(URL_EVENTOS);
+        fonte.addEventListener('versoes', e => comparar(JSON.parse(e.data).versoes));
+        fonte.addEventListener('versao', e => {
+            const dados = JSON.parse(e.data);
+            versoes[dados.fonte] = dados.versao;
+            marcarMudanca(dados.fonte);
+        });
+        fonte.addEventListener('error', () => {
+            // Erros de rede reconectam sozinhos; resposta HTTP de erro (503) fecha
+            if (fonte.readyState === EventSource.CLOSED) {
+                setTimeout(consultar, INTERVALO_CONSULTA);
+            }
+        });
+    }
+
+    document.addEventListener('visibilitychange', function () {
+        if (!document.hidden && pendentes.size && agendado === null) {
+            atualizar();
+        }
+    });
+
+    document.addEventListener('DOMContentLoaded', function () {
+        if (URL_EVENTOS && document.querySelector('[data-fonte]')) {
+            if (window.EventSource) {
+                conectar();
+            } else {
+                consultar();
+            }
+        }
+    });
+})();
@@ -0,0 +1,61 @@
+// Paginação parcial: os links de página dentro de um container [data-fragment]
+// buscam apenas o fragmento da tabela e trocam o container, sem recarregar o
+// restante da página (CSS/JS ficam no cache do navegador).
+(function () {
+    function loadFragment(container, url, push) {
+        return fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.text();
+            })
+            .then(html => {
+                const id = container.id;
+                container.outerHTML = html;
+                if (push) {
+                    history.pushState({ fragment: id }, '', url);
+                }
+                const novo = document.getElementById(id);
+                if (novo) {
+                    novo.scrollIntoView({ behavior: 'smooth', block: 'start' });
+                }
+                document.dispatchEvent(new CustomEvent('fragment:loaded', { detail: { id: id } }));
+            })
+            .catch(error => {
+                // Se a troca parcial falhar, cai para a navegação normal
+                console.error('Erro ao carregar fragmento:', error);
+                window.location.href = url;
+            })
+            .finally(() => {
+                document.body.classList.remove('loading');
+                if (typeof hideLoading === 'function') {
+                    hideLoading();
+                }
+            });
+    }
+
+    document.addEventListener('click', function (e) {
+        const link = e.target.closest('[data-fragment] a.page-link');
+        if (!link || e.button !== 0 || e.ctrlKey || e.metaKey || e.shiftKey) {
+            return;
+        }
+        e.preventDefault();
+        loadFragment(link.closest('[data-fragment]'), link.href, true);
+    });
+
+    window.addEventListener('popstate', function (e) {
+        const container = e.state && e.state.fragment && document.getElementById(e.state.fragment);
+        if (container) {
+            loadFragment(container, window.location.href, false);
+        }
+    });
+
+    document.addEventListener('DOMContentLoaded', function () {
+        // Registra o estado inicial para que o "voltar" restaure a primeira página
+        const container = document.querySelector('[data-fragment]');
+        if (container && !history.state) {
+            history.replaceState({ fragment: container.id }, '');
+        }
+    });
+})();
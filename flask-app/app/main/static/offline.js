@@ -0,0 +1,248 @@
+// Modo offline dos coletores: os datasets (ruptura, vencimento, ISV) ficam no
+// IndexedDB na versão em que foram baixados; busca, filtro e paginação rodam
+// aqui, sem servidor. Com rede, cada dataset pede só o que mudou desde a sua
+// versão (?desde=); se o servidor não tem mais essa versão (410) ou a loja
+// mudou, baixa tudo de novo. O service worker (/sw.js) guarda a página.
+(function () {
+    const pagina = document.getElementById('offline-page');
+    if (!pagina) {
+        return;
+    }
+    const LOJA = pagina.dataset.loja;
+    const POR_PAGINA = 50;
+    const BANCO = 'portal-offline';
+
+    const abas = Array.from(pagina.querySelectorAll('.offline-aba'));
+    const status = document.getElementById('offline-status');
+    const busca = document.getElementById('offline-busca');
+    const faceta = document.getElementById('offline-faceta');
+    const resumo = document.getElementById('offline-resumo');
+    const cabecalho = document.getElementById('offline-cabecalho');
+    const corpo = document.getElementById('offline-linhas');
+    const rotuloPagina = document.getElementById('offline-pagina');
+    const anterior = document.getElementById('offline-anterior');
+    const proxima = document.getElementById('offline-proxima');
+
+    let banco = null;
+    let aba = abas[0];
+    let linhas = [];
+    let colunas = [];
+    let filtradas = [];
+    let paginaAtual = 0;
+    let sincronizando = false;
+
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register(pagina.dataset.swUrl, { scope: '/' })
+            .catch(erro => console.warn('Service worker não registrado:', erro));
+    }
+
+    // =============== INDEXEDDB ===============
+
+    function requisicao(req) {
+        return new Promise((resolve, reject) => {
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
+        });
+    }
+
+    function concluir(tx) {
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = () => resolve();
+            tx.onerror = tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    function abrirBanco() {
+        const req = indexedDB.open(BANCO, 1);
+        req.onupgradeneeded = () => {
+            const db = req.result;
+            // Linhas de todos os datasets, pela chave (dataset, _id)
+            const store = db.createObjectStore('linhas', { keyPath: ['_dataset', '_id'] });
+            store.createIndex('dataset', '_dataset');
+            // Versão, loja e colunas de cada dataset guardado
+            db.createObjectStore('meta', { keyPath: 'dataset' });
+        };
+        return requisicao(req);
+    }
+
+    function lerMeta(nome) {
+        return requisicao(banco.transaction('meta').objectStore('meta').get(nome));
+    }
+
+    function lerLinhas(nome) {
+        const indice = banco.transaction('linhas').objectStore('linhas').index('dataset');
+        return requisicao(indice.getAll(IDBKeyRange.only(nome)));
+    }
+
+    function gravar(nome, meta, upserts, removidos, substituir) {
+        const tx = banco.transaction(['linhas', 'meta'], 'readwrite');
+        const store = tx.objectStore('linhas');
+        if (substituir) {
+            store.delete(IDBKeyRange.bound([nome], [nome, []]));
+        }
+        removidos.forEach(id => store.delete([nome, id]));
+        upserts.forEach(linha => {
+            linha._dataset = nome;
+            store.put(linha);
+        });
+        tx.objectStore('meta').put(meta);
+        return concluir(tx);
+    }
+
+    // =============== SINCRONIZAÇÃO ===============
+
+    function buscarJson(url) {
+        return fetch(url, { cache: 'no-store' }).then(response => {
+            if (response.status === 410) {
+                return null;
+            }
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.json();
+        });
+    }
+
+    function sincronizar(botao, meta) {
+        const nome = botao.dataset.dataset;
+        const base = botao.dataset.url + '?loja=' + encodeURIComponent(LOJA);
+        const delta = meta && meta.loja === LOJA && meta.versao;
+
+        const pedido = delta ? buscarJson(base + '&desde=' + encodeURIComponent(meta.versao)) : Promise.resolve(null);
+        return pedido.then(dados => {
+            if (dados) {
+                const novo = Object.assign({}, meta, { versao: dados.versao, sincronizado: Date.now() });
+                return gravar(nome, novo, dados.upserts, dados.removidos, false);
+            }
+            // Sem cópia, outra loja ou versão fora do histórico: tudo de novo
+            return buscarJson(base).then(completo => {
+                const novo = {
+                    dataset: nome,
+                    loja: completo.loja,
+                    versao: completo.versao,
+                    colunas: completo.colunas,
+                    sincronizado: Date.now(),
+                };
+                return gravar(nome, novo, completo.linhas, [], true);
+            });
+        });
+    }
+
+    function sincronizarTudo() {
+        if (sincronizando || !navigator.onLine) {
+            mostrarStatus();
+            return Promise.resolve();
+        }
+        sincronizando = true;
+        status.textContent = 'Sincronizando...';
+        // Um dataset por vez: o aparelho tem pouca memória e banda
+        return abas.reduce((fila, botao) => fila
+            .then(() => lerMeta(botao.dataset.dataset))
+            .then(meta => sincronizar(botao, meta))
+            .catch(erro => console.warn('Falha ao sincronizar ' + botao.dataset.dataset + ':', erro)),
+            Promise.resolve())
+            .then(() => {
+                sincronizando = false;
+                return carregarAba(aba);
+            });
+    }
+
+    // =============== TELA ===============
+
+    function mostrarStatus(meta) {
+        const quando = meta && meta.sincronizado
+            ? ' · dados de ' + new Date(meta.sincronizado).toLocaleString('pt-BR')
+            : '';
+        status.textContent = (navigator.onLine ? 'Online' : 'Offline') + quando;
+        status.classList.toggle('offline', !navigator.onLine);
+    }
+
+    function carregarAba(botao) {
+        aba = botao;
+        abas.forEach(b => b.classList.toggle('ativa', b === botao));
+        const nome = botao.dataset.dataset;
+        return Promise.all([lerMeta(nome), lerLinhas(nome)]).then(([meta, registros]) => {
+            linhas = registros;
+            colunas = botao.dataset.colunas ? JSON.parse(botao.dataset.colunas) : ((meta && meta.colunas) || []);
+            preencherFaceta(botao.dataset.faceta);
+            mostrarStatus(meta);
+            filtrar();
+        });
+    }
+
+    function preencherFaceta(coluna) {
+        const valores = coluna
+            ? Array.from(new Set(linhas.map(linha => linha[coluna]).filter(v => v !== null && v !== ''))).sort()
+            : [];
+        faceta.hidden = !coluna;
+        faceta.innerHTML = '';
+        faceta.add(new Option('Todos', ''));
+        valores.forEach(valor => faceta.add(new Option(valor, valor)));
+    }
+
+    function filtrar() {
+        const termo = busca.value.trim().toLowerCase();
+        const coluna = aba.dataset.faceta;
+        const escolhido = faceta.value;
+        filtradas = linhas.filter(linha =>
+            (!escolhido || String(linha[coluna]) === escolhido)
+            && (!termo || colunas.some(c => linha[c] !== null && String(linha[c]).toLowerCase().includes(termo))));
+        paginaAtual = 0;
+        desenhar();
+    }
+
+    function desenhar() {
+        const paginas = Math.max(1, Math.ceil(filtradas.length / POR_PAGINA));
+        paginaAtual = Math.min(paginaAtual, paginas - 1);
+
+        const titulo = document.createElement('tr');
+        colunas.forEach(coluna => {
+            const th = document.createElement('th');
+            th.textContent = coluna;
+            titulo.appendChild(th);
+        });
+        cabecalho.replaceChildren(titulo);
+
+        const fragmento = document.createDocumentFragment();
+        filtradas.slice(paginaAtual * POR_PAGINA, (paginaAtual + 1) * POR_PAGINA).forEach(linha => {
+            const tr = document.createElement('tr');
+            colunas.forEach(coluna => {
+                const td = document.createElement('td');
+                td.textContent = linha[coluna] === null || linha[coluna] === undefined ? '' : linha[coluna];
+                tr.appendChild(td);
+            });
+            fragmento.appendChild(tr);
+        });
+        corpo.replaceChildren(fragmento);
+
+        resumo.textContent = linhas.length
+            ? filtradas.length + ' de ' + linhas.length + ' itens'
+            : 'Nenhum dado guardado neste aparelho; conecte-se à rede para baixar.';
+        rotuloPagina.textContent = 'Página ' + (paginaAtual + 1) + ' de ' + paginas;
+        anterior.disabled = paginaAtual === 0;
+        proxima.disabled = paginaAtual >= paginas - 1;
+    }
+
+    abas.forEach(botao => botao.addEventListener('click', () => {
+        busca.value = '';
+        carregarAba(botao);
+    }));
+    busca.addEventListener('input', filtrar);
+    faceta.addEventListener('change', filtrar);
+    anterior.addEventListener('click', () => { paginaAtual -= 1; desenhar(); });
+    proxima.addEventListener('click', () => { paginaAtual += 1; desenhar(); });
+    window.addEventListener('online', sincronizarTudo);
+    window.addEventListener('offline', () => mostrarStatus());
+
+    abrirBanco()
+        .then(db => {
+            banco = db;
+            // Mostra a cópia local na hora e sincroniza em seguida
+            return carregarAba(aba);
+        })
+        .then(sincronizarTudo)
+        .catch(erro => {
+            status.textContent = 'Armazenamento local indisponível';
+            console.error(erro);
+        });
+})();
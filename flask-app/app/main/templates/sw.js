@@ -0,0 +1,58 @@
+// Service worker do modo offline (gerado por app/offline.py).
+// Guarda o app shell na instalação; navegações e assets vêm da rede quando
+// ela responde e do cache quando não responde. Os dados não passam por aqui:
+// ficam no IndexedDB, sincronizados por main/static/offline.js.
+const CACHE = 'portal-shell-{{ versao }}';
+const SHELL = {{ shell|tojson }};
+const PAGINA_OFFLINE = SHELL[0];
+// Respostas que nunca vêm do cache: dados, SSE e downloads
+const SEM_CACHE = ['/offline/api', '/eventos', '/relatorios/', '/metricas/', '/saude', '/admin/'];
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(CACHE).then(cache => cache.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys()
+        .then(nomes => Promise.all(nomes
+            .filter(nome => nome.startsWith('portal-shell-') && nome !== CACHE)
+            .map(nome => caches.delete(nome))))
+        .then(() => self.clients.claim()));
+});
+
+function guardar(request, response) {
+    // Respostas opacas (CDN sem CORS) também servem para o shell
+    if (response.ok || response.type === 'opaque') {
+        const copia = response.clone();
+        caches.open(CACHE).then(cache => cache.put(request, copia));
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (url.origin === self.location.origin && SEM_CACHE.some(prefixo => url.pathname.startsWith(prefixo))) {
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        // Páginas: rede primeiro; sem rede, a cópia da página ou o modo offline
+        event.respondWith(fetch(request)
+            .then(response => url.pathname === PAGINA_OFFLINE ? guardar(request, response) : response)
+            .catch(() => caches.match(request).then(copia => copia || caches.match(PAGINA_OFFLINE))));
+        return;
+    }
+
+    // Assets (os locais têm o hash na URL) e bibliotecas das CDNs: cache
+    // primeiro, rede para o que faltar. O resto (fragmentos, APIs) vai à rede.
+    const asset = url.origin !== self.location.origin
+        || url.pathname.startsWith('/assets/') || url.pathname.includes('/static/');
+    if (!asset) {
+        return;
+    }
+    event.respondWith(caches.match(request).then(copia => copia || fetch(request).then(response => guardar(request, response))));
+});
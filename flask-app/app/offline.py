@@ -0,0 +1,308 @@
+"""
+Modo offline dos coletores (handhelds): cópia local dos dados e sincronização por delta.
+
+Nos corredores o Wi-Fi cai o tempo todo. A página ``/offline/`` é registrada
+com um service worker (``/sw.js``, main/templates/sw.js) que guarda o
+"app shell" (a página, CSS, JS e imagens) e responde com ele quando a rede
+falha. Os datasets registrados pelos blueprints com
+``registrar_offline(DatasetOffline(...))`` (ruptura, vencimento, ISV) ficam
+no IndexedDB do aparelho na versão em que foram baixados; filtro e paginação
+rodam no navegador (main/static/offline.js), sem ida ao servidor.
+
+Cada linha tem um ``_id`` estável: o hash da chave do dataset (produto,
+produto + vencimento...) mais o número da ocorrência, como em
+``app.deltas``. Por versão dos arquivos de origem, o hash do conteúdo de
+cada linha fica gravado em ``OFFLINE_DIR`` (só os hashes, ``OFFLINE_HISTORICO``
+versões por loja e dataset), então qualquer worker (ou nó, com a pasta em
+disco compartilhado) responde o delta de uma versão que outro montou. Ao
+reconectar, o cliente pede ``?desde=<versão>`` e recebe só as linhas novas ou
+alteradas e os ids removidos; se a versão saiu do histórico a resposta é 410
+e o cliente baixa tudo de novo.
+
+Rotas:
+    GET /offline/                    página do modo offline
+    GET /offline/api                 datasets disponíveis e versão atual de cada um
+    GET /offline/api/<nome>          todas as linhas da versão atual
+    GET /offline/api/<nome>?desde=V  linhas alteradas/novas e ids removidos desde V
+    GET /sw.js                       service worker (escopo na raiz do site)
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from flask import Blueprint, current_app, jsonify, make_response, render_template, request, url_for
+
+from app.assets import asset_url
+from app.deltas import hashes_por_chave, para_registros
+from app.lazy import lazy_import
+from app.lojas import dataset_fixado, loja_atual, versao_fontes
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+offline = Blueprint('offline', __name__)
+
+# Datasets registrados pelos blueprints, por nome
+_datasets = {}
+
+# Assets do app shell (endpoint, arquivo), guardados junto com a página
+SHELL_ASSETS = [
+    ('main.static', 'style.css'),
+    ('main.static', 'base.css'),
+    ('main.static', 'base.js'),
+    ('main.static', 'fragments.js'),
+    ('main.static', 'eventos.js'),
+    ('main.static', 'offline.css'),
+    ('main.static', 'offline.js'),
+    ('main.static', 'imagem/atacadao.png'),
+]
+
+
+class DatasetOffline:
+    """Um dataset disponível no modo offline."""
+
+    def __init__(self, nome, titulo, fontes, carregar, chave, colunas=None, faceta=None):
+        """
+        Args:
+            carregar: ``carregar(loja)`` -> DataFrame preparado da loja
+            chave: colunas que identificam a linha (o ``_id`` sai delas)
+            colunas: colunas enviadas ao aparelho; padrão todas
+            faceta: coluna do filtro por lista (grupo, fornecedor...)
+        """
+        self.nome = nome
+        self.titulo = titulo
+        self.fontes = tuple(fontes)
+        self.carregar = carregar
+        self.chave = list(chave)
+        self.colunas = list(colunas) if colunas else None
+        self.faceta = faceta
+
+
+def registrar_offline(ds):
+    """Registra um dataset para o modo offline."""
+    _datasets[ds.nome] = ds
+    return ds
+
+
+class CopiaOffline:
+    """Versão de um dataset como o aparelho a recebe: linhas e hash de cada ``_id``."""
+
+    def __init__(self, df, hashes):
+        self.df = df
+        self.hashes = hashes
+
+
+class HistoricoOffline:
+    """
+    Hashes das linhas das últimas versões de cada (loja, dataset).
+
+    Cada versão vira um arquivo ``.npz`` em ``pasta/<loja>/<dataset>/``
+    (gravado de forma atômica), lido por qualquer worker; as versões lidas
+    ou gravadas ficam também em memória. Acima de ``historico`` versões por
+    (loja, dataset), as mais antigas saem.
+    """
+
+    def __init__(self, pasta, historico=12):
+        self.pasta = pasta
+        self.historico = historico
+        self._versoes = {}
+        self._lock = threading.Lock()
+
+    def _caminho(self, loja, nome, versao):
+        pasta = os.path.join(self.pasta, re.sub(r'[^\w.-]', '_', str(loja)), re.sub(r'[^\w.-]', '_', nome))
+        return pasta, os.path.join(pasta, hashlib.sha1(str(versao).encode('utf-8')).hexdigest()[:20] + '.npz')
+
+    def _lembrar(self, loja, nome, versao, hashes):
+        with self._lock:
+            versoes = self._versoes.setdefault((loja, nome), OrderedDict())
+            versoes[versao] = hashes
+            versoes.move_to_end(versao)
+            while len(versoes) > self.historico:
+                versoes.popitem(last=False)
+
+    def registrar(self, loja, nome, versao, hashes):
+        with self._lock:
+            if versao in self._versoes.get((loja, nome), {}):
+                return
+        self._lembrar(loja, nome, versao, hashes)
+        pasta, caminho = self._caminho(loja, nome, versao)
+        try:
+            os.makedirs(pasta, exist_ok=True)
+            if not os.path.exists(caminho):
+                tmp = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+                np.savez(tmp, chave=hashes.index.get_level_values(0).to_numpy(),
+                         ocorrencia=hashes.index.get_level_values(1).to_numpy(), hashes=hashes.to_numpy())
+                os.replace(tmp, caminho)
+            self._podar(pasta)
+        except OSError as e:
+            logger.warning('Modo offline: histórico de %s/%s não gravado (%s)', loja, nome, e)
+
+    def _podar(self, pasta):
+        arquivos = sorted((os.path.join(pasta, n) for n in os.listdir(pasta) if n.endswith('.npz') and '.tmp' not in n),
+                          key=os.path.getmtime)
+        for caminho in arquivos[:max(0, len(arquivos) - self.historico)]:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+    def hashes(self, loja, nome, versao):
+        """Hashes da ``versao`` ou None se ela não está no histórico."""
+        with self._lock:
+            hashes = self._versoes.get((loja, nome), {}).get(versao)
+        if hashes is not None:
+            return hashes
+        try:
+            with np.load(self._caminho(loja, nome, versao)[1]) as dados:
+                indice = pd.MultiIndex.from_arrays([dados['chave'], dados['ocorrencia']])
+                hashes = pd.Series(dados['hashes'], index=indice)
+        except (OSError, KeyError, ValueError):
+            return None
+        self._lembrar(loja, nome, versao, hashes)
+        return hashes
+
+
+def get_historico():
+    return current_app.extensions['offline']
+
+
+def _ids(indice):
+    """``_id`` de cada linha: hash da chave e número da ocorrência."""
+    return [f'{int(h):016x}-{int(o)}' for h, o in indice]
+
+
+def montar_copia(ds, loja):
+    """Linhas do dataset na versão atual das fontes, com o hash de cada linha."""
+    df = ds.carregar(loja)
+    colunas = list(ds.colunas or df.columns)
+    colunas += [c for c in ds.chave if c not in colunas]
+    df = df.reindex(columns=colunas).reset_index(drop=True)
+
+    hashes = hashes_por_chave(df, ds.chave)
+    df.index = hashes.index
+    return CopiaOffline(df, hashes)
+
+
+def copia_offline(ds, loja=None):
+    """
+    (versão, ``CopiaOffline``) do dataset da loja (a da requisição por padrão).
+
+    A versão é a da cópia fixada na requisição, e os hashes dela ficam no
+    histórico com essa mesma versão.
+    """
+    loja = loja or loja_atual()
+    fixado = dataset_fixado('offline_' + ds.nome, lambda loja: montar_copia(ds, loja), ds.fontes, loja=loja)
+    get_historico().registrar(loja, ds.nome, fixado.versao, fixado.valor.hashes)
+    return fixado.versao, fixado.valor
+
+
+def _registros(df):
+    registros = para_registros(df.reset_index(drop=True))
+    for registro, _id in zip(registros, _ids(df.index)):
+        registro['_id'] = _id
+    return registros
+
+
+def mudancas_desde(copia, anteriores):
+    """
+    Linhas novas ou alteradas e ids removidos entre os hashes ``anteriores`` e a cópia atual.
+
+    Returns:
+        tuple: (DataFrame das linhas novas/alteradas, lista de ids removidos)
+    """
+    atuais = copia.hashes
+    existia = atuais.index.isin(anteriores.index)
+    mudou = ~existia | (atuais.to_numpy() != anteriores.reindex(atuais.index).to_numpy())
+    removidos = anteriores.index[~anteriores.index.isin(atuais.index)]
+    return copia.df[mudou], _ids(removidos)
+
+
+@offline.route('/offline/')
+def pagina():
+    datasets = [{
+        'nome': ds.nome,
+        'titulo': ds.titulo,
+        'colunas': ds.colunas,
+        'faceta': ds.faceta,
+        'url': url_for('offline.api_dataset', nome=ds.nome),
+    } for ds in _datasets.values()]
+    return render_template('offline.html', datasets=datasets)
+
+
+@offline.route('/offline/api')
+def api_datasets():
+    """Versão atual de cada dataset offline da loja (o aparelho compara com a sua)."""
+    loja = loja_atual()
+    return jsonify({
+        'success': True,
+        'loja': loja,
+        'datasets': {nome: versao_fontes(ds.fontes, [loja]) for nome, ds in _datasets.items()},
+    })
+
+
+@offline.route('/offline/api/<nome>')
+def api_dataset(nome):
+    """
+    Linhas do dataset para o IndexedDB do aparelho.
+
+    Sem ``desde``: todas as linhas. Com ``desde``: só as novas/alteradas
+    (``upserts``) e os ``removidos``; 410 se a versão saiu do histórico.
+    """
+    ds = _datasets.get(nome)
+    if ds is None:
+        return jsonify({'success': False, 'error': 'Dataset não disponível offline'}), 404
+
+    loja = loja_atual()
+    versao, copia = copia_offline(ds, loja)
+    resposta = {'success': True, 'nome': nome, 'loja': loja, 'versao': versao}
+
+    desde = request.args.get('desde', '')
+    if not desde:
+        resposta.update({
+            'chave': ds.chave,
+            'colunas': list(copia.df.columns),
+            'total': len(copia.df),
+            'linhas': _registros(copia.df),
+        })
+        return jsonify(resposta)
+
+    if desde == versao:
+        return jsonify(dict(resposta, desde=desde, upserts=[], removidos=[]))
+
+    anteriores = get_historico().hashes(loja, nome, desde)
+    if anteriores is None:
+        return jsonify(dict(resposta, success=False, error='Versão fora do histórico, baixe tudo de novo')), 410
+
+    alteradas, removidos = mudancas_desde(copia, anteriores)
+    return jsonify(dict(resposta, desde=desde, upserts=_registros(alteradas), removidos=removidos))
+
+
+def urls_shell():
+    """URLs do app shell guardadas pelo service worker na instalação."""
+    return [url_for('offline.pagina')] + [asset_url(endpoint, filename=arquivo) for endpoint, arquivo in SHELL_ASSETS]
+
+
+@offline.route('/sw.js')
+def service_worker():
+    """Service worker na raiz, para controlar as páginas do portal inteiro."""
+    shell = urls_shell()
+    # O nome do cache muda quando algum asset muda; o worker novo apaga os antigos
+    versao = hashlib.sha1(json.dumps(shell).encode('utf-8')).hexdigest()[:12]
+    resposta = make_response(render_template('sw.js', shell=shell, versao=versao))
+    resposta.mimetype = 'application/javascript'
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['Service-Worker-Allowed'] = '/'
+    return resposta
+
+
+def init_app(app):
+    app.config.setdefault('OFFLINE_HISTORICO', 12)
+    app.config.setdefault('OFFLINE_DIR', os.path.join(app.instance_path, 'offline'))
+    app.extensions['offline'] = HistoricoOffline(app.config['OFFLINE_DIR'], app.config['OFFLINE_HISTORICO'])
+    app.register_blueprint(offline)
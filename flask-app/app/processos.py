@@ -0,0 +1,53 @@
+"""
+Pools de processos criados pelos workers (exportações e visões regionais).
+
+O worker ``gthread`` já tem outras threads rodando quando o primeiro pool é
+criado (eventos, recarga das lojas, aquecimento, perfilador). Um ``fork``
+nesse momento copia travas que outra thread pode estar segurando (logging,
+import, ``LazyModule``) e o filho pode travar até o timeout do job. Por isso
+os pools usam o contexto ``forkserver``: os filhos nascem de um processo
+limpo, sem threads.
+
+Sem herdar a memória do worker, cada filho monta o próprio app uma vez
+(``create_app`` com as lojas e os caminhos do worker, o que refaz o
+``configure_stores``) e roda as tarefas dentro do app context dele, como
+``app.relatorios`` já faz na geração dos relatórios.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+
+CONTEXTO = 'forkserver'
+
+# Configuração do worker repassada aos filhos (pode ter vindo do create_app(config))
+CONFIG_REPASSADA = ('LOJAS', 'LOJA_PADRAO', 'LOJAS_FONTES')
+
+_app_processo = None
+
+
+def criar_pool(max_workers):
+    """``ProcessPoolExecutor`` em ``forkserver`` com os filhos já configurados como o worker."""
+    config = {nome: current_app.config[nome] for nome in CONFIG_REPASSADA if nome in current_app.config}
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(CONTEXTO),
+        initializer=_iniciar_processo,
+        initargs=(config, os.environ.get('PORTAL_DATA_DIR')),
+    )
+
+
+def _iniciar_processo(config, data_dir):
+    """Monta o app uma vez em cada processo do pool."""
+    global _app_processo
+    if data_dir:
+        os.environ['PORTAL_DATA_DIR'] = data_dir
+    from app import create_app
+    _app_processo = create_app(config)
+
+
+def executar(func, *args):
+    """Roda ``func(*args)`` no processo do pool, dentro do app context dele."""
+    with _app_processo.app_context():
+        return func(*args)
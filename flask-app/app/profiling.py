@@ -0,0 +1,348 @@
+"""
+Captura de perfil (profiling) de requisições sob demanda, em produção.
+
+Só existe com ``PROFILE_TOKEN`` configurado (variável ``PORTAL_ADMIN_TOKEN``);
+sem o token nenhum gancho é registrado e o custo é zero. Com o token, a
+requisição que trouxer o cabeçalho ``X-Profile: <token>`` (ou
+``?_profile=<token>``) roda sob um perfilador. Prefira o cabeçalho: o
+parâmetro deixa o token no log de acesso do servidor e do proxy. O caminho
+guardado na captura sai sem ``_profile``, ``_profile_mode`` e ``token``.
+
+- ``amostragem`` (padrão): uma thread lê a pilha da thread da requisição a
+  cada ``PROFILE_INTERVALO_MS`` ms. Custo baixo e pilhas completas, que
+  viram o arquivo ``.folded`` (formato aceito pelo flamegraph.pl e pelo
+  speedscope);
+- ``cprofile`` (``X-Profile-Mode: cprofile`` ou ``_profile_mode=cprofile``):
+  determinístico, conta todas as chamadas; baixa como ``.prof`` (pstats,
+  para snakeviz/flameprof).
+
+Cada captura guarda as funções mais caras e a árvore de chamadas em
+``PROFILE_DIR`` (padrão instance/perfis), que funciona como buffer circular:
+só as ``PROFILE_CAPTURAS`` mais recentes ficam. Como é uma pasta, todos os
+workers do gunicorn do nó aparecem na lista.
+
+Rotas (exigem o token em ``?token=``, ``X-Admin-Token`` ou no cookie gravado
+pela primeira visita):
+    GET /admin/perfis                   lista de capturas
+    GET /admin/perfis/<id>              funções mais caras e árvore
+    GET /admin/perfis/<id>/download     .folded (amostragem) ou .prof
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import (Blueprint, abort, current_app, g, render_template, request,
+                   send_from_directory)
+
+perfis = Blueprint('perfis', __name__)
+
+COOKIE_NAME = 'admin_token'
+# Parâmetros que não vão para o caminho guardado na captura
+PARAMETROS_OCULTOS = ('_profile', '_profile_mode', 'token')
+MODO_AMOSTRAGEM = 'amostragem'
+MODO_CPROFILE = 'cprofile'
+# Funções exibidas e corte da árvore (fração do total de amostras)
+TOP_FUNCOES = 40
+CORTE_ARVORE = 0.01
+
+
+# =============== PERFILADORES ===============
+
+def _rotulo(code):
+    """Nome do frame: função (arquivo relativo:linha da definição)."""
+    arquivo = code.co_filename
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if arquivo.startswith(raiz):
+        arquivo = os.path.relpath(arquivo, raiz)
+    else:
+        # Bibliotecas: só a partir do nome do pacote
+        partes = arquivo.replace('\\', '/').split('/site-packages/')
+        arquivo = partes[-1] if len(partes) > 1 else os.path.basename(arquivo)
+    return f'{code.co_name} ({arquivo}:{code.co_firstlineno})'
+
+
+class Amostrador:
+    """Lê a pilha de uma thread em intervalos regulares."""
+
+    def __init__(self, thread_id, intervalo):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._parar.set()
+        self._thread.join()
+
+    def _run(self):
+        rotulos = {}
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while frame is not None:
+                code = frame.f_code
+                rotulo = rotulos.get(code)
+                if rotulo is None:
+                    rotulo = rotulos[code] = _rotulo(code)
+                pilha.append(rotulo)
+                frame = frame.f_back
+            if pilha:
+                self.pilhas[tuple(reversed(pilha))] += 1
+
+    def folded(self):
+        """Pilhas no formato "a;b;c contagem", uma por linha."""
+        return ''.join(f'{";".join(pilha)} {n}\n' for pilha, n in self.pilhas.most_common())
+
+    def top(self):
+        """Funções por amostras próprias (topo da pilha); total conta em qualquer nível."""
+        proprio, total = Counter(), Counter()
+        for pilha, n in self.pilhas.items():
+            proprio[pilha[-1]] += n
+            for rotulo in set(pilha):
+                total[rotulo] += n
+        soma = sum(self.pilhas.values()) or 1
+        ordem = sorted(total, key=lambda rotulo: (-proprio[rotulo], -total[rotulo]))
+        return [{'funcao': rotulo, 'proprio': proprio[rotulo], 'total': total[rotulo],
+                 'pct_total': round(100 * total[rotulo] / soma, 1)}
+                for rotulo in ordem[:TOP_FUNCOES]]
+
+    def arvore(self):
+        """Árvore de chamadas em texto, com o percentual de amostras de cada nó."""
+        raiz = {}
+        for pilha, n in self.pilhas.items():
+            no = raiz
+            for rotulo in pilha:
+                filho = no.setdefault(rotulo, [0, {}])
+                filho[0] += n
+                no = filho[1]
+        soma = sum(self.pilhas.values()) or 1
+        linhas = []
+
+        def descer(no, nivel):
+            for rotulo, (n, filhos) in sorted(no.items(), key=lambda item: -item[1][0]):
+                if n / soma < CORTE_ARVORE:
+                    continue
+                linhas.append(f'{"  " * nivel}{100 * n / soma:5.1f}%  {rotulo}')
+                descer(filhos, nivel + 1)
+
+        descer(raiz, 0)
+        return '\n'.join(linhas)
+
+    @property
+    def amostras(self):
+        return sum(self.pilhas.values())
+
+
+class Deterministico:
+    """cProfile da thread da requisição."""
+
+    def __init__(self):
+        self.perfil = cProfile.Profile()
+        self.stats = None
+
+    def start(self):
+        self.perfil.enable()
+
+    def stop(self):
+        self.perfil.disable()
+        self.stats = pstats.Stats(self.perfil)
+
+    def _texto(self, metodo, *args):
+        saida = io.StringIO()
+        self.stats.stream = saida
+        self.stats.sort_stats('cumulative')
+        getattr(self.stats, metodo)(*args)
+        return saida.getvalue()
+
+    def top(self):
+        """Funções por tempo próprio (sem as chamadas internas)."""
+        funcoes = []
+        for (arquivo, linha, nome), (_, chamadas, proprio, acumulado, _) in self.stats.stats.items():
+            funcoes.append({'funcao': f'{nome} ({os.path.basename(arquivo)}:{linha})',
+                            'chamadas': chamadas, 'proprio': round(proprio, 4), 'total': round(acumulado, 4)})
+        return sorted(funcoes, key=lambda f: (-f['proprio'], -f['total']))[:TOP_FUNCOES]
+
+    def arvore(self):
+        return self._texto('print_callees', TOP_FUNCOES)
+
+    @property
+    def amostras(self):
+        return self.stats.total_calls
+
+
+# =============== CAPTURAS ===============
+
+def _pasta():
+    return current_app.config['PROFILE_DIR']
+
+
+def token_valido(valor):
+    token = current_app.config['PROFILE_TOKEN']
+    return bool(token and valor and hmac.compare_digest(str(valor), token))
+
+
+def _iniciar():
+    if not token_valido(request.headers.get('X-Profile') or request.args.get('_profile')):
+        return None
+    modo = request.headers.get('X-Profile-Mode') or request.args.get('_profile_mode') or MODO_AMOSTRAGEM
+    if modo == MODO_CPROFILE:
+        perfilador = Deterministico()
+    else:
+        modo = MODO_AMOSTRAGEM
+        perfilador = Amostrador(threading.get_ident(), current_app.config['PROFILE_INTERVALO_MS'] / 1000)
+    g.perfil = {
+        'id': f'{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}',
+        'modo': modo,
+        'perfilador': perfilador,
+        'inicio': time.perf_counter(),
+        'status': 500,
+    }
+    perfilador.start()
+    return None
+
+
+def _marcar_resposta(response):
+    perfil = g.get('perfil')
+    if perfil is not None:
+        perfil['status'] = response.status_code
+        response.headers['X-Profile-Id'] = perfil['id']
+    return response
+
+
+def _finalizar(exc):
+    perfil = g.pop('perfil', None)
+    if perfil is None:
+        return
+    perfilador = perfil['perfilador']
+    perfilador.stop()
+    duracao = time.perf_counter() - perfil['inicio']
+    try:
+        salvar_captura(perfil['id'], perfil['modo'], perfilador, duracao, perfil['status'])
+    except Exception as e:
+        current_app.logger.error(f'Erro ao salvar o perfil {perfil["id"]}: {e}')
+
+
+def salvar_captura(captura_id, modo, perfilador, duracao, status):
+    pasta = _pasta()
+    os.makedirs(pasta, exist_ok=True)
+    if modo == MODO_CPROFILE:
+        arquivo = f'{captura_id}.prof'
+        perfilador.stats.dump_stats(os.path.join(pasta, arquivo))
+    else:
+        arquivo = f'{captura_id}.folded'
+        with open(os.path.join(pasta, arquivo), 'w', encoding='utf-8') as f:
+            f.write(perfilador.folded())
+
+    captura = {
+        'id': captura_id,
+        'modo': modo,
+        'momento': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+        'metodo': request.method,
+        'caminho': _caminho_sem_token(),
+        'endpoint': request.endpoint,
+        'status': status,
+        'duracao_ms': round(duracao * 1000, 1),
+        'amostras': perfilador.amostras,
+        'arquivo': arquivo,
+        'top': perfilador.top(),
+        'arvore': perfilador.arvore(),
+    }
+    with open(os.path.join(pasta, f'{captura_id}.json'), 'w', encoding='utf-8') as f:
+        json.dump(captura, f, ensure_ascii=False)
+    _podar(pasta)
+
+
+def _caminho_sem_token():
+    """Caminho da requisição sem o token de perfil/admin na query string."""
+    query = urlencode([(chave, valor) for chave, valor in request.args.items(multi=True)
+                       if chave not in PARAMETROS_OCULTOS])
+    return f'{request.path}?{query}' if query else request.path
+
+
+def _podar(pasta):
+    """Mantém só as capturas mais recentes (buffer circular)."""
+    ids = sorted(nome[:-5] for nome in os.listdir(pasta) if nome.endswith('.json'))
+    for captura_id in ids[:-current_app.config['PROFILE_CAPTURAS']]:
+        for extensao in ('.json', '.folded', '.prof'):
+            try:
+                os.remove(os.path.join(pasta, captura_id + extensao))
+            except FileNotFoundError:
+                pass
+
+
+def carregar_captura(captura_id):
+    caminho = os.path.join(_pasta(), f'{os.path.basename(captura_id)}.json')
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# =============== ROTAS ===============
+
+@perfis.before_request
+def _exigir_admin():
+    valor = request.headers.get('X-Admin-Token') or request.args.get('token') or request.cookies.get(COOKIE_NAME)
+    if not token_valido(valor):
+        abort(403)
+
+
+@perfis.after_request
+def _lembrar_admin(response):
+    token = request.args.get('token')
+    if token and request.cookies.get(COOKIE_NAME) != token:
+        response.set_cookie(COOKIE_NAME, token, httponly=True, samesite='Strict', path='/admin')
+    return response
+
+
+@perfis.route('')
+def lista():
+    pasta = _pasta()
+    ids = sorted((nome[:-5] for nome in os.listdir(pasta) if nome.endswith('.json')), reverse=True) \
+        if os.path.isdir(pasta) else []
+    capturas = [c for c in map(carregar_captura, ids) if c is not None]
+    return render_template('perfis.html', capturas=capturas, captura=None)
+
+
+@perfis.route('/<captura_id>')
+def detalhe(captura_id):
+    captura = carregar_captura(captura_id)
+    if captura is None:
+        abort(404)
+    return render_template('perfis.html', capturas=None, captura=captura)
+
+
+@perfis.route('/<captura_id>/download')
+def download(captura_id):
+    captura = carregar_captura(captura_id)
+    if captura is None:
+        abort(404)
+    return send_from_directory(_pasta(), captura['arquivo'], as_attachment=True)
+
+
+def init_app(app):
+    app.config.setdefault('PROFILE_TOKEN', os.environ.get('PORTAL_ADMIN_TOKEN'))
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'perfis'))
+    app.config.setdefault('PROFILE_CAPTURAS', 50)
+    app.config.setdefault('PROFILE_INTERVALO_MS', 5)
+
+    if not app.config['PROFILE_TOKEN']:
+        return
+    app.before_request(_iniciar)
+    app.after_request(_marcar_resposta)
+    app.teardown_request(_finalizar)
+    app.register_blueprint(perfis, url_prefix='/admin/perfis')
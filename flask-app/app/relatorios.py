@@ -0,0 +1,336 @@
+"""
+Relatórios pré-gerados: impressões e exportações prontas em disco.
+
+Toda manhã as mesmas impressões e exportações (ruptura por grupo, vencimento,
+total de perdas, perdas frios/HF) são pedidas por muita gente logo depois da
+carga do ERP. Os blueprints registram esses relatórios padrão com
+``registrar_relatorio(Relatorio(...))`` e o comando ``flask relatorios``
+gera todos os arquivos (HTML de impressão, CSV, XLSX por grupo) em processos
+paralelos assim que aparece uma versão nova dos dados:
+
+    flask --app run relatorios gerar     gera o que faltar para a versão atual
+    flask --app run relatorios agendar   fica conferindo as versões e gera a
+                                         cada versão nova (rode como serviço)
+
+Os arquivos ficam em ``RELATORIOS_DIR/<loja>/<relatório>/<versão>/``, onde a
+versão combina as versões dos arquivos de origem (e a data, nos relatórios
+que dependem do dia). A pasta da versão é montada em um temporário e
+publicada de uma vez; as versões anteriores são removidas em seguida.
+
+As rotas de impressão/exportação chamam ``servir_relatorio(nome, params)``
+antes de gerar a resposta: se o arquivo da versão atual existe, ele é
+enviado direto do disco; senão a rota segue gerando na hora, como antes.
+
+Rota:
+    GET /relatorios/<nome>?<params>   download do arquivo pré-gerado (404 se
+                                      ainda não existe para a versão atual)
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import click
+from flask import Blueprint, current_app, g, has_request_context, jsonify, request, send_file, url_for
+from flask.cli import AppGroup
+
+from app.lojas import loja_atual, lojas_configuradas, versao_fontes
+
+logger = logging.getLogger(__name__)
+
+relatorios = Blueprint('relatorios', __name__)
+
+# Relatórios registrados pelos blueprints, por nome
+_relatorios = {}
+
+
+class Relatorio:
+    """Um relatório padrão: fontes de que depende, variantes e como gerar cada arquivo."""
+
+    def __init__(self, nome, fontes, gerar, variantes=None, extensao='.html',
+                 mimetype='text/html; charset=utf-8', download=None, diario=False):
+        """
+        Args:
+            gerar: ``gerar(params, destino)``, chamada com o contexto de
+                requisição da loja; devolve o conteúdo (str, bytes ou a
+                resposta de uma rota) ou grava ``destino`` e devolve None
+            variantes: ``variantes()`` -> lista de params (um arquivo por
+                params); padrão um único arquivo sem params
+            download: nome do arquivo para anexo (str ou ``download(params)``);
+                None envia inline (páginas de impressão)
+            diario: o conteúdo depende da data (ex.: dias para vencer)
+        """
+        self.nome = nome
+        self.fontes = tuple(fontes)
+        self.gerar = gerar
+        self.variantes = variantes or (lambda: [{}])
+        self.extensao = extensao
+        self.mimetype = mimetype
+        self.download = download
+        self.diario = diario
+
+    def nome_download(self, params):
+        return self.download(params) if callable(self.download) else self.download
+
+
+def registrar_relatorio(relatorio):
+    """Registra um relatório padrão para a geração antecipada."""
+    _relatorios[relatorio.nome] = relatorio
+    return relatorio
+
+
+def base_dir():
+    return current_app.config['RELATORIOS_DIR']
+
+
+def versao_relatorio(relatorio, loja):
+    """Versão dos dados do relatório na loja (None se alguma fonte está inacessível)."""
+    versao = versao_fontes(relatorio.fontes, [loja])
+    if 'None' in versao.split('|'):
+        return None
+    if relatorio.diario:
+        versao += '|' + date.today().isoformat()
+    return hashlib.sha1(versao.encode('utf-8')).hexdigest()[:16]
+
+
+def _arquivo(relatorio, params):
+    """Nome do arquivo de uma variante (hash dos params normalizados)."""
+    chave = json.dumps({k: str(v) for k, v in (params or {}).items()}, sort_keys=True)
+    return hashlib.sha1(chave.encode('utf-8')).hexdigest()[:16] + relatorio.extensao
+
+
+def _pasta(loja, nome, versao=None):
+    partes = [p for p in (loja, nome, versao) if p]
+    return os.path.join(base_dir(), *partes)
+
+
+def caminho_relatorio(nome, params=None, loja=None):
+    """Arquivo pré-gerado da versão atual dos dados, ou None se ainda não existe."""
+    relatorio = _relatorios.get(nome)
+    if relatorio is None or not current_app.config['RELATORIOS_SERVIR']:
+        return None
+    # Durante a geração a rota precisa produzir o conteúdo, não servir o antigo
+    if has_request_context() and g.get('gerando_relatorio'):
+        return None
+    loja = loja or loja_atual()
+    versao = versao_relatorio(relatorio, loja)
+    if versao is None:
+        return None
+    caminho = os.path.join(_pasta(loja, nome, versao), _arquivo(relatorio, params))
+    return caminho if os.path.exists(caminho) else None
+
+
+def servir_relatorio(nome, params=None):
+    """Resposta com o arquivo pré-gerado, ou None para a rota gerar na hora."""
+    caminho = caminho_relatorio(nome, params)
+    if caminho is None:
+        return None
+    relatorio = _relatorios[nome]
+    download_name = relatorio.nome_download(params or {})
+    return send_file(caminho, mimetype=relatorio.mimetype, as_attachment=bool(download_name),
+                     download_name=download_name, max_age=0)
+
+
+def url_relatorio(nome, params=None):
+    """URL de download do arquivo pré-gerado, ou None se ainda não existe."""
+    if caminho_relatorio(nome, params) is None:
+        return None
+    return url_for('relatorios.download', nome=nome, **(params or {}))
+
+
+# =============== GERAÇÃO ===============
+
+_app_processo = None
+
+
+def _iniciar_processo():
+    """Cria o app uma vez em cada processo do pool (os relatórios se registram no import)."""
+    global _app_processo
+    from app import create_app
+    _app_processo = create_app()
+
+
+def _gerar_no_processo(loja, nome, forcar):
+    with _app_processo.app_context():
+        return gerar_relatorio(loja, nome, forcar)
+
+
+def gerar_relatorio(loja, nome, forcar=False):
+    """
+    Gera todos os arquivos de um relatório para a versão atual dos dados da loja.
+
+    Returns:
+        dict: relatório, loja, versão, situação ('gerado', 'atual',
+        'indisponivel' ou 'descartado'), arquivos e segundos
+    """
+    relatorio = _relatorios[nome]
+    inicio = time.monotonic()
+    resultado = {'relatorio': nome, 'loja': loja, 'versao': None, 'arquivos': 0}
+
+    versao = versao_relatorio(relatorio, loja)
+    resultado['versao'] = versao
+    destino = _pasta(loja, nome, versao) if versao else None
+    if versao is None:
+        resultado['situacao'] = 'indisponivel'
+    elif os.path.isdir(destino) and not forcar:
+        resultado['situacao'] = 'atual'
+    else:
+        tmp = f'{destino}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            # A loja vai na query string para loja_atual() valer nas rotas e templates
+            with current_app.test_request_context(query_string={'loja': loja}):
+                g.gerando_relatorio = True
+                variantes = relatorio.variantes()
+                for params in variantes:
+                    caminho = os.path.join(tmp, _arquivo(relatorio, params))
+                    conteudo = relatorio.gerar(params, caminho)
+                    if hasattr(conteudo, 'get_data'):  # resposta de uma rota
+                        conteudo = conteudo.get_data()
+                    if isinstance(conteudo, str):
+                        conteudo = conteudo.encode('utf-8')
+                    if conteudo is not None:
+                        with open(caminho, 'wb') as f:
+                            f.write(conteudo)
+
+            # Se os dados mudaram durante a geração, os arquivos não são desta versão
+            if versao_relatorio(relatorio, loja) != versao:
+                resultado['situacao'] = 'descartado'
+            else:
+                shutil.rmtree(destino, ignore_errors=True)
+                try:
+                    os.replace(tmp, destino)
+                except OSError:
+                    pass  # outro gerador publicou a mesma versão antes
+                resultado['situacao'] = 'gerado'
+                resultado['arquivos'] = len(variantes)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        if resultado['situacao'] == 'gerado':
+            pasta = _pasta(loja, nome)
+            for antiga in os.listdir(pasta):
+                if antiga != versao and not antiga.endswith('.tmp'):
+                    shutil.rmtree(os.path.join(pasta, antiga), ignore_errors=True)
+
+    resultado['segundos'] = round(time.monotonic() - inicio, 2)
+    return resultado
+
+
+def pendentes(lojas=None, nomes=None):
+    """(loja, relatório) sem arquivos para a versão atual dos dados."""
+    pares = []
+    for loja in lojas or lojas_configuradas():
+        for nome in nomes or _relatorios:
+            versao = versao_relatorio(_relatorios[nome], loja)
+            if versao and not os.path.isdir(_pasta(loja, nome, versao)):
+                pares.append((loja, nome))
+    return pares
+
+
+def gerar_em_paralelo(pares, forcar=False, workers=None):
+    """Gera os (loja, relatório) em processos paralelos; devolve os resultados na ordem em que terminam."""
+    workers = workers or current_app.config['RELATORIOS_WORKERS'] or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(pares) or 1)),
+                             initializer=_iniciar_processo) as pool:
+        futuros = {pool.submit(_gerar_no_processo, loja, nome, forcar): (loja, nome) for loja, nome in pares}
+        for futuro in as_completed(futuros):
+            loja, nome = futuros[futuro]
+            try:
+                yield futuro.result()
+            except Exception as e:
+                logger.error(f'Erro ao gerar o relatório {nome} da loja {loja}: {e}')
+                yield {'relatorio': nome, 'loja': loja, 'situacao': 'erro', 'erro': str(e)}
+
+
+# =============== CLI ===============
+
+relatorios_cli = AppGroup('relatorios', help='Impressões e exportações pré-geradas.')
+
+
+def _opcoes(func):
+    func = click.option('--loja', 'lojas', multiple=True, help='Loja (padrão: todas).')(func)
+    func = click.option('--relatorio', 'nomes', multiple=True, help='Relatório (padrão: todos).')(func)
+    func = click.option('--workers', type=int, default=None, help='Processos paralelos.')(func)
+    return func
+
+
+def _validar(nomes):
+    desconhecidos = [nome for nome in nomes if nome not in _relatorios]
+    if desconhecidos:
+        raise click.ClickException(f'Relatório desconhecido: {", ".join(desconhecidos)} '
+                                   f'(disponíveis: {", ".join(sorted(_relatorios))})')
+
+
+def _mostrar(resultado):
+    if resultado['situacao'] == 'erro':
+        click.echo(f'  {resultado["loja"]} {resultado["relatorio"]}: erro: {resultado["erro"]}', err=True)
+    else:
+        click.echo(f'  {resultado["loja"]} {resultado["relatorio"]}: {resultado["situacao"]} '
+                   f'({resultado["arquivos"]} arquivo(s), {resultado["segundos"]} s)')
+
+
+@relatorios_cli.command('gerar')
+@_opcoes
+@click.option('--forcar', is_flag=True, help='Gera de novo mesmo se a versão atual já existe.')
+def gerar_cli(lojas, nomes, workers, forcar):
+    """Gera os relatórios que faltam para a versão atual dos dados."""
+    _validar(nomes)
+    if forcar:
+        pares = [(loja, nome) for loja in lojas or lojas_configuradas() for nome in nomes or _relatorios]
+    else:
+        pares = pendentes(lojas, nomes)
+    if not pares:
+        click.echo('Relatórios já gerados para a versão atual dos dados.')
+        return
+    inicio = time.monotonic()
+    erros = 0
+    for resultado in gerar_em_paralelo(pares, forcar, workers):
+        _mostrar(resultado)
+        erros += resultado['situacao'] == 'erro'
+    click.echo(f'{len(pares)} relatório(s) em {time.monotonic() - inicio:.1f} s')
+    if erros:
+        raise click.ClickException(f'{erros} relatório(s) com erro')
+
+
+@relatorios_cli.command('agendar')
+@_opcoes
+@click.option('--intervalo', type=float, default=None, help='Segundos entre as conferências de versão.')
+def agendar_cli(lojas, nomes, workers, intervalo):
+    """Confere as versões dos dados e gera os relatórios a cada versão nova."""
+    _validar(nomes)
+    intervalo = intervalo or current_app.config['RELATORIOS_INTERVALO']
+    click.echo(f'Conferindo versões a cada {intervalo:g} s (Ctrl+C para sair)')
+    while True:
+        try:
+            pares = pendentes(lojas, nomes)
+            if pares:
+                click.echo(f'{time.strftime("%H:%M:%S")} versão nova: {len(pares)} relatório(s)')
+                for resultado in gerar_em_paralelo(pares, workers=workers):
+                    _mostrar(resultado)
+        except Exception as e:
+            logger.error(f'Erro no agendador de relatórios: {e}')
+        time.sleep(intervalo)
+
+
+@relatorios.route('/<nome>')
+def download(nome):
+    params = {k: v for k, v in request.args.items() if k != 'loja'}
+    resposta = servir_relatorio(nome, params)
+    if resposta is None:
+        return jsonify({'success': False, 'error': 'Relatório não gerado para a versão atual dos dados'}), 404
+    return resposta
+
+
+def init_app(app):
+    app.config.setdefault('RELATORIOS_DIR', os.path.join(app.instance_path, 'relatorios'))
+    app.config.setdefault('RELATORIOS_SERVIR', True)
+    app.config.setdefault('RELATORIOS_WORKERS', None)
+    app.config.setdefault('RELATORIOS_INTERVALO', 60)
+    app.cli.add_command(relatorios_cli)
+    app.register_blueprint(relatorios, url_prefix='/relatorios')
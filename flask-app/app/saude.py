@@ -0,0 +1,323 @@
+"""
+Saúde e prontidão do worker, com estatísticas de carga de cada fonte.
+
+Toda leitura de arquivo de origem passa por ``ler_fonte``, que registra, por
+(fonte, loja): quando carregou, quanto tempo levou a leitura, linhas,
+colunas, bytes em memória, mtime e versão do arquivo, o último erro e se os
+dados vieram de um caminho alternativo (fallback, ex.: ``test_data`` do
+controle de vencimento).
+
+O registro é do processo (não do app), porque as leituras também acontecem
+nos processos das visões regionais e das exportações; lá as estatísticas
+ficam só no processo filho.
+
+Rotas:
+    GET /saude         estatísticas de todas as fontes, com a idade da cópia
+                       e se o arquivo já mudou no disco (sempre 200)
+    GET /saude/pronto  200 quando as fontes críticas (``SAUDE_FONTES_CRITICAS``)
+                       da loja padrão foram carregadas sem fallback; senão 503
+                       e dispara, em segundo plano, as cargas registradas com
+                       ``registrar_carga`` para elas. Aponte o health check do
+                       balanceador para esta rota.
+
+Aquecimento: depois do fork, antes de aceitar conexões, o worker do gunicorn
+(hook ``post_worker_init`` em ``gunicorn.conf.py``) roda ``aquecer``: as
+cargas de ``registrar_carga`` (fontes críticas primeiro), que leem os
+arquivos e montam índices e agregados, e depois as páginas registradas com
+``registrar_aquecimento`` (as mais usadas e a primeira página das listas),
+renderizadas uma vez para deixar cursores, caches e templates prontos. O
+aquecimento tem um orçamento de tempo (``AQUECIMENTO_ORCAMENTO_S``); o que
+não coube fica para a primeira requisição. Os tempos de cada tarefa aparecem
+em ``/saude``, e ``/saude/pronto`` responde 503 enquanto o aquecimento roda.
+Sem gunicorn: ``flask --app run aquecer``.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask import current_app, jsonify, url_for
+
+from app.datasets import DEFAULT_STORE, file_version, source_path
+
+logger = logging.getLogger(__name__)
+
+
+class SourceMonitor:
+    """Estatísticas da última leitura de cada (fonte, loja) neste processo."""
+
+    def __init__(self):
+        self._fontes = {}
+        self._lock = threading.Lock()
+
+    def _estado(self, fonte, loja):
+        return self._fontes.setdefault((fonte, str(loja)), {
+            'fonte': fonte,
+            'loja': str(loja),
+            'cargas': 0,
+            'erros': 0,
+            'ultimo_erro': None,
+            'ultimo_erro_em': None,
+        })
+
+    def carregado(self, fonte, loja, caminho, df, duracao, fallback=False):
+        try:
+            mtime = datetime.fromtimestamp(os.path.getmtime(caminho)).isoformat(timespec='seconds')
+        except OSError:
+            mtime = None
+        with self._lock:
+            estado = self._estado(fonte, loja)
+            estado.update({
+                'caminho': caminho,
+                'carregado_em': datetime.now().isoformat(timespec='seconds'),
+                'leitura_s': round(duracao, 3),
+                'linhas': int(df.shape[0]),
+                'colunas': int(df.shape[1]),
+                'bytes': int(df.memory_usage(deep=True).sum()),
+                'mtime': mtime,
+                'versao': file_version(caminho),
+                'fallback': fallback,
+            })
+            estado['cargas'] += 1
+
+    def erro(self, fonte, loja, caminho, excecao):
+        with self._lock:
+            estado = self._estado(fonte, loja)
+            estado['erros'] += 1
+            estado['ultimo_erro'] = f'{type(excecao).__name__}: {excecao}'
+            estado['ultimo_erro_em'] = datetime.now().isoformat(timespec='seconds')
+            estado['caminho_com_erro'] = caminho
+
+    def pronta(self, fonte, loja):
+        """A fonte tem uma carga real (sem fallback) neste processo."""
+        with self._lock:
+            estado = self._fontes.get((fonte, str(loja)))
+            return bool(estado and estado.get('carregado_em') and not estado.get('fallback'))
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(estado) for estado in self._fontes.values()]
+
+
+monitor = SourceMonitor()
+
+
+def ler_fonte(fonte, loja, leitor, caminho=None, fallback=False, **kwargs):
+    """
+    Lê a fonte com ``leitor(caminho, **kwargs)`` registrando as estatísticas.
+
+    Args:
+        fonte: nome em ``app.datasets.SOURCES``
+        leitor: ``pd.read_csv``, ``pd.read_excel``...
+        caminho: caminho alternativo (por padrão ``source_path(fonte, loja)``)
+        fallback: indica que ``caminho`` é um substituto da fonte real
+    """
+    loja = str(loja or DEFAULT_STORE)
+    caminho = caminho or source_path(fonte, loja)
+    inicio = time.perf_counter()
+    try:
+        df = leitor(caminho, **kwargs)
+    except Exception as e:
+        monitor.erro(fonte, loja, caminho, e)
+        raise
+    monitor.carregado(fonte, loja, caminho, df, time.perf_counter() - inicio, fallback)
+    return df
+
+
+# =============== PRONTIDÃO ===============
+
+# fonte -> funções sem argumentos que carregam os datasets da fonte (loja padrão)
+_cargas = {}
+_aquecendo = threading.Lock()
+
+
+def registrar_carga(fontes, func):
+    """Registra ``func()`` como a carga que deixa as ``fontes`` prontas."""
+    for fonte in fontes:
+        _cargas.setdefault(fonte, []).append(func)
+
+
+def _carregar_em_segundo_plano(app, fontes):
+    if not _aquecendo.acquire(blocking=False):
+        return
+
+    def carregar():
+        try:
+            with app.app_context():
+                funcs = []
+                for fonte in fontes:
+                    for func in _cargas.get(fonte, ()):
+                        if func not in funcs:
+                            funcs.append(func)
+                for func in funcs:
+                    try:
+                        func()
+                    except Exception as e:
+                        logger.error(f'Erro na carga de prontidão ({func.__name__}): {e}')
+        finally:
+            _aquecendo.release()
+
+    threading.Thread(target=carregar, name='saude-carga', daemon=True).start()
+
+
+# =============== AQUECIMENTO ===============
+
+# Páginas renderizadas no aquecimento: (prioridade, endpoint, parâmetros da URL)
+_paginas = []
+_aquecimento = {'estado': 'nao_iniciado', 'tarefas': []}
+_aquecimento_lock = threading.Lock()
+
+
+def registrar_aquecimento(endpoint, prioridade=0, **params):
+    """
+    Registra a página ``endpoint`` (com os ``params`` da URL) para ser renderizada no aquecimento.
+
+    Maior ``prioridade`` renderiza antes (vale se o orçamento acabar); empates na ordem de registro.
+    """
+    _paginas.append((prioridade, endpoint, params))
+
+
+def _funcs_de_carga(primeiras):
+    """Cargas registradas sem repetição, as das fontes ``primeiras`` antes."""
+    funcs = []
+    for fonte in list(primeiras) + [f for f in _cargas if f not in primeiras]:
+        for func in _cargas.get(fonte, ()):
+            if func not in funcs:
+                funcs.append(func)
+    return funcs
+
+
+def _executar(tarefa, tipo, func):
+    inicio = time.perf_counter()
+    registro = {'tarefa': tarefa, 'tipo': tipo, 'resultado': 'ok'}
+    try:
+        func()
+    except Exception as e:
+        registro['resultado'] = 'erro'
+        registro['erro'] = f'{type(e).__name__}: {e}'
+        logger.error(f'Erro no aquecimento ({tarefa}): {e}')
+    registro['duracao_s'] = round(time.perf_counter() - inicio, 3)
+    return registro
+
+
+def _renderizar(client, url):
+    response = client.get(url)
+    response.close()
+    if response.status_code != 200:
+        raise RuntimeError(f'HTTP {response.status_code}')
+
+
+def aquecer(app, orcamento_s=None, notificar=None):
+    """
+    Carrega os datasets e renderiza as páginas registradas da loja padrão.
+
+    As tarefas rodam em ordem até o orçamento acabar; a que está rodando
+    termina, as seguintes ficam marcadas como puladas.
+
+    Args:
+        orcamento_s: tempo máximo (padrão ``AQUECIMENTO_ORCAMENTO_S``)
+        notificar: chamado entre as tarefas (``worker.notify`` do gunicorn,
+            para o master não matar o worker por falta de sinal)
+
+    Returns:
+        dict: estado, tempos e o resultado de cada tarefa (o mesmo de ``/saude``)
+    """
+    if orcamento_s is None:
+        orcamento_s = app.config['AQUECIMENTO_ORCAMENTO_S']
+    with app.app_context():
+        tarefas = [(func.__name__, 'carga', func)
+                   for func in _funcs_de_carga(app.config['SAUDE_FONTES_CRITICAS'])]
+    client = app.test_client()
+    for _, endpoint, params in sorted(_paginas, key=lambda pagina: -pagina[0]):
+        with app.test_request_context():
+            url = url_for(endpoint, **params)
+        tarefas.append((url, 'pagina', lambda url=url: _renderizar(client, url)))
+
+    inicio = time.perf_counter()
+    with _aquecimento_lock:
+        _aquecimento.clear()
+        _aquecimento.update({'estado': 'aquecendo', 'inicio': datetime.now().isoformat(timespec='seconds'),
+                             'orcamento_s': orcamento_s, 'tarefas': []})
+
+    # Não concorre com a carga de prontidão disparada por /saude/pronto
+    with _aquecendo:
+        for tarefa, tipo, func in tarefas:
+            if time.perf_counter() - inicio >= orcamento_s:
+                registro = {'tarefa': tarefa, 'tipo': tipo, 'resultado': 'pulada'}
+            elif tipo == 'carga':
+                with app.app_context():
+                    registro = _executar(tarefa, tipo, func)
+            else:
+                registro = _executar(tarefa, tipo, func)
+            with _aquecimento_lock:
+                _aquecimento['tarefas'].append(registro)
+            if notificar is not None:
+                notificar()
+
+    duracao = time.perf_counter() - inicio
+    with _aquecimento_lock:
+        puladas = any(t['resultado'] == 'pulada' for t in _aquecimento['tarefas'])
+        _aquecimento.update({'estado': 'esgotado' if puladas else 'concluido',
+                             'fim': datetime.now().isoformat(timespec='seconds'),
+                             'duracao_s': round(duracao, 3)})
+        relatorio = dict(_aquecimento, tarefas=list(_aquecimento['tarefas']))
+    logger.info(f'Aquecimento {relatorio["estado"]} em {duracao:.1f}s ({len(tarefas)} tarefas)')
+    return relatorio
+
+
+def estado_aquecimento():
+    with _aquecimento_lock:
+        return dict(_aquecimento, tarefas=list(_aquecimento['tarefas']))
+
+
+@click.command('aquecer')
+@click.option('--orcamento', type=float, default=None, help='tempo máximo em segundos')
+def aquecer_cli(orcamento):
+    """Roda o aquecimento neste processo e mostra o tempo de cada tarefa."""
+    relatorio = aquecer(current_app._get_current_object(), orcamento)
+    for tarefa in relatorio['tarefas']:
+        duracao = f"{tarefa['duracao_s']:7.3f}s" if 'duracao_s' in tarefa else '       -'
+        click.echo(f"{duracao}  {tarefa['resultado']:<7} {tarefa['tipo']:<6} {tarefa['tarefa']}"
+                   + (f"  ({tarefa['erro']})" if 'erro' in tarefa else ''))
+    click.echo(f"{relatorio['estado']} em {relatorio['duracao_s']:.3f}s (orçamento {relatorio['orcamento_s']}s)")
+
+
+def saude():
+    """Estatísticas de carga das fontes deste worker, com a idade da cópia em memória."""
+    agora = datetime.now()
+    fontes = monitor.snapshot()
+    for estado in fontes:
+        if estado.get('carregado_em'):
+            estado['idade_s'] = int((agora - datetime.fromisoformat(estado['carregado_em'])).total_seconds())
+            # Arquivo mudou no disco e este worker ainda não recarregou
+            estado['desatualizada'] = file_version(estado['caminho']) != estado['versao']
+    return jsonify({'pid': os.getpid(), 'fontes': fontes, 'aquecimento': estado_aquecimento()})
+
+
+def pronto():
+    """Prontidão para o balanceador: fontes críticas da loja padrão carregadas."""
+    loja = current_app.config['LOJA_PADRAO']
+    if estado_aquecimento()['estado'] == 'aquecendo':
+        response = jsonify({'pronto': False, 'loja': loja, 'aquecendo': True})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    faltando = [fonte for fonte in current_app.config['SAUDE_FONTES_CRITICAS']
+                if not monitor.pronta(fonte, loja)]
+    if faltando:
+        _carregar_em_segundo_plano(current_app._get_current_object(), faltando)
+        response = jsonify({'pronto': False, 'loja': loja, 'faltando': faltando})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    return jsonify({'pronto': True, 'loja': loja})
+
+
+def init_app(app):
+    app.config.setdefault('SAUDE_FONTES_CRITICAS', ('smg12', 'saeoi051'))
+    app.config.setdefault('AQUECIMENTO_ORCAMENTO_S', 25)
+    app.cli.add_command(aquecer_cli)
+    app.add_url_rule('/saude', 'saude', saude)
+    app.add_url_rule('/saude/pronto', 'saude_pronto', pronto)
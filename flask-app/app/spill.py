@@ -0,0 +1,78 @@
+"""
+Cópias em disco (snapshots) dos datasets que saem da memória do worker.
+
+Quando o cache de datasets por loja (``app.lojas``) passa do orçamento, os
+itens usados há mais tempo são gravados aqui e tirados da memória; no próximo
+acesso voltam do disco em milissegundos, em vez de ler e preparar de novo os
+arquivos do ERP.
+
+O formato usa o pickle protocolo 5 com buffers fora de banda: os arrays
+numpy (blocos numéricos dos DataFrames, índices, posições) vão para um
+arquivo ``.bin`` alinhado, e o restante (estrutura, textos) para o ``.pkl``.
+Na volta, o ``.bin`` é mapeado em memória (``mmap`` copy-on-write) e os
+arrays apontam direto para as páginas do arquivo: o kernel carrega só o que
+for lido e pode devolver essas páginas sob pressão, sem swap.
+"""
+import mmap
+import os
+import pickle
+
+# Alinhamento de cada buffer no .bin (linha de cache)
+ALINHAMENTO = 64
+
+
+def gravar_snapshot(valor, base):
+    """
+    Grava ``valor`` em ``base.pkl`` + ``base.bin``.
+
+    Returns:
+        int: bytes gravados
+
+    Raises:
+        Exception: se o valor não pode ser serializado (ex.: guarda uma trava)
+    """
+    buffers = []
+    dados = pickle.dumps(valor, protocol=5, buffer_callback=buffers.append)
+
+    posicoes = []
+    temporario = base + '.tmp'
+    with open(temporario + '.bin', 'wb') as arquivo:
+        posicao = 0
+        for buffer in buffers:
+            bruto = buffer.raw()
+            preenchimento = -posicao % ALINHAMENTO
+            arquivo.write(b'\0' * preenchimento)
+            posicao += preenchimento
+            posicoes.append((posicao, bruto.nbytes))
+            arquivo.write(bruto)
+            posicao += bruto.nbytes
+    with open(temporario + '.pkl', 'wb') as arquivo:
+        pickle.dump((posicoes, dados), arquivo, protocol=5)
+
+    os.replace(temporario + '.bin', base + '.bin')
+    os.replace(temporario + '.pkl', base + '.pkl')
+    return posicao + len(dados)
+
+
+def abrir_snapshot(base):
+    """Valor gravado por ``gravar_snapshot``, com os arrays mapeados do ``.bin``."""
+    with open(base + '.pkl', 'rb') as arquivo:
+        posicoes, dados = pickle.load(arquivo)
+    if sum(tamanho for _, tamanho in posicoes):
+        with open(base + '.bin', 'rb') as arquivo:
+            # copy-on-write: quem alterar um array altera só a própria cópia da página
+            mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_COPY)
+        visao = memoryview(mapa)
+    else:
+        # Só arrays vazios (ou nenhum): não há o que mapear
+        visao = memoryview(b'')
+    buffers = [visao[inicio:inicio + tamanho] for inicio, tamanho in posicoes]
+    return pickle.loads(dados, buffers=buffers)
+
+
+def remover_snapshot(base):
+    for extensao in ('.pkl', '.bin'):
+        try:
+            os.remove(base + extensao)
+        except OSError:
+            pass
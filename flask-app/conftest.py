@@ -0,0 +1 @@
+# Raiz dos testes: o pytest põe esta pasta no sys.path, então "import app" funciona
@@ -0,0 +1,35 @@
+"""
+Configuração do gunicorn lida automaticamente ao rodar ``gunicorn run:app``
+nesta pasta.
+
+Os workers são ``gthread`` (``PORTAL_THREADS`` threads, padrão 8): as telas
+abertas com atualização ao vivo (``/eventos``) prendem uma thread cada, e o
+limite dessas conexões fica abaixo do número de threads
+(``app.eventos.limitar_ao_worker``). Os limites de admissão por classe de rota
+também são ajustados às threads (``app.admission.ajustar_ao_worker``). ``PORTAL_WORKER_CLASS=gevent`` troca o
+tipo do worker e ``PORTAL_WORKERS`` o número de workers (padrão 2).
+
+Depois do fork, cada worker aquece (``app.saude.aquecer``: datasets, índices,
+agregados e as páginas mais usadas) antes de aceitar conexões, dentro de
+``AQUECIMENTO_ORCAMENTO_S``. ``PORTAL_AQUECIMENTO=0`` desliga.
+"""
+import os
+
+workers = int(os.environ.get('PORTAL_WORKERS', 2))
+worker_class = os.environ.get('PORTAL_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('PORTAL_THREADS', 8))
+
+
+def post_worker_init(worker):
+    from app.admission import ajustar_ao_worker
+    from app.eventos import limitar_ao_worker
+
+    limitar_ao_worker(worker.wsgi, worker.cfg.worker_class_str, worker.cfg.threads)
+    ajustar_ao_worker(worker.wsgi, worker.cfg.worker_class_str, worker.cfg.threads)
+
+    if os.environ.get('PORTAL_AQUECIMENTO', '1') == '0':
+        return
+    from app.saude import aquecer
+
+    # worker.wsgi é o app já carregado neste processo
+    aquecer(worker.wsgi, notificar=worker.notify)
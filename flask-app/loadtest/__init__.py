@@ -0,0 +1,7 @@
+"""
+Teste de carga do portal.
+
+Gera dados substitutos, sobe o app com gunicorn em várias configurações de
+workers/threads e mede vazão, latência por rota e RSS dos workers.
+Uso: ``python -m loadtest --help`` a partir da pasta flask-app.
+"""
@@ -0,0 +1,163 @@
+"""
+Linha de comando do teste de carga.
+
+Exemplo (a partir da pasta flask-app)::
+
+    python -m loadtest --configs 2x1,2x4,4x2 --concorrencia 1,5,10,20 --duracao 20
+
+Para cada configuração ``<workers>x<threads>`` sobe um gunicorn com
+``PORTAL_DATA_DIR`` apontando para os dados gerados, aquece as rotas e roda
+os níveis de concorrência em sequência. Com ``--url`` a carga vai para um
+servidor já em execução (sem medir RSS).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from .cenarios import CENARIOS, parse_mix
+from .dados import gerar_dados
+from .executor import AmostradorRSS, carregar_contexto, executar_carga, executar_cenario, requisitar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _parse_configs(texto):
+    configs = []
+    for parte in texto.split(','):
+        workers, _, threads = parte.strip().partition('x')
+        configs.append((int(workers), int(threads or 1)))
+    return configs
+
+
+def iniciar_gunicorn(workers, threads, data_dir, timeout_boot):
+    """Sobe ``gunicorn run:app`` e espera responder. Retorna (processo, url)."""
+    porta = _porta_livre()
+    env = dict(os.environ, PORTAL_DATA_DIR=data_dir)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+         '-b', f'127.0.0.1:{porta}', '--timeout', '300', 'run:app'],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{porta}'
+    limite = time.monotonic() + timeout_boot
+    while time.monotonic() < limite:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn {workers}x{threads} encerrou ao iniciar (código {proc.returncode})')
+        if requisitar(url, '/', {}, timeout=5)[0] == 200:
+            return proc, url
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f'gunicorn {workers}x{threads} não respondeu em {timeout_boot}s')
+
+
+def aquecer(url, contexto, rodadas=2):
+    """Passa por todos os cenários antes de medir (cada worker carrega seus dados)."""
+    import numpy as np
+    rng = np.random.default_rng(0)
+    for _ in range(rodadas):
+        for cenario in CENARIOS.values():
+            rotulo, caminho, headers = cenario(rng, contexto)
+            executar_cenario(url, rotulo, caminho, headers)
+
+
+def medir(url, args, mix, master_pid=None):
+    contexto = carregar_contexto(url)
+    aquecer(url, contexto)
+    niveis = []
+    for concorrencia in args.concorrencia:
+        amostrador = AmostradorRSS(master_pid) if master_pid else None
+        if amostrador:
+            amostrador.start()
+        resultado = executar_carga(url, mix, concorrencia, args.duracao, contexto, seed=args.seed)
+        if amostrador:
+            amostrador.parar()
+            resultado['memoria'] = amostrador.resumo()
+        niveis.append(resultado)
+        imprimir_nivel(resultado)
+    return niveis
+
+
+def imprimir_nivel(resultado):
+    memoria = resultado.get('memoria') or {}
+    rss = ''
+    if memoria.get('rss_max_worker_mb') is not None:
+        rss = (f"  RSS máx/worker {memoria['rss_max_worker_mb']} MB"
+               f"  total {memoria['rss_max_total_mb']} MB ({memoria['workers']} workers)")
+    print(f"\n  concorrência {resultado['concorrencia']:>3}: {resultado['vazao_rps']:>8} req/s"
+          f"  {resultado['requisicoes']} req  {resultado['erros']} erros{rss}")
+    print(f"    {'rota':<28}{'req':>7}{'erros':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for rotulo, r in resultado['rotas'].items():
+        print(f"    {rotulo:<28}{r['requisicoes']:>7}{r['erros']:>7}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def imprimir_comparacao(relatorio):
+    """Tabela final: vazão e p95 geral de cada configuração por nível."""
+    print('\n=== Comparação de configurações ===')
+    print(f"  {'config':<10}{'conc.':>6}{'req/s':>10}{'erros':>7}{'p95 pior rota':>16}{'RSS total MB':>14}")
+    for config, niveis in relatorio['configs'].items():
+        for n in niveis:
+            p95 = max((r['p95_ms'] for r in n['rotas'].values()), default=0)
+            rss = (n.get('memoria') or {}).get('rss_max_total_mb')
+            print(f"  {config:<10}{n['concorrencia']:>6}{n['vazao_rps']:>10}{n['erros']:>7}"
+                  f"{p95:>16}{rss if rss is not None else '-':>14}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description='Teste de carga do portal')
+    parser.add_argument('--dados', help='pasta com os dados (gerada se não existir; padrão: pasta temporária)')
+    parser.add_argument('--itens', type=int, default=20000, help='produtos nos dados gerados')
+    parser.add_argument('--configs', default='2x1,2x4,4x2', help='configurações gunicorn <workers>x<threads>')
+    parser.add_argument('--concorrencia', default='1,5,10,20', help='níveis de usuários simultâneos')
+    parser.add_argument('--duracao', type=float, default=20, help='segundos por nível de concorrência')
+    parser.add_argument('--mix', help='pesos dos cenários, ex.: ruptura=40,vencimento=30,perdas=20')
+    parser.add_argument('--url', help='servidor já em execução (ignora --configs)')
+    parser.add_argument('--timeout-boot', type=float, default=180, help='espera máxima pelo gunicorn (s)')
+    parser.add_argument('--seed', type=int, default=888)
+    parser.add_argument('--json', help='grava o relatório completo neste arquivo')
+    args = parser.parse_args(argv)
+    args.concorrencia = [int(c) for c in args.concorrencia.split(',')]
+    mix = parse_mix(args.mix)
+
+    relatorio = {'mix': mix, 'duracao_s': args.duracao, 'configs': {}}
+
+    if args.url:
+        print(f'=== {args.url} ===')
+        relatorio['configs']['externo'] = medir(args.url.rstrip('/'), args, mix)
+    else:
+        data_dir = args.dados or tempfile.mkdtemp(prefix='portal-carga-')
+        if not os.path.isdir(data_dir) or not os.listdir(data_dir):
+            print(f'Gerando dados substitutos em {data_dir} ...')
+            gerar_dados(data_dir, itens=args.itens, lotes=args.itens // 4,
+                        eventos=args.itens * 3 // 4, seed=args.seed)
+        relatorio['dados'] = data_dir
+        for workers, threads in _parse_configs(args.configs):
+            nome = f'{workers}x{threads}'
+            print(f'\n=== gunicorn {workers} workers x {threads} threads ===')
+            proc, url = iniciar_gunicorn(workers, threads, data_dir, args.timeout_boot)
+            try:
+                relatorio['configs'][nome] = medir(url, args, mix, master_pid=proc.pid)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    imprimir_comparacao(relatorio)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        print(f'\nRelatório salvo em {args.json}')
+
+
+if __name__ == '__main__':
+    main()
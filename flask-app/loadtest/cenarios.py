@@ -0,0 +1,110 @@
+"""
+Cenários de tráfego do chão de loja.
+
+Cada cenário sorteia uma requisição (rótulo da rota, caminho, cabeçalhos).
+O mix padrão imita um dia comum: muita paginação de ruptura e vencimento,
+consultas de ISV, painéis de perdas e algumas exportações.
+
+As rotas de ``ROTULOS_JOB`` respondem com um job de exportação: o executor
+acompanha o job até o arquivo baixar, e a latência medida é a do clique até
+o download.
+"""
+from urllib.parse import urlencode
+
+FRAGMENTO = {'X-Requested-With': 'XMLHttpRequest'}
+
+BUSCAS = ['PRODUTO', '00', 'FORNECEDOR 01', '123', 'HF', 'RF']
+
+# Faixas de idade (dias) dos filtros do ISV
+IDADES = [(0, 30), (30, 90), (90, 180), (180, None)]
+
+PAINEIS_PERDAS = ['totalperdas', 'perdaporgrupo', 'perdafrios', 'perda_hf', 'negativo', 'perda_vencimento']
+
+MIX_PADRAO = {
+    'ruptura': 35,
+    'isv': 10,
+    'vencimento': 30,
+    'perdas': 20,
+    'exportacoes': 5,
+}
+
+
+def ruptura(rng, ctx):
+    params = {'page': int(rng.integers(1, 20))}
+    if ctx['grupos'] and rng.random() < 0.6:
+        params['grupo'] = str(rng.choice(ctx['grupos']))
+    if rng.random() < 0.7:
+        # A maioria dos cliques de paginação só busca o fragmento da tabela
+        return 'ruptura.fragmento', '/controle-ruptura/?' + urlencode(params), FRAGMENTO
+    return 'ruptura.index', '/controle-ruptura/?' + urlencode(params), {}
+
+
+def isv(rng, ctx):
+    if rng.random() < 0.2:
+        return 'isv.page', '/controle-isv/page', {}
+    # Os filtros da tela vão para a API (mesmos parâmetros da página)
+    params = {'dias': int(rng.choice([1, 3, 7, 15, 30]))}
+    if rng.random() < 0.4:
+        params['busca'] = str(rng.choice(BUSCAS))
+    if ctx.get('fornecedores') and rng.random() < 0.3:
+        params['fornecedor'] = str(rng.choice(ctx['fornecedores']))
+    if rng.random() < 0.3:
+        idade_min, idade_max = IDADES[int(rng.integers(len(IDADES)))]
+        params['idade_min'] = idade_min
+        if idade_max is not None:
+            params['idade_max'] = idade_max
+    return 'isv.api_dados', '/controle-isv/api/dados?' + urlencode(params), {}
+
+
+def vencimento(rng, ctx):
+    params = {'page': int(rng.integers(1, 10))}
+    if rng.random() < 0.4:
+        params['dias_vencimento'] = int(rng.choice([7, 15, 30, 45]))
+    if rng.random() < 0.3:
+        params['filtro'] = str(rng.choice(BUSCAS))
+    sorteio = rng.random()
+    if sorteio < 0.2:
+        return 'vencimento.valoravencer', '/controle-vencimento/valoravencer?page=' + str(params['page']), FRAGMENTO
+    headers = FRAGMENTO if sorteio < 0.7 else {}
+    rotulo = 'vencimento.fragmento' if headers else 'vencimento.home'
+    return rotulo, '/controle-vencimento/?' + urlencode(params), headers
+
+
+def perdas(rng, ctx):
+    painel = str(rng.choice(PAINEIS_PERDAS))
+    return f'perdas.{painel}', f'/controle-perdas/{painel}', {}
+
+
+def exportacoes(rng, ctx):
+    if rng.random() < 0.5 and ctx['grupos']:
+        grupo = str(rng.choice(ctx['grupos'] + ['todos']))
+        return 'export.ruptura', '/controle-ruptura/export?' + urlencode({'grupo': grupo}), {}
+    if rng.random() < 0.5:
+        return 'imprimir.ruptura', '/controle-ruptura/imprimir', {}
+    return 'export.vencimento', '/controle-vencimento/exportar?dias_vencimento=45', {}
+
+
+# Rotas que enfileiram um job de exportação (app.export_jobs)
+ROTULOS_JOB = {'export.ruptura'}
+
+CENARIOS = {
+    'ruptura': ruptura,
+    'isv': isv,
+    'vencimento': vencimento,
+    'perdas': perdas,
+    'exportacoes': exportacoes,
+}
+
+
+def parse_mix(texto):
+    """Converte 'ruptura=40,perdas=20' em {cenário: peso}."""
+    if not texto:
+        return dict(MIX_PADRAO)
+    mix = {}
+    for parte in texto.split(','):
+        nome, _, peso = parte.partition('=')
+        nome = nome.strip()
+        if nome not in CENARIOS:
+            raise ValueError(f'Cenário desconhecido: {nome} (use {", ".join(CENARIOS)})')
+        mix[nome] = float(peso or 1)
+    return mix
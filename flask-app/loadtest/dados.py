@@ -0,0 +1,142 @@
+"""
+Geração de arquivos de dados substitutos para o teste de carga.
+
+Produz, em uma pasta local, os mesmos arquivos que o portal lê da rede
+(mesmos nomes de colunas e formatos: CSV ';' latin1 com decimais com
+vírgula e planilhas .xlsx), com a estrutura de ``app.datasets.LOCAL_NAMES``.
+Basta apontar ``PORTAL_DATA_DIR`` para a pasta gerada.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.datasets import LOCAL_NAMES
+
+GRUPOS = ['BEBIDAS', 'LIMPEZA', 'MERCEARIA', 'FRIOS', 'HORTIFRUTI', 'PERFUMARIA', 'BAZAR', 'PADARIA']
+SUBGRUPOS = ['REFRIGERANTES', 'CERVEJAS', 'DETERGENTES', 'ARROZ/FEIJAO', 'QUEIJOS', 'FRUTAS', 'SHAMPOO', 'PAES']
+FORNECEDORES = [f'FORNECEDOR {i:03d} LTDA' for i in range(1, 121)]
+OPERACOES = [
+    'MERCADORIAS  AVARIADAS',
+    'MERCADORIAS AVARIADAS POR VENCIMENTO',
+    'AVARIAS POR DEGUSTACAO',
+    'AVARIAS / HORTIFRUT',
+    'TRANSFERENCIA ENTRE DEPOSITOS',
+]
+EVENTOS = [1500, 6004, 6001, 6504, 6021, 8000, 6501, 6521]
+
+
+def _decimal_br(valores):
+    return pd.Series(valores).map(lambda v: f'{v:.1f}'.replace('.', ','))
+
+
+def _descricoes(rng, n):
+    prefixos = rng.choice(['', '', '', 'HF ', 'RF '], n)
+    return [f'{p}PRODUTO {i:06d}' for i, p in enumerate(prefixos)]
+
+
+def gerar_smg12(rng, codigos):
+    n = len(codigos)
+    hoje = pd.Timestamp.now().normalize()
+    dt_ent = hoje - pd.to_timedelta(rng.integers(0, 180, n), unit='D')
+    dt_vnd = hoje - pd.to_timedelta(rng.integers(0, 120, n), unit='D')
+    ent = pd.Series(dt_ent.strftime('%d/%m/%Y'))
+    ent[rng.random(n) < 0.05] = None
+    return pd.DataFrame({
+        'MERC': codigos,
+        'DESCRICAO': _descricoes(rng, n),
+        'EMBALAGEM': rng.choice(['UN', 'CX 12', 'FD 6', 'PCT 5'], n),
+        'DT ULT ENT': ent,
+        'NAO VENDE (RUPT.)': _decimal_br(rng.integers(0, 90, n)),
+        'QTD ULT ENT': _decimal_br(rng.integers(0, 500, n)),
+        'ESTOQ EMB1': _decimal_br(rng.integers(0, 800, n)),
+        'ESTOQ EMB9': _decimal_br(rng.integers(0, 60, n)),
+        'DT ULT VND': dt_vnd.strftime('%d/%m/%Y'),
+        'IDADE': _decimal_br(rng.integers(0, 400, n)),
+        'DIAS S/VND': rng.integers(0, 120, n),
+        'GRUPO': rng.choice(GRUPOS, n),
+    })
+
+
+def gerar_forn_isv(rng, codigos):
+    return pd.DataFrame({
+        'Item Produto': codigos.astype(float),
+        'Fornecedor Atual': [f'{rng.integers(10, 99)}.000.000/0001-{rng.integers(10, 99)}' for _ in codigos],
+        'Unnamed: 2': rng.choice(FORNECEDORES, len(codigos)),
+    })
+
+
+def gerar_forn_vencimento(rng, codigos):
+    return pd.DataFrame({
+        'Item Produto': codigos,
+        'Fornecedor Atual': '00.000.000/0001-00',
+        'FORNECEDOR': rng.choice(FORNECEDORES, len(codigos)),
+    })
+
+
+def gerar_saeou060(rng, codigos, lotes):
+    hoje = pd.Timestamp.now().normalize()
+    cod = rng.choice(codigos, lotes)
+    return pd.DataFrame({
+        'CÓDIGO': cod,
+        'DESCRIÇÃO MERCADORIA': [f'PRODUTO {c:06d}' for c in cod],
+        'COMPLEMENTO': '',
+        'EMBALAGEM': rng.choice(['UN', 'CX 12', 'FD 6'], lotes),
+        'DATA VENCIMENTO': hoje + pd.to_timedelta(rng.integers(-15, 180, lotes), unit='D'),
+        'EST. LÍQ. EMB1': rng.integers(0, 200, lotes),
+        'EST. LÍQ. EMB9': rng.integers(0, 20, lotes),
+        'VALOR VENCIMENTO': (rng.random(lotes) * 1500).round(2),
+    })
+
+
+def gerar_saeoi051(rng, codigos, eventos):
+    hoje = pd.Timestamp.now().normalize()
+    cod = rng.choice(codigos, eventos)
+    return pd.DataFrame({
+        'EVENTO': rng.choice(EVENTOS, eventos),
+        'MERCADORIA': cod,
+        'DESCRICAO': _descricoes(rng, eventos),
+        'VLR.TOTAL': (rng.random(eventos) * 400 - 60).round(2),
+        'EMB1': rng.integers(1, 30, eventos),
+        'OPERACAO': rng.choice(OPERACOES, eventos),
+        'GRUPO': rng.choice(GRUPOS, eventos),
+        'SUB-GRUPO': rng.choice(SUBGRUPOS, eventos),
+        'DT.ULT.EV.': hoje - pd.to_timedelta(rng.integers(0, 30, eventos), unit='D'),
+    })
+
+
+def gerar_dados(destino, itens=20000, lotes=5000, eventos=15000, seed=888):
+    """
+    Grava todos os arquivos de origem em ``destino``.
+
+    Args:
+        destino (str): pasta de saída (vira o PORTAL_DATA_DIR)
+        itens (int): quantidade de produtos (linhas do smg12)
+        lotes (int): linhas do SAEOU060 (lotes com vencimento)
+        eventos (int): linhas do SAEOI051 (eventos de perda)
+        seed (int): semente para gerar sempre os mesmos dados
+
+    Returns:
+        dict: {fonte: caminho do arquivo gerado}
+    """
+    rng = np.random.default_rng(seed)
+    codigos = rng.choice(np.arange(10000, 99999), size=itens, replace=False)
+
+    quadros = {
+        'smg12': gerar_smg12(rng, codigos),
+        'forn_isv': gerar_forn_isv(rng, codigos),
+        'forn_vencimento': gerar_forn_vencimento(rng, codigos),
+        'saeou060': gerar_saeou060(rng, codigos, lotes),
+        'saeoi051': gerar_saeoi051(rng, codigos, eventos),
+    }
+
+    caminhos = {}
+    for nome, df in quadros.items():
+        caminho = os.path.join(destino, *LOCAL_NAMES[nome].split('/'))
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        if caminho.endswith('.xlsx'):
+            df.to_excel(caminho, index=False)
+        else:
+            df.to_csv(caminho, sep=';', encoding='latin1', index=False)
+        caminhos[nome] = caminho
+    return caminhos
@@ -0,0 +1,217 @@
+"""
+Execução da carga e coleta de métricas (latência por rota e RSS dos workers).
+"""
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+
+from .cenarios import CENARIOS, ROTULOS_JOB
+
+# Intervalo entre as consultas de estado de um job de exportação (s)
+INTERVALO_JOB = 0.2
+
+
+def percentil(valores, q):
+    """Percentil por posição (nearest-rank) de uma lista já ordenada."""
+    if not valores:
+        return 0.0
+    indice = min(int(round(q * (len(valores) - 1))), len(valores) - 1)
+    return valores[indice]
+
+
+def requisitar(base_url, caminho, headers, timeout=120):
+    """Faz o GET e devolve (status, bytes recebidos)."""
+    req = urllib.request.Request(base_url + caminho, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, len(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, 0
+    except (urllib.error.URLError, OSError):
+        return 0, 0
+
+
+def _ler_json(base_url, caminho, timeout=120):
+    """GET de uma rota JSON; devolve (status, corpo) ou (0, {}) se falhar."""
+    req = urllib.request.Request(base_url + caminho)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, {}
+    except (urllib.error.URLError, OSError, ValueError):
+        return 0, {}
+
+
+def requisitar_job(base_url, caminho, headers, timeout=300):
+    """
+    Enfileira a exportação, acompanha o job e baixa o arquivo.
+
+    Returns:
+        tuple: (status final, bytes recebidos); 0 se o job não terminar
+            em ``timeout`` segundos
+    """
+    req = urllib.request.Request(base_url + caminho, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, job = resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, 0
+    except (urllib.error.URLError, OSError, ValueError):
+        return 0, 0
+
+    limite = time.monotonic() + timeout
+    while status == 202:
+        if time.monotonic() > limite:
+            return 0, 0
+        time.sleep(INTERVALO_JOB)
+        status, job = _ler_json(base_url, job['status_url'])
+    if status != 200 or job.get('status') == 'erro':
+        return status or 500, 0
+    return requisitar(base_url, job['download_url'], {}, timeout=timeout)
+
+
+def executar_cenario(base_url, rotulo, caminho, headers):
+    """Faz a requisição do cenário (jobs de exportação até o download)."""
+    if rotulo in ROTULOS_JOB:
+        return requisitar_job(base_url, caminho, headers)
+    return requisitar(base_url, caminho, headers)
+
+
+def carregar_contexto(base_url):
+    """Busca os dados que os cenários precisam (grupos e fornecedores do ISV)."""
+    _, grupos = _ler_json(base_url, '/controle-ruptura/api/grupos')
+    _, isv = _ler_json(base_url, '/controle-isv/api/dados')
+    return {
+        'grupos': grupos.get('grupos', []),
+        'fornecedores': [nome for nome, _ in isv.get('fornecedores', [])],
+    }
+
+
+# =============== RSS DOS WORKERS ===============
+
+def _rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _filhos(pid):
+    filhos = []
+    for nome in os.listdir('/proc'):
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f'/proc/{nome}/stat') as f:
+                campos = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(campos[1]) == pid:
+            filhos.append(int(nome))
+    return filhos
+
+
+class AmostradorRSS(threading.Thread):
+    """Amostra o RSS dos processos filhos do master do gunicorn (Linux /proc)."""
+
+    def __init__(self, master_pid, intervalo=0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.intervalo = intervalo
+        self.max_por_worker = {}
+        self.max_total = 0
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            total = 0
+            for pid in _filhos(self.master_pid):
+                rss = _rss_kb(pid)
+                if rss is None:
+                    continue
+                total += rss
+                self.max_por_worker[pid] = max(self.max_por_worker.get(pid, 0), rss)
+            self.max_total = max(self.max_total, total)
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+    def resumo(self):
+        por_worker = list(self.max_por_worker.values())
+        return {
+            'workers': len(por_worker),
+            'rss_max_worker_mb': round(max(por_worker) / 1024, 1) if por_worker else None,
+            'rss_max_total_mb': round(self.max_total / 1024, 1) if por_worker else None,
+        }
+
+
+# =============== CARGA ===============
+
+def executar_carga(base_url, mix, concorrencia, duracao, contexto, seed=0):
+    """
+    Roda ``concorrencia`` usuários simultâneos durante ``duracao`` segundos.
+
+    Returns:
+        dict: vazão total, erros e latências p50/p95/p99 por rota (ms)
+    """
+    nomes = list(mix)
+    pesos = np.array([mix[n] for n in nomes], dtype=float)
+    pesos = pesos / pesos.sum()
+    amostras = defaultdict(list)
+    erros = defaultdict(int)
+    lock = threading.Lock()
+    fim = time.monotonic() + duracao
+
+    def usuario(indice):
+        rng = np.random.default_rng(seed + indice)
+        while time.monotonic() < fim:
+            cenario = CENARIOS[nomes[rng.choice(len(nomes), p=pesos)]]
+            rotulo, caminho, headers = cenario(rng, contexto)
+            inicio = time.perf_counter()
+            status, _ = executar_cenario(base_url, rotulo, caminho, headers)
+            latencia = (time.perf_counter() - inicio) * 1000
+            with lock:
+                amostras[rotulo].append(latencia)
+                if status == 0 or status >= 500:
+                    erros[rotulo] += 1
+
+    inicio = time.monotonic()
+    threads = [threading.Thread(target=usuario, args=(i,)) for i in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    rotas = {}
+    for rotulo, lat in sorted(amostras.items()):
+        lat.sort()
+        rotas[rotulo] = {
+            'requisicoes': len(lat),
+            'erros': erros[rotulo],
+            'p50_ms': round(percentil(lat, 0.50), 1),
+            'p95_ms': round(percentil(lat, 0.95), 1),
+            'p99_ms': round(percentil(lat, 0.99), 1),
+        }
+    total = sum(len(v) for v in amostras.values())
+    return {
+        'concorrencia': concorrencia,
+        'duracao_s': round(decorrido, 1),
+        'requisicoes': total,
+        'erros': sum(erros.values()),
+        'vazao_rps': round(total / decorrido, 2) if decorrido else 0.0,
+        'rotas': rotas,
+    }
@@ -1,7 +1,11 @@
+import os
+
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host="10.122.244.64", port=5099, debug=True)
+    app.run(host=os.environ.get('PORTAL_HOST', '10.122.244.64'),
+            port=int(os.environ.get('PORTAL_PORT', 5099)),
+            debug=True)
     
\ No newline at end of file
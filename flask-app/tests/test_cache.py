@@ -0,0 +1,185 @@
+"""Cache compartilhado (app.cache): cliente RESP, trava no cluster e falhas do backend."""
+import os
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app import cache
+from app.cache import FileBackend, MemoryBackend, RedisBackend, RespError, SharedCache
+
+
+class _Resp(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            args = []
+            for _ in range(int(linha[1:])):
+                tamanho = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(tamanho + 2)[:-2])
+            self.wfile.write(self.server.executar(args))
+
+
+class ServidorResp(socketserver.ThreadingTCPServer):
+    """Substituto do Redis em memória: só GET, SET (NX/EX) e DEL."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Resp)
+        self.dados = {}  # chave -> (valor, expira_em)
+        self.comandos = []
+        self.falhar = False
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'redis://%s:%d/0' % self.server_address
+
+    def executar(self, args):
+        comando = args[0].decode().upper()
+        with self._lock:
+            self.comandos.append(comando)
+            if self.falhar:
+                return b'-ERR backend fora\r\n'
+            if comando == 'GET':
+                valor, expira_em = self.dados.get(args[1], (None, None))
+                if valor is None or (expira_em and time.monotonic() > expira_em):
+                    return b'$-1\r\n'
+                return b'$%d\r\n%s\r\n' % (len(valor), valor)
+            if comando == 'SET':
+                opcoes = [a.decode().upper() for a in args[3:]]
+                atual = self.dados.get(args[1])
+                if 'NX' in opcoes and atual and not (atual[1] and time.monotonic() > atual[1]):
+                    return b'$-1\r\n'
+                ex = int(opcoes[opcoes.index('EX') + 1]) if 'EX' in opcoes else None
+                self.dados[args[1]] = (args[2], time.monotonic() + ex if ex else None)
+                return b'+OK\r\n'
+            if comando == 'DEL':
+                return b':%d\r\n' % (self.dados.pop(args[1], None) is not None)
+            return b'-ERR comando desconhecido\r\n'
+
+
+@pytest.fixture
+def servidor():
+    servidor = ServidorResp()
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def no(servidor, espera=5):
+    return SharedCache(MemoryBackend(), RedisBackend(servidor.url, ttl=60), ttl=60, espera=espera)
+
+
+def test_get_set_nx_del(servidor):
+    redis = RedisBackend(servidor.url, ttl=60)
+    assert redis.get('k') is None
+
+    redis.set('k', {'a': 1})
+    assert redis.get('k') == {'a': 1}
+    redis.set('texto', 'x' * 10000)
+    assert redis.get('texto') == 'x' * 10000
+
+    assert redis.add('trava', 'no-1', ttl=5)
+    assert not redis.add('trava', 'no-2', ttl=5)
+    assert redis.get('trava') == 'no-1'
+
+    redis.delete('trava')
+    assert redis.get('trava') is None
+    assert redis.add('trava', 'no-2', ttl=5)
+
+
+def test_erro_do_servidor_vira_resp_error(servidor):
+    redis = RedisBackend(servidor.url)
+    servidor.falhar = True
+    with pytest.raises(RespError):
+        redis.get('k')
+
+
+def test_dois_nos_calculam_uma_vez_por_chave(servidor, monkeypatch):
+    monkeypatch.setattr(cache, 'INTERVALO_ESPERA', 0.01)
+    primeiro, segundo = no(servidor), no(servidor)
+    chamadas = []
+    liberar = threading.Event()
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        return 'valor'
+
+    resultados = {}
+    thread = threading.Thread(target=lambda: resultados.setdefault('primeiro', primeiro.get_or_compute('k', calcular)))
+    thread.start()
+    # Espera o primeiro nó pegar a trava antes do segundo pedir a mesma chave
+    while 'SET' not in servidor.comandos:
+        time.sleep(0.01)
+
+    threading.Timer(0.1, liberar.set).start()
+    resultados['segundo'] = segundo.get_or_compute('k', calcular)
+    thread.join(5)
+
+    assert resultados == {'primeiro': 'valor', 'segundo': 'valor'}
+    assert len(chamadas) == 1
+    assert segundo.contadores['esperas'] == 1
+    assert segundo.contadores['calculados'] == 0
+    # A trava foi apagada depois da gravação
+    assert RedisBackend(servidor.url).get('k:trava') is None
+
+    # Um terceiro nó lê o valor já gravado sem calcular
+    terceiro = no(servidor)
+    assert terceiro.get_or_compute('k', calcular) == 'valor'
+    assert terceiro.contadores['compartilhado'] == 1
+    assert len(chamadas) == 1
+
+
+def test_espera_esgotada_calcula_no_proprio_no(servidor, monkeypatch):
+    monkeypatch.setattr(cache, 'INTERVALO_ESPERA', 0.01)
+    # Trava de um nó que caiu no meio do cálculo
+    RedisBackend(servidor.url).add('k:trava', 'outro-no', ttl=60)
+
+    espera = no(servidor, espera=0.1)
+    assert espera.get_or_compute('k', lambda: 'valor') == 'valor'
+    assert espera.contadores['esperas'] == 1
+    assert espera.contadores['calculados'] == 1
+
+
+def test_falha_calcula_local_e_pausa_o_backend(servidor, monkeypatch):
+    cluster = no(servidor)
+    servidor.falhar = True
+
+    assert cluster.get_or_compute('a', lambda: 'valor a') == 'valor a'
+    assert cluster.contadores['erros'] == 1
+    assert cluster.contadores['calculados'] == 1
+
+    # Durante a pausa o backend nem é consultado, mesmo já respondendo
+    servidor.falhar = False
+    antes = len(servidor.comandos)
+    assert cluster.get_or_compute('b', lambda: 'valor b') == 'valor b'
+    assert len(servidor.comandos) == antes
+
+    # Passada a pausa, volta a ler e gravar no backend
+    agora = time.monotonic()
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: agora + cache.PAUSA_APOS_ERRO + 1)
+    assert cluster.get_or_compute('c', lambda: 'valor c') == 'valor c'
+    assert RedisBackend(servidor.url).get('c') == 'valor c'
+
+
+def test_file_backend_assume_trava_abandonada(tmp_path):
+    disco = FileBackend(str(tmp_path), ttl=60)
+    assert disco.add('k:trava', 'no-1', ttl=30)
+    assert not disco.add('k:trava', 'no-2', ttl=30)
+
+    # O nó 1 caiu: a trava passou do ttl e o próximo nó assume
+    caminho = disco._caminho('k:trava')
+    velho = time.time() - 31
+    os.utime(caminho, (velho, velho))
+    assert disco.add('k:trava', 'no-2', ttl=30)
+    assert disco.get('k:trava') == 'no-2'
+    assert not disco.add('k:trava', 'no-3', ttl=30)
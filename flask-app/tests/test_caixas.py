@@ -0,0 +1,66 @@
+"""Seleção parcial das caixas de perdas (app.controle_de_perdas.caixas) e o cursor do "carregar mais"."""
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import create_app
+from app.controle_de_perdas import routes
+from app.controle_de_perdas.caixas import CaixasPerdas, selecionar
+
+# Muitos empates e valores faltando
+VALORES = pd.Series([3.0, np.nan, 1.5, 3.0, -2.0, 1.5, np.nan, 3.0, 0.0, -2.0, 1.5, 7.25, np.nan, 0.0, 3.0, -2.0, 1.5])
+
+
+def chave(valores):
+    # Como SelecaoCaixa: sem valor vai para o fim
+    return np.where(np.isnan(valores), np.inf, valores)
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 5, 8, len(VALORES), len(VALORES) + 4])
+def test_primeiros_iguais_a_sort_values(n):
+    df = pd.DataFrame({'VLR.TOTAL': VALORES})
+    esperado = df.sort_values('VLR.TOTAL', kind='stable').head(n).index.to_numpy()
+    np.testing.assert_array_equal(selecionar(chave(VALORES.to_numpy()), 0, n), esperado)
+
+
+@pytest.mark.parametrize('n', [1, 2, 4, 6])
+def test_fatias_seguidas_sem_repetir_nem_pular(n):
+    ordem = VALORES.sort_values(kind='stable').index.to_numpy()
+    fatias = [selecionar(chave(VALORES.to_numpy()), inicio, n) for inicio in range(0, len(VALORES), n)]
+    np.testing.assert_array_equal(np.concatenate(fatias), ordem)
+    assert len(selecionar(chave(VALORES.to_numpy()), len(VALORES), n)) == 0
+
+
+@pytest.fixture
+def saeoi051():
+    return pd.DataFrame({
+        'EVENTO': 6004,
+        'MERCADORIA': range(1000, 1000 + len(VALORES)),
+        'DESCRICAO': 'RF QUEIJO',
+        'OPERACAO': 'AJUSTE',
+        'VLR.TOTAL': VALORES,
+        'EMB1': 1,
+    })
+
+
+@pytest.fixture
+def client(saeoi051, monkeypatch):
+    caixas = CaixasPerdas(saeoi051, routes.CAIXAS)
+    monkeypatch.setattr(routes, 'caixas_perdas', lambda loja=None: caixas)
+    return create_app({'TESTING': True}).test_client()
+
+
+@pytest.mark.parametrize('n', [1, 3, 5])
+def test_api_caixa_cursor_percorre_a_caixa(client, saeoi051, n):
+    vistos, cursor = [], 0
+    while cursor is not None:
+        resposta = client.get(f'/controle-perdas/api/caixa/frios?cursor={cursor}&n={n}').get_json()
+        assert resposta['success'] and resposta['cursor'] == cursor
+        vistos += [int(m) for m in re.findall(r'<td class="mercadoria">(\d+)</td>', resposta['html'])]
+        assert resposta['restantes'] == len(VALORES) - len(vistos)
+        cursor = resposta['proximo']
+
+    esperado = saeoi051.sort_values('VLR.TOTAL', kind='stable')['MERCADORIA'].tolist()
+    assert vistos == esperado
@@ -0,0 +1,116 @@
+"""Encaixe incremental e composição de deltas (app.deltas)."""
+import pandas as pd
+import pytest
+
+from app import deltas
+from app.deltas import (STATUS_ALTERADO, STATUS_INSERIDO, STATUS_REMOVIDO, DeltaLog, Incremental,
+                        calcular_delta, carregar, hashes_por_chave)
+
+
+def preparar(bruto):
+    # Linha a linha, como preparar_ruptura: renomeia, filtra e converte
+    df = bruto.rename(columns={'MERC': 'CODIGO'})
+    df = df[df['ESTOQUE'].notna()]
+    return df.assign(ESTOQUE=df['ESTOQUE'].astype(int), DOBRO=df['ESTOQUE'].astype(int) * 2)
+
+
+SPEC = Incremental(lambda loja: None, chave=['MERC'], preparar=preparar,
+                   chave_preparada='CODIGO', ordenar=['GRUPO', 'CODIGO'])
+
+
+def bruto(linhas):
+    # Como o arquivo chega: estoque em texto, vazio quando não informado
+    return pd.DataFrame(linhas, columns=['MERC', 'GRUPO', 'ESTOQUE'])
+
+
+V1 = bruto([(10, 'B', '5'), (11, 'A', '0'), (12, 'A', '3'), (13, 'C', None), (14, 'B', '7'), (15, 'A', '1')])
+# 11 alterado, 13 ganha estoque, 14 removido, 16 inserido
+V2 = bruto([(10, 'B', '5'), (11, 'A', '9'), (12, 'A', '3'), (13, 'C', '2'), (15, 'A', '1'), (16, 'C', '4')])
+V3 = bruto([(10, 'B', '6'), (11, 'A', '9'), (12, 'A', '3'), (13, 'C', '2'), (15, 'A', '1'), (17, 'B', '1')])
+
+
+def carga(spec, versao, df, anterior=None):
+    return carregar(_Spec(spec, df), '888', versao, anterior)
+
+
+class _Spec(Incremental):
+    def __init__(self, spec, df):
+        super().__init__(lambda loja: df, spec.chave, spec.preparar, spec.chave_preparada, spec.ordenar)
+
+
+@pytest.fixture(autouse=True)
+def sem_limite(monkeypatch):
+    # O encaixe vale para qualquer tamanho de delta nos testes
+    monkeypatch.setattr(deltas, 'LIMITE_INCREMENTAL', 1.0)
+
+
+def test_encaixe_igual_a_preparacao_completa():
+    anterior = carga(SPEC, 'v1', V1)
+    encaixado = carga(SPEC, 'v2', V2, anterior)
+    completo = carga(SPEC, 'v2', V2)
+
+    pd.testing.assert_frame_equal(encaixado.df, completo.df)
+    assert encaixado.df.index.is_unique
+    assert list(encaixado.df.index) == list(range(len(encaixado.df)))
+
+
+def test_encaixe_em_sequencia_igual_a_preparacao_completa():
+    snapshot = carga(SPEC, 'v1', V1)
+    for versao, df in (('v2', V2), ('v3', V3)):
+        snapshot = carga(SPEC, versao, df, snapshot)
+    pd.testing.assert_frame_equal(snapshot.df, carga(SPEC, 'v3', V3).df)
+
+
+def test_snapshot_guarda_so_a_chave_do_bruto():
+    snapshot = carga(SPEC, 'v1', V1)
+    assert list(snapshot.linhas.columns) == ['MERC']
+    assert snapshot.colunas == list(V1.columns)
+
+
+def _delta(anterior_df, df, versao_anterior, versao):
+    anterior = carga(SPEC, versao_anterior, anterior_df)
+    return calcular_delta(anterior, versao, df, hashes_por_chave(df, SPEC.chave))
+
+
+def _status(mudancas):
+    return dict(zip(mudancas['MERC'], mudancas['STATUS']))
+
+
+def test_delta_classifica_as_linhas():
+    status = _status(_delta(V1, V2, 'v1', 'v2').linhas())
+    assert status == {11: STATUS_ALTERADO, 13: STATUS_ALTERADO, 14: STATUS_REMOVIDO, 16: STATUS_INSERIDO}
+
+
+def test_composicao_de_deltas():
+    log = DeltaLog()
+    log.reiniciar('888', 'ruptura', 'v1')
+    log.registrar('888', 'ruptura', _delta(V1, V2, 'v1', 'v2'))
+    log.registrar('888', 'ruptura', _delta(V2, V3, 'v2', 'v3'))
+
+    status = _status(log.mudancas_desde('888', 'ruptura', 'v1'))
+    # 16 inserido e removido no intervalo não aparece; 17 só inserido
+    assert status == {10: STATUS_ALTERADO, 11: STATUS_ALTERADO, 13: STATUS_ALTERADO,
+                      14: STATUS_REMOVIDO, 17: STATUS_INSERIDO}
+    assert _status(log.mudancas_desde('888', 'ruptura', 'v2')) == {
+        10: STATUS_ALTERADO, 16: STATUS_REMOVIDO, 17: STATUS_INSERIDO}
+    assert log.mudancas_desde('888', 'ruptura', 'v3').empty
+    assert log.mudancas_desde('888', 'ruptura', 'v0') is None
+
+
+def test_removido_e_inserido_de_novo_vira_alterado():
+    sem_12 = V1[V1['MERC'] != 12].reset_index(drop=True)
+    log = DeltaLog()
+    log.registrar('888', 'ruptura', _delta(V1, sem_12, 'v1', 'v2'))
+    log.registrar('888', 'ruptura', _delta(sem_12, V1, 'v2', 'v3'))
+    assert _status(log.mudancas_desde('888', 'ruptura', 'v1')) == {12: STATUS_ALTERADO}
+
+
+def test_historico_gravado_vale_para_outro_worker(tmp_path):
+    quem_viu = DeltaLog(str(tmp_path))
+    quem_viu.registrar('888', 'ruptura', _delta(V1, V2, 'v1', 'v2'))
+    quem_viu.registrar('888', 'ruptura', _delta(V2, V3, 'v2', 'v3'))
+
+    # Outro worker subiu já na v3 e nunca viu a v1
+    outro = DeltaLog(str(tmp_path))
+    outro.reiniciar('888', 'ruptura', 'v3')
+    assert set(_status(outro.mudancas_desde('888', 'ruptura', 'v1'))) == {10, 11, 13, 14, 17}
@@ -0,0 +1,40 @@
+"""Vagas das conexões SSE (app.eventos): toda reserva volta, tenha o fluxo começado ou não."""
+import pytest
+
+from app import create_app, eventos
+
+
+@pytest.fixture
+def app():
+    app = create_app({'TESTING': True, 'EVENTOS_DURACAO': 0})
+    app.extensions['eventos'].max_conexoes = 1
+    return app
+
+
+def test_resposta_fechada_sem_ler_libera_a_vaga(app):
+    client = app.test_client()
+    resposta = client.get('/eventos', buffered=False)
+    assert resposta.status_code == 200
+    assert app.extensions['eventos'].abertas == 1
+    # A segunda conexão não cabe enquanto a primeira está aberta
+    assert client.get('/eventos', buffered=False).status_code == 503
+
+    resposta.close()
+    assert app.extensions['eventos'].abertas == 0
+
+
+def test_fluxo_lido_ate_o_fim_libera_uma_vez(app):
+    resposta = app.test_client().get('/eventos', buffered=False)
+    assert b'event: versoes' in b''.join(resposta.response)
+    resposta.close()
+    assert app.extensions['eventos'].abertas == 0
+
+
+def test_erro_antes_da_resposta_libera_a_vaga(app, monkeypatch):
+    def falhar():
+        raise RuntimeError('loja indisponível')
+
+    monkeypatch.setattr(eventos, 'loja_atual', falhar)
+    with pytest.raises(RuntimeError):
+        app.test_client().get('/eventos')
+    assert app.extensions['eventos'].abertas == 0
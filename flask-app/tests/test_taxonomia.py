@@ -0,0 +1,128 @@
+"""Caixas de perdas pela taxonomia (app.controle_de_perdas.taxonomia) contra os filtros antigos."""
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.controle_de_perdas.caixas import CaixasPerdas
+from app.controle_de_perdas.routes import CAIXAS
+
+# =============== FILTROS ANTIGOS (antes da taxonomia) ===============
+
+# Dois espaços no primeiro trecho, como estava
+OPERACOES_AVARIA = 'MERCADORIAS  AVARIADAS|MERCADORIAS AVARIADAS POR VENCIMENTO|AVARIAS POR DEGUSTACAO|AVARIAS / HORTIFRUT'
+OPERACAO_VENCIMENTO = 'MERCADORIAS AVARIADAS POR VENCIMENTO'
+EVENTOS_AJUSTE = [6004, 6001, 6504, 6021, 8000, 6501]
+EVENTOS_AJUSTE_FRIOS = [6004, 6001, 6504, 6021, 8000]
+
+
+def _avarias(t):
+    return (t.evento == 1500) & t.operacao.str.contains(OPERACOES_AVARIA).to_numpy()
+
+
+def _ajustes(t):
+    return np.isin(t.evento, EVENTOS_AJUSTE)
+
+
+def _frios(t):
+    return t.descricao.str.startswith('RF').to_numpy()
+
+
+def _vencimento(t):
+    return (t.operacao == OPERACAO_VENCIMENTO).to_numpy()
+
+
+def _hf(df):
+    return df['DESCRICAO'].str.startswith('HF', na=False).to_numpy()
+
+
+def tabela_antiga(df):
+    # Colunas normalizadas como no TabelaPerdas antigo (NaN vira '' / 0)
+    return SimpleNamespace(
+        evento=pd.to_numeric(df['EVENTO'], errors='coerce').fillna(0).astype(int).to_numpy(),
+        descricao=df['DESCRICAO'].astype(str).where(df['DESCRICAO'].notna(), ''),
+        operacao=df['OPERACAO'].astype(str).where(df['OPERACAO'].notna(), ''),
+    )
+
+
+BASE = {
+    'avarias_mes': lambda t, df: _avarias(t),
+    'ajustes_mes': lambda t, df: _ajustes(t),
+    'avarias_hoje': lambda t, df: _avarias(t),
+    'ajustes_hoje': lambda t, df: _ajustes(t),
+    'negativo_sobra': lambda t, df: t.evento == 6521,
+    'negativo_falta': lambda t, df: t.evento == 6021,
+    'frios': lambda t, df: _frios(t),
+    'frios_avarias': lambda t, df: _frios(t) & _avarias(t),
+    'frios_ajustes': lambda t, df: _frios(t) & np.isin(t.evento, EVENTOS_AJUSTE_FRIOS),
+    'frios_vencimento': lambda t, df: _frios(t) & _vencimento(t),
+    # perda_hf: filtro 1 e filtro 2 da página antiga
+    'hf_avarias': lambda t, df: _hf(df) & (df['OPERACAO'] == 'AVARIAS / HORTIFRUT').to_numpy(),
+    'hf_ajustes': lambda t, df: _hf(df) & ((df['OPERACAO'] != 'AVARIAS / HORTIFRUT')
+                                           & (df['EVENTO'] != 6521)).to_numpy(),
+    'vencimento': lambda t, df: _vencimento(t) & ~t.descricao.str.startswith(('HF', 'RF')).to_numpy(),
+}
+
+HOJE = pd.Timestamp('2024-05-10')
+
+EVENTOS = [1500, 6001, 6004, 6504, 8000, 6501, 6021, 6521, 7000, None]
+OPERACOES = [
+    'MERCADORIAS AVARIADAS POR VENCIMENTO',
+    'AVARIAS / HORTIFRUT',
+    'MERCADORIAS  AVARIADAS',
+    'MERCADORIAS AVARIADAS',  # um espaço: não é avaria
+    'AVARIAS POR DEGUSTACAO',
+    'X AVARIAS POR DEGUSTACAO X',
+    'TRANSFERENCIA',
+    None,
+]
+DESCRICOES = ['HF BANANA', 'RF QUEIJO', 'ARROZ', 'hf minusculo', ' RF COM ESPACO', None]
+
+
+@pytest.fixture(scope='module')
+def saeoi051():
+    linhas = []
+    for i, (evento, operacao, descricao) in enumerate(itertools.product(EVENTOS, OPERACOES, DESCRICOES)):
+        linhas.append({
+            'EVENTO': evento,
+            'MERCADORIA': 1000 + i,
+            'DESCRICAO': descricao,
+            'OPERACAO': operacao,
+            # Valores com mais de 2 casas, repetidos e faltando
+            'VLR.TOTAL': None if i % 17 == 0 else round((i % 23) * 1.337 - 9, 3),
+            'EMB1': i % 5,
+            'DT.ULT.EV.': HOJE if i % 3 else HOJE - pd.Timedelta(days=2),
+        })
+    return pd.DataFrame(linhas)
+
+
+@pytest.fixture(scope='module')
+def caixas(saeoi051):
+    return CaixasPerdas(saeoi051, CAIXAS)
+
+
+def test_todas_as_caixas_tem_filtro_antigo():
+    assert set(BASE) == set(CAIXAS)
+
+
+@pytest.mark.parametrize('nome', sorted(BASE))
+def test_caixa_igual_ao_filtro_antigo(caixas, saeoi051, nome):
+    mascara = BASE[nome](tabela_antiga(saeoi051), saeoi051)
+    if CAIXAS[nome].hoje:
+        mascara = mascara & (saeoi051['DT.ULT.EV.'] == HOJE).to_numpy()
+    esperado = np.flatnonzero(mascara)
+    assert len(esperado), f'{nome}: nenhuma linha no quadro de teste'
+
+    selecao = caixas.selecao(nome, HOJE)
+    np.testing.assert_array_equal(selecao.posicoes, esperado)
+
+    linhas = saeoi051.iloc[esperado]
+    valores = pd.to_numeric(linhas['VLR.TOTAL'])
+    if CAIXAS[nome].arredondar:
+        valores = valores.round(2)
+    assert selecao.total == len(esperado)
+    assert selecao.vlr_total == pytest.approx(valores.sum())
+    assert selecao.emb1_total == linhas['EMB1'].sum()
+    assert selecao.eventos == linhas['EVENTO'].fillna(0).nunique()